@@ -12,7 +12,7 @@ import traceback
 import logging
 import re
 import hashlib
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
 import requests as http_requests
@@ -381,28 +381,39 @@ class ApiTestService:
         failed_records = []
         total_duration = 0
 
+        # 为每条用例确定候选 endpoint，并发生成 DSL（各用例的 LLM 调用互不依赖）
+        case_ep_lists = []
         for case in cases:
-            start_time = time.time()
-            try:
-                # 如果有预匹配的 endpoint map，只传该用例对应的单个 endpoint
-                if case_endpoint_map and str(case.id) in case_endpoint_map:
-                    matched = case_endpoint_map[str(case.id)]
-                    # 从完整 ep_list 中找到对应的 endpoint（带完整文档信息）
-                    target_ep = None
-                    for ep in ep_list:
-                        if ep["method"] == matched["method"] and ep["path"] == matched["path"]:
-                            target_ep = ep
-                            break
-                    if target_ep:
-                        case_ep_list = [target_ep]
-                    else:
-                        # fallback: 构造基础信息
-                        case_ep_list = [{"method": matched["method"], "path": matched["path"],
-                                         "summary": matched.get("summary", ""), "description": None,
-                                         "params": None, "success_example": None, "error_example": None, "notes": None}]
-                    dsl = await _match_endpoint_and_generate_dsl(case, case_ep_list, mode)
+            # 如果有预匹配的 endpoint map，只传该用例对应的单个 endpoint
+            if case_endpoint_map and str(case.id) in case_endpoint_map:
+                matched = case_endpoint_map[str(case.id)]
+                # 从完整 ep_list 中找到对应的 endpoint（带完整文档信息）
+                target_ep = None
+                for ep in ep_list:
+                    if ep["method"] == matched["method"] and ep["path"] == matched["path"]:
+                        target_ep = ep
+                        break
+                if target_ep:
+                    case_ep_lists.append([target_ep])
                 else:
-                    dsl = await _match_endpoint_and_generate_dsl(case, ep_list, mode)
+                    # fallback: 构造基础信息
+                    case_ep_lists.append([{"method": matched["method"], "path": matched["path"],
+                                           "summary": matched.get("summary", ""), "description": None,
+                                           "params": None, "success_example": None, "error_example": None, "notes": None}])
+            else:
+                case_ep_lists.append(ep_list)
+
+        dsl_requests = [_build_dsl_request(case, eps) for case, eps in zip(cases, case_ep_lists)]
+        dsl_batch = await get_llm_client().achat_many([request for request, _ in dsl_requests])
+        logger.info(f"[ApiTest] DSL 并发生成: {dsl_batch.summary()}")
+
+        for case, case_ep_list, (_, ep_doc), dsl_item in zip(cases, case_ep_lists, dsl_requests, dsl_batch):
+            # 用例耗时包含该用例的 DSL 生成时间
+            start_time = time.time() - dsl_item.duration_ms / 1000
+            try:
+                if not dsl_item.ok:
+                    raise dsl_item.error
+                dsl = _parse_dsl_response(dsl_item.result, case, case_ep_list, ep_doc)
 
                 # 执行 HTTP 请求（放入线程池避免阻塞事件循环）
                 loop = asyncio.get_event_loop()
@@ -579,6 +590,24 @@ def _keyword_overlap_score(case_text: str, parse_summary: str, filename: str) ->
     return len(overlap) / max(len(case_words), 1)
 
 
+def _clean_llm_json(response: str) -> str:
+    """去掉 LLM 回答外层的 ``` 代码块和 <think> 标签"""
+    cleaned = response.strip()
+    if cleaned.startswith('```'):
+        cleaned = re.sub(r'^```(?:json)?\s*', '', cleaned)
+        cleaned = re.sub(r'```\s*$', '', cleaned)
+    return re.sub(r'<think>[\s\S]*?</think>', '', cleaned).strip()
+
+
+def _is_json_answer(response: str) -> bool:
+    """回答能否按 JSON 解析（LLM 响应缓存的校验函数，解析不了的回答不缓存）"""
+    try:
+        json.loads(_clean_llm_json(response))
+        return True
+    except json.JSONDecodeError:
+        return False
+
+
 def _llm_rank_specs(case_text: str, candidates: List[Dict]) -> Optional[Dict]:
     """LLM 精排候选接口文件"""
     llm = get_llm_client()
@@ -610,16 +639,14 @@ def _llm_rank_specs(case_text: str, candidates: List[Dict]) -> Optional[Dict]:
             {"role": "user", "content": user_prompt}
         ],
         temperature=0.1,
-        max_tokens=500
+        max_tokens=500,
+        source="api_test",
+        cache=True,
+        cache_validate=_is_json_answer,
     )
 
-    # 解析 JSON
-    cleaned = response.strip()
-    if cleaned.startswith('```'):
-        cleaned = re.sub(r'^```(?:json)?\s*', '', cleaned)
-        cleaned = re.sub(r'```\s*$', '', cleaned)
     try:
-        return json.loads(cleaned)
+        return json.loads(_clean_llm_json(response))
     except json.JSONDecodeError:
         return None
 
@@ -700,6 +727,18 @@ async def _match_endpoint_and_generate_dsl(
     核心逻辑：把接口文档中解析出的完整信息（params、请求体示例、响应示例、notes）
     全部传给 LLM，让它基于文档中的真实数据来构造请求，而不是凭空猜测。
     """
+    request, ep_doc = _build_dsl_request(case, endpoints)
+    response = await get_llm_client().achat(**request)
+    return _parse_dsl_response(response, case, endpoints, ep_doc)
+
+
+def _build_dsl_request(case: ExecutionCase, endpoints: List[Dict]) -> Tuple[Dict[str, Any], str]:
+    """
+    构造 DSL 生成的 LLM 请求
+
+    Returns:
+        (achat 参数, 接口文档文本)；可直接放入 LLMClient.achat_many 批量执行
+    """
     case_text = f"标题: {case.title}\n步骤: {case.steps}\n预期: {case.expected}"
     if case.test_data:
         case_text += f"\n测试数据: {json.dumps(case.test_data, ensure_ascii=False)}"
@@ -724,8 +763,6 @@ async def _match_endpoint_and_generate_dsl(
 
     ep_doc = "\n\n".join(ep_details)
 
-    llm = get_llm_client()
-
     single_ep = len(endpoints) == 1
     system_prompt = """你是一个接口测试 DSL 生成专家。
 你的任务是根据测试用例和接口文档，""" + ("基于指定的接口" if single_ep else "选择最合适的接口，并") + """基于文档中的参数定义和示例构造真实的 HTTP 请求。
@@ -800,25 +837,29 @@ async def _match_endpoint_and_generate_dsl(
 
 请严格按照接口文档中定义的字段名（不要替换为其他名称）和说明要求，为该测试用例生成可执行的测试 DSL。"""
 
-    response = await llm.achat(
-        messages=[
+    request = {
+        "messages": [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ],
-        temperature=0.1,
-        max_tokens=2000
-    )
-
-    cleaned = response.strip()
-    if cleaned.startswith('```'):
-        cleaned = re.sub(r'^```(?:json)?\s*', '', cleaned)
-        cleaned = re.sub(r'```\s*$', '', cleaned)
+        "temperature": 0.1,
+        "max_tokens": 2000,
+        "source": "api_test",
+        "cache": True,
+        "cache_validate": _is_json_answer,
+    }
+    return request, ep_doc
 
-    # 去除 think 标签
-    cleaned = re.sub(r'<think>[\s\S]*?</think>', '', cleaned).strip()
 
+def _parse_dsl_response(
+    response: str,
+    case: ExecutionCase,
+    endpoints: List[Dict],
+    ep_doc: str
+) -> Dict[str, Any]:
+    """解析 LLM 返回的 DSL，补全结构并按文档说明做后处理"""
     try:
-        dsl = json.loads(cleaned)
+        dsl = json.loads(_clean_llm_json(response))
     except json.JSONDecodeError:
         # fallback: 用第一个 endpoint，基于文档信息构造基础请求
         ep = endpoints[0] if endpoints else {"method": "GET", "path": "/"}
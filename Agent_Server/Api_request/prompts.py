@@ -9,6 +9,10 @@
 # ============================================
 # 通用常量定义（必须在使用前定义）
 # ============================================
+#
+# 各 *_SYSTEM 提示词是请求的固定前缀（DeepSeek / OpenAI 自动前缀缓存、
+# Anthropic cache_control 都按前缀命中），不要在其中拼接运行时数据；
+# 用户输入、页面信息等动态内容放在 user 消息中。
 
 # 通用动作参数格式说明（被多个提示词引用）
 ACTION_FORMAT_GUIDE = """
@@ -731,14 +735,9 @@ TASK_TREE_ATOMIC_PLANNING_SYSTEM = """你是专业的测试用例设计师（Tes
 
 要求：所有内容使用中文，步骤要基于页面真实 UI 元素描述，不要编造不存在的元素，不要跨页面测试。"""
 
-TASK_TREE_ATOMIC_PLANNING_USER_TEMPLATE = """为以下 L2 功能模块规划 L3 原子测试用例：
-
-L2 模块名称: {l2_name}
-描述: {l2_description}
-功能类型: {feature_type}
-测试关注点: {test_focus}
-
-页面能力摘要:
+# 同一次任务树规划中各 L2 节点的请求共享页面能力、测试环境和规则说明，
+# 这些内容放在前面，L2 节点自身的信息放在最后，使请求前缀一致、可命中供应商的提示词缓存
+TASK_TREE_ATOMIC_PLANNING_USER_TEMPLATE = """页面能力摘要:
 {page_capabilities}
 
 测试环境（必须使用以下真实数据填写 test_data，不要编造）:
@@ -765,6 +764,13 @@ L2 模块名称: {l2_name}
 - 使用真实的测试数据
 - 所有步骤在当前页面完成
 
+为以下 L2 功能模块规划 L3 原子测试用例：
+
+L2 模块名称: {l2_name}
+描述: {l2_description}
+功能类型: {feature_type}
+测试关注点: {test_focus}
+
 请为该模块设计 {estimated_count} 条左右的原子测试用例，覆盖正常/异常/边界/安全场景。"""
 
 
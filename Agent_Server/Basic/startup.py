@@ -63,4 +63,40 @@ async def lifespan(app: FastAPI):
     yield
     
     # 关闭时执行
+    try:
+        from Page_Knowledge.reindex import stop_reindex
+        await stop_reindex()
+    except Exception as e:
+        print(f"[Warning] 中断重建索引任务失败: {e}")
+
+    try:
+        from llm.usage_ledger import stop_usage_ledger
+        await asyncio.to_thread(stop_usage_ledger)
+    except Exception as e:
+        print(f"[Warning] 刷新 Token 使用量缓冲失败: {e}")
+    
+    try:
+        from llm.http_pool import close_http_pool
+        await close_http_pool()
+    except Exception as e:
+        print(f"[Warning] 关闭 LLM 连接池失败: {e}")
+
+    try:
+        from Page_Knowledge.access_tracker import stop_access_tracker
+        await stop_access_tracker()
+    except Exception as e:
+        print(f"[Warning] 写回页面知识访问时间失败: {e}")
+
+    try:
+        from Page_Knowledge.local_index import save_local_indexes
+        await asyncio.to_thread(save_local_indexes)
+    except Exception as e:
+        print(f"[Warning] 本地向量索引落盘失败: {e}")
+
+    try:
+        from Page_Knowledge.vector_store import close_vector_store
+        await close_vector_store()
+    except Exception as e:
+        print(f"[Warning] 关闭 Qdrant 连接失败: {e}")
+
     print("\n服务已安全关闭\n")
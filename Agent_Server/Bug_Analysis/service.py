@@ -4,7 +4,7 @@ Bug 分析服务
 作者: 程序员Eighteen
 """
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from sqlalchemy.orm import Session
 from datetime import datetime
 
@@ -35,20 +35,79 @@ class BugAnalysisService:
         Returns:
             Bug 分析结果
         """
-        from database.connection import TestCase, BugReport
+        results = await BugAnalysisService.analyze_bugs_from_executions(
+            [{
+                "test_case_id": test_case_id,
+                "test_record_id": test_record_id,
+                "execution_history": execution_history,
+                "error_message": error_message,
+            }],
+            db,
+            execution_mode=execution_mode
+        )
+        return results[0]
+    
+    @staticmethod
+    async def analyze_bugs_from_executions(
+        failures: List[Dict[str, Any]],
+        db: Session,
+        execution_mode: str = '单量'
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        批量分析多条失败执行
         
-        try:
-            # 获取测试用例
-            test_case = db.query(TestCase).filter(TestCase.id == test_case_id).first()
+        各条失败的 LLM 分析并发进行（LLMClient.achat_many），Bug 报告按顺序写库。
+        
+        Args:
+            failures: 每项包含 test_case_id / test_record_id / execution_history / error_message
+            db: 数据库会话
+            execution_mode: 执行模式
+        
+        Returns:
+            与 failures 顺序一致的分析结果，单条失败时为 None
+        """
+        from database.connection import TestCase
+        from llm import get_llm_client
+        
+        prompts = []
+        for failure in failures:
+            try:
+                test_case = db.query(TestCase).filter(TestCase.id == failure["test_case_id"]).first()
+            except Exception as e:
+                print(f"[BugAnalysis] 查询测试用例失败: {str(e)}")
+                test_case = None
+            prompts.append(
+                (test_case, BugAnalysisService._build_analysis_prompt(test_case, failure))
+                if test_case else (None, None)
+            )
+        
+        llm_client = get_llm_client()
+        batch = await llm_client.achat_many([
+            (lambda prompt=prompt: llm_client.aanalyze_bug(prompt))
+            for test_case, prompt in prompts if test_case
+        ])
+        analyses = iter(batch)
+        
+        results = []
+        for failure, (test_case, _) in zip(failures, prompts):
             if not test_case:
-                return None
-            
-            # 构建分析提示
-            analysis_prompt = f"""
+                results.append(None)
+                continue
+            item = next(analyses)
+            analysis = item.result if item.ok else {"success": False}
+            results.append(BugAnalysisService._create_bug_report(
+                test_case, failure, analysis, db, execution_mode
+            ))
+        return results
+    
+    @staticmethod
+    def _build_analysis_prompt(test_case, failure: Dict[str, Any]) -> str:
+        """构建分析提示"""
+        return f"""
 测试用例: {test_case.title}
 预期结果: {test_case.expected}
-执行历史: {json.dumps(execution_history, ensure_ascii=False)[:2000]}
-错误信息: {error_message}
+执行历史: {json.dumps(failure["execution_history"], ensure_ascii=False)[:2000]}
+错误信息: {failure["error_message"]}
 
 请分析这个测试失败的原因，返回 JSON 格式:
 {{
@@ -58,13 +117,21 @@ class BugAnalysisService:
     "result_feedback": "问题分析和建议"
 }}
 """
-            
-            # 调用 LLM 分析
-            from llm import get_llm_client
-            
-            llm_client = get_llm_client()
-            result = llm_client.analyze_bug(analysis_prompt)
-            
+    
+    @staticmethod
+    def _create_bug_report(
+        test_case,
+        failure: Dict[str, Any],
+        result: Dict[str, Any],
+        db: Session,
+        execution_mode: str
+    ) -> Optional[Dict[str, Any]]:
+        """根据 LLM 分析结果创建 Bug 报告"""
+        from database.connection import BugReport
+        
+        execution_history = failure["execution_history"]
+        error_message = failure["error_message"]
+        try:
             if not result.get('success'):
                 # 使用默认值
                 bug_data = {
@@ -85,9 +152,9 @@ class BugAnalysisService:
             
             # 创建 Bug 报告
             bug_report = BugReport(
-                test_record_id=test_record_id,
+                test_record_id=failure["test_record_id"],
                 bug_name=f"[Bug] {test_case.title}",
-                test_case_id=test_case_id,
+                test_case_id=test_case.id,
                 location_url=execution_history.get('final_state', {}).get('url', ''),
                 error_type=bug_data.get('error_type', '功能错误'),
                 severity_level=bug_data.get('severity_level', '二级'),
@@ -120,6 +187,7 @@ class BugAnalysisService:
             import traceback
             print(f"[BugAnalysis] 分析失败: {str(e)}")
             print(traceback.format_exc())
+            db.rollback()
             return None
     
     @staticmethod
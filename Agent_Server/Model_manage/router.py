@@ -32,6 +32,8 @@ class ModelCreate(BaseModel):
     provider: str = None
     priority: int = 1
     utilization: int = 100
+    rpm_limit: int = 0
+    tpm_limit: int = 0
 
 
 class ModelUpdate(BaseModel):
@@ -42,6 +44,8 @@ class ModelUpdate(BaseModel):
     provider: str = None
     priority: int = None
     utilization: int = None
+    rpm_limit: int = None
+    tpm_limit: int = None
     is_active: int = None
     status: str = None
 
@@ -57,6 +61,8 @@ class ModelResponse(BaseModel):
     is_active: int
     priority: int
     utilization: int
+    rpm_limit: int = 0
+    tpm_limit: int = 0
     tokens_used_total: int = 0
     tokens_used_today: int = 0
     status: str
@@ -67,6 +73,15 @@ class ModelResponse(BaseModel):
         from_attributes = True
 
 
+def _invalidate_model_cache(reason: str):
+    """模型变更后使配置快照失效（失败不影响接口结果）"""
+    try:
+        from llm.config_cache import invalidate_model_config
+        invalidate_model_config(reason)
+    except Exception as e:
+        print(f"[Warning] 刷新模型配置快照失败: {e}")
+
+
 # ============================================
 # API 接口
 # ============================================
@@ -93,6 +108,8 @@ def get_models(db: Session = Depends(get_db)):
                 "is_active": model.is_active,
                 "priority": model.priority,
                 "utilization": model.utilization,
+                "rpm_limit": model.rpm_limit or 0,
+                "tpm_limit": model.tpm_limit or 0,
                 "tokens_used_total": model.tokens_used_total or 0,
                 "tokens_used_today": model.tokens_used_today or 0,
                 "status": model.status,
@@ -376,6 +393,8 @@ def create_model(model_data: ModelCreate, db: Session = Depends(get_db)):
             provider=model_data.provider,
             priority=model_data.priority,
             utilization=model_data.utilization,
+            rpm_limit=model_data.rpm_limit,
+            tpm_limit=model_data.tpm_limit,
             is_active=0,
             tokens_used_total=0,
             tokens_used_today=0,
@@ -385,6 +404,7 @@ def create_model(model_data: ModelCreate, db: Session = Depends(get_db)):
         db.add(new_model)
         db.commit()
         db.refresh(new_model)
+        _invalidate_model_cache("create")
         
         return {
             "success": True,
@@ -416,6 +436,7 @@ def update_model(model_id: int, model_data: ModelUpdate, db: Session = Depends(g
         model.updated_at = datetime.now()
         db.commit()
         db.refresh(model)
+        _invalidate_model_cache("update")
         
         return {
             "success": True,
@@ -445,6 +466,7 @@ def delete_model(model_id: int, db: Session = Depends(get_db)):
         
         db.delete(model)
         db.commit()
+        _invalidate_model_cache("delete")
         
         return {
             "success": True,
@@ -475,7 +497,7 @@ def activate_model(model_id: int, db: Session = Depends(get_db)):
         
         db.commit()
         
-        # 刷新模型配置缓存
+        # 刷新模型配置缓存（内部会 bump 配置快照版本并广播）
         try:
             from Model_manage.config_manager import refresh_llm_config
             refresh_llm_config()
@@ -502,6 +524,7 @@ def get_auto_switch_status(db: Session = Depends(get_db)):
     """获取自动切换状态"""
     try:
         from llm.auto_switch import get_auto_switcher
+        from llm.config_cache import get_config_snapshot
         switcher = get_auto_switcher()
         switcher.load_profiles_from_db(db)
 
@@ -512,6 +535,8 @@ def get_auto_switch_status(db: Session = Depends(get_db)):
                 "current_model_id": switcher._current_model_id,
                 "profiles": switcher.get_all_profiles_status(),
                 "switch_history": switcher.get_switch_history(20),
+                "hedge": switcher.get_hedge_stats(),
+                "config_cache": get_config_snapshot().get_stats(),
             }
         }
     except Exception as e:
@@ -560,6 +585,11 @@ def get_token_stats_summary(db: Session = Depends(get_db)):
     """获取 Token 使用统计摘要"""
     try:
         from sqlalchemy import func
+        from llm.usage_ledger import get_usage_ledger
+
+        # 先落库缓冲中的使用记录，保证统计是最新的
+        ledger = get_usage_ledger()
+        ledger.flush()
 
         # 各模型统计
         models = db.query(LLMModel).order_by(LLMModel.priority).all()
@@ -588,6 +618,7 @@ def get_token_stats_summary(db: Session = Depends(get_db)):
                 func.sum(TokenUsageLog.total_tokens).label('total_tokens'),
                 func.sum(TokenUsageLog.prompt_tokens).label('prompt_tokens'),
                 func.sum(TokenUsageLog.completion_tokens).label('completion_tokens'),
+                func.sum(TokenUsageLog.cached_tokens).label('cached_tokens'),
             ).group_by(TokenUsageLog.source).all()
 
             for row in rows:
@@ -597,6 +628,8 @@ def get_token_stats_summary(db: Session = Depends(get_db)):
                     "total_tokens": row.total_tokens or 0,
                     "prompt_tokens": row.prompt_tokens or 0,
                     "completion_tokens": row.completion_tokens or 0,
+                    "cached_tokens": row.cached_tokens or 0,
+                    "cache_hit_rate": round((row.cached_tokens or 0) / row.prompt_tokens, 4) if row.prompt_tokens else 0.0,
                 })
         except Exception:
             pass  # 表可能还不存在
@@ -606,6 +639,7 @@ def get_token_stats_summary(db: Session = Depends(get_db)):
             "data": {
                 "models": model_stats,
                 "by_source": source_stats,
+                "ledger": ledger.get_stats(),
             }
         }
     except Exception as e:
@@ -629,6 +663,7 @@ def get_recent_token_logs(limit: int = 50, db: Session = Depends(get_db)):
                 "prompt_tokens": log.prompt_tokens,
                 "completion_tokens": log.completion_tokens,
                 "total_tokens": log.total_tokens,
+                "cached_tokens": log.cached_tokens or 0,
                 "source": log.source,
                 "success": log.success,
                 "error_type": log.error_type,
@@ -645,6 +680,10 @@ def get_recent_token_logs(limit: int = 50, db: Session = Depends(get_db)):
 def reset_today_tokens(db: Session = Depends(get_db)):
     """重置今日 Token 统计"""
     try:
+        # 缓冲中的记录属于重置前，先落库
+        from llm.usage_ledger import get_usage_ledger
+        get_usage_ledger().flush()
+
         db.query(LLMModel).update({
             LLMModel.tokens_used_today: 0,
             LLMModel.request_count_today: 0,
@@ -656,6 +695,77 @@ def reset_today_tokens(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ============================================
+# LLM 响应缓存 API
+# ============================================
+
+@router.get("/llm-cache/stats", response_model=dict)
+def get_llm_cache_stats():
+    """获取 LLM 响应缓存命中统计"""
+    from llm.response_cache import get_response_cache
+
+    response_cache = get_response_cache()
+    if response_cache is None:
+        return {"success": True, "data": {"enabled": False}}
+    return {"success": True, "data": {"enabled": True, **response_cache.get_stats()}}
+
+
+@router.post("/llm-cache/clear", response_model=dict)
+def clear_llm_cache():
+    """清空 LLM 响应缓存"""
+    try:
+        from llm.response_cache import get_response_cache
+
+        response_cache = get_response_cache()
+        if response_cache is not None:
+            response_cache.clear()
+        return {"success": True, "message": "LLM 响应缓存已清空"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/llm-traces", response_model=dict)
+def get_llm_traces(
+    source: str = None,
+    session_id: int = None,
+    status: str = None,
+    model_id: int = None,
+    limit: int = 100,
+):
+    """查询最近的 LLM 调用链路（排队、首 Token、总耗时、解析阶段、故障转移等）"""
+    from llm.tracing import get_llm_tracer
+
+    spans = get_llm_tracer().query(
+        source=source, session_id=session_id, status=status,
+        model_id=model_id, limit=min(max(limit, 1), 1000),
+    )
+    return {"success": True, "data": spans, "total": len(spans)}
+
+
+@router.get("/llm-traces/summary", response_model=dict)
+def get_llm_trace_summary(session_id: int = None):
+    """按来源汇总 LLM 调用链路统计"""
+    from llm.tracing import get_llm_tracer
+
+    return {"success": True, "data": get_llm_tracer().summary(session_id=session_id)}
+
+
+@router.get("/llm-singleflight/stats", response_model=dict)
+def get_llm_singleflight_stats():
+    """获取 LLM / Embedding 在途请求合并统计（按来源）"""
+    from llm.singleflight import get_singleflight
+
+    return {"success": True, "data": get_singleflight().get_stats()}
+
+
+@router.get("/llm-schema/stats", response_model=dict)
+def get_llm_schema_stats():
+    """获取结构化输出 schema 提示词缓存统计（含完整/紧凑 token 对比）"""
+    from llm.schema_prompt import get_schema_prompt_cache
+
+    return {"success": True, "data": get_schema_prompt_cache().get_stats()}
+
+
 @router.post("/test_connection")
 def test_connection(request_data: dict = None):
     """
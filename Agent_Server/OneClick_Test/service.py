@@ -17,7 +17,7 @@ import time
 import asyncio
 import logging
 import traceback
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any, Tuple
 from datetime import datetime
 
 from sqlalchemy.orm import Session
@@ -1169,7 +1169,9 @@ class OneClickService:
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=0.3,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                source="oneclick",
+                cache=True,
             )
             result = llm.parse_json_response(response)
             # 确保必要字段存在
@@ -1684,6 +1686,8 @@ class OneClickService:
                 temperature=0.3,
                 max_tokens=3000,
                 response_format={"type": "json_object"},
+                source="oneclick",
+                cache=True,
             )
             result = llm.parse_json_response(response)
             result.setdefault("summary", "页面能力抽象完成")
@@ -1756,6 +1760,40 @@ class OneClickService:
                 "total_estimated_cases": 0,
             }
 
+    @staticmethod
+    async def _stream_json_items(
+        llm,
+        messages: List[Dict[str, str]],
+        array_key: str,
+        on_item: Optional[Callable[[Dict], None]] = None,
+        **chat_kwargs,
+    ) -> Tuple[str, List[Any]]:
+        """
+        流式请求 LLM，目标数组中每个元素闭合即回调 on_item
+
+        Returns:
+            (完整响应文本, 已流式解析出的元素)；流式失败时回退到 achat，元素列表为空
+        """
+        from llm.streaming import IncrementalJSONArrayExtractor
+
+        extractor = IncrementalJSONArrayExtractor(array_key=array_key)
+        try:
+            async for delta in llm.achat_stream(messages=messages, **chat_kwargs):
+                for item in extractor.feed(delta):
+                    if on_item:
+                        try:
+                            on_item(item)
+                        except Exception as cb_err:
+                            logger.warning(f"[OneClick] 流式元素回调失败: {cb_err}")
+            return extractor.text, extractor.items
+        except Exception as e:
+            if extractor.items:
+                # 已产出部分元素，截断只丢失尾部
+                logger.warning(f"[OneClick] 流式响应中断，保留已解析的 {len(extractor.items)} 个元素: {e}")
+                return extractor.text, extractor.items
+            logger.warning(f"[OneClick] 流式请求失败，回退到普通请求: {e}")
+            return await llm.achat(messages=messages, **chat_kwargs), []
+
     @staticmethod
     async def _plan_atomic_tasks_for_l2(
         user_input: str, l2_node: Dict, page_capabilities: Dict,
@@ -1796,17 +1834,29 @@ class OneClickService:
         )
 
         try:
-            response = await llm.achat(
+            response, streamed_nodes = await OneClickService._stream_json_items(
+                llm,
                 messages=[
                     {"role": "system", "content": TASK_TREE_ATOMIC_PLANNING_SYSTEM},
                     {"role": "user", "content": user_prompt},
                 ],
+                array_key="l3_nodes",
                 temperature=0.5,
                 max_tokens=4000,
                 response_format={"type": "json_object"},
+                source="oneclick",
             )
-            result = llm.parse_json_response(response)
-            return result.get("l3_nodes", [])
+            try:
+                result = llm.parse_json_response(response)
+                return result.get("l3_nodes", []) or streamed_nodes
+            except (json.JSONDecodeError, ValueError):
+                if streamed_nodes:
+                    logger.warning(
+                        f"[OneClick] L3 规划响应不完整 ({l2_node.get('name', '')})，"
+                        f"使用已流式解析的 {len(streamed_nodes)} 个节点"
+                    )
+                    return streamed_nodes
+                raise
         except Exception as e:
             logger.warning(f"[OneClick] L3 原子规划失败 ({l2_node.get('name', '')}): {e}")
             return []
@@ -1831,10 +1881,17 @@ class OneClickService:
             "children": [],
         }
 
-        for l2_data in l2_nodes:
-            l3_nodes_raw = await OneClickService._plan_atomic_tasks_for_l2(
+        # 各 L2 节点的 L3 规划互不依赖，并发请求（受模型限流约束）
+        batch = await get_llm_client().achat_many([
+            lambda l2_data=l2_data: OneClickService._plan_atomic_tasks_for_l2(
                 user_input, l2_data, page_capabilities, env_info=env_info
             )
+            for l2_data in l2_nodes
+        ])
+        logger.info(f"[OneClick] L3 并发规划: {batch.summary()}")
+
+        for l2_data, item in zip(l2_nodes, batch):
+            l3_nodes_raw = item.result if item.ok else []
             l2_entry = {
                 "name": l2_data.get("name", ""),
                 "description": l2_data.get("description", ""),
@@ -1969,15 +2026,43 @@ class OneClickService:
         try:
             SessionManager.add_message(db, session, 'assistant', '正在生成测试用例...')
 
-            response = await llm.achat(
+            # 流式生成：用例闭合即写入会话，前端轮询可提前看到
+            # 提交放到线程池且同一时刻只有一次在途（期间到达的用例并入下一次），不阻塞事件循环
+            streamed_cases: List[Dict] = []
+            streamed_persist = {"count": 0, "task": None}
+
+            def _persist_streamed_cases():
+                snapshot = list(streamed_cases)
+                try:
+                    session.generated_cases = json.dumps(snapshot, ensure_ascii=False)
+                    db.commit()
+                    streamed_persist["count"] = len(snapshot)
+                except Exception as persist_err:
+                    logger.warning(f"[OneClick] 流式用例写入会话失败: {persist_err}")
+
+            def _on_case(case):
+                streamed_cases.append(case)
+                task = streamed_persist["task"]
+                if task is None or task.done():
+                    streamed_persist["task"] = asyncio.ensure_future(asyncio.to_thread(_persist_streamed_cases))
+
+            response, _ = await OneClickService._stream_json_items(
+                llm,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
+                array_key="cases",
+                on_item=_on_case,
                 temperature=0.5,
                 max_tokens=8000,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                source="oneclick",
             )
+            if streamed_persist["task"] is not None:
+                await streamed_persist["task"]
+            if streamed_persist["count"] < len(streamed_cases):
+                await asyncio.to_thread(_persist_streamed_cases)
 
             # 使用 Provider 感知的 JSON 解析（带重试）
             result = None
@@ -1988,6 +2073,13 @@ class OneClickService:
                     break
                 except (json.JSONDecodeError, ValueError) as parse_err:
                     last_error = parse_err
+                    if attempt == 0 and streamed_cases:
+                        # 响应被截断：保留已完整生成的用例，不再整体重试
+                        logger.warning(
+                            f"[OneClick] 用例 JSON 不完整，使用已流式解析的 {len(streamed_cases)} 条用例: {parse_err}"
+                        )
+                        result = {"cases": streamed_cases, "summary": ""}
+                        break
                     if attempt == 0:
                         logger.warning(f"[OneClick] 用例 JSON 解析失败（第1次），重新请求 LLM: {parse_err}")
                         response = await llm.achat(
@@ -2414,7 +2506,7 @@ class OneClickService:
             # 用 FailoverChatModel 包装，实现 429 时自动切换模型
             switcher = get_auto_switcher()
             if switcher.enabled and len(switcher._profiles) > 1:
-                llm = FailoverChatModel(raw_llm, switcher)
+                llm = FailoverChatModel(raw_llm, switcher, source="oneclick", session_id=session_id)
                 logger.info("[OneClick] ✅ 已启用 FailoverChatModel，支持 429 自动切换")
             else:
                 llm = raw_llm
@@ -0,0 +1,159 @@
+"""
+页面知识访问时间写后缓冲
+
+lookup 精确命中时原先用 store.upsert(point_id, [], {...}) 重写整份 payload 来更新 last_accessed，
+查询路径上多了一次 Qdrant 写入。现在命中只把访问时间记入内存（同一页面只保留最新时间），
+由后台任务定期把缓冲批量写回：一次 batch_update_points 请求，只设置 last_accessed 一个字段
+（顶层与 knowledge 结构内各一份，lookup / 详情读取的是 knowledge 内的字段）。
+
+- 刷新失败或被取消（关闭应用时）时未被新访问覆盖的时间回填缓冲，下次重试
+- 未刷新的访问时间可通过 peek() 读取，列表与老化判断不受刷新延迟影响
+- 应用关闭时强制刷新
+
+配置：
+  ACCESS_TRACKER_FLUSH_INTERVAL = 10（秒）
+  ACCESS_TRACKER_MAX_PENDING = 1000（缓冲页面数达到后立即刷新）
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# ── 访问时间缓冲配置 ──────────────────────────
+ACCESS_TRACKER_FLUSH_INTERVAL = float(os.getenv("ACCESS_TRACKER_FLUSH_INTERVAL", "10"))
+ACCESS_TRACKER_MAX_PENDING = int(os.getenv("ACCESS_TRACKER_MAX_PENDING", "1000"))
+
+
+class AccessTimeTracker:
+    """
+    last_accessed 写后缓冲
+
+    record() 只做内存操作，在事件循环中直接调用；刷新由同一事件循环上的后台任务完成。
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = ACCESS_TRACKER_FLUSH_INTERVAL,
+        max_pending: int = ACCESS_TRACKER_MAX_PENDING,
+    ):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stats = {
+            "recorded": 0,
+            "flushed": 0,
+            "flush_count": 0,
+            "flush_errors": 0,
+            "last_flush_at": None,
+        }
+
+    def record(self, point_id: str, accessed_at: Optional[str] = None):
+        """记录一次命中（非阻塞）"""
+        self._pending[point_id] = accessed_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._stats["recorded"] += 1
+        self._ensure_started()
+        if len(self._pending) >= self.max_pending and self._wakeup is not None:
+            self._wakeup.set()
+
+    def peek(self, point_id: str) -> Optional[str]:
+        """尚未刷新的访问时间"""
+        return self._pending.get(point_id)
+
+    def _ensure_started(self):
+        """首次记录时在当前事件循环上启动刷新任务"""
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # 不在事件循环中，留待下次记录或关闭时刷新
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"[AccessTracker] 刷新访问时间失败: {e}")
+
+    async def flush(self) -> int:
+        """
+        把缓冲的访问时间批量写回向量库
+
+        Returns:
+            本次写入的页面数
+        """
+        if not self._pending:
+            return 0
+        from Page_Knowledge.vector_store import get_vector_store
+
+        batch, self._pending = self._pending, {}
+        try:
+            ok = await get_vector_store().set_payload_batch(
+                {point_id: {"last_accessed": accessed_at} for point_id, accessed_at in batch.items()},
+                nested_keys=("knowledge",),
+            )
+        except BaseException:
+            # 含 CancelledError：批次已从缓冲取出，回填后再抛出，stop() 的最后一次刷新会带上
+            self._requeue(batch)
+            raise
+        if not ok:
+            self._requeue(batch)
+            self._stats["flush_errors"] += 1
+            logger.debug(f"[AccessTracker] 向量库不可用，{len(batch)} 条访问时间稍后重试")
+            return 0
+
+        self._stats["flushed"] += len(batch)
+        self._stats["flush_count"] += 1
+        self._stats["last_flush_at"] = datetime.now().isoformat()
+        logger.debug(f"[AccessTracker] 已写回 {len(batch)} 条访问时间")
+        return len(batch)
+
+    def _requeue(self, batch: Dict[str, str]):
+        # 刷新期间的新访问时间更新，不覆盖
+        for point_id, accessed_at in batch.items():
+            self._pending.setdefault(point_id, accessed_at)
+
+    async def stop(self):
+        """停止后台任务并做最后一次刷新"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓冲统计"""
+        return {**self._stats, "pending": len(self._pending)}
+
+
+# 全局单例
+_tracker: Optional[AccessTimeTracker] = None
+
+
+def get_access_tracker() -> AccessTimeTracker:
+    """获取全局访问时间缓冲"""
+    global _tracker
+    if _tracker is None:
+        _tracker = AccessTimeTracker()
+    return _tracker
+
+
+async def stop_access_tracker():
+    """应用关闭时调用：刷新剩余访问时间"""
+    if _tracker is not None:
+        await _tracker.stop()
@@ -0,0 +1,3 @@
+"""
+页面知识库基准测试脚本
+"""
@@ -0,0 +1,194 @@
+"""
+页面知识过滤检索基准
+
+在真实 Qdrant 上把测试 Collection 逐步灌到各个规模（默认 1k → 10k → 100k 个页面，
+分布在 --projects 个项目 / 域名下），每个规模测量以下过滤检索的延迟（p50 / p95）：
+  - 无过滤
+  - project_id
+  - project_id + page_type
+  - project_id + should(page_type 任一)
+  - domain
+
+对照组是同规模、不建 payload 索引的 Collection（--no-baseline 关闭），用于观察 payload 索引的效果。
+测试 Collection 在结束时删除（--keep 保留）。
+
+运行（在 Agent_Server 目录下，需要可连接的 Qdrant）:
+    python -m Page_Knowledge.benchmarks.filtered_search_bench
+    python -m Page_Knowledge.benchmarks.filtered_search_bench --sizes 1000,10000,100000 --projects 200 --queries 200
+    python -m Page_Knowledge.benchmarks.filtered_search_bench --hnsw-ef 128 --no-baseline
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+import Page_Knowledge.local_index as local_index
+from Page_Knowledge.vector_store import QDRANT_HOST, QDRANT_PORT, VectorStore, generate_point_id
+
+PAGE_TYPES = ["login", "list", "detail", "form", "dashboard", "mixed"]
+
+
+class _UnindexedStore(VectorStore):
+    """对照组：不创建 payload 索引"""
+
+    async def _ensure_payload_indexes(self, client, existing_schema=None) -> None:
+        return None
+
+
+def _domain(project_id: int) -> str:
+    return f"p{project_id}.bench.example.com"
+
+
+def _scenarios(projects: int, rng) -> List[Dict[str, Any]]:
+    """每次查询随机挑一个项目，返回各场景的过滤条件"""
+    project_id = int(rng.integers(projects))
+    page_type = PAGE_TYPES[int(rng.integers(len(PAGE_TYPES)))]
+    return [
+        {"name": "无过滤", "filter": None},
+        {"name": "project_id", "filter": {"project_id": project_id}},
+        {"name": "project_id+page_type", "filter": {"project_id": project_id, "page_type": page_type}},
+        {"name": "project_id+should", "filter": {
+            "must": {"project_id": project_id},
+            "should": {"page_type": ["list", "detail"]},
+        }},
+        {"name": "domain", "filter": {"domain": _domain(project_id)}},
+    ]
+
+
+async def _fill(store: VectorStore, start: int, end: int, dim: int, projects: int, seed: int, batch: int):
+    """写入编号 [start, end) 的页面（确定性生成，两组 Collection 数据一致）"""
+    import numpy as np
+
+    for chunk_start in range(start, end, batch):
+        chunk_end = min(end, chunk_start + batch)
+        rng = np.random.default_rng(seed + chunk_start)
+        vectors = rng.standard_normal((chunk_end - chunk_start, dim), dtype=np.float32).tolist()
+        points = []
+        for offset, i in enumerate(range(chunk_start, chunk_end)):
+            project_id = i % projects
+            url = f"https://{_domain(project_id)}/page/{i}"
+            points.append((generate_point_id(url), vectors[offset], {
+                "url": url,
+                "domain": _domain(project_id),
+                "page_type": PAGE_TYPES[i % len(PAGE_TYPES)],
+                "project_id": project_id,
+            }))
+        if not await store.upsert_many(points):
+            raise SystemExit(f"写入失败: {store._last_error}")
+
+
+async def _wait_ready(store: VectorStore, timeout: float = 600):
+    """等待 Qdrant 完成索引构建（Collection 状态变为 green）"""
+    client = store._get_client()
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        info = await client.get_collection(store.collection_name)
+        if str(getattr(info.status, "value", info.status)).lower() == "green":
+            return
+        await asyncio.sleep(0.5)
+
+
+async def _measure(store: VectorStore, queries: List[Dict[str, Any]], hnsw_ef: Optional[int]) -> Dict[str, Dict]:
+    """顺序执行全部查询，按场景统计延迟（ms）"""
+    timings: Dict[str, List[float]] = {}
+    hits: Dict[str, int] = {}
+    for query in queries:
+        for scenario in query["scenarios"]:
+            t0 = time.perf_counter()
+            results = await store.search(query["vector"], 5, 0.0, scenario["filter"], hnsw_ef)
+            timings.setdefault(scenario["name"], []).append((time.perf_counter() - t0) * 1000)
+            hits[scenario["name"]] = hits.get(scenario["name"], 0) + len(results)
+    if store._last_error:
+        raise SystemExit(f"检索失败: {store._last_error}")
+    summary = {}
+    for name, values in timings.items():
+        values.sort()
+        summary[name] = {
+            "p50": statistics.median(values),
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+            "avg_hits": hits[name] / len(values),
+        }
+    return summary
+
+
+async def run(args) -> None:
+    import numpy as np
+
+    # 基准只测 Qdrant，不写本地镜像索引
+    local_index.LOCAL_VECTOR_INDEX_MODE = "off"
+
+    stores = {"indexed": VectorStore(args.host, args.port, f"{args.collection}_indexed", args.dim)}
+    if not args.no_baseline:
+        stores["baseline"] = _UnindexedStore(args.host, args.port, f"{args.collection}_baseline", args.dim)
+
+    for store in stores.values():
+        try:
+            await store.drop_collection()
+        except Exception as e:
+            raise SystemExit(f"无法连接 Qdrant @ {args.host}:{args.port}: {e}")
+        if not await store.ensure_collection():
+            raise SystemExit(f"创建 Collection 失败: {store._last_error}")
+
+    sizes = sorted(int(s) for s in args.sizes.split(",") if s.strip())
+    rng = np.random.default_rng(args.seed + 1)
+    queries = [
+        {"vector": rng.standard_normal(args.dim, dtype=np.float32).tolist(), "scenarios": _scenarios(args.projects, rng)}
+        for _ in range(args.queries)
+    ]
+
+    print(f"维度: {args.dim}  项目数: {args.projects}  每规模查询数: {args.queries}  hnsw_ef: {args.hnsw_ef or '默认'}\n")
+    header = f"{'页面数':>8}  {'场景':<22}{'索引 p50':>10}{'索引 p95':>10}"
+    if "baseline" in stores:
+        header += f"{'无索引 p50':>12}{'无索引 p95':>12}"
+    header += f"{'平均命中':>10}"
+    print(header)
+
+    filled = 0
+    try:
+        for size in sizes:
+            for store in stores.values():
+                await _fill(store, filled, size, args.dim, args.projects, args.seed, args.batch)
+                await _wait_ready(store)
+            filled = size
+
+            results = {name: await _measure(store, queries, args.hnsw_ef) for name, store in stores.items()}
+            for scenario in results["indexed"]:
+                row = results["indexed"][scenario]
+                line = f"{size:>8}  {scenario:<22}{row['p50']:>10.2f}{row['p95']:>10.2f}"
+                if "baseline" in results:
+                    base = results["baseline"][scenario]
+                    line += f"{base['p50']:>12.2f}{base['p95']:>12.2f}"
+                line += f"{row['avg_hits']:>10.1f}"
+                print(line)
+            print()
+    finally:
+        for store in stores.values():
+            if not args.keep:
+                try:
+                    await store.drop_collection()
+                except Exception:
+                    pass
+            await store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="页面知识过滤检索基准")
+    parser.add_argument("--host", default=QDRANT_HOST, help="Qdrant 主机")
+    parser.add_argument("--port", type=int, default=QDRANT_PORT, help="Qdrant 端口")
+    parser.add_argument("--collection", default="page_knowledge_bench", help="测试 Collection 名前缀")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="逐步增长到的页面数（逗号分隔）")
+    parser.add_argument("--projects", type=int, default=100, help="页面分布的项目数")
+    parser.add_argument("--dim", type=int, default=256, help="向量维度")
+    parser.add_argument("--queries", type=int, default=100, help="每个规模的查询数")
+    parser.add_argument("--batch", type=int, default=512, help="写入批大小")
+    parser.add_argument("--hnsw-ef", type=int, default=None, help="检索时的 HNSW ef 覆盖值")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--no-baseline", action="store_true", help="不创建无 payload 索引的对照 Collection")
+    parser.add_argument("--keep", action="store_true", help="结束后保留测试 Collection")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
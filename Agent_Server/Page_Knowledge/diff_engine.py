@@ -8,9 +8,12 @@
   4. 自动回归测试推荐
 
 如果页面新增字段 → 自动建议新的边界测试子任务
+
+传入组件级子签名（PageKnowledge.compute_component_hashes）时只对比签名变化的组件，
+签名相同的组件内容一致、不可能产生变更，跳过即可得到与全量对比相同的结果。
 """
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Set
 from datetime import datetime
 
 from Page_Knowledge.schema import PageKnowledge
@@ -124,17 +127,69 @@ class DiffResult:
         }
 
 
+class ComponentChanges:
+    """组件级子签名比对结果：哪些组件需要 diff / merge"""
+
+    def __init__(
+        self,
+        forms: Set[str],
+        tables: Set[str],
+        buttons: bool,
+        sections: bool,
+        properties: bool,
+    ):
+        self.forms = forms            # 新增、删除或签名变化的表单名
+        self.tables = tables          # 新增、删除或签名变化的表格名
+        self.buttons = buttons
+        self.sections = sections
+        self.properties = properties
+
+    @property
+    def count(self) -> int:
+        return len(self.forms) + len(self.tables) + sum([self.buttons, self.sections, self.properties])
+
+    def to_dict(self) -> Dict:
+        return {
+            "forms": sorted(self.forms),
+            "tables": sorted(self.tables),
+            "buttons": self.buttons,
+            "sections": self.sections,
+            "properties": self.properties,
+        }
+
+
 class DiffEngine:
     """页面结构对比引擎"""
 
     @staticmethod
-    def compute_diff(old: PageKnowledge, new: PageKnowledge) -> DiffResult:
+    def changed_components(old_hashes: Dict, new_hashes: Dict) -> ComponentChanges:
+        """比对两份组件子签名，返回签名不同（含新增 / 删除）的组件"""
+        def _changed_names(key: str) -> Set[str]:
+            old_map = old_hashes.get(key) or {}
+            new_map = new_hashes.get(key) or {}
+            return {name for name in set(old_map) | set(new_map) if old_map.get(name) != new_map.get(name)}
+
+        return ComponentChanges(
+            forms=_changed_names("forms"),
+            tables=_changed_names("tables"),
+            buttons=old_hashes.get("buttons") != new_hashes.get("buttons"),
+            sections=old_hashes.get("sections") != new_hashes.get("sections"),
+            properties=old_hashes.get("properties") != new_hashes.get("properties"),
+        )
+
+    @staticmethod
+    def compute_diff(
+        old: PageKnowledge,
+        new: PageKnowledge,
+        changed: Optional[ComponentChanges] = None,
+    ) -> DiffResult:
         """
         对比两个版本的页面知识，生成差异报告
 
         Args:
             old: 知识库中已有的页面知识
             new: 最新探索得到的页面知识
+            changed: 组件级比对结果；为 None 时全量对比
 
         Returns:
             DiffResult 包含所有变更信息
@@ -142,19 +197,24 @@ class DiffEngine:
         result = DiffResult()
 
         # 1. 对比表单
-        DiffEngine._diff_forms(old, new, result)
+        if changed is None or changed.forms:
+            DiffEngine._diff_forms(old, new, result, changed.forms if changed else None)
 
         # 2. 对比按钮
-        DiffEngine._diff_buttons(old, new, result)
+        if changed is None or changed.buttons:
+            DiffEngine._diff_buttons(old, new, result)
 
         # 3. 对比表格
-        DiffEngine._diff_tables(old, new, result)
+        if changed is None or changed.tables:
+            DiffEngine._diff_tables(old, new, result, changed.tables if changed else None)
 
         # 4. 对比功能区域
-        DiffEngine._diff_sections(old, new, result)
+        if changed is None or changed.sections:
+            DiffEngine._diff_sections(old, new, result)
 
         # 5. 对比属性标记
-        DiffEngine._diff_properties(old, new, result)
+        if changed is None or changed.properties:
+            DiffEngine._diff_properties(old, new, result)
 
         # 计算严重度和摘要
         result.compute_severity()
@@ -166,10 +226,10 @@ class DiffEngine:
         return result
 
     @staticmethod
-    def _diff_forms(old: PageKnowledge, new: PageKnowledge, result: DiffResult):
-        """对比表单"""
-        old_forms = {f.name: f for f in old.forms}
-        new_forms = {f.name: f for f in new.forms}
+    def _diff_forms(old: PageKnowledge, new: PageKnowledge, result: DiffResult, names: Optional[Set[str]] = None):
+        """对比表单（names 非空时只对比这些表单）"""
+        old_forms = {f.name: f for f in old.forms if names is None or f.name in names}
+        new_forms = {f.name: f for f in new.forms if names is None or f.name in names}
 
         # 新增表单
         for name in new_forms:
@@ -251,10 +311,10 @@ class DiffEngine:
             result.add_change(ChangeType.BUTTON_REMOVED, f"删除按钮: {b}", {"button": b})
 
     @staticmethod
-    def _diff_tables(old: PageKnowledge, new: PageKnowledge, result: DiffResult):
-        """对比表格"""
-        old_tables = {t.name: t for t in old.tables}
-        new_tables = {t.name: t for t in new.tables}
+    def _diff_tables(old: PageKnowledge, new: PageKnowledge, result: DiffResult, names: Optional[Set[str]] = None):
+        """对比表格（names 非空时只对比这些表格）"""
+        old_tables = {t.name: t for t in old.tables if names is None or t.name in names}
+        new_tables = {t.name: t for t in new.tables if names is None or t.name in names}
 
         for name in new_tables:
             if name not in old_tables:
@@ -8,14 +8,26 @@ Embedding 向量生成模块
   - 回退到内置默认值
 
 向量化内容：页面结构摘要文本（不向量化整个 DOM）
+
+缓存：Page_Knowledge.embedding_cache（内存 LRU + SQLite float32 持久层，
+键为 (model, dimension, sha256(text))，切换模型时自动失效）
+
+请求：并发的单条 embed() 由 Page_Knowledge.embedding_batcher 合并为批量请求，
+经 llm.http_pool 中按 (base_url, api_key) 复用的长连接客户端发送
 """
 import os
 import logging
-import hashlib
 from typing import List, Optional
 
 import httpx
 
+from Page_Knowledge.embedding_batcher import (
+    EMBEDDING_BATCH_ENABLED,
+    EMBEDDING_BATCH_MAX_SIZE,
+    EmbeddingMicroBatcher,
+)
+from Page_Knowledge.embedding_cache import get_embedding_cache, text_hash
+
 logger = logging.getLogger(__name__)
 
 # ── Embedding 配置 ──────────────────────────
@@ -32,11 +44,7 @@ EMBEDDING_MODEL = os.getenv(
     "Qwen/Qwen3-Embedding-4B"
 )
 EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "1024"))
-
-# 缓存：避免对相同文本反复 Embedding
-_embed_cache: dict = {}
-_MAX_CACHE_SIZE = 500
-
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "30"))
 
 class EmbeddingClient:
     """Embedding 客户端封装"""
@@ -47,28 +55,60 @@ class EmbeddingClient:
         base_url: str = EMBEDDING_BASE_URL,
         model: str = EMBEDDING_MODEL,
         dimension: int = EMBEDDING_DIMENSION,
+        bind_cache: bool = True,
     ):
         self.api_key = api_key
         self.base_url = base_url
         self.model = model
         self.dimension = dimension
 
-    async def embed(self, text: str) -> List[float]:
-        """生成单条文本的 Embedding 向量"""
+        self._batcher: Optional[EmbeddingMicroBatcher] = (
+            EmbeddingMicroBatcher(self._call_api) if EMBEDDING_BATCH_ENABLED else None
+        )
+
+        # 绑定缓存会清除其它模型的向量；重建索引期间线上仍在用旧模型，不绑定
+        cache = get_embedding_cache()
+        if cache is not None and bind_cache:
+            cache.bind(self.model)
+
+    async def embed(self, text: str, source: str = "embedding") -> List[float]:
+        """
+        生成单条文本的 Embedding 向量
+
+        相同文本的并发请求合并为一次 API 调用（llm.singleflight，按 source 统计）
+        """
         if not text.strip():
             return [0.0] * self.dimension
 
         # 缓存检查
-        cache_key = hashlib.md5(text.encode("utf-8")).hexdigest()
-        if cache_key in _embed_cache:
-            return _embed_cache[cache_key]
-
-        vector = await self._call_api([text])
-        if vector and len(vector) > 0:
-            result = vector[0]
-            # 写入缓存
-            if len(_embed_cache) < _MAX_CACHE_SIZE:
-                _embed_cache[cache_key] = result
+        cache_key = text_hash(text)
+        cache = get_embedding_cache()
+        if cache is not None:
+            cached = (await cache.aget_many(self.model, self.dimension, [cache_key])).get(cache_key)
+            if cached is not None:
+                return cached
+
+        from llm.singleflight import LLM_SINGLEFLIGHT_ENABLED, get_singleflight
+        if not LLM_SINGLEFLIGHT_ENABLED:
+            return await self._embed_uncached(text, cache_key)
+        return await get_singleflight().do(
+            ("embed", self.model, self.base_url, cache_key),
+            lambda: self._embed_uncached(text, cache_key),
+            source=source,
+        )
+
+    async def _embed_uncached(self, text: str, cache_key: str) -> List[float]:
+        """调用 API 生成向量并写入缓存（开启微批时与其它并发请求合并发送）"""
+        if self._batcher is not None:
+            result = await self._batcher.submit(text)
+        else:
+            vectors = await self._call_api([text])
+            result = vectors[0] if vectors else []
+        if result:
+            # 写入缓存（全零向量不会被缓存）
+            cache = get_embedding_cache()
+            if cache is not None:
+                await cache.aset_many(self.model, self.dimension, {cache_key: result})
             return result
 
         logger.warning("[Embedding] API 返回空向量，使用零向量")
@@ -79,29 +119,33 @@ class EmbeddingClient:
         if not texts:
             return []
 
-        # 过滤空文本
-        processed = []
-        indices = []
-        results = [None] * len(texts)
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        # 文本哈希 → 需要该向量的位置（批内重复文本只请求一次）
+        pending: dict = {}
 
         for i, t in enumerate(texts):
             if not t.strip():
                 results[i] = [0.0] * self.dimension
             else:
-                cache_key = hashlib.md5(t.encode("utf-8")).hexdigest()
-                if cache_key in _embed_cache:
-                    results[i] = _embed_cache[cache_key]
-                else:
-                    processed.append(t)
-                    indices.append(i)
-
-        if processed:
-            vectors = await self._call_api(processed)
-            for idx, vec in zip(indices, vectors):
-                results[idx] = vec
-                cache_key = hashlib.md5(processed[indices.index(idx)].encode("utf-8")).hexdigest()
-                if len(_embed_cache) < _MAX_CACHE_SIZE:
-                    _embed_cache[cache_key] = vec
+                pending.setdefault(text_hash(t), []).append(i)
+
+        cache = get_embedding_cache()
+        if pending and cache is not None:
+            cached = await cache.aget_many(self.model, self.dimension, list(pending))
+            for h, vec in cached.items():
+                for i in pending.pop(h):
+                    results[i] = vec
+
+        # 按 EMBEDDING_BATCH_MAX_SIZE 分片请求
+        hashes = list(pending)
+        for start in range(0, len(hashes), EMBEDDING_BATCH_MAX_SIZE):
+            chunk = hashes[start:start + EMBEDDING_BATCH_MAX_SIZE]
+            vectors = await self._call_api([texts[pending[h][0]] for h in chunk])
+            for h, vec in zip(chunk, vectors):
+                for i in pending[h]:
+                    results[i] = vec
+            if cache is not None:
+                await cache.aset_many(self.model, self.dimension, dict(zip(chunk, vectors)))
 
         # 填充失败的位置
         for i in range(len(results)):
@@ -110,6 +154,12 @@ class EmbeddingClient:
 
         return results
 
+    def get_batch_stats(self) -> dict:
+        """微批处理统计"""
+        if self._batcher is None:
+            return {"enabled": False}
+        return self._batcher.get_stats()
+
     async def _call_api(self, texts: List[str]) -> List[List[float]]:
         """调用 Embedding API"""
         headers = {
@@ -123,27 +173,31 @@ class EmbeddingClient:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                resp = await client.post(
-                    self.base_url, json=payload, headers=headers
+            from llm.http_pool import get_http_pool
+
+            client = get_http_pool().get_http_client(
+                "embedding", self.base_url, self.api_key, EMBEDDING_TIMEOUT
+            )
+            resp = await client.post(
+                self.base_url, json=payload, headers=headers, timeout=EMBEDDING_TIMEOUT
+            )
+            resp.raise_for_status()
+            data = resp.json()
+
+            embeddings = data.get("data", [])
+            # 按 index 排序（API 可能乱序返回）
+            embeddings.sort(key=lambda x: x.get("index", 0))
+            vectors = [e["embedding"] for e in embeddings]
+
+            # 验证维度
+            if vectors and len(vectors[0]) != self.dimension:
+                actual_dim = len(vectors[0])
+                logger.info(
+                    f"[Embedding] 实际维度 {actual_dim}，更新本地配置（原 {self.dimension}）"
                 )
-                resp.raise_for_status()
-                data = resp.json()
+                self.dimension = actual_dim
 
-                embeddings = data.get("data", [])
-                # 按 index 排序（API 可能乱序返回）
-                embeddings.sort(key=lambda x: x.get("index", 0))
-                vectors = [e["embedding"] for e in embeddings]
-
-                # 验证维度
-                if vectors and len(vectors[0]) != self.dimension:
-                    actual_dim = len(vectors[0])
-                    logger.info(
-                        f"[Embedding] 实际维度 {actual_dim}，更新本地配置（原 {self.dimension}）"
-                    )
-                    self.dimension = actual_dim
-
-                return vectors
+            return vectors
 
         except httpx.HTTPStatusError as e:
             logger.error(f"[Embedding] API 状态码错误: {e.response.status_code} - {e.response.text[:500]}")
@@ -164,13 +218,19 @@ def get_embedding_client() -> EmbeddingClient:
     return _client
 
 
-def reload_embedding_client(config: dict) -> None:
-    """用 DB 中的配置重建 EmbeddingClient 单例"""
-    global _client
-    _client = EmbeddingClient(
+def build_embedding_client(config: dict, bind_cache: bool = True) -> EmbeddingClient:
+    """按 DB 中的配置创建 EmbeddingClient（不替换单例）"""
+    return EmbeddingClient(
         api_key=config.get("embedding_api_key") or EMBEDDING_API_KEY,
         base_url=config.get("embedding_api_url") or EMBEDDING_BASE_URL,
         model=config.get("embedding_model") or EMBEDDING_MODEL,
         dimension=int(config.get("vector_size", EMBEDDING_DIMENSION)),
+        bind_cache=bind_cache,
     )
+
+
+def reload_embedding_client(config: dict) -> None:
+    """用 DB 中的配置重建 EmbeddingClient 单例"""
+    global _client
+    _client = build_embedding_client(config)
     logger.info(f"[Embedding] 客户端已重载: model={_client.model} dim={_client.dimension}")
@@ -0,0 +1,115 @@
+"""
+Embedding 请求微批处理
+
+多个调用方同时 embed() 时，原先每条文本各发一次 API 请求。
+微批处理器把短时间窗口内（默认 5ms）到达的文本收集起来，合并为一次
+批量 input 请求；攒满 EMBEDDING_BATCH_MAX_SIZE 条时立即发送，不再等待窗口结束。
+
+- 结果按提交顺序拆分回各调用方
+- 单个调用方被取消不影响同批其它调用方
+- 待发送队列按事件循环区分（Future 不能跨循环等待），以弱引用按循环对象索引，循环销毁后自动清除
+- 发送任务在完成前持有强引用，不会被 GC 回收导致调用方永远等待
+
+配置：
+  EMBEDDING_BATCH_ENABLED = true
+  EMBEDDING_BATCH_WINDOW_MS = 5
+  EMBEDDING_BATCH_MAX_SIZE = 32（单次请求最多的文本数，也用于 embed_batch 分片）
+"""
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ── 微批配置 ──────────────────────────
+EMBEDDING_BATCH_ENABLED = os.getenv("EMBEDDING_BATCH_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+
+
+class _LoopQueue:
+    """单个事件循环上的待发送队列"""
+
+    def __init__(self):
+        self.items: List[Tuple[str, asyncio.Future]] = []
+        self.timer: Any = None
+
+
+class EmbeddingMicroBatcher:
+    """
+    把并发的单条 Embedding 请求合并为批量请求
+
+    call_api: 接收文本列表、按顺序返回向量列表的异步函数
+    """
+
+    def __init__(
+        self,
+        call_api: Callable[[List[str]], Awaitable[List[List[float]]]],
+        max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE,
+        window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+    ):
+        self._call_api = call_api
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms) / 1000
+        self._queues: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopQueue]" = weakref.WeakKeyDictionary()
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "max_batch": 0}
+
+    async def submit(self, text: str) -> List[float]:
+        """提交一条文本，等待所在批次返回后取回对应向量"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue = self._queues.get(loop)
+        if queue is None:
+            queue = self._queues[loop] = _LoopQueue()
+        queue.items.append((text, future))
+        if len(queue.items) >= self.max_batch_size:
+            self._flush(loop, queue)
+        elif queue.timer is None:
+            queue.timer = loop.call_later(self.window, self._flush, loop, queue)
+        return await future
+
+    def _flush(self, loop: asyncio.AbstractEventLoop, queue: _LoopQueue):
+        if queue.timer is not None:
+            queue.timer.cancel()
+            queue.timer = None
+        batch = [(text, fut) for text, fut in queue.items if not fut.cancelled()]
+        queue.items = []
+        if batch:
+            task = loop.create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]):
+        with self._lock:
+            self._stats["requests"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+        try:
+            vectors = await self._call_api([text for text, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        if len(vectors) != len(batch):
+            logger.warning(f"[EmbeddingBatcher] 返回向量数 {len(vectors)} 与请求数 {len(batch)} 不一致")
+        for i, (_, fut) in enumerate(batch):
+            if not fut.done():
+                fut.set_result(vectors[i] if i < len(vectors) else [])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """批处理统计"""
+        with self._lock:
+            stats = dict(self._stats)
+        return {
+            **stats,
+            "avg_batch": round(stats["requests"] / stats["batches"], 2) if stats["batches"] else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window * 1000,
+            "enabled": EMBEDDING_BATCH_ENABLED,
+        }
@@ -0,0 +1,340 @@
+"""
+Embedding 向量缓存
+
+两级缓存，键为 (model, dimension, sha256(text))：
+  - 内存层：LRU，向量以 float32 array 保存（比 Python float 列表省约 8 倍内存）
+  - 持久层：SQLite，向量以 float32 字节串（BLOB）保存，重启后仍可命中
+
+切换 Embedding 模型时（EmbeddingClient 创建 / 重载时调用 bind），
+内存层和持久层中旧模型的向量会被整体清除，避免不同向量空间混用。
+
+配置：
+  EMBEDDING_CACHE_ENABLED = true
+  EMBEDDING_CACHE_MEMORY_SIZE = 4096（内存层条数）
+  EMBEDDING_CACHE_SQLITE_PATH（为空字符串时仅使用内存层）
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ── 缓存配置 ──────────────────────────
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBEDDING_CACHE_MEMORY_SIZE = int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "4096"))
+EMBEDDING_CACHE_SQLITE_PATH = os.getenv(
+    "EMBEDDING_CACHE_SQLITE_PATH",
+    os.path.join(os.getenv("SAVE_FOLDER_DIR", "../save_floder"), "cache", "embedding_cache.sqlite3"),
+)
+
+# SQLite IN 查询单次最多的参数个数
+_SQLITE_BATCH = 500
+
+CacheKey = Tuple[str, int, str]
+
+
+def text_hash(text: str) -> str:
+    """文本内容哈希（sha256）"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _from_blob(blob: bytes) -> array:
+    vec = array("f")
+    vec.frombytes(blob)
+    return vec
+
+
+class _SQLiteVectorTier:
+    """SQLite 持久层：每个向量一行 float32 BLOB"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                " model TEXT NOT NULL, dim INTEGER NOT NULL, text_hash TEXT NOT NULL,"
+                " vector BLOB NOT NULL, created_at REAL NOT NULL,"
+                " PRIMARY KEY (model, dim, text_hash)) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, model: str, dim: int, hashes: List[str]) -> Dict[str, array]:
+        found: Dict[str, array] = {}
+        with self._lock:
+            conn = self._connect()
+            for start in range(0, len(hashes), _SQLITE_BATCH):
+                chunk = hashes[start:start + _SQLITE_BATCH]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT text_hash, vector FROM embedding_cache"
+                    f" WHERE model = ? AND dim = ? AND text_hash IN ({placeholders})",
+                    (model, dim, *chunk),
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = _from_blob(blob)
+        return found
+
+    def set_many(self, model: str, dim: int, items: List[Tuple[str, bytes]]):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (model, dim, text_hash, vector, created_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(model, dim, h, blob, now) for h, blob in items],
+            )
+            conn.commit()
+
+    def bind(self, model: str) -> int:
+        """记录当前模型；与上次记录的模型不同时清除其它模型的向量，返回删除的条数"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM embedding_cache_meta WHERE key = 'model'").fetchone()
+            if row and row[0] == model:
+                return 0
+            deleted = conn.execute("DELETE FROM embedding_cache WHERE model != ?", (model,)).rowcount
+            conn.execute(
+                "INSERT OR REPLACE INTO embedding_cache_meta (key, value) VALUES ('model', ?)", (model,)
+            )
+            conn.commit()
+            return max(deleted, 0)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM embedding_cache")
+            conn.commit()
+
+
+class EmbeddingCache:
+    """
+    Embedding 两级缓存
+
+    内存层为 LRU，命中持久层时回填内存层；持久层不可用时自动降级为仅内存。
+    全零向量（API 失败时的占位）不会被缓存。
+    """
+
+    def __init__(
+        self,
+        memory_size: int = EMBEDDING_CACHE_MEMORY_SIZE,
+        sqlite_path: str = EMBEDDING_CACHE_SQLITE_PATH,
+    ):
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[CacheKey, array]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._tier = self._init_tier(sqlite_path)
+        self.backend = "sqlite" if self._tier is not None else "memory"
+        self._model: Optional[str] = None
+        self._stats = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def _init_tier(path: str) -> Optional[_SQLiteVectorTier]:
+        if not path:
+            return None
+        try:
+            tier = _SQLiteVectorTier(path)
+            tier._connect()
+            return tier
+        except Exception as e:
+            logger.warning(f"[EmbeddingCache] 持久层不可用，仅使用内存缓存: {e}")
+            return None
+
+    # ── 模型绑定 ──────────────────────────────────────────────
+
+    def bind(self, model: str):
+        """
+        绑定当前 Embedding 模型
+
+        模型与上次不同时清除内存层和持久层中其它模型的向量（进程重启后同样生效）。
+        维度是缓存键的一部分，维度变化不需要清除。
+        """
+        if self._model == model:
+            return
+        with self._lock:
+            stale = [k for k in self._memory if k[0] != model]
+            for k in stale:
+                del self._memory[k]
+            self._model = model
+        deleted = 0
+        if self._tier is not None:
+            try:
+                deleted = self._tier.bind(model)
+            except Exception as e:
+                logger.warning(f"[EmbeddingCache] 持久层模型切换失败: {e}")
+        if stale or deleted:
+            with self._lock:
+                self._stats["invalidations"] += 1
+            logger.info(
+                f"[EmbeddingCache] Embedding 模型变更为 {model}，"
+                f"已清除旧向量 内存 {len(stale)} 条 / 持久层 {deleted} 条"
+            )
+
+    # ── 读写 ──────────────────────────────────────────────
+
+    def _memory_get_many(self, model: str, dim: int, hashes: List[str]) -> Tuple[Dict[str, List[float]], List[str]]:
+        found: Dict[str, List[float]] = {}
+        missing: List[str] = []
+        with self._lock:
+            for h in hashes:
+                vec = self._memory.get((model, dim, h))
+                if vec is None:
+                    missing.append(h)
+                else:
+                    self._memory.move_to_end((model, dim, h))
+                    found[h] = vec.tolist()
+            self._stats["memory_hits"] += len(found)
+        return found, missing
+
+    def _tier_get_many(self, model: str, dim: int, hashes: List[str]) -> Dict[str, List[float]]:
+        """查询持久层并回填内存层；未命中的计入 misses"""
+        persisted: Dict[str, array] = {}
+        if hashes and self._tier is not None:
+            try:
+                persisted = self._tier.get_many(model, dim, hashes)
+            except Exception as e:
+                logger.warning(f"[EmbeddingCache] 持久层读取失败: {e}")
+        with self._lock:
+            for h, vec in persisted.items():
+                self._memory_put((model, dim, h), vec)
+            self._stats["persistent_hits"] += len(persisted)
+            self._stats["misses"] += len(hashes) - len(persisted)
+        return {h: vec.tolist() for h, vec in persisted.items()}
+
+    def _tier_set_many(self, model: str, dim: int, items: List[Tuple[str, bytes]]):
+        if not items or self._tier is None:
+            return
+        try:
+            self._tier.set_many(model, dim, items)
+        except Exception as e:
+            logger.warning(f"[EmbeddingCache] 持久层写入失败: {e}")
+
+    def _memory_set_many(self, model: str, dim: int, items: Dict[str, Sequence[float]]) -> List[Tuple[str, bytes]]:
+        """写入内存层（跳过空向量和全零向量），返回待写入持久层的 (hash, float32 字节串)"""
+        valid = {h: array("f", v) for h, v in items.items() if v and any(v)}
+        with self._lock:
+            for h, vec in valid.items():
+                self._memory_put((model, dim, h), vec)
+            self._stats["stores"] += len(valid)
+        return [(h, vec.tobytes()) for h, vec in valid.items()]
+
+    def get_many(self, model: str, dim: int, hashes: List[str]) -> Dict[str, List[float]]:
+        """
+        批量查询
+
+        Returns:
+            {text_hash: 向量}，只包含命中的条目
+        """
+        found, missing = self._memory_get_many(model, dim, hashes)
+        if missing:
+            found.update(self._tier_get_many(model, dim, missing))
+        return found
+
+    async def aget_many(self, model: str, dim: int, hashes: List[str]) -> Dict[str, List[float]]:
+        """异步批量查询（持久层 IO 放到线程池）"""
+        found, missing = self._memory_get_many(model, dim, hashes)
+        if missing:
+            if self._tier is None:
+                found.update(self._tier_get_many(model, dim, missing))
+            else:
+                found.update(await asyncio.to_thread(self._tier_get_many, model, dim, missing))
+        return found
+
+    def set_many(self, model: str, dim: int, items: Dict[str, Sequence[float]]):
+        """批量写入两级缓存"""
+        self._tier_set_many(model, dim, self._memory_set_many(model, dim, items))
+
+    async def aset_many(self, model: str, dim: int, items: Dict[str, Sequence[float]]):
+        """异步批量写入"""
+        rows = self._memory_set_many(model, dim, items)
+        if rows and self._tier is not None:
+            await asyncio.to_thread(self._tier_set_many, model, dim, rows)
+
+    def _memory_put(self, key: CacheKey, vec: array):
+        """写入内存 LRU（调用方持有锁）"""
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def clear(self):
+        """清空全部缓存"""
+        with self._lock:
+            self._memory.clear()
+        if self._tier is not None:
+            try:
+                self._tier.clear()
+            except Exception as e:
+                logger.warning(f"[EmbeddingCache] 清空持久层失败: {e}")
+
+    # ── 统计 ──────────────────────────────────────────────
+
+    def get_stats(self) -> Dict[str, Any]:
+        """命中率统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            memory_entries = len(self._memory)
+        persistent_entries = None
+        if self._tier is not None:
+            try:
+                persistent_entries = self._tier.count()
+            except Exception:
+                pass
+        lookups = stats["memory_hits"] + stats["persistent_hits"] + stats["misses"]
+        hits = stats["memory_hits"] + stats["persistent_hits"]
+        return {
+            **stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": memory_entries,
+            "memory_size": self.memory_size,
+            "persistent_entries": persistent_entries,
+            "backend": self.backend,
+            "model": self._model,
+            "enabled": EMBEDDING_CACHE_ENABLED,
+        }
+
+
+# 全局单例
+_embedding_cache: Optional[EmbeddingCache] = None
+_init_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """获取全局 Embedding 缓存（EMBEDDING_CACHE_ENABLED=false 时返回 None）"""
+    global _embedding_cache
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    if _embedding_cache is None:
+        with _init_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache()
+    return _embedding_cache
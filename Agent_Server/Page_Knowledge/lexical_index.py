@@ -0,0 +1,345 @@
+"""
+页面知识本地词法索引（BM25 倒排索引）
+
+retrieve_context 原先是纯向量检索，检索前必须先调用一次远程 Embedding；按钮文案、表单名这类
+很短的中文 UI 标签，向量相似度往往不高，字面匹配反而最准。本模块在进程内维护页面知识的 BM25 倒排索引：
+
+  - 文档：只取页面自身的内容字段（标题、模块名、摘要、描述、功能区域、表单 / 字段 / 表格 / 列 / 按钮文案），
+    不用 build_embedding_text()——其中"页面标题：""表单：""按钮："这类模板标签每个页面都有，会让任何
+    含"页面""表单"的查询命中全部页面
+  - 分词：中文连续片段切成单字 + 相邻二字（不依赖分词词典），英文 / 数字按词小写
+  - 标签：页面标题、模块名、表单名、表格名、按钮、功能区域归一化后单独保存，查询与某个标签完全一致即为精确命中
+  - 覆盖率下限：非精确命中的页面须覆盖查询词项 IDF 权重的 LEXICAL_MIN_COVERAGE 以上才返回（也才参与融合），
+    只命中"用户""页面"这类常见词的页面不会被当作上下文
+  - 维护：store() / delete_knowledge() 增量更新；首次查询时从向量库逐页加载已有知识
+  - 每个进程一份；其它进程写入的知识在重建（POST /knowledge/lexical-index/rebuild）后可见
+
+retrieve_context 的 hybrid 模式：精确命中标签时直接返回本地结果，不调用 Embedding；
+否则向量检索结果与 BM25 结果做 RRF（倒数排名）融合，Embedding 不可用时只用 BM25 结果。
+
+配置：
+  PAGE_KB_RETRIEVE_MODE = hybrid / vector / lexical
+  LEXICAL_INDEX_ENABLED = true
+  LEXICAL_BM25_K1 = 1.2
+  LEXICAL_BM25_B = 0.75
+  LEXICAL_RRF_K = 60（RRF 融合常数，越大排名靠后的结果权重越高）
+  LEXICAL_MIN_COVERAGE = 0.3（非精确命中的最低查询词项覆盖率，按 IDF 加权，0 表示不限）
+"""
+import asyncio
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from Page_Knowledge.local_index import _matches
+
+logger = logging.getLogger(__name__)
+
+# ── 词法检索配置 ──────────────────────────
+PAGE_KB_RETRIEVE_MODE = os.getenv("PAGE_KB_RETRIEVE_MODE", "hybrid").lower()
+LEXICAL_INDEX_ENABLED = os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+LEXICAL_BM25_K1 = float(os.getenv("LEXICAL_BM25_K1", "1.2"))
+LEXICAL_BM25_B = float(os.getenv("LEXICAL_BM25_B", "0.75"))
+LEXICAL_RRF_K = int(os.getenv("LEXICAL_RRF_K", "60"))
+LEXICAL_MIN_COVERAGE = float(os.getenv("LEXICAL_MIN_COVERAGE", "0.3"))
+
+_TOKEN_RE = re.compile(r"[\u4e00-\u9fff]+|[a-z0-9]+")
+# 检索不需要的大字段，不保存在索引里
+_SKIPPED_PAYLOAD_FIELDS = ("embedding_text", "component_hashes")
+
+
+def tokenize(text: str) -> List[str]:
+    """中文片段 → 单字 + 相邻二字；英文 / 数字 → 小写单词"""
+    tokens = []
+    for chunk in _TOKEN_RE.findall((text or "").lower()):
+        if chunk[0].isascii():
+            tokens.append(chunk)
+            continue
+        tokens.extend(chunk)
+        tokens.extend(chunk[i:i + 2] for i in range(len(chunk) - 1))
+    return tokens
+
+
+def normalize_label(text: str) -> str:
+    return " ".join(str(text or "").lower().split())
+
+
+def document_text(payload: Dict[str, Any]) -> str:
+    """页面参与 BM25 的文本：只拼接内容字段，不含 build_embedding_text() 的模板标签"""
+    knowledge = payload.get("knowledge") or {}
+    values = [
+        knowledge.get("page_title"),
+        payload.get("module_name") or knowledge.get("module_name"),
+        knowledge.get("summary") or payload.get("summary"),
+        knowledge.get("description"),
+    ]
+    values += list(knowledge.get("page_sections") or [])
+    for form in knowledge.get("forms") or []:
+        if not isinstance(form, dict):
+            continue
+        values += [form.get("name"), form.get("submit_button")]
+        for f in form.get("fields") or []:
+            if isinstance(f, dict):
+                values += [f.get("label"), f.get("name"), f.get("placeholder")]
+    for table in knowledge.get("tables") or []:
+        if isinstance(table, dict):
+            values.append(table.get("name"))
+            values += list(table.get("columns") or [])
+            values += list(table.get("row_actions") or [])
+    values += list(knowledge.get("buttons") or [])
+    return "\n".join(str(v) for v in values if v)
+
+
+def _labels(payload: Dict[str, Any]) -> Set[str]:
+    """页面上可被精确查询的 UI 标签"""
+    knowledge = payload.get("knowledge") or {}
+    values = [knowledge.get("page_title"), payload.get("module_name") or knowledge.get("module_name")]
+    values += [f.get("name") for f in knowledge.get("forms") or [] if isinstance(f, dict)]
+    values += [t.get("name") for t in knowledge.get("tables") or [] if isinstance(t, dict)]
+    values += list(knowledge.get("buttons") or [])
+    values += list(knowledge.get("page_sections") or [])
+    return {label for label in (normalize_label(v) for v in values if v) if label}
+
+
+class LexicalIndex:
+    """
+    BM25 倒排索引
+
+    读写都在事件循环线程上做，单次操作是纯内存计算；线程锁只防止加载与增量更新交错。
+    """
+
+    def __init__(self, collection_name: str, k1: float = LEXICAL_BM25_K1, b: float = LEXICAL_BM25_B):
+        self.collection_name = collection_name
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._label_docs: Dict[str, Set[str]] = {}
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._total_len = 0
+        self._lock = threading.Lock()
+        self._load_lock: Optional[asyncio.Lock] = None
+        self._loaded = False
+        self._loading = False
+        self._deleted_while_loading: Set[str] = set()
+        self._stats = {"queries": 0, "exact_hits": 0, "loads": 0}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # ── 写入 ──────────────────────────────────────────────
+
+    def upsert(self, doc_id: str, payload: Dict[str, Any]):
+        """索引（或替换）一个页面"""
+        terms = Counter(tokenize(document_text(payload)))
+        doc = {
+            "terms": terms,
+            "len": sum(terms.values()),
+            "labels": _labels(payload),
+            "payload": {k: v for k, v in payload.items() if k not in _SKIPPED_PAYLOAD_FIELDS},
+        }
+        with self._lock:
+            self._remove_locked(doc_id)
+            self._docs[doc_id] = doc
+            self._total_len += doc["len"]
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            for label in doc["labels"]:
+                self._label_docs.setdefault(label, set()).add(doc_id)
+            self._deleted_while_loading.discard(doc_id)
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            self._remove_locked(doc_id)
+            if self._loading:
+                self._deleted_while_loading.add(doc_id)
+
+    def _remove_locked(self, doc_id: str):
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return
+        self._total_len -= doc["len"]
+        for term in doc["terms"]:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+        for label in doc["labels"]:
+            docs = self._label_docs.get(label)
+            if docs is not None:
+                docs.discard(doc_id)
+                if not docs:
+                    del self._label_docs[label]
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._label_docs.clear()
+            self._docs.clear()
+            self._total_len = 0
+            self._loaded = False
+
+    # ── 加载 ──────────────────────────────────────────────
+
+    async def ensure_loaded(self, store) -> None:
+        """首次使用时从向量库逐页加载全部页面（只加载一次；已由增量更新写入的页面不覆盖）"""
+        if self._loaded:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self._loaded:
+                return
+            self._loading = True
+            count = 0
+            try:
+                async for item in store.iter_points():
+                    payload = item["payload"]
+                    doc_id = item["id"]
+                    if doc_id in self._docs or doc_id in self._deleted_while_loading:
+                        continue
+                    self.upsert(doc_id, payload)
+                    count += 1
+                if store._is_temporarily_unavailable():
+                    # 遍历期间向量库不可用（读的是本地回退或只读了一部分），下次查询再加载；
+                    # 维度不一致拒绝写入等不影响读取的错误不算
+                    logger.warning(f"[LexicalIndex] 加载 {self.collection_name} 时向量库不可用，稍后重试")
+                    return
+                self._loaded = True
+                self._stats["loads"] += 1
+                logger.info(f"[LexicalIndex] 已加载 {self.collection_name}: {count} 条（共 {len(self)} 条）")
+            finally:
+                self._loading = False
+                self._deleted_while_loading.clear()
+
+    async def rebuild(self, store) -> int:
+        """清空后从向量库重新加载"""
+        self.clear()
+        await self.ensure_loaded(store)
+        return len(self)
+
+    # ── 检索 ──────────────────────────────────────────────
+
+    def search(
+        self,
+        query: str,
+        limit: int = 5,
+        filter_conditions: Optional[Dict] = None,
+        min_coverage: float = LEXICAL_MIN_COVERAGE,
+    ) -> List[Dict[str, Any]]:
+        """
+        BM25 检索
+
+        非精确命中的页面覆盖的查询词项权重（IDF 加权，查询里索引中没有的词项按最高 IDF 计入分母）
+        低于 min_coverage 时不返回。
+
+        Returns:
+            [{"id", "score", "coverage", "exact", "payload"}, ...]，精确命中标签的排在前面，其余按 BM25 分数降序
+        """
+        self._stats["queries"] += 1
+        label = normalize_label(query)
+        terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs or not (terms or label):
+                return []
+            avg_len = self._total_len / n_docs or 1.0
+            idf = {term: self._idf(n_docs, len(self._postings.get(term, ()))) for term in terms}
+            total_weight = sum(idf.values()) or 1.0
+            idf = {term: weight for term, weight in idf.items() if term in self._postings}
+            exact = {
+                doc_id for doc_id in self._label_docs.get(label, ())
+                if not filter_conditions or _matches(self._docs[doc_id]["payload"], filter_conditions)
+            }
+
+            scores: Dict[str, float] = {}
+            matched: Dict[str, float] = {}
+            if len(exact) >= limit:
+                # 精确命中已够 limit 条：只给这些页面打分，不遍历倒排表（单字词项的倒排表可能覆盖大部分页面）
+                for doc_id in exact:
+                    doc = self._docs[doc_id]
+                    scores[doc_id] = sum(
+                        self._term_score(weight, doc["terms"].get(term, 0), doc["len"], avg_len)
+                        for term, weight in idf.items()
+                    )
+            else:
+                for term, weight in idf.items():
+                    for doc_id, tf in self._postings[term].items():
+                        scores[doc_id] = scores.get(doc_id, 0.0) + self._term_score(
+                            weight, tf, self._docs[doc_id]["len"], avg_len
+                        )
+                        matched[doc_id] = matched.get(doc_id, 0.0) + weight
+
+            hits = []
+            for doc_id, score in scores.items():
+                is_exact = doc_id in exact
+                coverage = 1.0 if is_exact else matched.get(doc_id, 0.0) / total_weight
+                if not is_exact and coverage < min_coverage:
+                    continue
+                payload = self._docs[doc_id]["payload"]
+                if not is_exact and filter_conditions and not _matches(payload, filter_conditions):
+                    continue
+                hits.append({
+                    "id": doc_id, "score": score, "coverage": round(coverage, 3),
+                    "exact": is_exact, "payload": payload,
+                })
+        hits.sort(key=lambda h: (h["exact"], h["score"]), reverse=True)
+        if hits and hits[0]["exact"]:
+            self._stats["exact_hits"] += 1
+        return hits[:limit]
+
+    @staticmethod
+    def _idf(n_docs: int, df: int) -> float:
+        return math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+    def _term_score(self, idf: float, tf: int, doc_len: int, avg_len: float) -> float:
+        if not tf:
+            return 0.0
+        return idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * doc_len / avg_len))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "collection": self.collection_name,
+            "loaded": self._loaded,
+            "documents": len(self._docs),
+            "terms": len(self._postings),
+            "avg_doc_len": round(self._total_len / len(self._docs), 1) if self._docs else 0,
+            "min_coverage": LEXICAL_MIN_COVERAGE,
+            **self._stats,
+        }
+
+
+def fuse_rrf(ranked_lists: Iterable[List[Dict[str, Any]]], k: int = LEXICAL_RRF_K) -> List[Dict[str, Any]]:
+    """
+    倒数排名融合：score = Σ 1 / (k + rank)
+
+    各列表元素需带 "id"；返回按融合分数降序的 {"id", "score", "sources": [列表序号...], "items": [原始元素...]}
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for source, ranked in enumerate(ranked_lists):
+        for rank, item in enumerate(ranked, 1):
+            entry = fused.setdefault(item["id"], {"id": item["id"], "score": 0.0, "sources": [], "items": []})
+            entry["score"] += 1.0 / (k + rank)
+            entry["sources"].append(source)
+            entry["items"].append(item)
+    return sorted(fused.values(), key=lambda e: e["score"], reverse=True)
+
+
+# 每个 Collection 一份
+_indexes: Dict[str, LexicalIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(collection_name: str) -> Optional[LexicalIndex]:
+    """获取 Collection 对应的词法索引（LEXICAL_INDEX_ENABLED=false 时返回 None）"""
+    if not LEXICAL_INDEX_ENABLED:
+        return None
+    index = _indexes.get(collection_name)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.setdefault(collection_name, LexicalIndex(collection_name))
+    return index
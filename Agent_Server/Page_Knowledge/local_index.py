@@ -0,0 +1,385 @@
+"""
+本地向量索引（Qdrant 镜像 / 小规模部署的主存储）
+
+Qdrant 降级期间（VectorStore._mark_unavailable 之后的 QDRANT_RETRY_SECONDS 内），
+search / get_by_id / scroll_all 原先直接返回空结果，OneClick 随即退回完整的浏览器探索。
+本模块在进程内维护页面知识 Collection 的镜像：
+  - 向量：NumPy float32 矩阵（余弦距离时按行归一化），暴力计算相似度，结果精确
+  - payload：按点 ID 保存的字典
+  - 持久化：vectors.npy（加载时 mmap 只读映射）+ ids.json + payloads.json，原子替换写入
+
+重建来源：Qdrant（scroll 带向量）或 MySQL PageKnowledgeRecord（重新生成 Embedding，
+命中 Embedding 缓存时不产生 API 调用）。
+
+配置：
+  LOCAL_VECTOR_INDEX_MODE = off / mirror / primary
+      mirror: Qdrant 写入成功后同步写本地；Qdrant 不可用时读请求走本地
+      primary: 不连接 Qdrant，全部读写走本地（适合小规模部署）
+  LOCAL_VECTOR_INDEX_DIR（默认 save_floder/vector_index）
+  LOCAL_VECTOR_INDEX_SAVE_INTERVAL = 30（写入后最短落盘间隔，秒；关闭应用时强制落盘）
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ── 本地索引配置 ──────────────────────────
+LOCAL_VECTOR_INDEX_MODE = os.getenv("LOCAL_VECTOR_INDEX_MODE", "off").lower()
+LOCAL_VECTOR_INDEX_DIR = os.getenv(
+    "LOCAL_VECTOR_INDEX_DIR",
+    os.path.join(os.getenv("SAVE_FOLDER_DIR", "../save_floder"), "vector_index"),
+)
+LOCAL_VECTOR_INDEX_SAVE_INTERVAL = float(os.getenv("LOCAL_VECTOR_INDEX_SAVE_INTERVAL", "30"))
+
+_INITIAL_CAPACITY = 64
+
+
+def _value_matches(actual: Any, expected: Any) -> bool:
+    if isinstance(expected, (list, tuple, set)):
+        return actual in expected
+    return actual == expected
+
+
+def _matches(payload: Dict[str, Any], filter_conditions: Optional[Dict]) -> bool:
+    """与 VectorStore 一致的过滤语义（must / should / must_not，见 vector_store.split_filter）"""
+    if not filter_conditions:
+        return True
+    from Page_Knowledge.vector_store import split_filter
+    must, should, must_not = split_filter(filter_conditions)
+    if not all(_value_matches(payload.get(k), v) for k, v in must.items()):
+        return False
+    if should and not any(_value_matches(payload.get(k), v) for k, v in should.items()):
+        return False
+    return not any(_value_matches(payload.get(k), v) for k, v in must_not.items())
+
+
+class LocalVectorIndex:
+    """
+    单个 Collection 的本地向量索引
+
+    所有方法都是同步的：读操作直接在事件循环中调用（内存矩阵运算），可能落盘的写操作由 VectorStore 放到线程池执行。
+    """
+
+    def __init__(self, collection_name: str, base_dir: str = LOCAL_VECTOR_INDEX_DIR, distance: str = "Cosine"):
+        import numpy as np  # 可选依赖，缺失时由 get_local_index 降级
+
+        self._np = np
+        self.collection_name = collection_name
+        self.path = os.path.join(base_dir, collection_name)
+        self.distance = distance.lower()
+        if self.distance not in ("cosine", "dot"):
+            logger.warning(f"[LocalIndex] 不支持的距离 {distance}，本地索引按 Cosine 计算")
+            self.distance = "cosine"
+
+        self._lock = threading.RLock()
+        # 串行化落盘（写文件在 _lock 之外进行）
+        self._save_lock = threading.Lock()
+        self._matrix = None  # (capacity, dim) float32，前 _size 行有效
+        self._size = 0
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._last_save = 0.0
+        self._stats = {"searches": 0, "fallback_reads": 0, "upserts": 0, "deletes": 0, "saves": 0}
+        self._load()
+
+    # ── 持久化 ──────────────────────────────────────────────
+
+    def _files(self) -> Tuple[str, str, str]:
+        return (
+            os.path.join(self.path, "vectors.npy"),
+            os.path.join(self.path, "ids.json"),
+            os.path.join(self.path, "payloads.json"),
+        )
+
+    def _load(self):
+        vectors_file, ids_file, payloads_file = self._files()
+        if not (os.path.exists(vectors_file) and os.path.exists(ids_file) and os.path.exists(payloads_file)):
+            return
+        try:
+            matrix = self._np.load(vectors_file, mmap_mode="r")
+            with open(ids_file, "r", encoding="utf-8") as f:
+                ids = json.load(f)
+            with open(payloads_file, "r", encoding="utf-8") as f:
+                payloads = json.load(f)
+            if matrix.ndim != 2 or matrix.shape[0] != len(ids):
+                raise ValueError(f"向量数 {matrix.shape[0]} 与 ID 数 {len(ids)} 不一致")
+        except Exception as e:
+            logger.warning(f"[LocalIndex] 加载本地索引失败，将从空索引开始: {e}")
+            return
+        self._matrix = matrix  # 只读映射，首次写入时复制到内存
+        self._size = len(ids)
+        self._ids = list(ids)
+        self._rows = {pid: i for i, pid in enumerate(self._ids)}
+        self._payloads = payloads
+        self._last_save = time.time()
+        logger.info(f"[LocalIndex] 已加载 {self.collection_name}: {self._size} 条 (dim={self.dimension})")
+
+    def save(self, force: bool = True):
+        """
+        落盘（force=False 时距上次落盘不足 LOCAL_VECTOR_INDEX_SAVE_INTERVAL 秒则跳过）
+
+        只在持锁时复制矩阵 / ID / payload，写文件在锁外进行，落盘期间检索不被阻塞。
+        """
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                if not force and time.time() - self._last_save < LOCAL_VECTOR_INDEX_SAVE_INTERVAL:
+                    return
+                matrix = (
+                    self._matrix[:self._size].copy()
+                    if self._matrix is not None else self._np.zeros((0, 0), dtype=self._np.float32)
+                )
+                ids = list(self._ids)
+                payloads = dict(self._payloads)
+                # 复制之后的写入会重新置脏，由下一次落盘处理
+                self._dirty = False
+
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                vectors_file, ids_file, payloads_file = self._files()
+                # 先写临时文件再替换，避免中途崩溃留下不一致的索引
+                self._np.save(vectors_file + ".tmp.npy", matrix)
+                with open(ids_file + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(ids, f)
+                with open(payloads_file + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(payloads, f, ensure_ascii=False, default=str)
+                os.replace(vectors_file + ".tmp.npy", vectors_file)
+                os.replace(ids_file + ".tmp", ids_file)
+                os.replace(payloads_file + ".tmp", payloads_file)
+            except Exception:
+                with self._lock:
+                    self._dirty = True
+                raise
+
+            with self._lock:
+                self._last_save = time.time()
+                self._stats["saves"] += 1
+
+    # ── 写入 ──────────────────────────────────────────────
+
+    @property
+    def dimension(self) -> int:
+        return int(self._matrix.shape[1]) if self._matrix is not None else 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _prepare_vector(self, vector: List[float]):
+        vec = self._np.asarray(vector, dtype=self._np.float32)
+        if self.distance == "cosine":
+            norm = float(self._np.linalg.norm(vec))
+            if norm > 0:
+                vec = vec / norm
+        return vec
+
+    def _ensure_writable(self, dim: int):
+        """保证矩阵可写且至少还能追加一行；维度变化时清空（与 Qdrant 重建 Collection 一致）"""
+        np = self._np
+        if self._matrix is not None and self.dimension != dim:
+            logger.warning(f"[LocalIndex] 向量维度变化 {self.dimension} → {dim}，清空本地索引")
+            self._matrix = None
+            self._size = 0
+            self._ids, self._rows, self._payloads = [], {}, {}
+        if self._matrix is None:
+            self._matrix = np.zeros((_INITIAL_CAPACITY, dim), dtype=np.float32)
+            return
+        writable = isinstance(self._matrix, np.ndarray) and not isinstance(self._matrix, np.memmap)
+        if not writable or self._size >= self._matrix.shape[0]:
+            capacity = max(_INITIAL_CAPACITY, self._size * 2, self._size + 1)
+            grown = np.zeros((capacity, dim), dtype=np.float32)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+
+    def upsert(self, point_id: str, vector: List[float], payload: Dict[str, Any]):
+        """写入或替换一个点；vector 为空时只更新 payload"""
+        self.upsert_many([(point_id, vector, payload)])
+
+    def upsert_many(self, points: Iterable[Tuple[str, List[float], Dict[str, Any]]]):
+        """批量写入，整批结束后最多落盘一次"""
+        with self._lock:
+            for point_id, vector, payload in points:
+                if not vector:
+                    if point_id in self._payloads:
+                        self._payloads[point_id] = {**self._payloads[point_id], **payload}
+                        self._dirty = True
+                    continue
+                vec = self._prepare_vector(vector)
+                self._ensure_writable(len(vec))
+                row = self._rows.get(point_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._ids.append(point_id)
+                    self._rows[point_id] = row
+                self._matrix[row] = vec
+                self._payloads[point_id] = payload
+                self._dirty = True
+                self._stats["upserts"] += 1
+        self.save(force=False)
+
+    def delete(self, point_id: str):
+        with self._lock:
+            row = self._rows.pop(point_id, None)
+            if row is None:
+                return
+            self._ensure_writable(self.dimension)
+            last = self._size - 1
+            if row != last:
+                # 用最后一行填补空位
+                moved = self._ids[last]
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved
+                self._rows[moved] = row
+            self._ids.pop()
+            self._size -= 1
+            self._payloads.pop(point_id, None)
+            self._dirty = True
+            self._stats["deletes"] += 1
+        self.save(force=False)
+
+    def rebuild(self, points: Iterable[Tuple[str, List[float], Dict[str, Any]]]) -> int:
+        """用给定的 (id, vector, payload) 全量替换索引并落盘，返回条数"""
+        np = self._np
+        ids, vectors, payloads = [], [], {}
+        for point_id, vector, payload in points:
+            if not vector or point_id in payloads:
+                continue
+            ids.append(point_id)
+            vectors.append(self._prepare_vector(vector))
+            payloads[point_id] = payload or {}
+        with self._lock:
+            self._matrix = np.vstack(vectors).astype(np.float32) if vectors else None
+            self._size = len(ids)
+            self._ids = ids
+            self._rows = {pid: i for i, pid in enumerate(ids)}
+            self._payloads = payloads
+            self._dirty = True
+        self.save()
+        logger.info(f"[LocalIndex] 已重建 {self.collection_name}: {len(ids)} 条")
+        return len(ids)
+
+    # ── 读取 ──────────────────────────────────────────────
+
+    def search(
+        self,
+        query_vector: List[float],
+        limit: int = 5,
+        score_threshold: float = 0.0,
+        filter_conditions: Optional[Dict] = None,
+    ) -> List[Dict]:
+        """暴力计算相似度，返回与 VectorStore.search 相同的结构"""
+        np = self._np
+        with self._lock:
+            self._stats["searches"] += 1
+            if self._size == 0 or not query_vector or len(query_vector) != self.dimension:
+                return []
+            scores = np.asarray(self._matrix[:self._size] @ self._prepare_vector(query_vector))
+            if filter_conditions:
+                candidates = np.array(
+                    [i for i, pid in enumerate(self._ids) if _matches(self._payloads.get(pid, {}), filter_conditions)],
+                    dtype=np.int64,
+                )
+            else:
+                candidates = np.arange(self._size)
+            if score_threshold:
+                candidates = candidates[scores[candidates] >= score_threshold]
+            if candidates.size == 0:
+                return []
+            k = min(limit, candidates.size)
+            top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {"id": self._ids[i], "score": float(scores[i]), "payload": self._payloads.get(self._ids[i], {})}
+                for i in top
+            ]
+
+    def get(self, point_id: str) -> Optional[Dict]:
+        with self._lock:
+            payload = self._payloads.get(point_id)
+            if payload is None:
+                return None
+            return {"id": point_id, "payload": payload}
+
+    def scroll(
+        self,
+        filter_conditions: Optional[Dict] = None,
+        limit: int = 100,
+        offset: int = 0,
+        payload_fields: Optional[List[str]] = None,
+    ) -> Tuple[List[Dict], Optional[int]]:
+        """从第 offset 行开始读取一页，返回 (items, next_offset)；next_offset 为 None 表示已到末尾"""
+        with self._lock:
+            results = []
+            for row in range(max(offset, 0), self._size):
+                pid = self._ids[row]
+                payload = self._payloads.get(pid, {})
+                if not _matches(payload, filter_conditions):
+                    continue
+                if payload_fields:
+                    payload = {k: payload[k] for k in payload_fields if k in payload}
+                results.append({"id": pid, "payload": payload})
+                if len(results) >= limit:
+                    return results, (row + 1 if row + 1 < self._size else None)
+            return results, None
+
+    def record_fallback(self):
+        with self._lock:
+            self._stats["fallback_reads"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "mode": LOCAL_VECTOR_INDEX_MODE,
+                "collection": self.collection_name,
+                "count": self._size,
+                "dimension": self.dimension,
+                "distance": self.distance,
+                "memory_mapped": self._matrix is not None and isinstance(self._matrix, self._np.memmap),
+                "dirty": self._dirty,
+                "path": self.path,
+            }
+
+
+# 按 Collection 缓存的本地索引
+_indexes: Dict[str, LocalVectorIndex] = {}
+_indexes_lock = threading.Lock()
+_numpy_missing_logged = False
+
+
+def get_local_index(collection_name: str, distance: str = "Cosine") -> Optional[LocalVectorIndex]:
+    """获取 Collection 对应的本地索引（LOCAL_VECTOR_INDEX_MODE=off 或未安装 numpy 时返回 None）"""
+    global _numpy_missing_logged
+    if LOCAL_VECTOR_INDEX_MODE not in ("mirror", "primary"):
+        return None
+    index = _indexes.get(collection_name)
+    if index is not None:
+        return index
+    with _indexes_lock:
+        index = _indexes.get(collection_name)
+        if index is None:
+            try:
+                index = LocalVectorIndex(collection_name, distance=distance)
+            except ImportError:
+                if not _numpy_missing_logged:
+                    logger.warning("[LocalIndex] numpy 未安装，本地向量索引不可用")
+                    _numpy_missing_logged = True
+                return None
+            _indexes[collection_name] = index
+    return index
+
+
+def save_local_indexes():
+    """应用关闭时调用：落盘所有有改动的本地索引"""
+    for index in list(_indexes.values()):
+        try:
+            index.save()
+        except Exception as e:
+            logger.warning(f"[LocalIndex] 落盘失败 ({index.collection_name}): {e}")
@@ -0,0 +1,633 @@
+"""
+页面知识库重建索引（Embedding 模型 / 维度变更时的无损迁移）
+
+QdrantCollectionConfig 换了模型或维度后，VectorStore 原先在写入时发现维度不符就直接删除重建 Collection，
+已有的点全部丢失。本模块在后台用新配置把整个知识库重新生成 Embedding，写入影子 Collection，
+完成后把别名原子切换过去：
+
+  1. 读取来源：Qdrant 现有 payload（默认）或 MySQL PageKnowledgeRecord，按游标分页流式读取
+  2. 每批 REINDEX_BATCH_SIZE 条调用 embed_batch，同时最多 REINDEX_CONCURRENCY 批在途
+  3. 写入影子 Collection `<别名>__reindex_<时间戳>`，每个窗口写完后把游标记入检查点文件
+  4. 复制期间线上被改写的点记为脏点，随检查点落盘，切换前补写（只改了 payload 的点只复制 payload，不重新 Embedding）；
+     任务中断后只要检查点可续跑，线上写入仍然记为脏点
+  5. 开启写屏障：新的 VectorStore 写入先等待，已在途的写入完成后补写剩余脏点；脏点清空才切换，否则任务失败（可续跑）
+  6. 别名切换到影子 Collection，新配置应用到 VectorStore / EmbeddingClient 单例，关闭写屏障；
+     等待中的写入随后写入新 Collection（向量按旧配置生成的由 VectorStore 用新模型重新生成）
+
+进程崩溃或任务取消后再次启动（resume=True）从检查点游标继续；点 ID 由 URL 决定，
+重做最后一个窗口是幂等的。检查点不保存 API Key，续跑时使用调用方传入的当前配置。
+写屏障只作用于本进程的 VectorStore，多进程部署时重建期间其它进程应停止写入。
+
+首次迁移时 Collection 名还是物理 Collection，需先删除它再创建同名别名，两步之间有很短的不可用窗口；
+之后的迁移都是单次请求内的原子切换。首次迁移删除前比对点数：影子 Collection 比原 Collection 少
+（source=qdrant 时扣除跳过的无正文点）则不切换，原数据保持不动；source=mysql 时 MySQL 里没有记录的
+向量点会让切换被拒绝，这种情况请改用 source=qdrant。
+
+配置：
+  REINDEX_BATCH_SIZE = 64
+  REINDEX_CONCURRENCY = 4
+  REINDEX_MAX_RETRIES = 2（单批 Embedding 失败的重试次数，仍失败则任务中止，可续跑）
+  REINDEX_BARRIER_TIMEOUT = 120（写屏障内等待在途写入并补写剩余脏点的最长秒数，超时则不切换）
+  REINDEX_CHECKPOINT_PATH（默认 save_floder/reindex/checkpoint.json）
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from Page_Knowledge.vector_store import QDRANT_HOST, QDRANT_PORT, VectorStore
+
+logger = logging.getLogger(__name__)
+
+# ── 重建索引配置 ──────────────────────────
+REINDEX_BATCH_SIZE = int(os.getenv("REINDEX_BATCH_SIZE", "64"))
+REINDEX_CONCURRENCY = int(os.getenv("REINDEX_CONCURRENCY", "4"))
+REINDEX_MAX_RETRIES = int(os.getenv("REINDEX_MAX_RETRIES", "2"))
+REINDEX_BARRIER_TIMEOUT = float(os.getenv("REINDEX_BARRIER_TIMEOUT", "120"))
+REINDEX_CHECKPOINT_PATH = os.getenv(
+    "REINDEX_CHECKPOINT_PATH",
+    os.path.join(os.getenv("SAVE_FOLDER_DIR", "../save_floder"), "reindex", "checkpoint.json"),
+)
+
+REINDEX_SOURCES = ("qdrant", "mysql")
+_RESUMABLE = ("interrupted", "failed", "cancelled")
+# 写屏障开启时等待中的写入的轮询间隔
+_BARRIER_POLL_SECONDS = 0.05
+
+# 待处理的点：(point_id, embedding_text, payload)
+_Item = Tuple[str, str, Dict[str, Any]]
+
+
+class _ShadowStore(VectorStore):
+    """影子 Collection：不写本地镜像索引，不通知重建任务，不受写屏障限制"""
+
+    def _local_index(self):
+        return None
+
+    def _note_writes(self, point_ids: Sequence[str], kind: str) -> None:
+        return None
+
+    async def _begin_write(self) -> bool:
+        return False
+
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _item_from_payload(point_id: str, payload: Dict[str, Any]) -> Optional[_Item]:
+    """Qdrant payload → 待处理条目（没有 embedding_text 时由 knowledge 重新生成）"""
+    text = payload.get("embedding_text")
+    if not text and payload.get("knowledge"):
+        from Page_Knowledge.schema import PageKnowledge
+        text = PageKnowledge.from_dict(payload["knowledge"]).build_embedding_text()
+    if not text:
+        return None
+    return point_id, text, payload
+
+
+class ReindexJob:
+    """
+    单实例的后台重建任务
+
+    state 是检查点的全部内容（每个窗口写完后原子落盘）；任务本身运行在调用 start() 的事件循环上。
+    """
+
+    def __init__(self, checkpoint_path: str = REINDEX_CHECKPOINT_PATH):
+        self.checkpoint_path = checkpoint_path
+        self.state: Dict[str, Any] = self._load_checkpoint()
+        self._dirty: Dict[str, str] = dict(self.state.pop("dirty", None) or {})
+        self._task: Optional[asyncio.Task] = None
+        self._cancel_requested = False
+        # 写屏障：开启时线上写入等待；_inflight_writes 为已通过屏障、尚未结束的写入数
+        self._write_lock = threading.Lock()
+        self._barrier = False
+        self._inflight_writes = 0
+
+    # ── 检查点 ──────────────────────────────────────────────
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"[Reindex] 检查点读取失败（忽略）: {e}")
+            return {}
+        if state.get("status") == "running":
+            # 上次进程在任务运行中退出
+            state["status"] = "interrupted"
+        return state
+
+    def _save_checkpoint(self):
+        self.state["updated_at"] = _now()
+        os.makedirs(os.path.dirname(self.checkpoint_path) or ".", exist_ok=True)
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**self.state, "dirty": self._dirty}, f, ensure_ascii=False)
+        os.replace(tmp, self.checkpoint_path)
+
+    def _remove_checkpoint(self):
+        try:
+            os.remove(self.checkpoint_path)
+        except FileNotFoundError:
+            pass
+
+    # ── 控制 ──────────────────────────────────────────────
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(
+        self,
+        config: Dict[str, Any],
+        source: str = "qdrant",
+        resume: bool = True,
+        drop_old: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        启动重建任务（立即返回，任务在后台运行）
+
+        Args:
+            config: 目标配置（QdrantCollectionConfig 字典），collection_name 即切换后的别名
+            source: qdrant（从现有 payload 读取）/ mysql（从 PageKnowledgeRecord 读取）
+            resume: 检查点与目标配置一致时从检查点继续
+            drop_old: 切换完成后删除旧的物理 Collection
+        """
+        from Page_Knowledge.local_index import LOCAL_VECTOR_INDEX_MODE
+        from Page_Knowledge.vector_store import get_vector_store
+
+        if self.running:
+            raise RuntimeError(f"重建任务正在运行: {self.state.get('job_id')}")
+        if source not in REINDEX_SOURCES:
+            raise ValueError(f"source 只能是 {' / '.join(REINDEX_SOURCES)}")
+        if LOCAL_VECTOR_INDEX_MODE == "primary":
+            raise RuntimeError("LOCAL_VECTOR_INDEX_MODE=primary 时不使用 Qdrant，请改用本地索引重建（source=mysql）")
+
+        alias = config.get("collection_name") or get_vector_store().collection_name
+        if resume and self._can_resume(config, alias, source):
+            logger.info(
+                f"[Reindex] 从检查点继续 {self.state['job_id']}: "
+                f"cursor={self.state.get('cursor')} processed={self.state.get('processed', 0)}"
+            )
+        else:
+            if self.state.get("target_collection") and self.state.get("status") in _RESUMABLE:
+                await self._drop_collection(self.state, self.state["target_collection"])
+            self._dirty = {}
+            job_id = time.strftime("%Y%m%d%H%M%S")
+            self.state = {
+                "job_id": job_id,
+                "source": source,
+                "alias": alias,
+                "source_collection": get_vector_store().collection_name,
+                "target_collection": f"{alias}__reindex_{job_id}",
+                "previous_collection": None,
+                "qdrant_host": config.get("qdrant_host"),
+                "qdrant_port": config.get("qdrant_port"),
+                "embedding_model": config.get("embedding_model"),
+                "vector_size": None,
+                "distance": config.get("distance") or "Cosine",
+                "phase": "copy",
+                "cursor": None,
+                "total": None,
+                "processed": 0,
+                "written": 0,
+                "skipped": 0,
+                "retries": 0,
+                "drop_old": drop_old,
+                "started_at": _now(),
+                "finished_at": None,
+                "error": None,
+            }
+        self.state["drop_old"] = drop_old
+        self.state["status"] = "running"
+        self.state["error"] = None
+        self._cancel_requested = False
+        self._save_checkpoint()
+        self._task = asyncio.get_running_loop().create_task(self._run(config))
+        return self.get_status()
+
+    def _can_resume(self, config: Dict[str, Any], alias: str, source: str) -> bool:
+        state = self.state
+        return (
+            state.get("status") in _RESUMABLE
+            and state.get("alias") == alias
+            and state.get("source") == source
+            and state.get("embedding_model") == config.get("embedding_model")
+            and (state.get("distance") or "Cosine") == (config.get("distance") or "Cosine")
+            and state.get("qdrant_host") == config.get("qdrant_host")
+            and state.get("qdrant_port") == config.get("qdrant_port")
+        )
+
+    async def cancel(self, discard: bool = False) -> Dict[str, Any]:
+        """取消任务；discard=True 时同时删除影子 Collection 与检查点（不可再续跑）"""
+        if self.running:
+            self._cancel_requested = True
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        if discard and self.state.get("target_collection") and self.state.get("status") != "completed":
+            await self._drop_collection(self.state, self.state["target_collection"])
+            self.state = {}
+            self._dirty = {}
+            self._remove_checkpoint()
+        return self.get_status()
+
+    async def stop(self):
+        """应用关闭时调用：中断任务并保留检查点，下次启动可续跑"""
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def _tracking(self, collection_name: str) -> bool:
+        """任务运行中或检查点可续跑、且尚未切换完成时，记录来源 Collection 的改写"""
+        return (
+            collection_name == self.state.get("source_collection")
+            and (self.running or self.state.get("status") in _RESUMABLE)
+            and self.state.get("phase") != "done"
+        )
+
+    def note_writes(self, collection_name: str, point_ids: Sequence[str], kind: str):
+        """
+        记录复制开始后线上被改写的点（delete 覆盖之前的记录，upsert 覆盖 payload）
+
+        任务未运行（等待续跑）时有新脏点立即写入检查点，进程退出后续跑也不会漏补写。
+        """
+        if not self._tracking(collection_name):
+            return
+        changed = False
+        for pid in point_ids:
+            if kind == "payload" and self._dirty.get(pid) in ("upsert", "delete"):
+                # 已删除的点只改 payload 不会发生；upsert 的补写已包含最新 payload
+                continue
+            if self._dirty.get(pid) != kind:
+                self._dirty[pid] = kind
+                changed = True
+        if changed and not self.running:
+            try:
+                self._save_checkpoint()
+            except Exception as e:
+                logger.warning(f"[Reindex] 脏点写入检查点失败: {e}")
+
+    async def begin_write(self, collection_name: str) -> bool:
+        """线上写入前调用：写屏障开启期间等待；返回 True 表示已计入在途写入"""
+        while True:
+            with self._write_lock:
+                if not self._barrier or collection_name != self.state.get("source_collection"):
+                    self._inflight_writes += 1
+                    return True
+            await asyncio.sleep(_BARRIER_POLL_SECONDS)
+
+    def end_write(self):
+        with self._write_lock:
+            self._inflight_writes -= 1
+
+    def _set_barrier(self, enabled: bool):
+        with self._write_lock:
+            self._barrier = enabled
+
+    def get_status(self) -> Dict[str, Any]:
+        """任务进度"""
+        if not self.state:
+            return {"status": "idle"}
+        total = self.state.get("total")
+        processed = self.state.get("processed", 0)
+        return {
+            **self.state,
+            "running": self.running,
+            "resumable": self.state.get("status") in _RESUMABLE,
+            "dirty_pending": len(self._dirty),
+            "write_barrier": self._barrier,
+            "percent": round(min(processed / total, 1.0) * 100, 1) if total else None,
+        }
+
+    # ── 执行 ──────────────────────────────────────────────
+
+    async def _run(self, config: Dict[str, Any]):
+        from Page_Knowledge.embedding import build_embedding_client
+        from Page_Knowledge.vector_store import get_vector_store
+
+        live = get_vector_store()
+        embedder = build_embedding_client(config, bind_cache=False)
+        shadow = None
+        try:
+            shadow = await self._open_shadow(embedder)
+            if self.state["phase"] == "copy":
+                await self._copy(live, shadow, embedder)
+                self.state["phase"] = "catch_up"
+                self._save_checkpoint()
+            await self._catch_up(live, shadow, embedder)
+            self.state["phase"] = "swap"
+            self._save_checkpoint()
+            previous = await self._swap_under_barrier(config, live, shadow, embedder)
+            await self._finish_swap(previous)
+            self.state["phase"] = "done"
+            self.state["status"] = "completed"
+            self.state["finished_at"] = _now()
+            self._save_checkpoint()
+            logger.info(
+                f"[Reindex] ✅ 完成 {self.state['job_id']}: {self.state['written']} 条 → "
+                f"{self.state['target_collection']}（别名 {self.state['alias']}）"
+            )
+        except asyncio.CancelledError:
+            self.state["status"] = "cancelled" if self._cancel_requested else "interrupted"
+            self._save_checkpoint()
+            logger.info(f"[Reindex] 任务 {self.state['job_id']} 已{'取消' if self._cancel_requested else '中断'}，检查点已保存")
+            raise
+        except Exception as e:
+            self.state["status"] = "failed"
+            self.state["error"] = str(e)
+            self._save_checkpoint()
+            logger.error(f"[Reindex] 任务 {self.state['job_id']} 失败（可续跑）: {e}")
+        finally:
+            if shadow is not None:
+                await shadow.close()
+
+    async def _open_shadow(self, embedder) -> VectorStore:
+        """创建或打开影子 Collection；首次运行时用一条探测请求确定新模型的实际维度"""
+        if not self.state.get("vector_size"):
+            probe = (await embedder.embed_batch(["page knowledge reindex probe"]))[0]
+            if not any(probe):
+                raise RuntimeError("Embedding API 不可用（探测请求返回空向量），请检查模型配置")
+            self.state["vector_size"] = len(probe)
+
+        shadow = _ShadowStore(
+            host=self.state.get("qdrant_host") or QDRANT_HOST,
+            port=int(self.state.get("qdrant_port") or QDRANT_PORT),
+            collection_name=self.state["target_collection"],
+            vector_size=self.state["vector_size"],
+            distance=self.state["distance"],
+        )
+        existed = self.state["target_collection"] in await shadow._collection_names(shadow._get_client())
+        if not existed and (self.state.get("cursor") or self.state["phase"] != "copy"):
+            # 检查点指向的影子 Collection 已被删除，从头复制
+            logger.warning(f"[Reindex] 影子 Collection {self.state['target_collection']} 不存在，从头开始")
+            self.state.update({"phase": "copy", "cursor": None, "processed": 0, "written": 0, "skipped": 0})
+        if not await shadow.ensure_collection():
+            raise RuntimeError(f"影子 Collection 创建失败: {shadow._last_error}")
+        return shadow
+
+    async def _copy(self, live: VectorStore, shadow: VectorStore, embedder):
+        """按窗口流式复制：读 REINDEX_CONCURRENCY 批 → 并发 Embedding → 写入 → 记录检查点"""
+        if self.state.get("total") is None:
+            self.state["total"] = await self._count_source(live)
+
+        cursor = self.state.get("cursor")
+        exhausted = False
+        while not exhausted:
+            window: List[List[_Item]] = []
+            for _ in range(max(1, REINDEX_CONCURRENCY)):
+                batch, cursor = await self._read_batch(live, cursor)
+                if batch:
+                    window.append(batch)
+                if cursor is None:
+                    exhausted = True
+                    break
+
+            points = []
+            for embedded in await asyncio.gather(*(self._embed(embedder, batch) for batch in window)):
+                points.extend(embedded)
+            if points and not await shadow.upsert_many(points):
+                raise RuntimeError(f"写入影子 Collection 失败: {shadow._last_error}")
+
+            self.state["cursor"] = cursor
+            self.state["processed"] += sum(len(batch) for batch in window)
+            self.state["written"] += len(points)
+            self._save_checkpoint()
+
+    async def _count_source(self, live: VectorStore) -> Optional[int]:
+        if self.state["source"] == "qdrant":
+            return await live.count()
+
+        def _count():
+            from database.connection import PageKnowledgeRecord, SessionLocal
+            db = SessionLocal()
+            try:
+                return db.query(PageKnowledgeRecord).count()
+            finally:
+                db.close()
+
+        return await asyncio.to_thread(_count)
+
+    async def _read_batch(self, live: VectorStore, cursor: Optional[str]) -> Tuple[List[_Item], Optional[str]]:
+        """读取来源中游标之后的一批，返回 (items, next_cursor)；next_cursor 为 None 表示已读完"""
+        if self.state["source"] == "mysql":
+            return await asyncio.to_thread(self._read_mysql_batch, cursor)
+
+        if not await live.ensure_collection():
+            raise RuntimeError(f"Qdrant 不可用: {live._last_error or 'unknown'}")
+        records, next_cursor = await live.scroll_page(None, REINDEX_BATCH_SIZE, cursor)
+        items = []
+        for record in records:
+            item = _item_from_payload(record["id"], record["payload"])
+            if item is None:
+                self.state["skipped"] += 1
+            else:
+                items.append(item)
+        return items, next_cursor
+
+    def _read_mysql_batch(self, cursor: Optional[str]) -> Tuple[List[_Item], Optional[str]]:
+        """按主键游标读取 PageKnowledgeRecord（在线程池中执行）"""
+        from database.connection import PageKnowledgeRecord, SessionLocal
+        from Page_Knowledge.schema import PageKnowledge
+        from Page_Knowledge.service import PageKnowledgeService
+        from Page_Knowledge.vector_store import generate_point_id
+
+        db = SessionLocal()
+        try:
+            query = db.query(PageKnowledgeRecord).order_by(PageKnowledgeRecord.id)
+            if cursor:
+                query = query.filter(PageKnowledgeRecord.id > int(cursor))
+            records = query.limit(REINDEX_BATCH_SIZE).all()
+            items = []
+            for record in records:
+                data = record.knowledge_json
+                if isinstance(data, str):
+                    try:
+                        data = json.loads(data)
+                    except ValueError:
+                        data = None
+                if not data:
+                    self.state["skipped"] += 1
+                    continue
+                knowledge = PageKnowledge.from_dict(data)
+                text = knowledge.build_embedding_text()
+                point_id = record.vector_point_id or generate_point_id(knowledge.url)
+                items.append((point_id, text, PageKnowledgeService._build_payload(knowledge, text, record.project_id)))
+            next_cursor = str(records[-1].id) if len(records) == REINDEX_BATCH_SIZE else None
+            return items, next_cursor
+        finally:
+            db.close()
+
+    async def _embed(self, embedder, batch: List[_Item]) -> List[Tuple[str, List[float], Dict[str, Any]]]:
+        """整批生成向量；有非空文本拿到零向量（API 失败）时整批重试"""
+        texts = [text for _, text, _ in batch]
+        for attempt in range(REINDEX_MAX_RETRIES + 1):
+            vectors = await embedder.embed_batch(texts)
+            failed = sum(1 for text, vec in zip(texts, vectors) if text.strip() and not any(vec))
+            if not failed:
+                return [(pid, vec, payload) for (pid, _, payload), vec in zip(batch, vectors)]
+            if attempt < REINDEX_MAX_RETRIES:
+                self.state["retries"] += 1
+                await asyncio.sleep(2 ** attempt)
+        raise RuntimeError(f"Embedding 连续 {REINDEX_MAX_RETRIES + 1} 次失败（{failed}/{len(texts)} 条）")
+
+    async def _catch_up(self, live: VectorStore, shadow: VectorStore, embedder, max_rounds: int = 5):
+        """补写复制期间被改写的点；补写时又有新写入则再来一轮（剩余的在写屏障内补完）"""
+        for _ in range(max_rounds):
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+            try:
+                records = await live.retrieve_many([pid for pid, kind in dirty.items() if kind != "delete"])
+                deletes = [pid for pid, kind in dirty.items() if kind == "delete" or pid not in records]
+                payloads = {pid: records[pid]["payload"] for pid, kind in dirty.items() if kind == "payload" and pid in records}
+                items = [
+                    item for pid, kind in dirty.items() if kind == "upsert" and pid in records
+                    for item in [_item_from_payload(pid, records[pid]["payload"])] if item is not None
+                ]
+                for start in range(0, len(items), REINDEX_BATCH_SIZE):
+                    points = await self._embed(embedder, items[start:start + REINDEX_BATCH_SIZE])
+                    if not await shadow.upsert_many(points):
+                        raise RuntimeError(f"补写影子 Collection 失败: {shadow._last_error}")
+                if payloads and not await shadow.set_payload_batch(payloads):
+                    raise RuntimeError(f"补写 payload 失败: {shadow._last_error}")
+                for pid in deletes:
+                    await shadow.delete(pid)
+            except Exception:
+                # 未完成的脏点放回，续跑时重做（期间的新记录优先）
+                for pid, kind in dirty.items():
+                    self._dirty.setdefault(pid, kind)
+                raise
+            logger.info(f"[Reindex] 补写复制期间的改动: upsert {len(items)} / payload {len(payloads)} / delete {len(deletes)}")
+            self._save_checkpoint()
+        if self._dirty:
+            logger.info(f"[Reindex] 补写 {max_rounds} 轮后仍有 {len(self._dirty)} 个新改动，留到写屏障内补写")
+
+    async def _swap_under_barrier(
+        self, config: Dict[str, Any], live: VectorStore, shadow: VectorStore, embedder,
+    ) -> Optional[str]:
+        """
+        开启写屏障 → 等在途写入结束 → 补写剩余脏点 → 切换别名并应用新配置 → 关闭写屏障
+
+        脏点未清空时不切换（抛出异常，任务可续跑），返回原先指向的物理 Collection。
+        """
+        self._set_barrier(True)
+        logger.info("[Reindex] 写屏障已开启，等待在途写入并补写剩余改动")
+        try:
+            await asyncio.wait_for(self._drain_and_catch_up(live, shadow, embedder), REINDEX_BARRIER_TIMEOUT)
+            if self._dirty:
+                raise RuntimeError(f"写屏障内补写后仍有 {len(self._dirty)} 个改动未同步，未切换")
+            return await self._swap(config, shadow)
+        except asyncio.TimeoutError:
+            raise RuntimeError(
+                f"写屏障内 {REINDEX_BARRIER_TIMEOUT:.0f}s 未完成补写（剩余 {len(self._dirty)} 个改动），未切换"
+            )
+        finally:
+            self._set_barrier(False)
+            logger.info("[Reindex] 写屏障已关闭")
+
+    async def _drain_and_catch_up(self, live: VectorStore, shadow: VectorStore, embedder):
+        while self._inflight_writes > 0:
+            await asyncio.sleep(_BARRIER_POLL_SECONDS)
+        await self._catch_up(live, shadow, embedder, max_rounds=1)
+
+    async def _swap(self, config: Dict[str, Any], shadow: VectorStore) -> Optional[str]:
+        """切换别名并应用新配置（写屏障内调用），返回原先指向的物理 Collection"""
+        from Page_Knowledge.embedding import reload_embedding_client
+        from Page_Knowledge.vector_store import apply_config_to_store
+
+        alias_store = _ShadowStore(
+            host=shadow.host, port=shadow.port, collection_name=self.state["alias"],
+            vector_size=shadow.vector_size, distance=self.state["distance"],
+        )
+        try:
+            # source=qdrant 时跳过的点本来就不会复制；source=mysql 时原 Collection 的点必须全部有来源
+            allow_shortfall = self.state.get("skipped", 0) if self.state["source"] == "qdrant" else 0
+            previous = await alias_store.swap_alias(self.state["target_collection"], allow_shortfall=allow_shortfall)
+        finally:
+            await alias_store.close()
+        self.state["previous_collection"] = previous
+        self._save_checkpoint()
+
+        # 切换后立即换用新模型，避免线上用旧模型的向量写入新 Collection
+        new_config = {**config, "collection_name": self.state["alias"], "vector_size": self.state["vector_size"]}
+        reload_embedding_client(new_config)
+        apply_config_to_store(new_config)
+        return previous
+
+    async def _finish_swap(self, previous: Optional[str]):
+        """切换后的收尾（写屏障外）：可选删除旧 Collection，mirror 模式下重建本地索引"""
+        from Page_Knowledge.local_index import LOCAL_VECTOR_INDEX_MODE
+        from Page_Knowledge.vector_store import get_vector_store
+
+        if self.state.get("drop_old") and previous and previous != self.state["target_collection"]:
+            await self._drop_collection(self.state, previous)
+
+        if LOCAL_VECTOR_INDEX_MODE == "mirror":
+            try:
+                await get_vector_store().rebuild_local_index()
+            except Exception as e:
+                logger.warning(f"[Reindex] 本地索引重建失败（忽略）: {e}")
+
+    @staticmethod
+    async def _drop_collection(state: Dict[str, Any], collection_name: str):
+        """删除物理 Collection（失败只记录警告）"""
+        store = _ShadowStore(
+            host=state.get("qdrant_host") or QDRANT_HOST,
+            port=int(state.get("qdrant_port") or QDRANT_PORT),
+            collection_name=collection_name,
+        )
+        try:
+            if await store.drop_collection():
+                logger.info(f"[Reindex] 已删除 Collection: {collection_name}")
+        except Exception as e:
+            logger.warning(f"[Reindex] 删除 Collection {collection_name} 失败（忽略）: {e}")
+        finally:
+            await store.close()
+
+
+# 全局单例
+_job: Optional[ReindexJob] = None
+
+
+def get_reindex_job() -> ReindexJob:
+    """获取全局重建索引任务"""
+    global _job
+    if _job is None:
+        _job = ReindexJob()
+    return _job
+
+
+def note_writes(collection_name: str, point_ids: Sequence[str], kind: str):
+    """VectorStore 写入成功后调用；没有运行中或可续跑的任务时是空操作（首次调用时读取检查点）"""
+    get_reindex_job().note_writes(collection_name, point_ids, kind)
+
+
+async def begin_write(collection_name: str) -> bool:
+    """VectorStore 写入前调用：重建任务的写屏障开启时等待"""
+    if _job is None:
+        return False
+    return await _job.begin_write(collection_name)
+
+
+def end_write():
+    if _job is not None:
+        _job.end_write()
+
+
+async def stop_reindex():
+    """应用关闭时调用：中断任务并保存检查点"""
+    if _job is not None:
+        await _job.stop()
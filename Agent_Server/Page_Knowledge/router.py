@@ -27,7 +27,12 @@ from database.connection import (
 )
 from Page_Knowledge.service import PageKnowledgeService
 from Page_Knowledge.vector_store import get_vector_store, apply_config_to_store
-from Page_Knowledge.embedding import reload_embedding_client
+from Page_Knowledge.embedding import get_embedding_client, reload_embedding_client
+from Page_Knowledge.embedding_cache import get_embedding_cache
+from Page_Knowledge.access_tracker import get_access_tracker
+from Page_Knowledge.local_index import LOCAL_VECTOR_INDEX_MODE, get_local_index
+from Page_Knowledge.lexical_index import get_lexical_index
+from Page_Knowledge.reindex import get_reindex_job
 from Page_Knowledge.schema import PageKnowledge
 from Exploration.cache_service import ExplorationCacheService
 from Exploration.dispatcher_service import ExplorationDispatcherService
@@ -60,6 +65,7 @@ class RetrieveContextRequest(BaseModel):
     query: str
     domain: str = ""
     limit: int = 3
+    mode: Optional[str] = None  # hybrid / vector / lexical，默认 PAGE_KB_RETRIEVE_MODE
 
 
 # ── 接口 ──
@@ -68,10 +74,9 @@ class RetrieveContextRequest(BaseModel):
 async def knowledge_stats(db: Session = Depends(get_db)):
     """知识库统计信息"""
     try:
-        import asyncio
         from database.connection import PageKnowledgeRecord
         store = get_vector_store()
-        health = await asyncio.to_thread(store.health_check)
+        health = await store.health_check()
         # MySQL 真实记录数
         total_records = db.query(PageKnowledgeRecord).count()
         # Qdrant 向量数
@@ -99,16 +104,93 @@ async def knowledge_stats(db: Session = Depends(get_db)):
 
 
 @router.get("/knowledge/health")
-def knowledge_health():
+async def knowledge_health():
     """向量数据库健康检查"""
     try:
         store = get_vector_store()
-        health = store.health_check()
+        health = await store.health_check()
         return {"success": True, "data": health}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 
+@router.get("/knowledge/embedding-cache/stats")
+def embedding_cache_stats():
+    """Embedding 缓存命中率统计"""
+    cache = get_embedding_cache()
+    if cache is None:
+        return {"success": True, "data": {"enabled": False}}
+    return {"success": True, "data": cache.get_stats()}
+
+
+@router.get("/knowledge/embedding-batcher/stats")
+def embedding_batcher_stats():
+    """Embedding 微批处理统计（请求数、批次数、平均批大小）"""
+    return {"success": True, "data": get_embedding_client().get_batch_stats()}
+
+
+@router.post("/knowledge/embedding-cache/clear")
+def embedding_cache_clear():
+    """清空 Embedding 缓存（内存层 + 持久层）"""
+    cache = get_embedding_cache()
+    if cache is not None:
+        cache.clear()
+    return {"success": True, "message": "Embedding 缓存已清空"}
+
+
+@router.get("/knowledge/access-tracker/stats")
+def access_tracker_stats():
+    """访问时间写后缓冲统计（待写回数、刷新次数）"""
+    return {"success": True, "data": get_access_tracker().get_stats()}
+
+
+@router.get("/knowledge/local-index/stats")
+def local_index_stats():
+    """本地向量索引统计（Qdrant 降级时的后备索引）"""
+    store = get_vector_store()
+    index = get_local_index(store.collection_name)
+    if index is None:
+        return {"success": True, "data": {"enabled": False, "mode": LOCAL_VECTOR_INDEX_MODE}}
+    return {"success": True, "data": index.get_stats()}
+
+
+@router.post("/knowledge/local-index/rebuild")
+async def local_index_rebuild(source: str = "qdrant", db: Session = Depends(get_db)):
+    """重建本地向量索引（source=qdrant 从向量库拉取；source=mysql 从页面知识记录重新生成）"""
+    if source not in ("qdrant", "mysql"):
+        return {"success": False, "message": f"不支持的重建来源: {source}"}
+    try:
+        data = await PageKnowledgeService.rebuild_local_index(db, source)
+        return {"success": True, "data": data}
+    except Exception as e:
+        logger.error(f"[PageKB API] local-index rebuild 失败: {e}")
+        return {"success": False, "message": str(e)}
+
+
+@router.get("/knowledge/lexical-index/stats")
+def lexical_index_stats():
+    """本地 BM25 词法索引统计（文档数、词项数、精确命中次数）"""
+    index = get_lexical_index(get_vector_store().collection_name)
+    if index is None:
+        return {"success": True, "data": {"enabled": False}}
+    return {"success": True, "data": index.get_stats()}
+
+
+@router.post("/knowledge/lexical-index/rebuild")
+async def lexical_index_rebuild():
+    """从向量库重新加载本地词法索引（其它进程写入的知识在重建后可见）"""
+    store = get_vector_store()
+    index = get_lexical_index(store.collection_name)
+    if index is None:
+        return {"success": False, "message": "词法索引未启用（LEXICAL_INDEX_ENABLED=false）"}
+    try:
+        count = await index.rebuild(store)
+        return {"success": True, "data": {"count": count}}
+    except Exception as e:
+        logger.error(f"[PageKB API] lexical-index rebuild 失败: {e}")
+        return {"success": False, "message": str(e)}
+
+
 @router.post("/knowledge/lookup")
 async def knowledge_lookup(req: LookupRequest):
     """查询页面知识（精确 + 语义检索）"""
@@ -188,8 +270,15 @@ async def knowledge_check_update(req: StoreRequest, db: Session = Depends(get_db
 
 
 @router.get("/knowledge/list")
-async def knowledge_list(domain: str = "", page_type: str = "", limit: int = 100, project_id: int = None, db: Session = Depends(get_db)):
-    """列出所有页面知识"""
+async def knowledge_list(
+    domain: str = "",
+    page_type: str = "",
+    limit: int = 100,
+    project_id: int = None,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """列出页面知识（游标分页：传入上一页返回的 next_cursor 获取下一页）"""
     try:
         from database.connection import get_active_project_by_id
 
@@ -207,10 +296,11 @@ async def knowledge_list(domain: str = "", page_type: str = "", limit: int = 100
                 # 项目未启用，返回空列表
                 return {"success": True, "data": {"items": [], "total": 0}}
 
-        items = await PageKnowledgeService.list_all(
-            domain=domain, page_type=page_type, limit=limit, project_id=project.id,
+        page = await PageKnowledgeService.list_page(
+            domain=domain, page_type=page_type, limit=limit, project_id=project.id, cursor=cursor,
         )
-        return {"success": True, "data": {"items": items, "total": len(items)}}
+        items = page["items"]
+        return {"success": True, "data": {"items": items, "total": len(items), "next_cursor": page["next_cursor"]}}
     except Exception as e:
         logger.error(f"[PageKB API] list 失败: {e}")
         return {"success": False, "message": str(e)}
@@ -242,10 +332,15 @@ async def knowledge_delete(req: DeleteRequest, db: Session = Depends(get_db)):
 
 @router.post("/knowledge/retrieve-context")
 async def knowledge_retrieve_context(req: RetrieveContextRequest):
-    """RAG 上下文检索（给任务规划用）"""
+    """
+    RAG 上下文检索（给任务规划用）
+
+    score 为向量余弦相似度，只由词法检索命中的结果为 null；
+    bm25_score / coverage / rrf_score 为词法分数、查询词覆盖率和融合排序分数（未参与时为 null）。
+    """
     try:
         contexts = await PageKnowledgeService.retrieve_context(
-            query=req.query, domain=req.domain, limit=req.limit,
+            query=req.query, domain=req.domain, limit=req.limit, mode=req.mode,
         )
         items = []
         for ctx in contexts:
@@ -255,7 +350,11 @@ async def knowledge_retrieve_context(req: RetrieveContextRequest):
                 "summary": ctx.get("summary", ""),
                 "page_type": ctx.get("page_type", ""),
                 "module_name": ctx.get("module_name", ""),
-                "score": ctx.get("score", 0),
+                "score": ctx.get("score"),
+                "match": ctx.get("match", ""),
+                "bm25_score": ctx.get("bm25_score"),
+                "coverage": ctx.get("coverage"),
+                "rrf_score": ctx.get("rrf_score"),
                 "knowledge": k.to_dict() if isinstance(k, PageKnowledge) else None,
             })
         return {"success": True, "data": {"items": items, "total": len(items)}}
@@ -265,9 +364,13 @@ async def knowledge_retrieve_context(req: RetrieveContextRequest):
 
 
 @router.get("/knowledge/stale")
-async def knowledge_stale(max_age_days: int = 30):
-    """查找已老化的知识"""
+async def knowledge_stale(max_age_days: int = 30, limit: int = 0, cursor: Optional[str] = None):
+    """查找已老化的知识（limit > 0 时按游标分页，否则遍历全部）"""
     try:
+        if limit > 0:
+            page = await PageKnowledgeService.find_stale_page(max_age_days, limit, cursor)
+            items = page["items"]
+            return {"success": True, "data": {"items": items, "total": len(items), "next_cursor": page["next_cursor"]}}
         items = await PageKnowledgeService.find_stale_knowledge(max_age_days)
         return {"success": True, "data": {"items": items, "total": len(items)}}
     except Exception as e:
@@ -378,7 +481,6 @@ def save_collection_config(req: CollectionConfigRequest, db: Session = Depends(g
 async def create_collection(req: CollectionCreateRequest, db: Session = Depends(get_db)):
     """应用当前配置，创建/初始化 Qdrant Collection（force=True 时先删除再重建）"""
     try:
-        import asyncio
         # 加载 DB 配置（若无则用默认值）
         cfg = db.query(QdrantCollectionConfig).filter_by(is_active=1).order_by(
             QdrantCollectionConfig.id.desc()
@@ -393,21 +495,15 @@ async def create_collection(req: CollectionCreateRequest, db: Session = Depends(
 
         if req.force:
             # 强制删除旧 collection 再重建
-            def _force_recreate():
-                try:
-                    client = store._get_client()
-                    collections = [c.name for c in client.get_collections().collections]
-                    if store.collection_name in collections:
-                        client.delete_collection(store.collection_name)
-                        logger.info(f"[PageKB API] 已删除旧 Collection: {store.collection_name}")
-                except Exception as e:
-                    logger.warning(f"[PageKB API] 删除旧 Collection 失败（忽略）: {e}")
-
-            await asyncio.to_thread(_force_recreate)
-
-        ok = await asyncio.to_thread(store.ensure_collection)
+            try:
+                if await store.drop_collection():
+                    logger.info(f"[PageKB API] 已删除旧 Collection: {store.collection_name}")
+            except Exception as e:
+                logger.warning(f"[PageKB API] 删除旧 Collection 失败（忽略）: {e}")
+
+        ok = await store.ensure_collection()
         if ok:
-            health = await asyncio.to_thread(store.health_check)
+            health = await store.health_check()
             return {
                 "success": True,
                 "message": f"Collection '{store.collection_name}' 初始化成功",
@@ -423,6 +519,43 @@ async def create_collection(req: CollectionCreateRequest, db: Session = Depends(
         return {"success": False, "message": str(e)}
 
 
+class ReindexRequest(BaseModel):
+    source: str = "qdrant"  # qdrant / mysql
+    resume: bool = True
+    drop_old: bool = False
+
+
+@router.post("/knowledge/reindex")
+async def start_reindex(req: ReindexRequest, db: Session = Depends(get_db)):
+    """按当前保存的 Collection 配置在后台重建索引：重新生成 Embedding 写入影子 Collection，完成后切换别名"""
+    try:
+        cfg = db.query(QdrantCollectionConfig).filter_by(is_active=1).order_by(
+            QdrantCollectionConfig.id.desc()
+        ).first()
+        config_dict = _config_to_dict(cfg) if cfg else _DEFAULT_CONFIG
+        data = await get_reindex_job().start(config_dict, req.source, req.resume, req.drop_old)
+        return {"success": True, "data": data, "message": f"重建任务已启动: {data['job_id']}"}
+    except Exception as e:
+        logger.error(f"[PageKB API] reindex 启动失败: {e}")
+        return {"success": False, "message": str(e)}
+
+
+@router.get("/knowledge/reindex/status")
+def reindex_status():
+    """重建索引进度（阶段、游标、已处理 / 总数、待补写的改动数）"""
+    return {"success": True, "data": get_reindex_job().get_status()}
+
+
+@router.post("/knowledge/reindex/cancel")
+async def cancel_reindex(discard: bool = False):
+    """取消重建任务（保留检查点可续跑；discard=True 时删除影子 Collection 与检查点）"""
+    try:
+        return {"success": True, "data": await get_reindex_job().cancel(discard)}
+    except Exception as e:
+        logger.error(f"[PageKB API] reindex 取消失败: {e}")
+        return {"success": False, "message": str(e)}
+
+
 # ── 页面探索专用接口 ──
 
 # 全局探索任务跟踪（用于中止功能）
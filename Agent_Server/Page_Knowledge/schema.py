@@ -17,6 +17,12 @@ from datetime import datetime
 from typing import List, Dict, Optional, Any
 
 
+def _fingerprint(value: Any) -> str:
+    """结构化数据的稳定短哈希（用于组件级变更检测）"""
+    raw = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
 @dataclass
 class FormField:
     """表单字段"""
@@ -49,6 +55,9 @@ class FormCapability:
         d["fields"] = [f.to_dict() for f in self.fields]
         return d
 
+    def fingerprint(self) -> str:
+        return _fingerprint(self.to_dict())
+
     @classmethod
     def from_dict(cls, d: Dict) -> "FormCapability":
         fields = [FormField.from_dict(f) for f in d.get("fields", [])]
@@ -74,6 +83,9 @@ class TableCapability:
     def to_dict(self) -> Dict:
         return asdict(self)
 
+    def fingerprint(self) -> str:
+        return _fingerprint(self.to_dict())
+
     @classmethod
     def from_dict(cls, d: Dict) -> "TableCapability":
         return cls(**{k: v for k, v in d.items() if k in cls.__dataclass_fields__})
@@ -146,6 +158,25 @@ class PageKnowledge:
         raw = "|".join(sig_parts)
         return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
 
+    def compute_component_hashes(self) -> Dict[str, Any]:
+        """
+        计算组件级子签名（随 payload 存储）
+
+        compute_hash 只给出整页的粗粒度签名；更新时按组件比对子签名，
+        只对签名变化的表单 / 表格 / 按钮集 / 功能区域集 / 属性标记做 diff 和 merge。
+        同名表单（表格）以最后一个为准，与 DiffEngine 的按名称对比一致。
+        """
+        return {
+            "forms": {f.name: f.fingerprint() for f in self.forms},
+            "tables": {t.name: t.fingerprint() for t in self.tables},
+            "buttons": _fingerprint(sorted({str(b) for b in self.buttons})),
+            "sections": _fingerprint(sorted({str(s) for s in self.page_sections})),
+            "properties": _fingerprint([
+                self.auth_required, self.has_file_upload, self.has_export,
+                self.has_import, self.has_search, self.has_pagination,
+            ]),
+        }
+
     def refresh_hash(self):
         self.hash_signature = self.compute_hash()
         self.last_updated = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -6,7 +6,7 @@ RAG 记忆层入口：
   2. 存储新页面知识（探索 → 抽象 → Embedding → 写入 Qdrant + MySQL）
   3. 版本检查（hash 比对 → diff → 自动更新）
   4. 知识老化管理
-  5. 为任务树规划提供 RAG 上下文
+  5. 为任务树规划提供 RAG 上下文（向量 + 本地 BM25 混合检索）
 """
 import asyncio
 import copy
@@ -19,9 +19,11 @@ from urllib.parse import urlparse
 from sqlalchemy.orm import Session
 
 from Page_Knowledge.schema import PageKnowledge
+from Page_Knowledge.access_tracker import get_access_tracker
 from Page_Knowledge.embedding import get_embedding_client
-from Page_Knowledge.vector_store import get_vector_store, generate_point_id
-from Page_Knowledge.diff_engine import DiffEngine, DiffResult
+from Page_Knowledge.lexical_index import PAGE_KB_RETRIEVE_MODE, fuse_rrf, get_lexical_index
+from Page_Knowledge.vector_store import QDRANT_SCROLL_PAGE_SIZE, get_vector_store, generate_point_id
+from Page_Knowledge.diff_engine import ComponentChanges, DiffEngine, DiffResult
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +32,12 @@ SIMILARITY_THRESHOLD = 0.82    # 相似度阈值：高于此值认为命中
 KNOWLEDGE_MAX_AGE_DAYS = 30    # 知识老化：超过此天数需重新验证
 FRESHNESS_HOURS = 4            # 新鲜度：4 小时内的知识直接复用
 
+# 列表/老化扫描只取这些 payload 字段，不拉取完整 knowledge 结构
+LIST_PAYLOAD_FIELDS = [
+    "url", "domain", "page_type", "module_name", "summary",
+    "hash_signature", "version", "last_updated", "last_accessed",
+]
+
 
 class PageKnowledgeService:
 
@@ -53,15 +61,17 @@ class PageKnowledgeService:
         """
         store = get_vector_store()
 
-        async def _exact_lookup(url: str) -> Optional[Dict]:
-            if not url:
-                return None
-            point_id = generate_point_id(url)
-            existing = await asyncio.to_thread(store.get_by_id, point_id)
+        # 优先 login_url（知识库通常以登录页为入口存储），再试 base_url；两个 ID 一次批量读取
+        candidates = [(url, generate_point_id(url)) for url in (login_url, base_url) if url]
+        found = await store.retrieve_many([point_id for _, point_id in candidates])
+
+        for url, point_id in candidates:
+            existing = found.get(point_id)
             if existing and existing.get("payload"):
                 payload = existing["payload"]
                 knowledge = PageKnowledge.from_dict(payload.get("knowledge", payload))
                 is_fresh = PageKnowledgeService._is_fresh(knowledge)
+                get_access_tracker().record(point_id)
                 logger.info(f"[PageKB] 精确命中: {url}, 新鲜={is_fresh}")
                 return {
                     "hit": True,
@@ -71,17 +81,6 @@ class PageKnowledgeService:
                     "payload": payload,
                     "point_id": point_id,
                 }
-            return None
-
-        # 优先 login_url（知识库通常以登录页为入口存储）
-        result = await _exact_lookup(login_url)
-        if result:
-            return result
-
-        # 再试 base_url
-        result = await _exact_lookup(base_url)
-        if result:
-            return result
 
         logger.info(f"[PageKB] 未命中: login_url={login_url}, base_url={base_url}")
         return None
@@ -156,6 +155,8 @@ class PageKnowledgeService:
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.1,
                 response_format={"type": "json_object"},
+                source="page_knowledge",
+                cache=True,
             )
             result = llm.parse_json_response(response)
             result.setdefault("is_sufficient", False)
@@ -197,7 +198,7 @@ class PageKnowledgeService:
 
         # ── 1.1 精确匹配 ──
         point_id = generate_point_id(url)
-        existing = await asyncio.to_thread(store.get_by_id, point_id)
+        existing = await store.get_by_id(point_id)
         if existing and existing.get("payload"):
             payload = existing["payload"]
             knowledge = PageKnowledge.from_dict(payload.get("knowledge", payload))
@@ -205,14 +206,8 @@ class PageKnowledgeService:
             # 新鲜度检查
             if PageKnowledgeService._is_fresh(knowledge):
                 knowledge.last_accessed = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                # 异步更新 last_accessed（非阻塞）
-                try:
-                    await asyncio.to_thread(store.upsert, point_id, [], {
-                        **payload,
-                        "knowledge": {**payload.get("knowledge", payload), "last_accessed": knowledge.last_accessed}
-                    })
-                except Exception:
-                    pass
+                # 访问时间记入内存缓冲，由后台批量写回（查询路径不写向量库）
+                get_access_tracker().record(point_id, knowledge.last_accessed)
 
                 logger.info(f"[PageKB] ✅ 精确命中: {url}")
                 return {
@@ -238,14 +233,13 @@ class PageKnowledgeService:
             query_text = url
 
         try:
-            query_vector = await embed_client.embed(query_text)
+            query_vector = await embed_client.embed(query_text, source="page_knowledge.lookup")
 
             filter_cond = {}
             if domain_filter:
                 filter_cond["domain"] = domain_filter
 
-            results = await asyncio.to_thread(
-                store.search,
+            results = await store.search(
                 query_vector,
                 3,
                 SIMILARITY_THRESHOLD,
@@ -283,17 +277,20 @@ class PageKnowledgeService:
         knowledge: PageKnowledge,
         db: Optional[Session] = None,
         project_id: int = None,
+        previous_embedding_text: Optional[str] = None,
     ) -> Dict:
         """
         存储或更新页面知识到向量数据库 + MySQL
 
         流程：
           1. 刷新 hash
-          2. 生成 Embedding
+          2. 生成 Embedding（Embedding 文本与 previous_embedding_text 相同时沿用已有向量，只更新 payload）
           3. 写入 Qdrant
           4. 写入 MySQL（PageKnowledgeRecord）
         """
         store = get_vector_store()
+        # 先记下配置代数再取 Embedding 客户端：写入前模型被切换（重建索引）时由 VectorStore 按新模型重新生成
+        generation = store.config_generation
         embed_client = get_embedding_client()
 
         if project_id is None:
@@ -310,28 +307,24 @@ class PageKnowledgeService:
             except Exception:
                 pass
 
-        # 生成 Embedding
+        # 生成 Embedding（文本未变化时跳过，空向量表示只更新 payload）
         embedding_text = knowledge.build_embedding_text()
-        vector = await embed_client.embed(embedding_text)
+        if previous_embedding_text is not None and embedding_text == previous_embedding_text:
+            vector = []
+            logger.debug(f"[PageKB] Embedding 文本未变化，沿用已有向量: {knowledge.url}")
+        else:
+            vector = await embed_client.embed(embedding_text, source="page_knowledge.store")
 
         # 写入 Qdrant
         point_id = generate_point_id(knowledge.url)
-        payload = {
-            "url": knowledge.url,
-            "domain": knowledge.domain,
-            "page_type": knowledge.page_type,
-            "module_name": knowledge.module_name,
-            "hash_signature": knowledge.hash_signature,
-            "version": knowledge.version,
-            "last_updated": knowledge.last_updated,
-            "last_accessed": knowledge.last_accessed,
-            "summary": knowledge.summary,
-            "embedding_text": embedding_text,
-            "knowledge": knowledge.to_dict(),  # 完整结构
-            "project_id": project_id,
-        }
+        payload = PageKnowledgeService._build_payload(knowledge, embedding_text, project_id)
 
-        success = await asyncio.to_thread(store.upsert, point_id, vector, payload)
+        success = await store.upsert(point_id, vector, payload, generation=generation)
+
+        # 同步本地词法索引
+        lexical = get_lexical_index(store.collection_name)
+        if success and lexical is not None:
+            lexical.upsert(point_id, payload)
 
         # 写入 MySQL（可选）
         mysql_id = None
@@ -387,7 +380,7 @@ class PageKnowledgeService:
         # 查已有知识
         store = get_vector_store()
         point_id = generate_point_id(url)
-        existing = await asyncio.to_thread(store.get_by_id, point_id)
+        existing = await store.get_by_id(point_id)
 
         if not existing or not existing.get("payload"):
             # 全新页面 → 直接存储
@@ -416,18 +409,25 @@ class PageKnowledgeService:
                 "knowledge": old_knowledge,
             }
 
-        # 结构有变 → 执行 Diff
-        diff_result = DiffEngine.compute_diff(old_knowledge, new_knowledge)
+        # 结构有变 → 按组件子签名找出变化的组件，只对这些组件 Diff / 合并
+        # （旧版本写入的 payload 没有子签名时现算）
+        old_components = payload.get("component_hashes") or old_knowledge.compute_component_hashes()
+        changed = DiffEngine.changed_components(old_components, new_knowledge.compute_component_hashes())
+        diff_result = DiffEngine.compute_diff(old_knowledge, new_knowledge, changed)
         logger.info(
             f"[PageKB] 🔄 结构变更: {url} "
-            f"(severity={diff_result.severity}, changes={len(diff_result.changes)})"
+            f"(severity={diff_result.severity}, changes={len(diff_result.changes)}, "
+            f"changed_components={changed.count})"
         )
 
         # 智能合并：将新探索结果 merge 到旧知识上，而非全文覆盖
         # 旧知识中未被新探索覆盖到的部分会被保留，只补充缺失、更新已变化的部分
-        merged_knowledge = PageKnowledgeService._merge_knowledge(old_knowledge, new_knowledge, diff_result)
+        merged_knowledge = PageKnowledgeService._merge_knowledge(old_knowledge, new_knowledge, diff_result, changed)
         merged_knowledge.version = old_knowledge.version + 1
-        result = await PageKnowledgeService.store(merged_knowledge, db, project_id=project_id)
+        result = await PageKnowledgeService.store(
+            merged_knowledge, db, project_id=project_id,
+            previous_embedding_text=payload.get("embedding_text"),
+        )
 
         return {
             "action": "updated",
@@ -437,6 +437,7 @@ class PageKnowledgeService:
             "old_version": old_knowledge.version,
             "new_version": merged_knowledge.version,
             "merged_changes": len(diff_result.changes),
+            "changed_components": changed.to_dict(),
         }
 
     # ═══════════════════════════════════════════════
@@ -448,6 +449,7 @@ class PageKnowledgeService:
         query: str,
         domain: str = "",
         limit: int = 3,
+        mode: Optional[str] = None,
     ) -> List[Dict]:
         """
         为任务树规划提供 RAG 上下文
@@ -455,44 +457,97 @@ class PageKnowledgeService:
         当生成 L2 任务时，不要只用当前页面结构——
         同时检索历史页面知识作为参考
 
+        mode（默认 PAGE_KB_RETRIEVE_MODE）:
+          hybrid  — 查询与按钮 / 表单名等标签完全一致时只查本地 BM25 索引（不调用 Embedding），
+                    否则向量结果与 BM25 结果做 RRF 融合；Embedding 不可用时退回 BM25 结果
+          vector  — 纯向量检索
+          lexical — 只查本地 BM25 索引
+
         Returns:
-            [{ "url", "summary", "page_type", "score", "knowledge": PageKnowledge }, ...]
+            [{ "url", "summary", "page_type", "score", "match", "bm25_score", "coverage", "rrf_score",
+               "knowledge": PageKnowledge }, ...]
+            score 始终是向量余弦相似度（与纯向量检索时含义一致，可继续按阈值过滤）；
+            只由词法检索命中、没有向量分数的结果 score 为 None。
+            bm25_score / coverage 为词法命中的 BM25 分数和查询词覆盖率，rrf_score 为融合排序分数，
+            对应检索路径没有参与时为 None。
         """
+        mode = (mode or PAGE_KB_RETRIEVE_MODE).lower()
         store = get_vector_store()
-        embed_client = get_embedding_client()
-
-        try:
-            query_vector = await embed_client.embed(query)
+        filter_cond = {"domain": domain} if domain else None
 
-            filter_cond = {}
-            if domain:
-                filter_cond["domain"] = domain
-
-            results = await asyncio.to_thread(
-                store.search,
-                query_vector,
-                limit,
-                0.5,
-                filter_cond if filter_cond else None,
-            )
+        lexical_hits: List[Dict] = []
+        lexical = get_lexical_index(store.collection_name) if mode != "vector" else None
+        if lexical is not None:
+            try:
+                await lexical.ensure_loaded(store)
+                lexical_hits = lexical.search(query, limit * 2, filter_cond)
+            except Exception as e:
+                logger.warning(f"[PageKB] 词法检索失败，改用向量检索: {e}")
+            if mode == "lexical" or (lexical_hits and lexical_hits[0]["exact"]):
+                return [
+                    PageKnowledgeService._context_item(h["payload"], "lexical", lexical_hit=h)
+                    for h in lexical_hits[:limit]
+                ]
 
-            contexts = []
-            for r in results:
-                payload = r["payload"]
-                contexts.append({
-                    "url": payload.get("url", ""),
-                    "summary": payload.get("summary", ""),
-                    "page_type": payload.get("page_type", ""),
-                    "score": r["score"],
-                    "module_name": payload.get("module_name", ""),
-                    "knowledge": PageKnowledge.from_dict(
-                        payload.get("knowledge", payload)
-                    ),
-                })
-            return contexts
+        try:
+            query_vector = await get_embedding_client().embed(query, source="page_knowledge.retrieve")
+            vector_hits = []
+            if any(query_vector):
+                vector_hits = await store.search(
+                    query_vector,
+                    limit * 2 if lexical_hits else limit,
+                    0.5,
+                    filter_cond,
+                )
         except Exception as e:
-            logger.warning(f"[PageKB] RAG 上下文检索失败: {e}")
-            return []
+            logger.warning(f"[PageKB] RAG 上下文向量检索失败: {e}")
+            vector_hits = []
+
+        if not lexical_hits:
+            return [
+                PageKnowledgeService._context_item(r["payload"], "vector", vector_hit=r)
+                for r in vector_hits[:limit]
+            ]
+        if not vector_hits:
+            return [
+                PageKnowledgeService._context_item(h["payload"], "lexical", lexical_hit=h)
+                for h in lexical_hits[:limit]
+            ]
+
+        contexts = []
+        for entry in fuse_rrf([vector_hits, lexical_hits])[:limit]:
+            hits = dict(zip(entry["sources"], entry["items"]))
+            vector_hit, lexical_hit = hits.get(0), hits.get(1)
+            match = "hybrid" if len(hits) > 1 else ("vector" if vector_hit else "lexical")
+            # 两路都命中时取向量库的 payload（含完整字段）
+            payload = (vector_hit or lexical_hit)["payload"]
+            contexts.append(PageKnowledgeService._context_item(
+                payload, match, vector_hit=vector_hit, lexical_hit=lexical_hit, rrf_score=entry["score"],
+            ))
+        return contexts
+
+    @staticmethod
+    def _context_item(
+        payload: Dict,
+        match: str,
+        vector_hit: Optional[Dict] = None,
+        lexical_hit: Optional[Dict] = None,
+        rrf_score: Optional[float] = None,
+    ) -> Dict:
+        return {
+            "url": payload.get("url", ""),
+            "summary": payload.get("summary", ""),
+            "page_type": payload.get("page_type", ""),
+            "score": vector_hit["score"] if vector_hit else None,
+            "match": match,
+            "bm25_score": lexical_hit["score"] if lexical_hit else None,
+            "coverage": lexical_hit.get("coverage") if lexical_hit else None,
+            "rrf_score": rrf_score,
+            "module_name": payload.get("module_name", ""),
+            "knowledge": PageKnowledge.from_dict(
+                payload.get("knowledge", payload)
+            ),
+        }
 
     @staticmethod
     def build_rag_prompt_context(contexts: List[Dict]) -> str:
@@ -533,9 +588,41 @@ class PageKnowledgeService:
         limit: int = 100,
         project_id: int = None,
     ) -> List[Dict]:
-        """列出知识库中所有页面知识"""
+        """列出知识库中所有页面知识（最多 limit 条）"""
+        store = get_vector_store()
+        filter_cond = PageKnowledgeService._list_filter(domain, page_type, project_id)
+
+        result = []
+        async for item in store.iter_points(filter_cond, min(limit, QDRANT_SCROLL_PAGE_SIZE), LIST_PAYLOAD_FIELDS):
+            result.append(PageKnowledgeService._list_item(item))
+            if len(result) >= limit:
+                break
+        return result
+
+    @staticmethod
+    async def list_page(
+        domain: str = "",
+        page_type: str = "",
+        limit: int = 100,
+        project_id: int = None,
+        cursor: Optional[str] = None,
+    ) -> Dict:
+        """
+        游标分页列出页面知识
+
+        Returns:
+            { "items": [...], "next_cursor": str | None }（next_cursor 为 None 表示没有更多数据）
+        """
         store = get_vector_store()
+        filter_cond = PageKnowledgeService._list_filter(domain, page_type, project_id)
+        items, next_cursor = await store.scroll_page(filter_cond, limit, cursor, LIST_PAYLOAD_FIELDS)
+        return {
+            "items": [PageKnowledgeService._list_item(item) for item in items],
+            "next_cursor": next_cursor,
+        }
 
+    @staticmethod
+    def _list_filter(domain: str, page_type: str, project_id: Optional[int]) -> Optional[Dict]:
         filter_cond = {}
         if domain:
             filter_cond["domain"] = domain
@@ -543,38 +630,31 @@ class PageKnowledgeService:
             filter_cond["page_type"] = page_type
         if project_id is not None:
             filter_cond["project_id"] = project_id
+        return filter_cond or None
 
-        items = await asyncio.to_thread(
-            store.scroll_all,
-            filter_cond if filter_cond else None,
-            limit,
-        )
-
-        result = []
-        for item in items:
-            payload = item.get("payload", {})
-            knowledge_data = payload.get("knowledge", {})
-            result.append({
-                "id": item.get("id"),
-                "url": payload.get("url", knowledge_data.get("url", "")),
-                "domain": payload.get("domain", ""),
-                "page_type": payload.get("page_type", ""),
-                "module_name": payload.get("module_name", ""),
-                "summary": payload.get("summary", ""),
-                "hash_signature": payload.get("hash_signature", ""),
-                "version": payload.get("version", 1),
-                "last_updated": payload.get("last_updated", ""),
-                "last_accessed": payload.get("last_accessed", ""),
-            })
-
-        return result
+    @staticmethod
+    def _list_item(item: Dict) -> Dict:
+        payload = item.get("payload", {})
+        return {
+            "id": item.get("id"),
+            "url": payload.get("url", ""),
+            "domain": payload.get("domain", ""),
+            "page_type": payload.get("page_type", ""),
+            "module_name": payload.get("module_name", ""),
+            "summary": payload.get("summary", ""),
+            "hash_signature": payload.get("hash_signature", ""),
+            "version": payload.get("version", 1),
+            "last_updated": payload.get("last_updated", ""),
+            # 优先取尚未写回的访问时间
+            "last_accessed": get_access_tracker().peek(item.get("id")) or payload.get("last_accessed", ""),
+        }
 
     @staticmethod
     async def get_detail(url: str) -> Optional[Dict]:
         """获取单个页面知识详情"""
         store = get_vector_store()
         point_id = generate_point_id(url)
-        record = await asyncio.to_thread(store.get_by_id, point_id)
+        record = await store.get_by_id(point_id)
 
         if not record or not record.get("payload"):
             return None
@@ -594,7 +674,11 @@ class PageKnowledgeService:
         """删除指定 URL 的页面知识"""
         store = get_vector_store()
         point_id = generate_point_id(url)
-        success = await asyncio.to_thread(store.delete, point_id)
+        success = await store.delete(point_id)
+
+        lexical = get_lexical_index(store.collection_name)
+        if success and lexical is not None:
+            lexical.remove(point_id)
 
         if db and success:
             try:
@@ -605,15 +689,61 @@ class PageKnowledgeService:
         return success
 
     @staticmethod
-    def get_stats() -> Dict:
+    async def get_stats() -> Dict:
         """知识库统计"""
         store = get_vector_store()
-        health = store.health_check()
+        health = await store.health_check()
         return {
             "total_pages": health.get("count", 0),
             "vector_store": health,
         }
 
+    @staticmethod
+    async def rebuild_local_index(db: Optional[Session] = None, source: str = "qdrant") -> Dict:
+        """
+        重建本地向量索引
+
+        source:
+          qdrant — 从 Qdrant 拉取向量与 payload（Qdrant 需可用）
+          mysql  — 从 PageKnowledgeRecord 重新生成 Embedding（命中 Embedding 缓存时不调用 API）
+        """
+        store = get_vector_store()
+        if source == "qdrant":
+            count = await store.rebuild_local_index()
+            return {"source": source, "count": count}
+
+        if db is None:
+            raise ValueError("db is required when rebuilding local index from MySQL")
+        from database.connection import PageKnowledgeRecord
+        from Page_Knowledge.local_index import get_local_index
+
+        index = get_local_index(store.collection_name, store._distance)
+        if index is None:
+            raise RuntimeError("本地向量索引未启用（LOCAL_VECTOR_INDEX_MODE=off 或未安装 numpy）")
+
+        points, texts = [], []
+        for record in db.query(PageKnowledgeRecord).all():
+            data = record.knowledge_json
+            if isinstance(data, str):
+                try:
+                    data = json.loads(data)
+                except ValueError:
+                    continue
+            if not data:
+                continue
+            knowledge = PageKnowledge.from_dict(data)
+            embedding_text = knowledge.build_embedding_text()
+            point_id = record.vector_point_id or generate_point_id(knowledge.url)
+            points.append((point_id, PageKnowledgeService._build_payload(knowledge, embedding_text, record.project_id)))
+            texts.append(embedding_text)
+
+        vectors = await get_embedding_client().embed_batch(texts) if texts else []
+        count = await asyncio.to_thread(
+            index.rebuild,
+            [(pid, vec, payload) for (pid, payload), vec in zip(points, vectors) if any(vec)],
+        )
+        return {"source": source, "count": count, "records": len(points)}
+
     # ═══════════════════════════════════════════════
     # 6. 知识老化管理
     # ═══════════════════════════════════════════════
@@ -621,29 +751,58 @@ class PageKnowledgeService:
     @staticmethod
     async def find_stale_knowledge(
         max_age_days: int = KNOWLEDGE_MAX_AGE_DAYS,
+        project_id: Optional[int] = None,
     ) -> List[Dict]:
         """
         查找已老化的知识（超过 max_age_days 天未更新）
 
-        用于定期重新验证页面结构
+        用于定期重新验证页面结构；逐页遍历整个知识库，不受单页条数限制
         """
-        all_items = await PageKnowledgeService.list_all(limit=500)
-        stale = []
+        store = get_vector_store()
         cutoff = datetime.now() - timedelta(days=max_age_days)
+        filter_cond = PageKnowledgeService._list_filter("", "", project_id)
+        stale = []
+        async for item in store.iter_points(filter_cond, payload_fields=LIST_PAYLOAD_FIELDS):
+            listed = PageKnowledgeService._list_item(item)
+            if PageKnowledgeService._is_stale(listed, cutoff):
+                stale.append(listed)
+        return stale
 
-        for item in all_items:
-            last_updated = item.get("last_updated", "")
-            if last_updated:
-                try:
-                    dt = datetime.strptime(last_updated, "%Y-%m-%d %H:%M:%S")
-                    if dt < cutoff:
-                        stale.append(item)
-                except ValueError:
-                    stale.append(item)
-            else:
-                stale.append(item)
+    @staticmethod
+    async def find_stale_page(
+        max_age_days: int = KNOWLEDGE_MAX_AGE_DAYS,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        project_id: Optional[int] = None,
+    ) -> Dict:
+        """
+        游标分页查找老化知识：从 cursor 处按页扫描，累计到 limit 条老化记录（或扫描完）为止
 
-        return stale
+        同一页内的老化记录全部返回，因此单次结果可能略多于 limit 条。
+        """
+        store = get_vector_store()
+        cutoff = datetime.now() - timedelta(days=max_age_days)
+        filter_cond = PageKnowledgeService._list_filter("", "", project_id)
+        stale = []
+        while True:
+            items, cursor = await store.scroll_page(filter_cond, limit, cursor, LIST_PAYLOAD_FIELDS)
+            for item in items:
+                listed = PageKnowledgeService._list_item(item)
+                if PageKnowledgeService._is_stale(listed, cutoff):
+                    stale.append(listed)
+            if cursor is None or len(stale) >= limit:
+                break
+        return {"items": stale, "next_cursor": cursor}
+
+    @staticmethod
+    def _is_stale(item: Dict, cutoff: datetime) -> bool:
+        last_updated = item.get("last_updated", "")
+        if not last_updated:
+            return True
+        try:
+            return datetime.strptime(last_updated, "%Y-%m-%d %H:%M:%S") < cutoff
+        except ValueError:
+            return True
 
     # ═══════════════════════════════════════════════
     # 内部方法
@@ -654,10 +813,14 @@ class PageKnowledgeService:
         old: PageKnowledge,
         new: PageKnowledge,
         diff: "DiffResult",
+        changed: Optional[ComponentChanges] = None,
     ) -> PageKnowledge:
         """
         智能合并两个版本的页面知识（surgical merge，而非全文覆盖）
 
+        传入 changed 时，子签名未变化的已有表单 / 表格、按钮集、功能区域集直接跳过
+        （内容相同，合并结果不变）。
+
         策略：
           - 新探索发现了旧知识没有的元素 → 补充进去（填充缺口）
           - 两边都有但属性有变化的元素   → 以新值更新（修复过时内容）
@@ -675,6 +838,8 @@ class PageKnowledgeService:
         # ── 1. 合并 forms ─────────────────────────────────────────────
         old_form_map = {f.name: f for f in merged.forms}
         for new_form in new.forms:
+            if changed is not None and new_form.name not in changed.forms:
+                continue
             if new_form.name not in old_form_map:
                 # 新增表单 → 直接追加
                 merged.forms.append(copy.deepcopy(new_form))
@@ -708,6 +873,8 @@ class PageKnowledgeService:
         # ── 2. 合并 tables ────────────────────────────────────────────
         old_table_map = {t.name: t for t in merged.tables}
         for new_table in new.tables:
+            if changed is not None and new_table.name not in changed.tables:
+                continue
             if new_table.name not in old_table_map:
                 # 新增表格
                 merged.tables.append(copy.deepcopy(new_table))
@@ -733,7 +900,7 @@ class PageKnowledgeService:
 
         # ── 3. 合并 buttons（字符串集合取并集）───────────────────────
         old_btn_set = set(str(b) for b in merged.buttons)
-        for btn in new.buttons:
+        for btn in (new.buttons if changed is None or changed.buttons else []):
             btn_str = str(btn)
             if btn_str not in old_btn_set:
                 merged.buttons.append(btn_str)
@@ -741,7 +908,7 @@ class PageKnowledgeService:
 
         # ── 4. 合并 page_sections（取并集）────────────────────────────
         old_sec_set = set(merged.page_sections)
-        for sec in new.page_sections:
+        for sec in (new.page_sections if changed is None or changed.sections else []):
             if sec not in old_sec_set:
                 merged.page_sections.append(sec)
                 old_sec_set.add(sec)
@@ -829,6 +996,25 @@ class PageKnowledgeService:
         except ValueError:
             return False
 
+    @staticmethod
+    def _build_payload(knowledge: PageKnowledge, embedding_text: str, project_id: Optional[int]) -> Dict:
+        """向量库 payload（Qdrant 与本地索引共用）"""
+        return {
+            "url": knowledge.url,
+            "domain": knowledge.domain,
+            "page_type": knowledge.page_type,
+            "module_name": knowledge.module_name,
+            "hash_signature": knowledge.hash_signature,
+            "version": knowledge.version,
+            "last_updated": knowledge.last_updated,
+            "last_accessed": knowledge.last_accessed,
+            "summary": knowledge.summary,
+            "embedding_text": embedding_text,
+            "knowledge": knowledge.to_dict(),  # 完整结构
+            "component_hashes": knowledge.compute_component_hashes(),  # 组件级子签名（增量 diff）
+            "project_id": project_id,
+        }
+
     @staticmethod
     def _save_to_mysql(
         db: Session,
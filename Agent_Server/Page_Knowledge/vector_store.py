@@ -1,12 +1,28 @@
 ﻿"""
 Qdrant vector store wrapper for Page Knowledge Base.
+
+所有操作基于 AsyncQdrantClient（QDRANT_PREFER_GRPC=true 时走 gRPC），直接在事件循环中 await，
+不再经 asyncio.to_thread 绕一圈线程池；读路径无锁，只有 Collection 初始化/重建互斥。
+批量接口 upsert_many / retrieve_many / search_batch 单次往返处理多条数据。
+scroll_page / iter_points 按游标分页遍历整个 Collection，不一次性加载到内存。
+domain / page_type / project_id 建有 payload 索引（创建 Collection 及已有 Collection 升级时补建），
+过滤检索在 Qdrant 服务端走索引，不再扫描全部 payload。
+
+LOCAL_VECTOR_INDEX_MODE=mirror 时写入同步到本地向量索引，Qdrant 降级期间读请求由本地索引提供；
+=primary 时不连接 Qdrant，全部读写走本地索引（见 local_index.py）。
+
+collection_name 可以是别名（重建索引完成后指向影子 Collection，见 reindex.py）。
+已有点的 Collection 维度不符时不再自动删除重建，需通过重建索引任务迁移。
+重建任务切换别名期间写入先等待（写屏障）；等待期间配置已切换的 upsert 用新 Embedding 模型重新生成向量。
 """
+import asyncio
+import functools
+import json
 import os
 import logging
 import time
 import uuid
-import threading
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, AsyncIterator, Sequence, Tuple
 
 # 跳过系统代理对 localhost 的拦截（防止系统全局代理导致 qdrant-client 请求返回 503）
 _no_proxy = os.environ.get("NO_PROXY", "")
@@ -19,8 +35,87 @@ logger = logging.getLogger(__name__)
 
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() in ("1", "true", "yes")
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "page_knowledge")
 QDRANT_RETRY_SECONDS = int(os.getenv("QDRANT_RETRY_SECONDS", "30"))
+QDRANT_UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256"))
+QDRANT_SCROLL_PAGE_SIZE = int(os.getenv("QDRANT_SCROLL_PAGE_SIZE", "256"))
+QDRANT_SEARCH_HNSW_EF = int(os.getenv("QDRANT_SEARCH_HNSW_EF", "0"))  # 0 = 使用 Collection 默认 ef
+
+# 常用过滤字段的 payload 索引类型
+PAYLOAD_INDEXES = {
+    "domain": "keyword",
+    "page_type": "keyword",
+    "project_id": "integer",
+}
+_FILTER_CLAUSES = ("must", "should", "must_not")
+
+# 本地索引分页游标前缀（Qdrant 游标是点 ID）
+_LOCAL_CURSOR_PREFIX = "local:"
+
+# (point_id, vector, payload)
+Point = Tuple[str, List[float], Dict[str, Any]]
+
+
+def split_filter(filter_conditions: Optional[Dict]) -> Tuple[Dict, Dict, Dict]:
+    """
+    拆分过滤条件为 (must, should, must_not)
+
+    支持两种写法：
+      {"domain": "a.com", "project_id": 3}                              全部为 must
+      {"must": {...}, "should": {"page_type": "list", ...}, "must_not": {...}}
+          should 中至少满足一个；must_not 中任一满足即排除
+    字段值为 list / tuple / set 时表示匹配其中任一值
+    """
+    if not filter_conditions:
+        return {}, {}, {}
+    if any(k in _FILTER_CLAUSES for k in filter_conditions):
+        return (
+            dict(filter_conditions.get("must") or {}),
+            dict(filter_conditions.get("should") or {}),
+            dict(filter_conditions.get("must_not") or {}),
+        )
+    return dict(filter_conditions), {}, {}
+
+
+def _build_filter(filter_conditions: Optional[Dict]):
+    must, should, must_not = split_filter(filter_conditions)
+    if not (must or should or must_not):
+        return None
+    from qdrant_client.models import Filter, FieldCondition, MatchAny, MatchValue
+
+    def _conditions(fields: Dict):
+        conditions = []
+        for key, value in fields.items():
+            if isinstance(value, (list, tuple, set)):
+                conditions.append(FieldCondition(key=key, match=MatchAny(any=list(value))))
+            else:
+                conditions.append(FieldCondition(key=key, match=MatchValue(value=value)))
+        return conditions or None
+
+    return Filter(must=_conditions(must), should=_conditions(should), must_not=_conditions(must_not))
+
+
+def _search_params(hnsw_ef: Optional[int]):
+    ef = QDRANT_SEARCH_HNSW_EF if hnsw_ef is None else hnsw_ef
+    if not ef:
+        return None
+    from qdrant_client.models import SearchParams
+    return SearchParams(hnsw_ef=ef)
+
+
+def _write_barrier(method):
+    """写方法装饰器：重建索引任务切换别名期间先等待切换完成，并计入在途写入（见 reindex.py）"""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        counted = await self._begin_write()
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            if counted:
+                self._end_write()
+    return wrapper
 
 
 class VectorStore:
@@ -39,11 +134,20 @@ class VectorStore:
         self.vector_size = vector_size
         self._distance = distance  # Cosine / Dot / Euclid / Manhattan
         self._client = None
+        self._client_loop = None
         self._initialized = False
+        self._existing_dim: Optional[int] = None  # 已有 Collection 的实际维度（有数据且与配置不符时拒绝写入）
         self._retry_seconds = max(QDRANT_RETRY_SECONDS, 1)
         self._unavailable_until = 0.0
         self._last_error = ""
-        self._lock = threading.RLock()
+        # 配置代数：每次热更新 +1，用于识别按旧配置生成的向量
+        self._config_generation = 0
+        # 仅保护 Collection 初始化/重建；读写请求本身不加锁
+        self._init_lock = asyncio.Lock()
+
+    @property
+    def config_generation(self) -> int:
+        return self._config_generation
 
     def reload_config(self, config: dict) -> None:
         """热更新 Qdrant 连接与 Collection 配置，重置内部状态"""
@@ -53,20 +157,87 @@ class VectorStore:
         self.vector_size = int(config.get("vector_size", self.vector_size))
         self._distance = config.get("distance", self._distance)
         # 关闭旧连接，下次使用时重新建立
-        self._client = None
+        self._discard_client()
         self._initialized = False
+        self._existing_dim = None
         self._unavailable_until = 0.0
         self._last_error = ""
+        self._config_generation += 1
         logger.info(f"[VectorStore] 配置已热更新: {self.host}:{self.port}/{self.collection_name} dim={self.vector_size} distance={self._distance}")
 
+    # ── 本地索引 ──────────────────────────────────────────────
+
+    def _local_index(self):
+        """本地向量索引（未启用时为 None）"""
+        from Page_Knowledge.local_index import get_local_index
+        return get_local_index(self.collection_name, self._distance)
+
+    def _local_primary(self):
+        """primary 模式下返回本地索引，此时不访问 Qdrant"""
+        from Page_Knowledge.local_index import LOCAL_VECTOR_INDEX_MODE
+        return self._local_index() if LOCAL_VECTOR_INDEX_MODE == "primary" else None
+
+    def _local_fallback(self, op: str):
+        """Qdrant 不可用时的只读后备索引（未启用或为空时为 None）"""
+        index = self._local_index()
+        if index is None or len(index) == 0:
+            return None
+        index.record_fallback()
+        logger.debug(f"[VectorStore] {op} served by local index ({len(index)} points)")
+        return index
+
+    async def _mirror_upsert(self, points: Sequence[Point]) -> None:
+        index = self._local_index()
+        if index is None:
+            return
+        try:
+            # 可能触发落盘，放到线程池
+            await asyncio.to_thread(index.upsert_many, points)
+        except Exception as e:
+            logger.warning(f"[VectorStore] 本地索引写入失败（忽略）: {e}")
+
+    def _note_writes(self, point_ids: Sequence[str], kind: str) -> None:
+        """通知进行中的重建索引任务：这些点在复制开始后被改写（kind: upsert / payload / delete）"""
+        from Page_Knowledge.reindex import note_writes
+        note_writes(self.collection_name, point_ids, kind)
+
+    async def _begin_write(self) -> bool:
+        """写入前经过重建索引的写屏障；返回 True 表示已计入在途写入，结束时需调用 _end_write()"""
+        from Page_Knowledge.reindex import begin_write
+        return await begin_write(self.collection_name)
+
+    def _end_write(self) -> None:
+        from Page_Knowledge.reindex import end_write
+        end_write()
+
+    async def _reembed(self, points: Sequence[Point]) -> List[Point]:
+        """用当前 Embedding 模型按 payload 中的 embedding_text 重新生成向量（没有文本的点跳过）"""
+        from Page_Knowledge.embedding import get_embedding_client
+        points = [p for p in points if p[2].get("embedding_text")]
+        if not points:
+            return []
+        vectors = await get_embedding_client().embed_batch([payload["embedding_text"] for _, _, payload in points])
+        return [(pid, vec, payload) for (pid, _, payload), vec in zip(points, vectors) if any(vec)]
+
+    # ── 连接与降级 ──────────────────────────────────────────────
+
     def _is_temporarily_unavailable(self) -> bool:
         return time.time() < self._unavailable_until
 
+    def _discard_client(self) -> None:
+        client, self._client, self._client_loop = self._client, None, None
+        if client is None:
+            return
+        try:
+            asyncio.get_running_loop().create_task(client.close())
+        except RuntimeError:
+            pass  # 没有运行中的事件循环，交给 GC 回收
+
     def _mark_unavailable(self, reason: str, op: str = "") -> None:
         # 已在降级窗口内且错误相同，不重复刷 warning
         if self._is_temporarily_unavailable() and reason == self._last_error:
             return
-        self._client = None
+        self._discard_client()
         self._initialized = False
         self._last_error = reason
         self._unavailable_until = time.time() + self._retry_seconds
@@ -85,15 +256,23 @@ class VectorStore:
             raise RuntimeError(
                 f"Qdrant temporarily unavailable, retry in {wait}s: {self._last_error or 'unknown'}"
             )
+        # 异步客户端的连接绑定事件循环，换循环时重新创建
+        loop = asyncio.get_running_loop()
+        if self._client is not None and self._client_loop is not loop:
+            self._discard_client()
         if self._client is None:
             try:
-                from qdrant_client import QdrantClient
-                self._client = QdrantClient(
-                    host=self.host, port=self.port, timeout=3,
+                from qdrant_client import AsyncQdrantClient
+                self._client = AsyncQdrantClient(
+                    host=self.host, port=self.port, grpc_port=QDRANT_GRPC_PORT,
+                    prefer_grpc=QDRANT_PREFER_GRPC, timeout=3,
                     check_compatibility=False,
-                    prefer_grpc=False,
                 )
-                logger.info(f"[VectorStore] Connected to Qdrant @ {self.host}:{self.port}")
+                self._client_loop = loop
+                logger.info(
+                    f"[VectorStore] Connected to Qdrant @ {self.host}:"
+                    f"{QDRANT_GRPC_PORT if QDRANT_PREFER_GRPC else self.port} ({'grpc' if QDRANT_PREFER_GRPC else 'http'})"
+                )
                 self._mark_available()
             except ImportError:
                 self._mark_unavailable(
@@ -106,16 +285,25 @@ class VectorStore:
                 raise
         return self._client
 
-    def ensure_collection(self, recreate_on_mismatch: bool = False):
+    async def close(self) -> None:
+        """关闭 Qdrant 连接（应用关闭时调用）"""
+        client, self._client, self._client_loop = self._client, None, None
+        self._initialized = False
+        if client is not None:
+            await client.close()
+
+    async def ensure_collection(self, recreate_on_mismatch: bool = False):
         if self._is_temporarily_unavailable():
             return False
-        with self._lock:
+        if self._initialized:
+            return True
+        async with self._init_lock:
             if self._initialized:
                 return True
             try:
                 from qdrant_client.models import Distance, VectorParams
                 client = self._get_client()
-                collections = [c.name for c in client.get_collections().collections]
+                collections = await self._collection_names(client)
                 dist_map = {
                     "cosine": Distance.COSINE,
                     "dot": Distance.DOT,
@@ -126,7 +314,7 @@ class VectorStore:
 
                 if self.collection_name not in collections:
                     try:
-                        client.create_collection(
+                        await client.create_collection(
                             collection_name=self.collection_name,
                             vectors_config=VectorParams(size=self.vector_size, distance=dist_obj),
                         )
@@ -135,21 +323,25 @@ class VectorStore:
                         # 并发初始化时，另一请求可能已创建成功（409）
                         if "already exists" not in str(create_err):
                             raise
+                    self._existing_dim = self.vector_size
+                    await self._ensure_payload_indexes(client)
                 else:
                     # 检查已有 Collection 的向量维度
                     try:
-                        coll_info = client.get_collection(self.collection_name)
+                        coll_info = await client.get_collection(self.collection_name)
                         vectors_cfg = coll_info.config.params.vectors
                         existing_dim = vectors_cfg.size if hasattr(vectors_cfg, "size") else None
+                        self._existing_dim = existing_dim
                         if existing_dim and existing_dim != self.vector_size:
-                            if recreate_on_mismatch:
+                            # 只重建空 Collection；已有数据时重建会丢掉全部点，改走重建索引任务
+                            if recreate_on_mismatch and not coll_info.points_count:
                                 logger.warning(
                                     f"[VectorStore] Collection dim mismatch (existing={existing_dim}, "
                                     f"configured={self.vector_size}). Recreating collection."
                                 )
-                                client.delete_collection(self.collection_name)
+                                await client.delete_collection(self.collection_name)
                                 try:
-                                    client.create_collection(
+                                    await client.create_collection(
                                         collection_name=self.collection_name,
                                         vectors_config=VectorParams(size=self.vector_size, distance=dist_obj),
                                     )
@@ -159,6 +351,14 @@ class VectorStore:
                                 logger.info(
                                     f"[VectorStore] Recreated collection: {self.collection_name} (dim={self.vector_size})"
                                 )
+                                self._existing_dim = self.vector_size
+                                coll_info = None
+                            elif recreate_on_mismatch:
+                                logger.error(
+                                    f"[VectorStore] Collection dim mismatch (existing={existing_dim}, "
+                                    f"configured={self.vector_size}) and it holds {coll_info.points_count} points; "
+                                    f"not recreating. Run POST /api/knowledge/reindex to migrate."
+                                )
                             else:
                                 logger.warning(
                                     f"[VectorStore] Collection dim mismatch (existing={existing_dim}, "
@@ -166,6 +366,8 @@ class VectorStore:
                                 )
                         else:
                             logger.info(f"[VectorStore] Collection already exists: {self.collection_name}")
+                        # 旧版本创建的 Collection 没有 payload 索引，在此补建
+                        await self._ensure_payload_indexes(client, coll_info.payload_schema if coll_info else None)
                     except Exception as dim_err:
                         logger.warning(f"[VectorStore] 维度检查失败（忽略）: {dim_err}")
                 self._initialized = True
@@ -175,170 +377,535 @@ class VectorStore:
                 self._mark_unavailable(str(e), "ensure_collection")
                 return False
 
-    def upsert(self, point_id: str, vector: List[float], payload: Dict[str, Any]) -> bool:
+    async def _ensure_payload_indexes(self, client, existing_schema: Optional[Dict] = None) -> None:
+        """为 PAYLOAD_INDEXES 中尚未建索引的字段创建 payload 索引（失败只记录警告）"""
+        from qdrant_client.models import PayloadSchemaType
+        existing = set(existing_schema or {})
+        for field, schema in PAYLOAD_INDEXES.items():
+            if field in existing:
+                continue
+            try:
+                await client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field,
+                    field_schema=PayloadSchemaType(schema),
+                    wait=True,
+                )
+                logger.info(f"[VectorStore] Created payload index: {self.collection_name}.{field} ({schema})")
+            except Exception as e:
+                logger.warning(f"[VectorStore] payload 索引创建失败（忽略）: {field}: {e}")
+
+    @staticmethod
+    async def _collection_names(client) -> List[str]:
+        """物理 Collection 名 + 别名"""
+        names = [c.name for c in (await client.get_collections()).collections]
         try:
-            from qdrant_client.models import PointStruct
-            with self._lock:
-                # 空向量仅更新 payload，避免误触发向量维度重建
-                if len(vector) == 0:
-                    if not self.ensure_collection(recreate_on_mismatch=False):
-                        return False
-                    client = self._get_client()
-                    client.set_payload(
-                        collection_name=self.collection_name,
+            names += [a.alias_name for a in (await client.get_aliases()).aliases]
+        except Exception as e:
+            logger.debug(f"[VectorStore] 读取别名失败（忽略）: {e}")
+        return names
+
+    async def resolve_alias(self) -> Optional[str]:
+        """collection_name 是别名时返回它指向的物理 Collection，否则返回 None"""
+        client = self._get_client()
+        for alias in (await client.get_aliases()).aliases:
+            if alias.alias_name == self.collection_name:
+                return alias.collection_name
+        return None
+
+    async def swap_alias(self, target_collection: str, allow_shortfall: int = 0) -> Optional[str]:
+        """
+        把 collection_name 切换为指向 target_collection 的别名，返回原先指向的物理 Collection
+
+        已经是别名时删除旧别名与创建新别名在同一请求内完成（原子切换）；
+        collection_name 还是物理 Collection 时只能先删除它再创建同名别名（首次迁移），返回 None。
+        首次迁移删除前先比对点数：target_collection 比原 Collection 少于 allow_shortfall 以上时拒绝切换，
+        原 Collection 保持不动。
+        """
+        from qdrant_client.models import (
+            CreateAlias,
+            CreateAliasOperation,
+            DeleteAlias,
+            DeleteAliasOperation,
+        )
+        client = self._get_client()
+        previous = await self.resolve_alias()
+        operations = [CreateAliasOperation(create_alias=CreateAlias(
+            collection_name=target_collection, alias_name=self.collection_name,
+        ))]
+        if previous is not None:
+            operations.insert(0, DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=self.collection_name)))
+        elif self.collection_name in [c.name for c in (await client.get_collections()).collections]:
+            existing = (await client.count(self.collection_name, exact=True)).count
+            copied = (await client.count(target_collection, exact=True)).count
+            if copied + allow_shortfall < existing:
+                raise RuntimeError(
+                    f"{target_collection} 只有 {copied} 个点，原 Collection {self.collection_name} 有 {existing} 个"
+                    f"（允许缺少 {allow_shortfall} 个），拒绝删除原 Collection"
+                )
+            await client.delete_collection(self.collection_name)
+            logger.warning(f"[VectorStore] 已删除物理 Collection {self.collection_name}，改为别名")
+        await client.update_collection_aliases(change_aliases_operations=operations)
+        self._initialized = False
+        self._existing_dim = None
+        logger.info(
+            f"[VectorStore] Alias {self.collection_name} -> {target_collection} (previous: {previous or 'collection'})"
+        )
+        return previous
+
+    async def drop_collection(self) -> bool:
+        """删除当前 Collection（强制重建前调用；collection_name 是别名时删除其指向的物理 Collection）"""
+        client = self._get_client()
+        self._initialized = False
+        self._existing_dim = None
+        target = await self.resolve_alias() or self.collection_name
+        if target not in [c.name for c in (await client.get_collections()).collections]:
+            return False
+        await client.delete_collection(target)
+        return True
+
+    # ── 写入 ──────────────────────────────────────────────
+
+    async def upsert(
+        self,
+        point_id: str,
+        vector: List[float],
+        payload: Dict[str, Any],
+        generation: Optional[int] = None,
+    ) -> bool:
+        # 空向量仅更新 payload，避免误触发向量维度重建
+        if len(vector) == 0:
+            return await self.set_payload(point_id, payload)
+        return await self.upsert_many([(point_id, vector, payload)], generation=generation)
+
+    @_write_barrier
+    async def set_payload(self, point_id: str, payload: Dict[str, Any]) -> bool:
+        local = self._local_primary()
+        if local is not None:
+            await asyncio.to_thread(local.upsert, point_id, [], payload)
+            return True
+        try:
+            if not await self.ensure_collection(recreate_on_mismatch=False):
+                return False
+            client = self._get_client()
+            await client.set_payload(
+                collection_name=self.collection_name,
+                payload=payload,
+                points=[point_id],
+            )
+            await self._mirror_upsert([(point_id, [], payload)])
+            self._note_writes([point_id], "payload")
+            return True
+        except Exception as e:
+            self._mark_unavailable(str(e), "set_payload")
+            return False
+
+    @_write_barrier
+    async def set_payload_batch(
+        self,
+        updates: Dict[str, Dict[str, Any]],
+        nested_keys: Sequence[str] = (),
+    ) -> bool:
+        """
+        批量更新部分 payload 字段（不影响其它字段），整批一次请求
+
+        内容相同的更新合并为一个操作；按 ID 过滤选择点，已删除的点直接跳过而不是让整批失败。
+        nested_keys 中的每个对象字段（如 "knowledge"）内也写入同样的字段，与顶层更新在同一请求内完成。
+        """
+        if not updates:
+            return True
+        local = self._local_primary()
+        if local is not None:
+            await asyncio.to_thread(local.upsert_many, self._local_payload_points(local, updates, nested_keys))
+            return True
+        try:
+            from qdrant_client.models import Filter, HasIdCondition, SetPayload, SetPayloadOperation
+            if not await self.ensure_collection(recreate_on_mismatch=False):
+                return False
+            groups: Dict[str, Tuple[Dict[str, Any], List[str]]] = {}
+            for pid, payload in updates.items():
+                key = json.dumps(payload, sort_keys=True, default=str)
+                groups.setdefault(key, (payload, []))[1].append(pid)
+            client = self._get_client()
+            await client.batch_update_points(
+                collection_name=self.collection_name,
+                update_operations=[
+                    SetPayloadOperation(set_payload=SetPayload(
                         payload=payload,
-                        points=[point_id],
-                    )
-                    return True
-
-                # 若 embedding 实际维度与配置不符，更新 vector_size 并在写入路径重建
-                if len(vector) != self.vector_size:
-                    logger.warning(
-                        f"[VectorStore] Vector dim mismatch: configured={self.vector_size}, "
-                        f"actual={len(vector)}. Updating dim and recreating collection."
-                    )
-                    self.vector_size = len(vector)
-                    self._initialized = False
-
-                if not self.ensure_collection(recreate_on_mismatch=True):
-                    return False
-                client = self._get_client()
-                client.upsert(
+                        filter=Filter(must=[HasIdCondition(has_id=ids)]),
+                        key=key,
+                    ))
+                    for payload, ids in groups.values()
+                    for key in (None, *nested_keys)
+                ],
+            )
+            index = self._local_index()
+            if index is not None:
+                await self._mirror_upsert(self._local_payload_points(index, updates, nested_keys))
+            self._note_writes(list(updates), "payload")
+            return True
+        except Exception as e:
+            self._mark_unavailable(str(e), "set_payload")
+            return False
+
+    @staticmethod
+    def _local_payload_points(index, updates: Dict[str, Dict[str, Any]], nested_keys: Sequence[str]) -> List[Point]:
+        """本地索引的 payload 合并只到顶层，嵌套字段需先取出原对象再合并"""
+        points = []
+        for pid, payload in updates.items():
+            merged = dict(payload)
+            if nested_keys:
+                record = index.get(pid)
+                existing = record["payload"] if record else {}
+                for key in nested_keys:
+                    if isinstance(existing.get(key), dict):
+                        merged[key] = {**existing[key], **payload}
+            points.append((pid, [], merged))
+        return points
+
+    @_write_barrier
+    async def upsert_many(
+        self,
+        points: Sequence[Point],
+        batch_size: int = QDRANT_UPSERT_BATCH_SIZE,
+        generation: Optional[int] = None,
+    ) -> bool:
+        """
+        批量写入 (point_id, vector, payload)，按 batch_size 分批请求
+
+        generation 为生成向量时的 config_generation；与当前不一致（期间完成了重建索引切换或配置热更新）时，
+        向量按当前模型重新生成后再写入。
+        """
+        points = [p for p in points if p[1]]
+        if points and generation is not None and generation != self._config_generation:
+            logger.info(f"[VectorStore] 向量生成后配置已变更，按当前模型重新生成 {len(points)} 条")
+            fresh = await self._reembed(points)
+            if len(fresh) < len(points):
+                self._last_error = f"re-embedding after config change failed for {len(points) - len(fresh)} points"
+                logger.warning(f"[VectorStore] upsert rejected: {self._last_error}")
+                return False
+            points = fresh
+        if not points:
+            return True
+        local = self._local_primary()
+        if local is not None:
+            await asyncio.to_thread(local.upsert_many, points)
+            return True
+        try:
+            from qdrant_client.models import PointStruct
+            # 若 embedding 实际维度与配置不符，更新 vector_size 并在写入路径重建
+            actual_dim = len(points[0][1])
+            if actual_dim != self.vector_size:
+                logger.warning(
+                    f"[VectorStore] Vector dim mismatch: configured={self.vector_size}, "
+                    f"actual={actual_dim}. Updating dim and recreating collection."
+                )
+                self.vector_size = actual_dim
+                self._initialized = False
+
+            if not await self.ensure_collection(recreate_on_mismatch=True):
+                return False
+            if self._existing_dim and self._existing_dim != actual_dim:
+                self._last_error = (
+                    f"collection {self.collection_name} has dim {self._existing_dim}, vectors have {actual_dim}; "
+                    f"run POST /api/knowledge/reindex"
+                )
+                logger.warning(f"[VectorStore] upsert rejected: {self._last_error}")
+                return False
+            client = self._get_client()
+            for start in range(0, len(points), max(1, batch_size)):
+                chunk = points[start:start + batch_size]
+                await client.upsert(
                     collection_name=self.collection_name,
-                    points=[PointStruct(id=point_id, vector=vector, payload=payload)],
+                    points=[PointStruct(id=pid, vector=vec, payload=payload) for pid, vec, payload in chunk],
                 )
-                return True
+            await self._mirror_upsert(points)
+            self._note_writes([pid for pid, _, _ in points], "upsert")
+            return True
         except Exception as e:
             self._mark_unavailable(str(e), "upsert")
             return False
 
-    def search(
+    @_write_barrier
+    async def delete(self, point_id: str) -> bool:
+        local = self._local_primary()
+        if local is not None:
+            await asyncio.to_thread(local.delete, point_id)
+            return True
+        try:
+            from qdrant_client.models import PointIdsList
+            if not await self.ensure_collection():
+                return False
+            client = self._get_client()
+            await client.delete(
+                collection_name=self.collection_name,
+                points_selector=PointIdsList(points=[point_id]),
+            )
+            index = self._local_index()
+            if index is not None:
+                await asyncio.to_thread(index.delete, point_id)
+            self._note_writes([point_id], "delete")
+            return True
+        except Exception as e:
+            self._mark_unavailable(str(e), "delete")
+            return False
+
+    # ── 读取 ──────────────────────────────────────────────
+
+    async def search(
         self,
         query_vector: List[float],
         limit: int = 5,
         score_threshold: float = 0.0,
         filter_conditions: Optional[Dict] = None,
+        hnsw_ef: Optional[int] = None,
     ) -> List[Dict]:
+        results = await self.search_batch([query_vector], limit, score_threshold, filter_conditions, hnsw_ef)
+        return results[0]
+
+    async def search_batch(
+        self,
+        query_vectors: Sequence[List[float]],
+        limit: int = 5,
+        score_threshold: float = 0.0,
+        filter_conditions: Optional[Dict] = None,
+        hnsw_ef: Optional[int] = None,
+    ) -> List[List[Dict]]:
+        """
+        多个查询向量一次往返检索，按输入顺序返回各自的结果列表
+
+        filter_conditions 写法见 split_filter；hnsw_ef 覆盖本次查询的 HNSW ef
+        （越大召回越高、越慢；默认取 QDRANT_SEARCH_HNSW_EF，本地索引为精确检索，忽略该参数）
+        """
+        if not query_vectors:
+            return []
+        local = self._local_primary()
+        if local is not None:
+            return [local.search(q, limit, score_threshold, filter_conditions) for q in query_vectors]
         try:
-            from qdrant_client.models import Filter, FieldCondition, MatchValue
-            if not self.ensure_collection():
-                return []
+            if not await self.ensure_collection():
+                return self._local_search_batch(query_vectors, limit, score_threshold, filter_conditions)
             client = self._get_client()
-            qdrant_filter = None
-            if filter_conditions:
-                must = [FieldCondition(key=k, match=MatchValue(value=v)) for k, v in filter_conditions.items()]
-                qdrant_filter = Filter(must=must)
-            # qdrant-client >= 1.10 removed client.search(); use query_points() instead
+            qdrant_filter = _build_filter(filter_conditions)
+            params = _search_params(hnsw_ef)
+            # qdrant-client >= 1.10 removed search_batch(); use query_batch_points() instead
             try:
-                response = client.query_points(
+                from qdrant_client.models import QueryRequest
+                responses = await client.query_batch_points(
                     collection_name=self.collection_name,
-                    query=query_vector,
-                    limit=limit,
-                    score_threshold=score_threshold,
-                    query_filter=qdrant_filter,
+                    requests=[
+                        QueryRequest(query=q, limit=limit, score_threshold=score_threshold,
+                                     filter=qdrant_filter, params=params, with_payload=True)
+                        for q in query_vectors
+                    ],
                 )
-                results = response.points
-            except AttributeError:
+                batches = [r.points for r in responses]
+            except (ImportError, AttributeError):
                 # Fallback for older qdrant-client versions
-                results = client.search(  # type: ignore[attr-defined]
+                from qdrant_client.models import SearchRequest
+                batches = await client.search_batch(  # type: ignore[attr-defined]
                     collection_name=self.collection_name,
-                    query_vector=query_vector,
-                    limit=limit,
-                    score_threshold=score_threshold,
-                    query_filter=qdrant_filter,
+                    requests=[
+                        SearchRequest(vector=q, limit=limit, score_threshold=score_threshold,
+                                      filter=qdrant_filter, params=params, with_payload=True)
+                        for q in query_vectors
+                    ],
                 )
-            return [{"id": str(r.id), "score": r.score, "payload": r.payload or {}} for r in results]
+            return [
+                [{"id": str(r.id), "score": r.score, "payload": r.payload or {}} for r in results]
+                for results in batches
+            ]
         except Exception as e:
             self._mark_unavailable(str(e), "search")
-            return []
+            return self._local_search_batch(query_vectors, limit, score_threshold, filter_conditions)
 
-    def get_by_id(self, point_id: str) -> Optional[Dict]:
+    def _local_search_batch(self, query_vectors, limit, score_threshold, filter_conditions) -> List[List[Dict]]:
+        index = self._local_fallback("search")
+        if index is None:
+            return [[] for _ in query_vectors]
+        return [index.search(q, limit, score_threshold, filter_conditions) for q in query_vectors]
+
+    async def get_by_id(self, point_id: str) -> Optional[Dict]:
+        return (await self.retrieve_many([point_id])).get(point_id)
+
+    async def retrieve_many(self, point_ids: Sequence[str]) -> Dict[str, Dict]:
+        """按 ID 批量读取 payload，返回 {point_id: {"id", "payload"}}（不存在的 ID 不出现在结果中）"""
+        point_ids = [pid for pid in dict.fromkeys(point_ids) if pid]
+        if not point_ids:
+            return {}
+        local = self._local_primary()
+        if local is not None:
+            return self._local_retrieve(local, point_ids)
         try:
-            if not self.ensure_collection():
-                return None
+            if not await self.ensure_collection():
+                return self._local_retrieve(self._local_fallback("retrieve"), point_ids)
             client = self._get_client()
-            results = client.retrieve(
+            results = await client.retrieve(
                 collection_name=self.collection_name,
-                ids=[point_id],
+                ids=point_ids,
                 with_payload=True,
                 with_vectors=False,
             )
-            if results:
-                r = results[0]
-                return {"id": str(r.id), "payload": r.payload or {}}
-            return None
+            return {str(r.id): {"id": str(r.id), "payload": r.payload or {}} for r in results}
         except Exception as e:
-            self._mark_unavailable(str(e), "get_by_id")
-            return None
+            self._mark_unavailable(str(e), "retrieve")
+            return self._local_retrieve(self._local_fallback("retrieve"), point_ids)
 
-    def delete(self, point_id: str) -> bool:
-        try:
-            from qdrant_client.models import PointIdsList
-            if not self.ensure_collection():
-                return False
-            client = self._get_client()
-            client.delete(
-                collection_name=self.collection_name,
-                points_selector=PointIdsList(points=[point_id]),
-            )
-            return True
-        except Exception as e:
-            self._mark_unavailable(str(e), "delete")
-            return False
+    @staticmethod
+    def _local_retrieve(index, point_ids: Sequence[str]) -> Dict[str, Dict]:
+        if index is None:
+            return {}
+        found = {}
+        for pid in point_ids:
+            record = index.get(pid)
+            if record is not None:
+                found[pid] = record
+        return found
+
+    async def scroll_page(
+        self,
+        filter_conditions: Optional[Dict] = None,
+        limit: int = QDRANT_SCROLL_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        payload_fields: Optional[List[str]] = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        读取一页点，返回 (items, next_cursor)；next_cursor 为 None 表示已遍历完
 
-    def scroll_all(self, filter_conditions: Optional[Dict] = None, limit: int = 100) -> List[Dict]:
+        payload_fields 指定时只返回这些 payload 字段（列表页不需要完整的 knowledge 结构）。
+        """
+        local = self._local_primary()
+        if local is not None or (cursor or "").startswith(_LOCAL_CURSOR_PREFIX):
+            return self._local_scroll_page(local or self._local_index(), filter_conditions, limit, cursor, payload_fields)
         try:
-            from qdrant_client.models import Filter, FieldCondition, MatchValue
-            if not self.ensure_collection():
-                return []
+            if not await self.ensure_collection():
+                return self._local_scroll_page(
+                    self._local_fallback("scroll"), filter_conditions, limit, cursor, payload_fields
+                )
             client = self._get_client()
-            qdrant_filter = None
-            if filter_conditions:
-                must = [FieldCondition(key=k, match=MatchValue(value=v)) for k, v in filter_conditions.items()]
-                qdrant_filter = Filter(must=must)
-            results, _next = client.scroll(
+            results, next_offset = await client.scroll(
                 collection_name=self.collection_name,
                 limit=limit,
-                scroll_filter=qdrant_filter,
-                with_payload=True,
+                offset=cursor,
+                scroll_filter=_build_filter(filter_conditions),
+                with_payload=payload_fields or True,
                 with_vectors=False,
             )
-            return [{"id": str(r.id), "payload": r.payload or {}} for r in results]
+            items = [{"id": str(r.id), "payload": r.payload or {}} for r in results]
+            return items, (str(next_offset) if next_offset is not None else None)
         except Exception as e:
-            self._mark_unavailable(str(e), "scroll_all")
-            return []
+            self._mark_unavailable(str(e), "scroll")
+            return self._local_scroll_page(
+                self._local_fallback("scroll"), filter_conditions, limit, cursor, payload_fields
+            )
+
+    @staticmethod
+    def _local_scroll_page(index, filter_conditions, limit, cursor, payload_fields) -> Tuple[List[Dict], Optional[str]]:
+        if cursor and not cursor.startswith(_LOCAL_CURSOR_PREFIX):
+            # Qdrant 游标无法在本地索引上续读，报错而不是静默返回不完整的结果
+            raise RuntimeError("Qdrant 不可用，无法继续该分页游标，请稍后从头重新遍历")
+        if index is None:
+            return [], None
+        offset = int(cursor[len(_LOCAL_CURSOR_PREFIX):]) if cursor else 0
+        items, next_offset = index.scroll(filter_conditions, limit, offset, payload_fields)
+        return items, (f"{_LOCAL_CURSOR_PREFIX}{next_offset}" if next_offset is not None else None)
 
-    def count(self) -> int:
+    async def iter_points(
+        self,
+        filter_conditions: Optional[Dict] = None,
+        page_size: int = QDRANT_SCROLL_PAGE_SIZE,
+        payload_fields: Optional[List[str]] = None,
+    ) -> AsyncIterator[Dict]:
+        """逐页遍历整个 Collection（同一时刻只持有一页数据）"""
+        cursor = None
+        while True:
+            items, cursor = await self.scroll_page(filter_conditions, page_size, cursor, payload_fields)
+            for item in items:
+                yield item
+            if cursor is None:
+                break
+
+    async def scroll_all(self, filter_conditions: Optional[Dict] = None, limit: int = 100) -> List[Dict]:
+        """读取至多 limit 个点（跨页读取，不再只返回第一页）"""
+        results = []
+        async for item in self.iter_points(filter_conditions, min(limit, QDRANT_SCROLL_PAGE_SIZE)):
+            results.append(item)
+            if len(results) >= limit:
+                break
+        return results
+
+    async def count(self) -> int:
+        local = self._local_primary()
+        if local is not None:
+            return len(local)
         try:
-            if not self.ensure_collection():
+            if not await self.ensure_collection():
                 return 0
             client = self._get_client()
-            info = client.get_collection(self.collection_name)
+            info = await client.get_collection(self.collection_name)
             return info.points_count or 0
         except Exception as e:
             self._mark_unavailable(str(e), "count")
             return 0
 
-    def health_check(self) -> Dict:
+    async def rebuild_local_index(self, batch_size: int = 256) -> int:
+        """从 Qdrant 全量拉取点（含向量）重建本地索引，返回条数"""
+        index = self._local_index()
+        if index is None:
+            raise RuntimeError("本地向量索引未启用（LOCAL_VECTOR_INDEX_MODE=off 或未安装 numpy）")
+        if not await self.ensure_collection():
+            raise RuntimeError(f"Qdrant 不可用: {self._last_error or 'unknown'}")
+        client = self._get_client()
+        points = []
+        offset = None
+        while True:
+            results, offset = await client.scroll(
+                collection_name=self.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            points.extend((str(r.id), r.vector, r.payload or {}) for r in results)
+            if offset is None:
+                break
+        return await asyncio.to_thread(index.rebuild, points)
+
+    async def health_check(self) -> Dict:
+        local = self._local_index()
+        if local is not None and self._local_primary() is not None:
+            return {
+                "status": "healthy",
+                "host": "local",
+                "target_collection": self.collection_name,
+                "exists": True,
+                "count": len(local),
+                "local_index": local.get_stats(),
+            }
         if self._is_temporarily_unavailable():
             wait = max(1, int(self._unavailable_until - time.time()))
-            return {
+            result = {
                 "status": "degraded",
                 "host": f"{self.host}:{self.port}",
                 "error": self._last_error,
                 "retry_in_seconds": wait,
             }
+            if local is not None:
+                result["local_index"] = local.get_stats()
+                result["fallback"] = "local" if len(local) else "none"
+            return result
         try:
             client = self._get_client()
-            info = client.get_collections()
-            collection_names = [c.name for c in info.collections]
+            collection_names = await self._collection_names(client)
             return {
                 "status": "healthy",
                 "host": f"{self.host}:{self.port}",
+                "transport": "grpc" if QDRANT_PREFER_GRPC else "http",
                 "collections": collection_names,
                 "target_collection": self.collection_name,
                 "exists": self.collection_name in collection_names,
-                "count": self.count() if self.collection_name in collection_names else 0,
+                "count": await self.count() if self.collection_name in collection_names else 0,
+                **({"local_index": local.get_stats()} if local is not None else {}),
             }
         except Exception as e:
             return {
@@ -366,3 +933,9 @@ def apply_config_to_store(config: dict) -> None:
     """将 DB 里的 QdrantCollectionConfig 应用到全局 VectorStore 单例"""
     store = get_vector_store()
     store.reload_config(config)
+
+
+async def close_vector_store() -> None:
+    """应用关闭时调用：关闭 Qdrant 连接"""
+    if _store is not None:
+        await _store.close()
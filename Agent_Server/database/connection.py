@@ -186,6 +186,8 @@ class LLMModel(Base):
     last_failure_reason = Column(String(50), comment='最近失败原因')
     last_used_at = Column(DateTime, comment='最近使用时间')
     auto_switch_enabled = Column(Integer, default=1, comment='是否参与自动切换')
+    rpm_limit = Column(Integer, default=0, comment='每分钟请求数上限（0:不限）')
+    tpm_limit = Column(Integer, default=0, comment='每分钟Token数上限（0:不限）')
     status = Column(String(50), default='待命', comment='模型状态')
     created_at = Column(DateTime, default=datetime.now, comment='创建时间')
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, comment='更新时间')
@@ -202,6 +204,8 @@ class TokenUsageLog(Base):
     prompt_tokens = Column(Integer, default=0, comment='输入Token')
     completion_tokens = Column(Integer, default=0, comment='输出Token')
     total_tokens = Column(Integer, default=0, comment='总Token')
+    cached_tokens = Column(Integer, default=0, comment='命中提示词缓存的输入Token')
+    cache_creation_tokens = Column(Integer, default=0, comment='写入提示词缓存的输入Token')
     source = Column(String(50), comment='来源: chat/browser_use/oneclick/api_test')
     session_id = Column(Integer, comment='关联会话ID')
     success = Column(Integer, default=1, comment='是否成功')
@@ -632,6 +636,8 @@ def _upgrade_existing_tables(inspector):
         ('llm_models', 'last_failure_reason', 'VARCHAR(50) DEFAULT NULL', None),
         ('llm_models', 'last_used_at', 'DATETIME DEFAULT NULL', None),
         ('llm_models', 'auto_switch_enabled', 'INT DEFAULT 1', None),
+        ('llm_models', 'rpm_limit', 'INT DEFAULT 0', None),
+        ('llm_models', 'tpm_limit', 'INT DEFAULT 0', None),
         ('execution_cases', 'security_status', "VARCHAR(20) DEFAULT '待测试'", None),
         ('execution_cases', 'project_id', 'INT DEFAULT 1', 'INDEX'),
         ('test_records', 'project_id', 'INT DEFAULT 1', 'INDEX'),
@@ -652,6 +658,8 @@ def _upgrade_existing_tables(inspector):
         ('project_platform_config', 'api_version', "VARCHAR(20) DEFAULT 'v2'", None),
         ('project_platform_config', 'last_token', 'VARCHAR(500) DEFAULT NULL', None),
         ('project_platform_config', 'token_expire_at', 'DATETIME DEFAULT NULL', None),
+        ('token_usage_logs', 'cached_tokens', 'INT DEFAULT 0', None),
+        ('token_usage_logs', 'cache_creation_tokens', 'INT DEFAULT 0', None),
     ]
 
     with engine.connect() as conn:
@@ -90,6 +90,7 @@ from .config import (
     PROVIDER_DEFAULT_ENDPOINTS,
     MODEL_NAMES,
     REASONING_MODELS,
+    MODEL_CONTEXT_WINDOWS,
     get_provider_display_name,
     get_provider_models,
     get_default_endpoint,
@@ -97,8 +98,14 @@ from .config import (
     is_reasoning_model,
     supports_structured_output,
     get_provider_feature,
+    get_model_context_limits,
+    lookup_model_context_limits,
+    get_model_max_output_tokens,
 )
 
+# 上下文窗口适配
+from .context_window import count_tokens, count_messages_tokens, fit_messages
+
 # 工厂函数
 from .factory import (
     create_llm_provider,
@@ -136,6 +143,51 @@ from .auto_switch import (
     FailoverChatModel,
 )
 
+# 流式 JSON 增量解析
+from .streaming import IncrementalJSONArrayExtractor
+
+# JSON 容错解析
+from .json_parser import parse_llm_json, get_json_parse_stats
+
+# Schema 提示词缓存
+from .schema_prompt import SchemaPromptCache, get_schema_prompt_cache
+
+# HTTP 连接池
+from .http_pool import (
+    LLMHttpClientPool,
+    get_http_pool,
+    close_http_pool,
+)
+
+# 模型配置快照
+from .config_cache import (
+    ModelConfigSnapshot,
+    get_config_snapshot,
+    invalidate_model_config,
+)
+
+# LLM 响应缓存
+from .response_cache import (
+    LLMResponseCache,
+    get_response_cache,
+)
+
+# Token 使用量缓冲
+from .usage_ledger import (
+    TokenUsageLedger,
+    get_usage_ledger,
+    stop_usage_ledger,
+)
+
+# 调用链路追踪
+from .tracing import LLMSpan, LLMTracer, get_llm_tracer, trace_context
+
+# 在途请求合并
+from .singleflight import SingleFlight, get_singleflight
+
+# 批量请求
+from .batch import BatchResult, BatchItemResult, BatchUsage
+
 # LLM 客户端（兼容旧接口）
 from .client import (
     LLMClient,
@@ -168,6 +220,7 @@ __all__ = [
     "PROVIDER_DEFAULT_ENDPOINTS",
     "MODEL_NAMES",
     "REASONING_MODELS",
+    "MODEL_CONTEXT_WINDOWS",
     "get_provider_display_name",
     "get_provider_models",
     "get_default_endpoint",
@@ -175,6 +228,14 @@ __all__ = [
     "is_reasoning_model",
     "supports_structured_output",
     "get_provider_feature",
+    "get_model_context_limits",
+    "lookup_model_context_limits",
+    "get_model_max_output_tokens",
+    
+    # 上下文窗口适配
+    "count_tokens",
+    "count_messages_tokens",
+    "fit_messages",
     
     # 工厂
     "create_llm_provider",
@@ -205,6 +266,51 @@ __all__ = [
     "get_auto_switcher",
     "FailoverChatModel",
     
+    # 流式 JSON 增量解析
+    "IncrementalJSONArrayExtractor",
+
+    # JSON 容错解析
+    "parse_llm_json",
+    "get_json_parse_stats",
+
+    # Schema 提示词缓存
+    "SchemaPromptCache",
+    "get_schema_prompt_cache",
+    
+    # HTTP 连接池
+    "LLMHttpClientPool",
+    "get_http_pool",
+    "close_http_pool",
+    
+    # 模型配置快照
+    "ModelConfigSnapshot",
+    "get_config_snapshot",
+    "invalidate_model_config",
+    
+    # LLM 响应缓存
+    "LLMResponseCache",
+    "get_response_cache",
+    
+    # Token 使用量缓冲
+    "TokenUsageLedger",
+    "get_usage_ledger",
+    "stop_usage_ledger",
+    
+    # 调用链路追踪
+    "LLMSpan",
+    "LLMTracer",
+    "get_llm_tracer",
+    "trace_context",
+    
+    # 在途请求合并
+    "SingleFlight",
+    "get_singleflight",
+    
+    # 批量请求
+    "BatchResult",
+    "BatchItemResult",
+    "BatchUsage",
+    
     # LLM 客户端
     "LLMClient",
     "get_llm_client",
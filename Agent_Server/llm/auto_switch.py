@@ -6,20 +6,42 @@
 - 当遇到限流(429)/认证失败/超时时，自动切换到下一个可用模型
 - 带冷却检测：失败的模型进入冷却期，冷却结束后自动恢复
 - Token 使用量统计和利用率追踪
+- 每个模型 RPM/TPM 令牌桶主动限流，并发请求按 utilization 加权分摊到所有健康模型
+- 滚动 p50/p95 延迟统计：同优先级优先选更快的模型，可选对冲请求压低尾延迟
 
 作者: 程序员Eighteen
 版本: 2.0
 """
+import math
+import os
+import random
+import threading
 import time
 import logging
 import asyncio
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 from dataclasses import dataclass, field
 from enum import Enum
 from datetime import datetime
 
+from .latency import LatencyTracker
+from .rate_limiter import ProfileRateLimiter, estimate_messages_tokens
+from .tracing import add_failover_hop, annotate, get_llm_tracer
+
 logger = logging.getLogger(__name__)
 
+# 加权路由：开启后并发调用按 utilization 和剩余限流额度分摊到所有健康模型，
+# 关闭时所有调用固定走当前激活模型（仍受其 RPM/TPM 限流）
+LLM_LOAD_BALANCE_ENABLED = os.getenv("LLM_LOAD_BALANCE_ENABLED", "true").lower() in ("1", "true", "yes")
+# 限流等待上限（秒），超过后不再等待，直接发出请求交给 429 故障转移处理
+LLM_RATE_LIMIT_MAX_WAIT = float(os.getenv("LLM_RATE_LIMIT_MAX_WAIT", "30"))
+# browser-use 单步输出 Token 预估（用于 TPM 预扣，完成后按实际用量修正）
+FAILOVER_OUTPUT_TOKENS_ESTIMATE = int(os.getenv("FAILOVER_OUTPUT_TOKENS_ESTIMATE", "1000"))
+# 对冲请求：调用超过该模型 p95 仍未返回时，向次优模型发送副本，取先返回的结果
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+
 
 class FailureReason(str, Enum):
     """失败原因分类"""
@@ -41,7 +63,10 @@ class ModelProfile:
     api_key: str
     base_url: str
     priority: int = 1
-    utilization: int = 100  # 利用率百分比
+    utilization: int = 100  # 利用率百分比（加权路由的权重）
+    auto_switch_enabled: bool = True
+    rpm_limit: int = 0  # 每分钟请求数上限，0 表示不限
+    tpm_limit: int = 0  # 每分钟 Token 数上限，0 表示不限
 
     # 运行时状态（不持久化）
     failure_count: int = 0
@@ -52,6 +77,13 @@ class ModelProfile:
     last_success_time: float = 0.0
     total_requests: int = 0
     total_tokens_used: int = 0
+    in_flight: int = 0
+    limiter: ProfileRateLimiter = field(default=None, repr=False)
+    latency: LatencyTracker = field(default_factory=LatencyTracker, repr=False)
+
+    def __post_init__(self):
+        if self.limiter is None:
+            self.limiter = ProfileRateLimiter(self.rpm_limit, self.tpm_limit)
 
     @property
     def is_cooling_down(self) -> bool:
@@ -195,34 +227,49 @@ class ModelAutoSwitcher:
         self._enabled: bool = True
         self._switch_history: List[Dict] = []  # 切换历史记录
         self._lock = asyncio.Lock()
+        self._route_lock = threading.Lock()
+        self._profiles_version = -1  # 已加载的配置快照版本
+        self._hedge_stats = {"fired": 0, "won": 0}
         self._initialized = True
         logger.info("[AutoSwitch] 模型自动切换器已初始化")
 
     def load_profiles_from_db(self, db=None):
-        """从数据库加载所有模型配置"""
-        close_db = False
-        if db is None:
-            from database.connection import SessionLocal
-            db = SessionLocal()
-            close_db = True
+        """
+        从数据库加载所有模型配置
 
+        未传入 db 时读取进程级快照（llm.config_cache），版本未变时不访问数据库。
+        """
         try:
-            from database.connection import LLMModel
-            models = db.query(LLMModel).order_by(LLMModel.priority).all()
-
-            for model in models:
+            if db is None:
+                from .config_cache import get_config_snapshot
+                snapshot = get_config_snapshot()
+                self._profiles_version = snapshot.version
+                rows = snapshot.get_models()
+            else:
+                from database.connection import LLMModel
+                from .config_cache import model_row_to_dict
+                rows = [
+                    model_row_to_dict(m)
+                    for m in db.query(LLMModel).order_by(LLMModel.priority).all()
+                ]
+
+            for row in rows:
+                model_id = row["id"]
                 profile = ModelProfile(
-                    model_id=model.id,
-                    model_name=model.model_name,
-                    provider=model.provider or "openai",
-                    api_key=model.api_key,
-                    base_url=model.base_url or "",
-                    priority=model.priority or 1,
-                    utilization=model.utilization or 100,
+                    model_id=model_id,
+                    model_name=row["model_name"],
+                    provider=row.get("provider") or "openai",
+                    api_key=row["api_key"],
+                    base_url=row.get("base_url") or "",
+                    priority=row.get("priority") or 1,
+                    utilization=row.get("utilization") if row.get("utilization") is not None else 100,
+                    auto_switch_enabled=row.get("auto_switch_enabled") != 0,
+                    rpm_limit=row.get("rpm_limit") or 0,
+                    tpm_limit=row.get("tpm_limit") or 0,
                 )
                 # 保留已有的运行时状态
-                if model.id in self._profiles:
-                    old = self._profiles[model.id]
+                if model_id in self._profiles:
+                    old = self._profiles[model_id]
                     profile.failure_count = old.failure_count
                     profile.last_failure_time = old.last_failure_time
                     profile.last_failure_reason = old.last_failure_reason
@@ -231,11 +278,21 @@ class ModelAutoSwitcher:
                     profile.last_success_time = old.last_success_time
                     profile.total_requests = old.total_requests
                     profile.total_tokens_used = old.total_tokens_used
+                    profile.in_flight = old.in_flight
+                    profile.latency = old.latency
+                    # 限额未变时沿用原令牌桶，避免重新加载后额度被重置
+                    if old.limiter.same_limits(profile.rpm_limit, profile.tpm_limit):
+                        profile.limiter = old.limiter
+
+                self._profiles[model_id] = profile
 
-                self._profiles[model.id] = profile
+                if row.get("is_active") == 1:
+                    self._current_model_id = model_id
 
-                if model.is_active == 1:
-                    self._current_model_id = model.id
+            # 已删除的模型不再参与切换
+            live_ids = {row["id"] for row in rows}
+            for stale_id in [mid for mid in self._profiles if mid not in live_ids]:
+                self._profiles.pop(stale_id, None)
 
             logger.info(
                 f"[AutoSwitch] 已加载 {len(self._profiles)} 个模型配置, "
@@ -243,9 +300,6 @@ class ModelAutoSwitcher:
             )
         except Exception as e:
             logger.error(f"[AutoSwitch] 加载模型配置失败: {e}")
-        finally:
-            if close_db:
-                db.close()
 
     @property
     def enabled(self) -> bool:
@@ -256,6 +310,11 @@ class ModelAutoSwitcher:
         self._enabled = value
         logger.info(f"[AutoSwitch] 自动切换已{'开启' if value else '关闭'}")
 
+    @property
+    def load_balancing(self) -> bool:
+        """是否按权重分摊请求（需同时开启自动切换）"""
+        return self._enabled and LLM_LOAD_BALANCE_ENABLED
+
     @property
     def current_profile(self) -> Optional[ModelProfile]:
         if self._current_model_id is None:
@@ -281,6 +340,10 @@ class ModelAutoSwitcher:
                 "last_failure_reason": p.last_failure_reason.value if p.last_failure_reason else None,
                 "total_requests": p.total_requests,
                 "total_tokens_used": p.total_tokens_used,
+                "auto_switch_enabled": p.auto_switch_enabled,
+                "in_flight": p.in_flight,
+                "rate_limit": p.limiter.get_stats(),
+                "latency": p.latency.get_stats(),
             })
         return result
 
@@ -342,12 +405,16 @@ class ModelAutoSwitcher:
         查找下一个可用模型（按优先级排序）
 
         策略：
-        1. 优先选择 is_available 且优先级最高的
+        1. 优先选择 is_available 且优先级最高的（限流额度已耗尽的排在最后，同优先级取 p50 更低的）
         2. 如果都在冷却中，选择冷却时间最短的
         """
         sorted_profiles = sorted(
             self._profiles.values(),
-            key=lambda p: (p.priority, p.failure_count)
+            key=lambda p: (
+                p.limiter.headroom() <= 0, p.priority,
+                p.latency.p50 if p.latency.p50 is not None else float("inf"),
+                p.failure_count,
+            )
         )
 
         # 第一轮：找可用的
@@ -411,7 +478,7 @@ class ModelAutoSwitcher:
                     model.updated_at = datetime.now()
                 db.commit()
 
-                # 刷新 ModelConfigManager 缓存
+                # 刷新 ModelConfigManager 缓存（同时 bump 配置快照版本并广播）
                 from llm.manager import model_config_manager
                 model_config_manager.refresh_config(db)
 
@@ -447,6 +514,252 @@ class ModelAutoSwitcher:
             p.last_failure_reason = None
         logger.info("[AutoSwitch] 已重置所有模型状态")
 
+    # ── 主动限流与加权路由 ────────────────────────────────
+
+    def _ensure_profiles(self):
+        """首次使用或模型配置变更（快照版本变化）后重新加载档案，保留运行时状态"""
+        try:
+            from .config_cache import get_config_snapshot
+            stale = get_config_snapshot().version != self._profiles_version
+        except Exception:
+            stale = False
+        if stale or not self._profiles:
+            self.load_profiles_from_db()
+
+    def _routable_profiles(self, exclude: Optional[Set[int]] = None) -> List[ModelProfile]:
+        """参与加权路由的档案：未冷却、utilization > 0、开启自动切换（当前激活模型总是参与）"""
+        exclude = exclude or set()
+        return [
+            p for p in self._profiles.values()
+            if p.model_id not in exclude and p.is_available
+            and (p.auto_switch_enabled or p.model_id == self._current_model_id)
+        ]
+
+    @staticmethod
+    def _route_weight(profile: ModelProfile, speed: float = 1.0) -> float:
+        """路由权重 = utilization × 剩余限流额度 × 速度系数 / (1 + 在途请求数)"""
+        return profile.utilization * (0.05 + profile.limiter.headroom()) * speed / (1 + profile.in_flight)
+
+    @staticmethod
+    def _speed_factors(profiles: List[ModelProfile]) -> Dict[int, float]:
+        """
+        速度系数：同优先级中 p50 最低的为 1，其余按 p50 之比递减
+
+        没有足够延迟样本的档案系数为 1，保证新模型也能被探测到。
+        """
+        fastest: Dict[int, float] = {}
+        for p in profiles:
+            p50 = p.latency.p50
+            if p50:
+                fastest[p.priority] = min(fastest.get(p.priority, p50), p50)
+        factors = {}
+        for p in profiles:
+            p50 = p.latency.p50
+            factors[p.model_id] = max(0.1, fastest[p.priority] / p50) if p50 else 1.0
+        return factors
+
+    def _weighted_order(self, profiles: List[ModelProfile]) -> List[ModelProfile]:
+        """按权重随机排序（加权无放回抽样），权重越大越可能排在前面"""
+        speeds = self._speed_factors(profiles)
+        keyed = []
+        for p in profiles:
+            weight = self._route_weight(p, speeds[p.model_id])
+            if weight > 0:
+                keyed.append((random.random() ** (1.0 / weight), p))
+        keyed.sort(key=lambda item: item[0], reverse=True)
+        return [p for _, p in keyed]
+
+    def pick_profile(self, exclude: Optional[Set[int]] = None) -> Optional[ModelProfile]:
+        """按权重挑选一个可用档案（不占用限流额度）"""
+        with self._route_lock:
+            ordered = self._weighted_order(self._routable_profiles(exclude))
+        return ordered[0] if ordered else None
+
+    def _try_acquire(
+        self,
+        estimated_tokens: int,
+        preferred_id: Optional[int],
+        exclude: Optional[Set[int]],
+    ) -> Tuple[Optional[ModelProfile], float]:
+        """
+        尝试占用一个档案的限流额度
+
+        Returns:
+            (档案, 0) 或 (None, 最短等待秒数)
+        """
+        exclude = exclude or set()
+        candidates: List[ModelProfile] = []
+        preferred = self._profiles.get(preferred_id) if preferred_id is not None else None
+        if preferred is not None and preferred.model_id not in exclude and not preferred.is_cooling_down:
+            candidates.append(preferred)
+        if self.load_balancing:
+            others = [p for p in self._routable_profiles(exclude) if p is not preferred]
+            candidates.extend(self._weighted_order(others))
+        elif preferred is None:
+            current = self.current_profile
+            if current is not None and current.model_id not in exclude:
+                candidates.append(current)
+
+        min_wait = float("inf")
+        with self._route_lock:
+            for p in candidates:
+                wait = p.limiter.try_acquire(estimated_tokens)
+                if wait <= 0:
+                    p.in_flight += 1
+                    return p, 0.0
+                min_wait = min(min_wait, wait)
+        return None, min_wait
+
+    def _acquire_fallback(
+        self,
+        estimated_tokens: int,
+        preferred_id: Optional[int],
+        exclude: Optional[Set[int]],
+    ) -> Optional[ModelProfile]:
+        """
+        等待超时或没有候选档案时，不再限流，直接返回首选/当前档案
+
+        额度照常扣减（可扣成负数），release() 按实际用量修正时才不会退回从未占用的额度。
+        """
+        exclude = exclude or set()
+        for model_id in (preferred_id, self._current_model_id):
+            p = self._profiles.get(model_id) if model_id is not None else None
+            if p is not None and p.model_id not in exclude:
+                with self._route_lock:
+                    p.limiter.consume(estimated_tokens)
+                    p.in_flight += 1
+                return p
+        return None
+
+    async def acquire(
+        self,
+        estimated_tokens: int = 0,
+        preferred_id: Optional[int] = None,
+        exclude: Optional[Set[int]] = None,
+        max_wait: float = LLM_RATE_LIMIT_MAX_WAIT,
+    ) -> Optional[ModelProfile]:
+        """
+        请求发出前占用一个模型的限流额度（异步等待）
+
+        Args:
+            estimated_tokens: 预估 Token 数（prompt + 输出上限）
+            preferred_id: 首选模型（会话粘滞），额度不足时才分流到其他模型
+            exclude: 排除的模型 ID
+            max_wait: 最长等待秒数
+
+        Returns:
+            选中的档案；没有任何档案时返回 None。调用结束后必须调用 release()
+        """
+        self._ensure_profiles()
+        deadline = time.monotonic() + max_wait
+        while True:
+            profile, wait = self._try_acquire(estimated_tokens, preferred_id, exclude)
+            if profile is not None:
+                return profile
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or wait == float("inf"):
+                if wait != float("inf"):
+                    logger.warning(f"[AutoSwitch] 限流等待超过 {max_wait:.0f}s，直接发出请求")
+                return self._acquire_fallback(estimated_tokens, preferred_id, exclude)
+            await asyncio.sleep(min(wait, remaining, 5.0))
+
+    def acquire_sync(
+        self,
+        estimated_tokens: int = 0,
+        preferred_id: Optional[int] = None,
+        exclude: Optional[Set[int]] = None,
+        max_wait: float = LLM_RATE_LIMIT_MAX_WAIT,
+    ) -> Optional[ModelProfile]:
+        """acquire 的同步版本（阻塞等待）"""
+        self._ensure_profiles()
+        deadline = time.monotonic() + max_wait
+        while True:
+            profile, wait = self._try_acquire(estimated_tokens, preferred_id, exclude)
+            if profile is not None:
+                return profile
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or wait == float("inf"):
+                if wait != float("inf"):
+                    logger.warning(f"[AutoSwitch] 限流等待超过 {max_wait:.0f}s，直接发出请求")
+                return self._acquire_fallback(estimated_tokens, preferred_id, exclude)
+            time.sleep(min(wait, remaining, 5.0))
+
+    def release(
+        self,
+        model_id: int,
+        estimated_tokens: int = 0,
+        actual_tokens: Optional[int] = None,
+        refund: bool = False,
+    ):
+        """
+        请求结束：释放在途计数，并按实际 Token 用量修正 TPM 额度
+
+        refund=True 表示请求没有发出，RPM / TPM 占用全部退回。
+        """
+        profile = self._profiles.get(model_id)
+        if profile is None:
+            return
+        with self._route_lock:
+            profile.in_flight = max(0, profile.in_flight - 1)
+        if refund:
+            profile.limiter.refund(estimated_tokens)
+        else:
+            profile.limiter.settle(estimated_tokens, actual_tokens)
+
+    # ── 延迟统计与对冲 ────────────────────────────────────
+
+    def record_latency(self, model_id: int, latency: float, ttft: Optional[float] = None):
+        """记录一次成功调用的耗时（秒）和首 Token 时间"""
+        profile = self._profiles.get(model_id)
+        if profile is not None:
+            profile.latency.record(latency, ttft)
+
+    def hedge_delay(self, model_id: int) -> Optional[float]:
+        """
+        对冲触发时间（秒）：该模型的 p95，且不低于 LLM_HEDGE_MIN_DELAY
+
+        未开启对冲、没有备选模型或延迟样本不足时返回 None。
+        """
+        if not LLM_HEDGE_ENABLED or not self.load_balancing or len(self._profiles) < 2:
+            return None
+        profile = self._profiles.get(model_id)
+        if profile is None or profile.latency.samples < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        p95 = profile.latency.p95
+        return max(p95, LLM_HEDGE_MIN_DELAY) if p95 is not None else None
+
+    def record_hedge(self, won: bool):
+        """记录一次对冲请求（won: 副本先于原请求返回）"""
+        self._hedge_stats["fired"] += 1
+        if won:
+            self._hedge_stats["won"] += 1
+
+    def get_hedge_stats(self) -> Dict[str, Any]:
+        return {**self._hedge_stats, "enabled": LLM_HEDGE_ENABLED}
+
+    def concurrency_hint(self, cap: int) -> int:
+        """
+        批量请求的建议并发数（不超过 cap）
+
+        按 Little 定律估算每个可路由模型能承受的在途请求数：RPM/60 × p50 延迟
+        （无延迟样本时按 10 秒）；不限 RPM 的模型直接按 cap 计。
+        未开启加权路由时只统计当前激活模型。
+        """
+        self._ensure_profiles()
+        if self.load_balancing:
+            profiles = self._routable_profiles()
+        else:
+            current = self.current_profile
+            profiles = [current] if current else []
+        if not profiles:
+            return cap
+        total = 0
+        for p in profiles:
+            if p.rpm_limit <= 0:
+                return cap
+            total += max(1, math.ceil(p.rpm_limit / 60.0 * (p.latency.p50 or 10.0)))
+        return max(1, min(cap, total))
+
     async def call_with_failover(
         self,
         call_fn,
@@ -539,17 +852,31 @@ class FailoverChatModel:
     包装 browser-use 的 ChatOpenAI，在 ainvoke 调用中拦截 429/RateLimitError，
     自动从 ModelAutoSwitcher 获取下一个可用模型，创建新的 LLM 实例并重试。
 
+    每次调用前先占用模型的 RPM/TPM 额度：首次调用按权重选择模型，之后粘滞在
+    该模型上，额度不足时才分流到其他健康模型，避免多个会话同时压垮同一个模型。
+
     对 browser-use Agent 完全透明 — Agent 只看到一个正常的 LLM 对象。
     """
 
-    def __init__(self, initial_llm, switcher: ModelAutoSwitcher = None):
+    def __init__(
+        self,
+        initial_llm,
+        switcher: ModelAutoSwitcher = None,
+        source: str = "browser_use",
+        session_id: Optional[int] = None,
+    ):
         # 减少底层 LLM 的重试次数，因为 FailoverChatModel 自己处理重试（通过切换模型）
         if hasattr(initial_llm, 'max_retries'):
             initial_llm.max_retries = 1
         self._current_llm = initial_llm
         self._switcher = switcher or get_auto_switcher()
+        self._model_id: Optional[int] = self._switcher._current_model_id  # initial_llm 对应激活模型
+        self._routed = False  # 是否已完成首次加权选择
         self._switch_count = 0
         self._max_switches_per_call = 3  # 单次 ainvoke 最多切换 3 次
+        # 链路追踪标签
+        self._trace_source = source
+        self._trace_session_id = session_id
 
     # ---- 透传 BaseChatModel 协议所需的属性 ----
 
@@ -591,15 +918,46 @@ class FailoverChatModel:
         3. 创建新的 LLM 实例
         4. 用新 LLM 重试
         """
+        with get_llm_tracer().span(
+            "llm.ainvoke", messages, source=self._trace_source, session_id=self._trace_session_id
+        ):
+            return await self._ainvoke_with_failover(messages, output_format)
+
+    async def _ainvoke_with_failover(self, messages, output_format=None):
+        """ainvoke 的实际实现（在链路追踪 Span 内执行）"""
         switches_this_call = 0
         last_error = None
+        estimated_tokens = estimate_messages_tokens(messages) + FAILOVER_OUTPUT_TOKENS_ESTIMATE
+
+        queue_seconds = 0.0
 
         while switches_this_call <= self._max_switches_per_call:
+            queued = time.monotonic()
+            profile = await self._acquire_profile(estimated_tokens)
+            queue_seconds += time.monotonic() - queued
+            annotate(
+                queue_ms=round(queue_seconds * 1000, 1),
+                model_id=self._model_id,
+                model_name=self.model_name,
+                provider=self.provider,
+            )
+            actual_tokens = None
+            started = time.monotonic()
             try:
                 result = await self._current_llm.ainvoke(messages, output_format)
+                usage = getattr(result, 'usage', None)
+                actual_tokens = getattr(usage, 'total_tokens', None)
+                annotate(
+                    prompt_tokens=getattr(usage, 'prompt_tokens', 0) or 0,
+                    completion_tokens=getattr(usage, 'completion_tokens', 0) or 0,
+                    # browser-use 的 ChatInvokeUsage 会带上供应商返回的缓存命中数
+                    cached_tokens=getattr(usage, 'prompt_cached_tokens', 0) or 0,
+                )
+                if profile is not None:
+                    self._switcher.record_latency(profile.model_id, time.monotonic() - started)
                 # 成功 — 标记成功
-                if self._switcher.enabled and self._switcher._current_model_id:
-                    self._switcher.mark_success(self._switcher._current_model_id, 0)
+                if self._switcher.enabled and self._model_id:
+                    self._switcher.mark_success(self._model_id, 0)
                 return result
 
             except Exception as e:
@@ -615,41 +973,76 @@ class FailoverChatModel:
                     raise
 
                 # 标记当前模型失败
-                current_id = self._switcher._current_model_id
+                current_id = self._model_id
                 reason = classify_failure_reason(e)
                 new_id = self._switcher.mark_failure(current_id or 0, reason)
-
-                if new_id and new_id != current_id:
-                    # 切换成功，创建新 LLM
+                if not new_id or new_id == current_id:
+                    # 本会话的模型不是全局激活模型时，按权重另选一个
+                    alternative = self._switcher.pick_profile(exclude={current_id} if current_id else None)
+                    new_id = alternative.model_id if alternative else new_id
+
+                if new_id and new_id != current_id and self._switch_to(new_id):
+                    switches_this_call += 1
+                    add_failover_hop(current_id, new_id, reason.value)
                     logger.info(
-                        f"[FailoverLLM] 🔄 模型切换: ID={current_id} → ID={new_id}, "
-                        f"正在创建新 LLM 实例..."
+                        f"[FailoverLLM] ✅ 已切换到新模型，累计切换 {self._switch_count} 次，"
+                        f"本次调用第 {switches_this_call} 次切换"
                     )
-                    new_llm = self._create_llm_from_profile(new_id)
-                    if new_llm:
-                        self._current_llm = new_llm
-                        self._switch_count += 1
-                        switches_this_call += 1
-                        logger.info(
-                            f"[FailoverLLM] ✅ 已切换到新模型，累计切换 {self._switch_count} 次，"
-                            f"本次调用第 {switches_this_call} 次切换"
-                        )
-                        continue  # 用新 LLM 重试
-                    else:
-                        logger.error("[FailoverLLM] ❌ 创建新 LLM 实例失败")
-                        raise
+                    continue  # 用新 LLM 重试
+                if new_id and new_id != current_id:
+                    logger.error("[FailoverLLM] ❌ 创建新 LLM 实例失败")
                 else:
                     logger.warning(
                         f"[FailoverLLM] ❌ 没有可用的备选模型，无法切换 "
                         f"(current={current_id}, new={new_id})"
                     )
-                    raise
+                raise
+            finally:
+                if profile is not None:
+                    self._switcher.release(profile.model_id, estimated_tokens, actual_tokens)
 
         # 超过最大切换次数
         logger.error(f"[FailoverLLM] ❌ 已达到最大切换次数 {self._max_switches_per_call}")
         if last_error:
             raise last_error
 
+    async def _acquire_profile(self, estimated_tokens: int) -> Optional[ModelProfile]:
+        """
+        占用限流额度；选中的模型与当前 LLM 不同时切换 LLM 实例
+
+        首次调用不指定首选模型（按权重分摊会话），之后优先使用当前模型。
+        """
+        preferred_id = self._model_id if self._routed else None
+        profile = await self._switcher.acquire(estimated_tokens, preferred_id=preferred_id)
+        self._routed = True
+        if profile is not None and profile.model_id != self._model_id:
+            logger.info(
+                f"[FailoverLLM] 加权路由: ID={self._model_id} → ID={profile.model_id} "
+                f"({profile.model_name})"
+            )
+            if not self._switch_to(profile.model_id):
+                # 创建失败时继续使用当前 LLM：额度归还给选中的档案，改为占用当前模型的额度
+                self._switcher.release(profile.model_id, estimated_tokens, refund=True)
+                others = {model_id for model_id in self._switcher._profiles if model_id != self._model_id}
+                profile = await self._switcher.acquire(
+                    estimated_tokens, preferred_id=self._model_id, exclude=others
+                )
+        return profile
+
+    def _switch_to(self, model_id: int) -> bool:
+        """切换到指定模型的新 LLM 实例"""
+        logger.info(
+            f"[FailoverLLM] 🔄 模型切换: ID={self._model_id} → ID={model_id}, "
+            f"正在创建新 LLM 实例..."
+        )
+        new_llm = self._create_llm_from_profile(model_id)
+        if not new_llm:
+            return False
+        self._current_llm = new_llm
+        self._model_id = model_id
+        self._switch_count += 1
+        return True
+
     def _is_switchable_error(self, error, error_msg: str) -> bool:
         """判断是否为可以通过切换模型解决的错误"""
         # browser-use 的 ModelRateLimitError
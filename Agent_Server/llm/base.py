@@ -8,57 +8,13 @@ LLM Provider 基类
 """
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Union, Type
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Union, Type
 from enum import Enum
-import json
-import re
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def _find_matching_brace(text: str) -> int:
-    """
-    找到与第一个 '{' 匹配的 '}' 的位置索引。
-    正确处理 JSON 字符串中的转义字符和嵌套括号。
-    返回 -1 表示未找到匹配。
-    """
-    if not text or text[0] != '{':
-        return -1
-
-    depth = 0
-    in_string = False
-    escape_next = False
-    i = 0
-
-    while i < len(text):
-        ch = text[i]
-
-        if escape_next:
-            escape_next = False
-            i += 1
-            continue
-
-        if ch == '\\' and in_string:
-            escape_next = True
-            i += 1
-            continue
-
-        if ch == '"' and not escape_next:
-            in_string = not in_string
-        elif not in_string:
-            if ch == '{':
-                depth += 1
-            elif ch == '}':
-                depth -= 1
-                if depth == 0:
-                    return i
-
-        i += 1
-
-    return -1
-
-
 class ProviderType(Enum):
     """Provider 类型枚举"""
     OPENAI = "openai"
@@ -136,6 +92,8 @@ class LLMResponse:
     prompt_tokens: int = 0
     completion_tokens: int = 0
     total_tokens: int = 0
+    cached_tokens: int = 0  # 命中提示词缓存的输入 Token（包含在 prompt_tokens 内）
+    cache_creation_tokens: int = 0  # 写入提示词缓存的输入 Token（Anthropic）
     
     # 元数据
     raw_response: Any = None
@@ -149,6 +107,26 @@ class LLMResponse:
         return self.content
 
 
+def get_cached_prompt_tokens(usage: Any) -> int:
+    """
+    从 OpenAI 兼容接口的 usage 中读取命中提示词缓存的输入 Token 数
+
+    - OpenAI / Azure: usage.prompt_tokens_details.cached_tokens
+    - DeepSeek: usage.prompt_cache_hit_tokens
+    - Moonshot 等: usage.cached_tokens
+    """
+    if usage is None:
+        return 0
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached = getattr(details, 'cached_tokens', None) if details is not None else None
+    if not cached:
+        cached = getattr(usage, 'prompt_cache_hit_tokens', None) or getattr(usage, 'cached_tokens', None)
+    try:
+        return int(cached or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
 class BaseLLMProvider(ABC):
     """
     LLM Provider 抽象基类
@@ -227,6 +205,38 @@ class BaseLLMProvider(ABC):
         """
         pass
     
+    async def achat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None,
+        usage_callback: Optional[Callable[[int, int], None]] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        异步流式聊天接口，逐段产出文本增量
+        
+        默认实现退化为一次 achat 后整体产出；支持流式的 Provider 应覆盖此方法。
+        可配合 llm.streaming.IncrementalJSONArrayExtractor 增量解析 JSON。
+        
+        Args:
+            messages: 消息列表
+            temperature: 温度
+            max_tokens: 最大输出 token
+            usage_callback: 流结束后回调 (prompt_tokens, completion_tokens)
+            **kwargs: 额外参数
+            
+        Yields:
+            文本增量
+        """
+        response = await self.achat(
+            messages, temperature=temperature, max_tokens=max_tokens, **kwargs
+        )
+        if usage_callback:
+            usage_callback(response.prompt_tokens, response.completion_tokens)
+        if response.content:
+            yield response.content
+    
     def ensure_initialized(self):
         """确保客户端已初始化（延迟初始化）"""
         if not self._initialized:
@@ -293,29 +303,6 @@ class BaseLLMProvider(ABC):
         
         return "", content
     
-    def _extract_json(self, content: str) -> str:
-        """
-        从响应中提取 JSON（可能在 markdown 代码块中）
-        
-        Args:
-            content: 响应内容
-            
-        Returns:
-            提取的 JSON 字符串
-        """
-        if not content:
-            return content
-        
-        content = content.strip()
-        
-        # 处理 ```json ... ``` 格式
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0].strip()
-        
-        return content
-
     def parse_json_response(self, content: str) -> dict:
         """
         从 LLM 响应中解析 JSON，处理各种不规范格式
@@ -327,98 +314,23 @@ class BaseLLMProvider(ABC):
         - DeepSeek: R1 模型有 <think>...</think> 推理过程，不支持 response_format
         - Ollama: 本地模型输出不稳定，可能有 <think> 标签、多余文字
         - Moonshot/Alibaba/通用: 偶尔有尾部逗号、未闭合括号
+        - Qwen/MiniMax: JSON 前后有中文说明，<think> 内容可能嵌在字段值内
+        - 各模型被 max_tokens 截断时 JSON 不完整
+
+        以上问题统一由 json_parser.parse_llm_json 单遍处理，子类无需覆盖。
 
         Args:
             content: LLM 原始响应文本
 
         Returns:
             解析后的 dict
-        """
-        if not content:
-            raise ValueError("LLM 响应为空")
-
-        text = content.strip()
-
-        # 1. 剥离所有 <think>...</think> 推理标签（包括嵌在 JSON 字段值内的）
-        text = re.sub(r'<think>[\s\S]*?</think>', '', text).strip()
-
-        # 2. 剥离 **JSON Response:** 格式（Ollama 常见）
-        if "**JSON Response:**" in text:
-            text = text.split("**JSON Response:**")[-1].strip()
-
-        # 3. 剥离 markdown 代码块
-        text = self._extract_json(text)
-
-        # 4. 如果不是以 { 开头，找到第一个 {
-        if text and text[0] != '{':
-            idx = text.find('{')
-            if idx >= 0:
-                text = text[idx:]
-
-        # 5. 用括号匹配提取完整 JSON 对象（解决 Extra data / trailing characters）
-        if text and text.startswith('{'):
-            end_idx = _find_matching_brace(text)
-            if end_idx > 0:
-                extracted = text[:end_idx + 1]
-                if end_idx < len(text) - 1:
-                    logger.debug(
-                        f"[parse_json_response] 括号匹配截断: "
-                        f"原始 {len(text)} → 提取 {len(extracted)} 字符"
-                    )
-                text = extracted
-
-        # 6. 直接尝试解析
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-
-        # 7. 移除尾部逗号: ,] → ] 和 ,} → }
-        fixed = re.sub(r',\s*([}\]])', r'\1', text)
-        try:
-            return json.loads(fixed)
-        except json.JSONDecodeError:
-            pass
 
-        # 7.5 修复缺少逗号: "value"\n"key" → "value",\n"key" 等
-        fixed2 = re.sub(r'"\s*\n(\s*")', r'",\n\1', fixed)
-        fixed2 = re.sub(r'(\})\s*\n(\s*\{)', r'\1,\n\2', fixed2)
-        fixed2 = re.sub(r'(true|false|null|\d+)\s*\n(\s*")', r'\1,\n\2', fixed2)
-        if fixed2 != fixed:
-            try:
-                return json.loads(fixed2)
-            except json.JSONDecodeError:
-                pass
-
-        # 8. 修复截断的 JSON（补全缺失的括号）
-        open_braces = fixed.count('{') - fixed.count('}')
-        open_brackets = fixed.count('[') - fixed.count(']')
-        if open_braces > 0 or open_brackets > 0:
-            patched = fixed
-            last_close = max(patched.rfind('}'), patched.rfind(']'))
-            if last_close > 0:
-                patched = patched[:last_close + 1]
-                open_braces = patched.count('{') - patched.count('}')
-                open_brackets = patched.count('[') - patched.count(']')
-            patched += ']' * open_brackets + '}' * open_braces
-            patched = re.sub(r',\s*([}\]])', r'\1', patched)
-            try:
-                return json.loads(patched)
-            except json.JSONDecodeError:
-                pass
-
-        # 9. 使用 json_repair 库作为最终修复手段
-        try:
-            from json_repair import repair_json
-            repaired = repair_json(text, return_objects=True)
-            if isinstance(repaired, dict):
-                logger.info(f"[parse_json_response] json_repair 成功修复 JSON ({len(text)} 字符)")
-                return repaired
-        except Exception as e:
-            logger.debug(f"[parse_json_response] json_repair 也失败: {e}")
-
-        # 10. 全部失败，抛出原始错误
-        return json.loads(text)
+        Raises:
+            ValueError: 响应为空
+            json.JSONDecodeError: 无法解析
+        """
+        from .json_parser import parse_llm_json
+        return parse_llm_json(content, source=self.provider_name)
     
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}(provider={self.provider_name}, model={self.config.model_name})"
@@ -492,6 +404,7 @@ class BaseOpenAICompatibleProvider(BaseLLMProvider):
                 prompt_tokens=usage.prompt_tokens if usage else 0,
                 completion_tokens=usage.completion_tokens if usage else 0,
                 total_tokens=usage.total_tokens if usage else 0,
+                cached_tokens=get_cached_prompt_tokens(usage),
                 raw_response=response
             )
             
@@ -508,14 +421,10 @@ class BaseOpenAICompatibleProvider(BaseLLMProvider):
         **kwargs
     ) -> LLMResponse:
         """异步聊天"""
-        from openai import AsyncOpenAI
+        from .http_pool import get_http_pool
         
-        # 创建异步客户端
-        async_client = AsyncOpenAI(
-            api_key=self.config.api_key,
-            base_url=self.config.base_url,
-            timeout=self.config.timeout
-        )
+        # 复用按模型档案缓存的异步客户端（长连接）
+        async_client = get_http_pool().get_async_openai(self.config)
         
         # 构建请求参数
         request_params = {
@@ -552,6 +461,7 @@ class BaseOpenAICompatibleProvider(BaseLLMProvider):
                 prompt_tokens=usage.prompt_tokens if usage else 0,
                 completion_tokens=usage.completion_tokens if usage else 0,
                 total_tokens=usage.total_tokens if usage else 0,
+                cached_tokens=get_cached_prompt_tokens(usage),
                 raw_response=response
             )
             
@@ -559,9 +469,55 @@ class BaseOpenAICompatibleProvider(BaseLLMProvider):
             logger.error(f"[{self.provider_name}] 异步聊天请求失败: {e}")
             raise
     
+    # 是否在流式请求中附带 stream_options.include_usage（部分兼容服务不支持）
+    supports_stream_usage: bool = True
+    
+    async def achat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None,
+        usage_callback: Optional[Callable[[int, int], None]] = None,
+        response_format: Dict[str, str] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """异步流式聊天（只产出正文，reasoning_content 不产出）"""
+        from .http_pool import get_http_pool
+        
+        async_client = get_http_pool().get_async_openai(self.config)
+        
+        request_params = {
+            "model": self.config.model_name,
+            "messages": messages,
+            "temperature": temperature if temperature is not None else self.config.temperature,
+            "max_tokens": max_tokens if max_tokens is not None else self.config.max_tokens,
+            "stream": True,
+        }
+        if response_format:
+            request_params["response_format"] = response_format
+        if self.supports_stream_usage:
+            request_params["stream_options"] = {"include_usage": True}
+        request_params.update(kwargs)
+        
+        try:
+            stream = await async_client.chat.completions.create(**request_params)
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None)
+                if usage and usage_callback:
+                    usage_callback(usage.prompt_tokens or 0, usage.completion_tokens or 0)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta is not None and delta.content:
+                    yield delta.content
+        except Exception as e:
+            logger.error(f"[{self.provider_name}] 流式聊天请求失败: {e}")
+            raise
+    
     def get_langchain_llm(self) -> Any:
         """获取 LangChain LLM 实例"""
         from langchain_openai import ChatOpenAI
+        from .http_pool import get_shared_http_client
         
         return ChatOpenAI(
             model=self.config.model_name,
@@ -569,4 +525,5 @@ class BaseOpenAICompatibleProvider(BaseLLMProvider):
             base_url=self.config.base_url,
             temperature=self.config.temperature,
             max_tokens=self.config.max_tokens,
+            http_async_client=get_shared_http_client(self.config),
         )
@@ -0,0 +1,126 @@
+"""
+LLM 批量请求模块
+
+多个互不依赖的 LLM 调用（按 L2 节点规划 L3、按用例生成接口 DSL、按失败用例分析 Bug）
+原先逐个 await，总耗时是所有调用之和。LLMClient.achat_many 把它们放进有界并发中同时执行，
+总耗时接近最慢的一次调用。
+
+- 结果顺序与请求顺序一致，单条失败只记录在该条结果中，不影响其它请求
+- 每条请求的 Token 用量通过 contextvar 收集（LLMClient 记账时顺带累加），批次汇总
+- 并发上限默认由 ModelAutoSwitcher.concurrency_hint 根据模型 RPM 和延迟估算
+
+配置:
+    LLM_BATCH_MAX_CONCURRENCY = 8（批量请求并发上限）
+
+作者: 程序员Eighteen
+版本: 1.0
+"""
+import contextvars
+import os
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+# 配置
+LLM_BATCH_MAX_CONCURRENCY = int(os.getenv("LLM_BATCH_MAX_CONCURRENCY", "8"))
+
+
+@dataclass
+class BatchUsage:
+    """一组请求的 Token 用量"""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    calls: int = 0
+    failed_calls: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, prompt_tokens: int, completion_tokens: int, success: bool = True):
+        self.prompt_tokens += prompt_tokens or 0
+        self.completion_tokens += completion_tokens or 0
+        self.calls += 1
+        if not success:
+            self.failed_calls += 1
+
+    def merge(self, other: "BatchUsage"):
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.calls += other.calls
+        self.failed_calls += other.failed_calls
+
+    def to_dict(self) -> dict:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "calls": self.calls,
+            "failed_calls": self.failed_calls,
+        }
+
+
+@dataclass
+class BatchItemResult:
+    """单条请求的结果（error 不为空表示失败）"""
+    index: int
+    result: Any = None
+    error: Optional[BaseException] = None
+    duration_ms: int = 0
+    usage: BatchUsage = field(default_factory=BatchUsage)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BatchResult:
+    """批量请求结果，items 与请求顺序一一对应"""
+    items: List[BatchItemResult]
+    duration_ms: int = 0
+    max_concurrency: int = 0
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __getitem__(self, index: int) -> BatchItemResult:
+        return self.items[index]
+
+    @property
+    def results(self) -> List[Any]:
+        """按顺序的结果列表，失败项为 None"""
+        return [item.result if item.ok else None for item in self.items]
+
+    @property
+    def failed(self) -> List[BatchItemResult]:
+        return [item for item in self.items if not item.ok]
+
+    @property
+    def usage(self) -> BatchUsage:
+        total = BatchUsage()
+        for item in self.items:
+            total.merge(item.usage)
+        return total
+
+    def summary(self) -> str:
+        usage = self.usage
+        return (
+            f"{len(self.items)} 条请求, 失败 {len(self.failed)}, 并发 {self.max_concurrency}, "
+            f"耗时 {self.duration_ms}ms, Token {usage.total_tokens}"
+        )
+
+
+# 当前请求的用量收集器（achat_many 为每条请求设置独立实例）
+_usage_sink: contextvars.ContextVar[Optional[BatchUsage]] = contextvars.ContextVar(
+    "llm_batch_usage_sink", default=None
+)
+
+
+def record_batch_usage(prompt_tokens: int, completion_tokens: int, success: bool = True):
+    """LLMClient 记账时调用：处于批量请求中时把用量累加到该条请求"""
+    sink = _usage_sink.get()
+    if sink is not None:
+        sink.add(prompt_tokens, completion_tokens, success)
@@ -0,0 +1,6 @@
+"""
+LLM 模块基准测试脚本
+
+作者: 程序员Eighteen
+版本: 1.0
+"""
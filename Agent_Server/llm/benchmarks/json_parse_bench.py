@@ -0,0 +1,192 @@
+"""
+LLM JSON 解析基准
+
+用 malformed_json_corpus.jsonl 中收集的模型真实异常输出，对比
+旧的多轮正则级联（legacy）与 json_parser.parse_llm_json 的解析成功率和耗时。
+
+语料格式（每行一条）:
+    {"name": "...", "text": "模型原始输出", "expect": 期望结果}
+    expect 为 null 表示应当解析失败；为 "truncated" 表示截断样本，只要求返回非空对象
+
+运行（在 Agent_Server 目录下）:
+    python -m llm.benchmarks.json_parse_bench
+    python -m llm.benchmarks.json_parse_bench --iterations 500 --verbose
+
+作者: 程序员Eighteen
+版本: 1.0
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+from llm.json_parser import parse_llm_json
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "malformed_json_corpus.jsonl")
+
+
+def _legacy_find_matching_brace(text: str) -> int:
+    """旧版 base._find_matching_brace（逐字符扫描）"""
+    if not text or text[0] != '{':
+        return -1
+    depth = 0
+    in_string = False
+    escape_next = False
+    for i, ch in enumerate(text):
+        if escape_next:
+            escape_next = False
+            continue
+        if ch == '\\' and in_string:
+            escape_next = True
+            continue
+        if ch == '"':
+            in_string = not in_string
+        elif not in_string:
+            if ch == '{':
+                depth += 1
+            elif ch == '}':
+                depth -= 1
+                if depth == 0:
+                    return i
+    return -1
+
+
+def legacy_parse(content: str) -> dict:
+    """旧版 BaseLLMProvider.parse_json_response 的级联逻辑（作为基线）"""
+    if not content:
+        raise ValueError("LLM 响应为空")
+    text = content.strip()
+    text = re.sub(r'<think>[\s\S]*?</think>', '', text).strip()
+    if "**JSON Response:**" in text:
+        text = text.split("**JSON Response:**")[-1].strip()
+    if "```json" in text:
+        text = text.split("```json")[1].split("```")[0].strip()
+    elif "```" in text:
+        text = text.split("```")[1].split("```")[0].strip()
+    if text and text[0] != '{':
+        idx = text.find('{')
+        if idx >= 0:
+            text = text[idx:]
+    if text and text.startswith('{'):
+        end_idx = _legacy_find_matching_brace(text)
+        if end_idx > 0:
+            text = text[:end_idx + 1]
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    fixed = re.sub(r',\s*([}\]])', r'\1', text)
+    try:
+        return json.loads(fixed)
+    except json.JSONDecodeError:
+        pass
+    fixed2 = re.sub(r'"\s*\n(\s*")', r'",\n\1', fixed)
+    fixed2 = re.sub(r'(\})\s*\n(\s*\{)', r'\1,\n\2', fixed2)
+    fixed2 = re.sub(r'(true|false|null|\d+)\s*\n(\s*")', r'\1,\n\2', fixed2)
+    if fixed2 != fixed:
+        try:
+            return json.loads(fixed2)
+        except json.JSONDecodeError:
+            pass
+    open_braces = fixed.count('{') - fixed.count('}')
+    open_brackets = fixed.count('[') - fixed.count(']')
+    if open_braces > 0 or open_brackets > 0:
+        patched = fixed
+        last_close = max(patched.rfind('}'), patched.rfind(']'))
+        if last_close > 0:
+            patched = patched[:last_close + 1]
+            open_braces = patched.count('{') - patched.count('}')
+            open_brackets = patched.count('[') - patched.count(']')
+        patched += ']' * open_brackets + '}' * open_braces
+        patched = re.sub(r',\s*([}\]])', r'\1', patched)
+        try:
+            return json.loads(patched)
+        except json.JSONDecodeError:
+            pass
+    try:
+        from json_repair import repair_json
+        repaired = repair_json(text, return_objects=True)
+        if isinstance(repaired, dict):
+            return repaired
+    except Exception:
+        pass
+    return json.loads(text)
+
+
+def load_corpus(path: str = CORPUS_PATH) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _is_correct(result: Any, expect: Any) -> bool:
+    if expect is None:
+        return False
+    if expect == "truncated":
+        return isinstance(result, dict) and any(result.values())
+    return result == expect
+
+
+def run_parser(parse: Callable[[str], Any], corpus: List[Dict[str, Any]], iterations: int) -> Dict[str, Any]:
+    """对每条语料重复解析 iterations 次，统计正确率与单次耗时"""
+    correct = 0
+    per_case = []
+    for case in corpus:
+        text, expect = case["text"], case["expect"]
+        try:
+            result = parse(text)
+            ok = _is_correct(result, expect)
+        except (json.JSONDecodeError, ValueError):
+            ok = expect is None
+        correct += ok
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            try:
+                parse(text)
+            except (json.JSONDecodeError, ValueError):
+                pass
+        elapsed_us = (time.perf_counter() - start) / iterations * 1e6
+        per_case.append({"name": case["name"], "ok": ok, "us": elapsed_us, "size": len(text)})
+
+    timings = [c["us"] for c in per_case]
+    return {
+        "success_rate": correct / len(corpus) if corpus else 0.0,
+        "correct": correct,
+        "total": len(corpus),
+        "median_us": statistics.median(timings) if timings else 0.0,
+        "total_us": sum(timings),
+        "cases": per_case,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM JSON 解析基准")
+    parser.add_argument("--iterations", type=int, default=200, help="每条语料的重复解析次数")
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="语料文件路径")
+    parser.add_argument("--verbose", action="store_true", help="输出每条语料的结果")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    results = {
+        "legacy": run_parser(legacy_parse, corpus, args.iterations),
+        "parse_llm_json": run_parser(parse_llm_json, corpus, args.iterations),
+    }
+
+    print(f"语料: {len(corpus)} 条, 每条重复 {args.iterations} 次\n")
+    print(f"{'解析器':<16}{'正确率':>10}{'中位耗时(us)':>16}{'总耗时(us)':>14}")
+    for name, r in results.items():
+        print(f"{name:<16}{r['correct']:>5}/{r['total']:<4}{r['median_us']:>16.1f}{r['total_us']:>14.1f}")
+
+    if args.verbose:
+        print(f"\n{'语料':<28}{'字符':>8}{'legacy':>16}{'parse_llm_json':>20}")
+        for old, new in zip(results["legacy"]["cases"], results["parse_llm_json"]["cases"]):
+            old_cell = f"{'✓' if old['ok'] else '✗'} {old['us']:.1f}"
+            new_cell = f"{'✓' if new['ok'] else '✗'} {new['us']:.1f}"
+            print(f"{old['name']:<28}{old['size']:>8}{old_cell:>16}{new_cell:>20}")
+
+
+if __name__ == "__main__":
+    main()
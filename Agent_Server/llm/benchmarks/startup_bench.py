@@ -0,0 +1,183 @@
+"""
+启动耗时基准
+
+在全新的子进程中测量:
+1. import app（FastAPI 应用及所有路由模块的导入耗时）
+2. 首个 HTTP 请求（TestClient 请求 /health，不触发 lifespan）
+3. 首个 LLM Provider（create_llm_provider + 客户端初始化，不发网络请求）
+
+并列出每个阶段结束时已加载的重量级 SDK，用于发现 Provider 懒加载失效等导入回归。
+设置 --max-import-ms 后，import app 中位耗时超出预算时以非零状态退出，可接入 CI。
+
+运行（在 Agent_Server 目录下）:
+    python -m llm.benchmarks.startup_bench
+    python -m llm.benchmarks.startup_bench --repeat 5 --importtime
+    python -m llm.benchmarks.startup_bench --provider anthropic --model claude-3-5-sonnet-latest --max-import-ms 3000
+
+作者: 程序员Eighteen
+版本: 1.0
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+AGENT_SERVER_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PROJECT_ROOT = os.path.dirname(AGENT_SERVER_DIR)
+
+# 导入后不应出现在 sys.modules 中的重量级依赖（只应在首次使用时加载）
+HEAVY_MODULES = [
+    "openai",
+    "anthropic",
+    "google.genai",
+    "google.generativeai",
+    "mistralai",
+    "langchain_core",
+    "langchain_openai",
+    "langchain_anthropic",
+    "langchain_ollama",
+    "browser_use",
+    "qdrant_client",
+    "tiktoken",
+    "numpy",
+]
+
+# 子进程脚本：依次执行三个阶段，最后一行输出 JSON 结果
+_CHILD_SCRIPT = r'''
+import json, sys, time
+
+HEAVY = {heavy!r}
+result = {{}}
+
+def loaded():
+    return [m for m in HEAVY if m in sys.modules]
+
+t0 = time.perf_counter()
+import app
+result["import_ms"] = (time.perf_counter() - t0) * 1000
+result["heavy_after_import"] = loaded()
+
+try:
+    from fastapi.testclient import TestClient
+    client = TestClient(app.app)
+    t0 = time.perf_counter()
+    resp = client.get("/health")
+    result["first_request_ms"] = (time.perf_counter() - t0) * 1000
+    result["first_request_status"] = resp.status_code
+except Exception as e:
+    result["first_request_error"] = f"{{type(e).__name__}}: {{e}}"
+
+try:
+    from llm import create_llm_provider
+    t0 = time.perf_counter()
+    provider = create_llm_provider({provider!r}, {model!r}, api_key="sk-startup-bench")
+    provider.ensure_initialized()
+    result["first_provider_ms"] = (time.perf_counter() - t0) * 1000
+except Exception as e:
+    result["first_provider_error"] = f"{{type(e).__name__}}: {{e}}"
+result["heavy_after_provider"] = loaded()
+
+print(json.dumps(result))
+'''
+
+
+def run_once(provider: str, model: str, importtime: bool = False) -> Dict[str, Any]:
+    """在新进程中跑一轮，返回各阶段耗时；importtime=True 时附带 -X importtime 的原始输出"""
+    script = _CHILD_SCRIPT.format(heavy=HEAVY_MODULES, provider=provider, model=model)
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", script]
+
+    env = dict(os.environ)
+    # app.py 以 Agent_Server.xxx 形式导入，同时各模块以 llm / database 形式互相导入
+    env["PYTHONPATH"] = os.pathsep.join(p for p in [AGENT_SERVER_DIR, PROJECT_ROOT, env.get("PYTHONPATH")] if p)
+    env.setdefault("PYTHONDONTWRITEBYTECODE", "1")
+
+    proc = subprocess.run(cmd, cwd=AGENT_SERVER_DIR, env=env, capture_output=True, text=True)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        tail = "\n".join(proc.stderr.strip().splitlines()[-15:])
+        raise RuntimeError(f"子进程失败 (exit={proc.returncode}):\n{tail}")
+    result = json.loads(lines[-1])
+    if importtime:
+        result["importtime_raw"] = proc.stderr
+    return result
+
+
+def top_imports(raw: str, limit: int) -> List[Dict[str, Any]]:
+    """解析 -X importtime 输出，返回累计耗时最高的顶层包"""
+    rows = []
+    for line in raw.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        name = parts[2].rstrip()
+        # 顶层导入（非嵌套）包名前只有一个空格
+        if name.startswith("  "):
+            continue
+        try:
+            rows.append({"module": name.strip(), "cumulative_ms": int(parts[1]) / 1000})
+        except ValueError:
+            continue
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:limit]
+
+
+def _median(results: List[Dict[str, Any]], key: str):
+    values = [r[key] for r in results if key in r]
+    return statistics.median(values) if values else None
+
+
+def _fmt(value) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准")
+    parser.add_argument("--repeat", type=int, default=3, help="重复运行的进程数（取中位数）")
+    parser.add_argument("--provider", default="deepseek", help="首个 Provider 阶段使用的供应商")
+    parser.add_argument("--model", default="deepseek-chat", help="首个 Provider 阶段使用的模型")
+    parser.add_argument("--importtime", action="store_true", help="额外输出 import app 中最慢的顶层模块")
+    parser.add_argument("--top", type=int, default=15, help="--importtime 列出的模块数")
+    parser.add_argument("--max-import-ms", type=float, default=0, help="import app 中位耗时预算，超出时返回非零状态")
+    args = parser.parse_args()
+
+    results = [run_once(args.provider, args.model) for _ in range(max(1, args.repeat))]
+    last = results[-1]
+
+    print(f"进程数: {len(results)}  Provider: {args.provider}/{args.model}\n")
+    print(f"{'阶段':<20}{'中位(ms)':>12}{'最小(ms)':>12}{'最大(ms)':>12}")
+    for label, key in [("import app", "import_ms"), ("首个请求 /health", "first_request_ms"), ("首个 Provider", "first_provider_ms")]:
+        values = [r[key] for r in results if key in r]
+        print(f"{label:<20}{_fmt(_median(results, key)):>12}"
+              f"{_fmt(min(values) if values else None):>12}{_fmt(max(values) if values else None):>12}")
+
+    for key in ("first_request_error", "first_provider_error"):
+        if key in last:
+            print(f"\n{key}: {last[key]}")
+
+    print(f"\nimport app 后已加载的重量级模块: {', '.join(last['heavy_after_import']) or '无'}")
+    print(f"首个 Provider 后已加载的重量级模块: {', '.join(last['heavy_after_provider']) or '无'}")
+
+    if args.importtime:
+        raw = run_once(args.provider, args.model, importtime=True)["importtime_raw"]
+        print(f"\n{'模块':<48}{'累计(ms)':>12}")
+        for row in top_imports(raw, args.top):
+            print(f"{row['module']:<48}{row['cumulative_ms']:>12.1f}")
+
+    if args.max_import_ms:
+        median_import = _median(results, "import_ms")
+        if median_import is not None and median_import > args.max_import_ms:
+            print(f"\n✗ import app 中位耗时 {median_import:.1f}ms 超出预算 {args.max_import_ms:.0f}ms")
+            sys.exit(1)
+        print(f"\n✓ import app 中位耗时在预算 {args.max_import_ms:.0f}ms 内")
+
+
+if __name__ == "__main__":
+    main()
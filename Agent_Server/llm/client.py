@@ -6,13 +6,24 @@ LLM 客户端模块
 作者: 程序员Eighteen
 版本: 1.0
 """
+import asyncio
 import json
 import logging
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 
 from .manager import get_active_llm_config, model_config_manager
 from .factory import create_llm_provider
 from .base import BaseLLMProvider
+from .rate_limiter import estimate_messages_tokens
+from .singleflight import LLM_SINGLEFLIGHT_ENABLED, get_singleflight
+from .tracing import add_failover_hop, annotate, get_llm_tracer
+from .context_window import LLM_CONTEXT_FIT_ENABLED, fit_messages
+from .config import get_model_max_output_tokens
+from .batch import (
+    LLM_BATCH_MAX_CONCURRENCY, BatchItemResult, BatchResult,
+    _usage_sink, record_batch_usage,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -27,10 +38,21 @@ class LLMClient:
     def __init__(self):
         self._provider: Optional[BaseLLMProvider] = None
         self._config: Optional[Dict] = None
+        self._config_version: int = -1
+        # 加权路由到非激活模型时使用的 Provider（按 model_id 缓存）
+        self._routed_providers: Dict[int, BaseLLMProvider] = {}
     
     def _get_config(self) -> Dict:
-        """获取模型配置"""
+        """获取模型配置（配置快照版本变化后自动重新获取）"""
+        from .config_cache import get_config_snapshot
+        
+        snapshot = get_config_snapshot()
+        if self._config is not None and self._config_version != snapshot.version:
+            self._config = None
+            self._provider = None
+            self._routed_providers.clear()
         if self._config is None:
+            self._config_version = snapshot.version
             try:
                 self._config = get_active_llm_config()
             except Exception as e:
@@ -38,18 +60,241 @@ class LLMClient:
                 raise
         return self._config
     
+    def _usage_model_info(self, route=None) -> Dict:
+        """当前实际调用的模型身份（用于 Token 统计归属）"""
+        if route is not None:
+            return {
+                'model_id': route.model_id,
+                'model_name': route.model_name,
+                'provider': route.provider,
+            }
+        if not self._config:
+            return {}
+        return {
+            'model_id': self._config.get('id'),
+            'model_name': self._config.get('model_name'),
+            'provider': self._config.get('provider'),
+        }
+    
+    def _response_cache_lookup_key(
+        self,
+        cache: bool,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        response_format: Optional[Dict[str, str]],
+    ):
+        """返回 (缓存实例, 缓存键)；未启用缓存时返回 (None, None)"""
+        if not cache:
+            return None, None
+        from .response_cache import get_response_cache, build_cache_key
+        
+        response_cache = get_response_cache()
+        if response_cache is None:
+            return None, None
+        config = self._get_config()
+        return response_cache, build_cache_key(
+            config.get('provider'), config.get('model_name'),
+            messages, temperature, max_tokens, response_format,
+        )
+    
+    def _cache_valid(
+        self,
+        content: str,
+        response_format: Optional[Dict[str, str]],
+        cache_validate: Optional[Callable[[str], bool]],
+    ) -> bool:
+        """
+        回答能否写入（或继续使用）响应缓存
+
+        调用方传入 cache_validate 时以它为准；否则 JSON 模式（response_format=json_object）
+        要求能被 parse_json_response 解析。校验函数抛出异常视为不通过。
+        """
+        try:
+            if cache_validate is not None:
+                return bool(cache_validate(content))
+            if (response_format or {}).get("type") == "json_object":
+                self.parse_json_response(content)
+            return True
+        except Exception:
+            return False
+    
+    def _cacheable(
+        self,
+        route,
+        response,
+        response_format: Optional[Dict[str, str]],
+        cache_validate: Optional[Callable[[str], bool]],
+    ) -> bool:
+        """只缓存激活模型的、未被 max_tokens 截断且通过校验的回答"""
+        if not self._is_active_route(route):
+            return False
+        if (response.finish_reason or "").lower() in ("length", "max_tokens"):
+            return False
+        if not self._cache_valid(response.content, response_format, cache_validate):
+            logger.info("[LLMClient] 回答未通过缓存校验，不写入响应缓存")
+            return False
+        return True
+    
     def _ensure_provider(self):
         """确保 Provider 已初始化"""
+        config = self._get_config()
         if self._provider is None:
-            config = self._get_config()
             self._provider = create_llm_provider(
                 provider=config['provider'],
                 model_name=config['model_name'],
                 api_key=config['api_key'],
                 base_url=config['base_url'],
                 temperature=config.get('temperature', 0.0),
-                max_tokens=config.get('max_tokens', 128000),
+                max_tokens=config.get('max_tokens') or get_model_max_output_tokens(
+                    config['provider'], config['model_name']
+                ),
+            )
+    
+    @staticmethod
+    def _get_switcher():
+        from .auto_switch import get_auto_switcher
+        return get_auto_switcher()
+    
+    def _provider_for(self, route) -> BaseLLMProvider:
+        """路由结果对应的 Provider（激活模型复用 self._provider）"""
+        if route is None or route.model_id == self._config.get('id'):
+            return self._provider
+        provider = self._routed_providers.get(route.model_id)
+        if provider is None:
+            provider = create_llm_provider(
+                provider=route.provider,
+                model_name=route.model_name,
+                api_key=route.api_key,
+                base_url=route.base_url,
+                temperature=self._config.get('temperature', 0.0),
+                max_tokens=get_model_max_output_tokens(route.provider, route.model_name),
+            )
+            self._routed_providers[route.model_id] = provider
+        return provider
+    
+    def _fit_context(self, route, messages: List[Dict[str, str]], max_tokens: Optional[int]) -> Dict[str, Any]:
+        """
+        按实际调用模型的上下文窗口适配请求（见 llm.context_window）
+        
+        Returns:
+            {"messages": ..., "max_tokens": ...}，可直接展开为 Provider 调用参数
+        """
+        if not LLM_CONTEXT_FIT_ENABLED:
+            return {"messages": messages, "max_tokens": max_tokens}
+        if route is not None:
+            provider, model_name = route.provider, route.model_name
+        else:
+            provider, model_name = self._config.get('provider'), self._config.get('model_name')
+        num_ctx = self._provider_for(route).config.num_ctx if provider == "ollama" else None
+        try:
+            fitted, safe_max_tokens, info = fit_messages(messages, provider, model_name, max_tokens, num_ctx)
+        except Exception as e:
+            logger.warning(f"[LLMClient] 上下文窗口适配失败，按原请求发送: {e}")
+            return {"messages": messages, "max_tokens": max_tokens}
+        annotate(
+            context_window=info["context_window"],
+            context_trimmed=info["dropped_messages"],
+        )
+        return {"messages": fitted, "max_tokens": safe_max_tokens}
+    
+    @staticmethod
+    def _record_usage(**kwargs):
+        """记录 Token 用量（全局统计 + 当前批量请求的用量汇总）"""
+        model_config_manager.increment_token_usage(**kwargs)
+        if kwargs.get('success', True):
+            annotate(
+                prompt_tokens=kwargs.get('prompt_tokens', 0),
+                completion_tokens=kwargs.get('completion_tokens', 0),
+                cached_tokens=kwargs.get('cached_tokens', 0),
+                model_id=kwargs.get('model_id'),
+                model_name=kwargs.get('model_name'),
+                provider=kwargs.get('provider'),
             )
+        record_batch_usage(
+            kwargs.get('prompt_tokens', 0),
+            kwargs.get('completion_tokens', 0),
+            kwargs.get('success', True),
+        )
+    
+    def _release_route(self, route, estimated_tokens: int, actual_tokens: Optional[int], refund: bool = False):
+        if route is not None:
+            self._get_switcher().release(route.model_id, estimated_tokens, actual_tokens, refund=refund)
+    
+    def _is_active_route(self, route) -> bool:
+        """路由结果是否就是激活模型（响应缓存按激活模型建键，只缓存激活模型的回答）"""
+        return route is None or route.model_id == self._config.get('id')
+    
+    async def _achat_routed(self, route, estimated_tokens: int, **call_kwargs) -> Tuple[Any, Any]:
+        """
+        在路由选中的模型上发起请求并记录延迟
+        
+        开启对冲（LLM_HEDGE_ENABLED）且该模型已有足够延迟样本时，
+        超过其 p95 仍未返回就向次优模型发送副本，取先成功返回的结果，另一个取消。
+        
+        Returns:
+            (LLMResponse, 实际返回结果的路由)；无论成败，路由额度都已释放
+        """
+        switcher = self._get_switcher()
+        started = time.monotonic()
+        delay = switcher.hedge_delay(route.model_id) if route is not None else None
+        
+        if delay is None:
+            try:
+                response = await self._provider_for(route).achat(**call_kwargs)
+            except Exception:
+                self._release_route(route, estimated_tokens, None)
+                raise
+            self._release_route(route, estimated_tokens, response.total_tokens)
+            if route is not None:
+                switcher.record_latency(route.model_id, time.monotonic() - started)
+            return response, route
+        
+        primary = asyncio.ensure_future(self._provider_for(route).achat(**call_kwargs))
+        tasks = {primary: route}
+        errors: Dict[Any, BaseException] = {}
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if not done:
+                hedge_route = await switcher.acquire(
+                    estimated_tokens, exclude={route.model_id}, max_wait=0
+                )
+                if hedge_route is not None:
+                    logger.info(
+                        f"[LLMClient] ⏱ 模型 ID={route.model_id} 超过 p95({delay:.1f}s)，"
+                        f"对冲请求发往 ID={hedge_route.model_id}"
+                    )
+                    hedge = asyncio.ensure_future(self._provider_for(hedge_route).achat(**call_kwargs))
+                    tasks[hedge] = hedge_route
+            
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        errors[task] = task.exception()
+                        continue
+                    winner = tasks[task]
+                    elapsed = time.monotonic() - started
+                    switcher.record_latency(winner.model_id, elapsed)
+                    if len(tasks) > 1:
+                        switcher.record_hedge(won=task is not primary)
+                        annotate(hedged=True, hedge_won=task is not primary)
+                        if task is not primary and not primary.done():
+                            # 原请求至少已耗时 elapsed，计入样本让 p95 反映慢模型
+                            switcher.record_latency(route.model_id, elapsed)
+                    return task.result(), winner
+            raise errors.get(primary) or next(iter(errors.values()))
+        finally:
+            for task, task_route in tasks.items():
+                if not task.done():
+                    task.cancel()
+                    actual = None
+                elif task.cancelled() or task.exception() is not None:
+                    actual = None
+                else:
+                    actual = task.result().total_tokens
+                self._release_route(task_route, estimated_tokens, actual)
     
     def chat(
         self,
@@ -59,35 +304,93 @@ class LLMClient:
         response_format: Optional[Dict[str, str]] = None,
         source: str = "chat",
         session_id: int = None,
+        cache: bool = False,
+        cache_ttl: Optional[int] = None,
+        cache_validate: Optional[Callable[[str], bool]] = None,
     ) -> str:
         """
         发送聊天请求（带自动切换和详细 Token 统计）
+        
+        cache=True 时按输入内容缓存响应（见 llm.response_cache），
+        适用于低温度、输入确定的调用。被截断或校验不通过的回答不会缓存：
+        JSON 模式默认要求能解析，其它格式由调用方传入 cache_validate（回答文本 → 是否可缓存）。
         """
+        with get_llm_tracer().span("llm.chat", messages, source=source, session_id=session_id):
+            return self._chat_traced(
+                messages, temperature, max_tokens, response_format,
+                source, session_id, cache, cache_ttl, cache_validate,
+            )
+    
+    def _chat_traced(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        response_format: Optional[Dict[str, str]],
+        source: str,
+        session_id: int,
+        cache: bool,
+        cache_ttl: Optional[int],
+        cache_validate: Optional[Callable[[str], bool]],
+    ) -> str:
+        """chat 的实际实现"""
         import time as _time
         self._ensure_provider()
         start_ms = int(_time.time() * 1000)
         
+        response_cache, cache_key = self._response_cache_lookup_key(
+            cache, messages, temperature, max_tokens, response_format
+        )
+        if response_cache is not None:
+            cached = response_cache.get(cache_key, source=source)
+            if cached is not None and not self._cache_valid(cached, response_format, cache_validate):
+                response_cache.delete(cache_key)
+                cached = None
+            if cached is not None:
+                logger.debug(f"[LLMClient] 命中响应缓存 (source={source})")
+                annotate(cache_hit=True)
+                return cached
+        
+        # 主动限流 + 加权路由：占用一个模型的 RPM/TPM 额度
+        estimated_tokens = estimate_messages_tokens(messages) + (max_tokens or 0)
+        queued = time.monotonic()
+        route = self._get_switcher().acquire_sync(estimated_tokens)
+        annotate(queue_ms=round((time.monotonic() - queued) * 1000, 1))
+        
         try:
-            response = self._provider.chat(
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                response_format=response_format
-            )
+            started = time.monotonic()
+            try:
+                response = self._provider_for(route).chat(
+                    **self._fit_context(route, messages, max_tokens),
+                    temperature=temperature,
+                    response_format=response_format
+                )
+            except Exception:
+                self._release_route(route, estimated_tokens, None)
+                raise
+            self._release_route(route, estimated_tokens, response.total_tokens)
+            if route is not None:
+                self._get_switcher().record_latency(route.model_id, time.monotonic() - started)
             
             duration_ms = int(_time.time() * 1000) - start_ms
 
             # 更新 token 使用量（增强版）
-            model_config_manager.increment_token_usage(
+            self._record_usage(
                 tokens=response.total_tokens,
                 prompt_tokens=response.prompt_tokens,
                 completion_tokens=response.completion_tokens,
+                cached_tokens=response.cached_tokens,
+                cache_creation_tokens=response.cache_creation_tokens,
                 source=source,
                 session_id=session_id,
                 success=True,
                 duration_ms=duration_ms,
+                **self._usage_model_info(route),
             )
             
+            if response_cache is not None and self._cacheable(route, response, response_format, cache_validate):
+                response_cache.set(cache_key, response.content, cache_ttl, source=source)
+            
             return response.content
             
         except Exception as e:
@@ -95,7 +398,7 @@ class LLMClient:
             logger.error(f"[LLMClient] 请求失败: {e}")
 
             # 记录失败的 token 使用
-            model_config_manager.increment_token_usage(
+            self._record_usage(
                 tokens=0,
                 prompt_tokens=0,
                 completion_tokens=0,
@@ -104,6 +407,7 @@ class LLMClient:
                 success=False,
                 error_type=str(type(e).__name__),
                 duration_ms=duration_ms,
+                **self._usage_model_info(route),
             )
 
             # 尝试自动切换
@@ -115,27 +419,60 @@ class LLMClient:
                     switcher.load_profiles_from_db()
                 if switcher.enabled and self._config and len(switcher._profiles) > 1:
                     reason = classify_failure_reason(e)
-                    current_id = self._config.get('id', 0)
+                    current_id = route.model_id if route else self._config.get('id', 0)
                     new_id = switcher.mark_failure(current_id, reason)
+                    retry_route = (
+                        switcher.acquire_sync(estimated_tokens, exclude={current_id})
+                        if switcher.load_balancing else None
+                    )
+                    if retry_route is not None:
+                        logger.info(f"[LLMClient] 🔄 加权路由重试: ID={current_id} → ID={retry_route.model_id}")
+                        add_failover_hop(current_id, retry_route.model_id, reason.value)
+                        try:
+                            response = self._provider_for(retry_route).chat(
+                                **self._fit_context(retry_route, messages, max_tokens),
+                                temperature=temperature,
+                                response_format=response_format
+                            )
+                        except Exception:
+                            self._release_route(retry_route, estimated_tokens, None)
+                            raise
+                        self._release_route(retry_route, estimated_tokens, response.total_tokens)
+                        self._record_usage(
+                            tokens=response.total_tokens,
+                            prompt_tokens=response.prompt_tokens,
+                            completion_tokens=response.completion_tokens,
+                            cached_tokens=response.cached_tokens,
+                            cache_creation_tokens=response.cache_creation_tokens,
+                            source=source,
+                            session_id=session_id,
+                            success=True,
+                            duration_ms=int(_time.time() * 1000) - start_ms,
+                            **self._usage_model_info(retry_route),
+                        )
+                        return response.content
                     if new_id and new_id != current_id:
                         logger.info(f"[LLMClient] 🔄 自动切换: ID={current_id} → ID={new_id}，重试请求")
+                        add_failover_hop(current_id, new_id, reason.value)
                         self.refresh()
                         self._ensure_provider()
                         response = self._provider.chat(
-                            messages=messages,
+                            **self._fit_context(None, messages, max_tokens),
                             temperature=temperature,
-                            max_tokens=max_tokens,
                             response_format=response_format
                         )
                         retry_duration = int(_time.time() * 1000) - start_ms
-                        model_config_manager.increment_token_usage(
+                        self._record_usage(
                             tokens=response.total_tokens,
                             prompt_tokens=response.prompt_tokens,
                             completion_tokens=response.completion_tokens,
+                            cached_tokens=response.cached_tokens,
+                            cache_creation_tokens=response.cache_creation_tokens,
                             source=source,
                             session_id=session_id,
                             success=True,
                             duration_ms=retry_duration,
+                            **self._usage_model_info(),
                         )
                         return response.content
                     else:
@@ -153,43 +490,145 @@ class LLMClient:
         response_format: Optional[Dict[str, str]] = None,
         source: str = "chat",
         session_id: int = None,
+        cache: bool = False,
+        cache_ttl: Optional[int] = None,
+        cache_validate: Optional[Callable[[str], bool]] = None,
+        coalesce: bool = True,
     ) -> str:
-        """异步聊天请求（带自动切换和详细 Token 统计）"""
+        """
+        异步聊天请求（带自动切换和详细 Token 统计，cache=True 时启用响应缓存，缓存校验同 chat）
+        
+        coalesce=True 时，路由到同一模型、且消息与采样参数完全一致的在途请求
+        共享同一次上游调用的结果（见 llm.singleflight）。
+        """
+        with get_llm_tracer().span("llm.achat", messages, source=source, session_id=session_id):
+            return await self._achat_traced(
+                messages, temperature, max_tokens, response_format,
+                source, session_id, cache, cache_ttl, cache_validate,
+                coalesce and LLM_SINGLEFLIGHT_ENABLED,
+            )
+    
+    async def _achat_traced(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        response_format: Optional[Dict[str, str]],
+        source: str,
+        session_id: int,
+        cache: bool,
+        cache_ttl: Optional[int],
+        cache_validate: Optional[Callable[[str], bool]],
+        coalesce: bool,
+    ) -> str:
+        """achat 的实际实现：查缓存 → 路由占用额度 → （合并后）发起请求"""
         import time as _time
         self._ensure_provider()
         start_ms = int(_time.time() * 1000)
         
+        response_cache, cache_key = self._response_cache_lookup_key(
+            cache, messages, temperature, max_tokens, response_format
+        )
+        if response_cache is not None:
+            cached = await response_cache.aget(cache_key, source=source)
+            if cached is not None and not self._cache_valid(cached, response_format, cache_validate):
+                await response_cache.adelete(cache_key)
+                cached = None
+            if cached is not None:
+                logger.debug(f"[LLMClient] 命中响应缓存 (source={source})")
+                annotate(cache_hit=True)
+                return cached
+        
+        # 主动限流 + 加权路由：占用一个模型的 RPM/TPM 额度
+        estimated_tokens = estimate_messages_tokens(messages) + (max_tokens or 0)
+        queued = time.monotonic()
+        route = await self._get_switcher().acquire(estimated_tokens)
+        annotate(queue_ms=round((time.monotonic() - queued) * 1000, 1))
+        
+        call = lambda: self._achat_on_route(
+            route, estimated_tokens, start_ms, messages, temperature, max_tokens,
+            response_format, source, session_id, response_cache, cache_key, cache_ttl, cache_validate,
+        )
+        if not coalesce:
+            return await call()
+        
+        # 合并键按路由选中的模型构建：发往不同模型的相同请求不共享结果
+        from .response_cache import build_cache_key
+        model = self._usage_model_info(route)
+        key = build_cache_key(
+            model.get('provider'), model.get('model_name'),
+            messages, temperature, max_tokens, response_format,
+        )
+        led = False
+        
+        def lead():
+            nonlocal led
+            led = True
+            return call()
+        
         try:
-            response = await self._provider.achat(
-                messages=messages,
+            return await get_singleflight().do(("chat", model.get('model_id'), key), lead, source=source)
+        finally:
+            if not led:
+                # 复用了在途请求的结果，本次占用的额度原样退回
+                self._release_route(route, estimated_tokens, None, refund=True)
+    
+    async def _achat_on_route(
+        self,
+        route,
+        estimated_tokens: int,
+        start_ms: int,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        response_format: Optional[Dict[str, str]],
+        source: str,
+        session_id: int,
+        response_cache,
+        cache_key,
+        cache_ttl: Optional[int],
+        cache_validate: Optional[Callable[[str], bool]],
+    ) -> str:
+        """在已占用额度的路由上发起请求（失败时按自动切换策略重试）"""
+        import time as _time
+        try:
+            response, route = await self._achat_routed(
+                route, estimated_tokens,
+                **self._fit_context(route, messages, max_tokens),
                 temperature=temperature,
-                max_tokens=max_tokens,
                 response_format=response_format
             )
             
             duration_ms = int(_time.time() * 1000) - start_ms
 
-            model_config_manager.increment_token_usage(
+            self._record_usage(
                 tokens=response.total_tokens,
                 prompt_tokens=response.prompt_tokens,
                 completion_tokens=response.completion_tokens,
+                cached_tokens=response.cached_tokens,
+                cache_creation_tokens=response.cache_creation_tokens,
                 source=source,
                 session_id=session_id,
                 success=True,
                 duration_ms=duration_ms,
+                **self._usage_model_info(route),
             )
             
+            if response_cache is not None and self._cacheable(route, response, response_format, cache_validate):
+                await response_cache.aset(cache_key, response.content, cache_ttl, source=source)
+            
             return response.content
             
         except Exception as e:
             duration_ms = int(_time.time() * 1000) - start_ms
             logger.error(f"[LLMClient] 异步请求失败: {e}")
 
-            model_config_manager.increment_token_usage(
+            self._record_usage(
                 tokens=0, prompt_tokens=0, completion_tokens=0,
                 source=source, session_id=session_id,
                 success=False, error_type=str(type(e).__name__),
                 duration_ms=duration_ms,
+                **self._usage_model_info(route),
             )
 
             # 尝试自动切换
@@ -201,25 +640,56 @@ class LLMClient:
                     switcher.load_profiles_from_db()
                 if switcher.enabled and self._config and len(switcher._profiles) > 1:
                     reason = classify_failure_reason(e)
-                    current_id = self._config.get('id', 0)
+                    current_id = route.model_id if route else self._config.get('id', 0)
                     new_id = switcher.mark_failure(current_id, reason)
+                    retry_route = (
+                        await switcher.acquire(estimated_tokens, exclude={current_id})
+                        if switcher.load_balancing else None
+                    )
+                    if retry_route is not None:
+                        logger.info(f"[LLMClient] 🔄 加权路由重试: ID={current_id} → ID={retry_route.model_id}")
+                        add_failover_hop(current_id, retry_route.model_id, reason.value)
+                        try:
+                            response = await self._provider_for(retry_route).achat(
+                                **self._fit_context(retry_route, messages, max_tokens),
+                                temperature=temperature,
+                                response_format=response_format
+                            )
+                        except Exception:
+                            self._release_route(retry_route, estimated_tokens, None)
+                            raise
+                        self._release_route(retry_route, estimated_tokens, response.total_tokens)
+                        self._record_usage(
+                            tokens=response.total_tokens,
+                            prompt_tokens=response.prompt_tokens,
+                            completion_tokens=response.completion_tokens,
+                            cached_tokens=response.cached_tokens,
+                            cache_creation_tokens=response.cache_creation_tokens,
+                            source=source, session_id=session_id,
+                            success=True, duration_ms=int(_time.time() * 1000) - start_ms,
+                            **self._usage_model_info(retry_route),
+                        )
+                        return response.content
                     if new_id and new_id != current_id:
                         logger.info(f"[LLMClient] 🔄 自动切换: ID={current_id} → ID={new_id}，重试异步请求")
+                        add_failover_hop(current_id, new_id, reason.value)
                         self.refresh()
                         self._ensure_provider()
                         response = await self._provider.achat(
-                            messages=messages,
+                            **self._fit_context(None, messages, max_tokens),
                             temperature=temperature,
-                            max_tokens=max_tokens,
                             response_format=response_format
                         )
                         retry_duration = int(_time.time() * 1000) - start_ms
-                        model_config_manager.increment_token_usage(
+                        self._record_usage(
                             tokens=response.total_tokens,
                             prompt_tokens=response.prompt_tokens,
                             completion_tokens=response.completion_tokens,
+                            cached_tokens=response.cached_tokens,
+                            cache_creation_tokens=response.cache_creation_tokens,
                             source=source, session_id=session_id,
                             success=True, duration_ms=retry_duration,
+                            **self._usage_model_info(),
                         )
                         return response.content
                     else:
@@ -229,6 +699,153 @@ class LLMClient:
 
             raise
     
+    async def achat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 4000,
+        response_format: Optional[Dict[str, str]] = None,
+        source: str = "chat",
+        session_id: int = None,
+    ) -> AsyncIterator[str]:
+        """
+        异步流式聊天，逐段产出文本增量（带 Token 统计）
+        
+        与 achat 一样先经加权路由占用模型的 RPM/TPM 额度、按该模型的上下文窗口适配请求，
+        流结束（或中途关闭）后按实际用量结算额度。
+        流式请求中途失败无法透明重试，这里不做自动切换，只记录失败并向上抛出；
+        调用方可回退到 achat。
+        """
+        import time as _time
+        self._ensure_provider()
+        start_ms = int(_time.time() * 1000)
+        usage = {"prompt": 0, "completion": 0}
+        
+        def _on_usage(prompt_tokens: int, completion_tokens: int):
+            usage["prompt"], usage["completion"] = prompt_tokens, completion_tokens
+        
+        extra = {"response_format": response_format} if response_format else {}
+        # 异步生成器可能在其它上下文中被关闭，Span 不放入 contextvar，直接填写字段
+        with get_llm_tracer().span(
+            "llm.stream", messages, source=source, session_id=session_id, activate=False
+        ) as span:
+            estimated_tokens = estimate_messages_tokens(messages) + (max_tokens or 0)
+            queued = time.monotonic()
+            route = await self._get_switcher().acquire(estimated_tokens)
+            if span is not None:
+                span.queue_ms = round((time.monotonic() - queued) * 1000, 1)
+            fitted = self._fit_context(route, messages, max_tokens)
+            
+            started = time.monotonic()
+            first_token_at = None
+            try:
+                async for delta in self._provider_for(route).achat_stream(
+                    fitted["messages"],
+                    temperature=temperature,
+                    max_tokens=fitted["max_tokens"],
+                    usage_callback=_on_usage,
+                    **extra,
+                ):
+                    if first_token_at is None and delta:
+                        first_token_at = time.monotonic()
+                        if span is not None:
+                            span.ttft_ms = round((first_token_at - started) * 1000, 1)
+                    yield delta
+            except Exception as e:
+                self._record_usage(
+                    tokens=0, prompt_tokens=0, completion_tokens=0,
+                    source=source, session_id=session_id,
+                    success=False, error_type=str(type(e).__name__),
+                    duration_ms=int(_time.time() * 1000) - start_ms,
+                    **self._usage_model_info(route),
+                )
+                raise
+            finally:
+                # 中途关闭的流按已产生的用量结算；Provider 未回报用量时按预估值计
+                self._release_route(route, estimated_tokens, (usage["prompt"] + usage["completion"]) or None)
+            
+            model_info = self._usage_model_info(route)
+            self._record_usage(
+                prompt_tokens=usage["prompt"],
+                completion_tokens=usage["completion"],
+                source=source, session_id=session_id,
+                success=True, duration_ms=int(_time.time() * 1000) - start_ms,
+                **model_info,
+            )
+            if span is not None:
+                span.prompt_tokens = usage["prompt"]
+                span.completion_tokens = usage["completion"]
+                span.model_id = model_info.get('model_id')
+                span.model_name = model_info.get('model_name')
+                span.provider = model_info.get('provider')
+            if route is not None:
+                self._get_switcher().record_latency(
+                    route.model_id,
+                    time.monotonic() - started,
+                    ttft=(first_token_at - started) if first_token_at is not None else None,
+                )
+    
+    async def achat_many(
+        self,
+        requests: List[Any],
+        max_concurrency: Optional[int] = None,
+        source: Optional[str] = None,
+    ) -> BatchResult:
+        """
+        并发执行一组互不依赖的 LLM 请求
+        
+        Args:
+            requests: 每项为 achat 的关键字参数 dict（messages、temperature、source 等），
+                或无参异步函数（需要流式解析等自定义调用时使用，内部的 LLMClient 调用同样计入用量）
+            max_concurrency: 并发上限；为空时按模型 RPM 限额和延迟估算，不超过 LLM_BATCH_MAX_CONCURRENCY
+            source: 为 dict 请求补充默认的 source
+        
+        Returns:
+            BatchResult，items 与 requests 顺序一致；单条失败记录在 item.error 中，不会抛出
+        """
+        if not requests:
+            return BatchResult(items=[])
+        if max_concurrency is None:
+            try:
+                max_concurrency = self._get_switcher().concurrency_hint(LLM_BATCH_MAX_CONCURRENCY)
+            except Exception as e:
+                logger.warning(f"[LLMClient] 估算批量并发数失败，使用默认值: {e}")
+                max_concurrency = LLM_BATCH_MAX_CONCURRENCY
+        max_concurrency = max(1, min(max_concurrency, len(requests)))
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def _run(index: int, request: Any) -> BatchItemResult:
+            item = BatchItemResult(index=index)
+            async with semaphore:
+                # 每条请求在独立的 Task 中运行，contextvar 设置互不影响
+                _usage_sink.set(item.usage)
+                started = time.monotonic()
+                try:
+                    if callable(request):
+                        item.result = await request()
+                    else:
+                        kwargs = dict(request)
+                        if source and 'source' not in kwargs:
+                            kwargs['source'] = source
+                        item.result = await self.achat(**kwargs)
+                except Exception as e:
+                    item.error = e
+                    logger.warning(f"[LLMClient] 批量请求第 {index} 条失败: {e}")
+                item.duration_ms = int((time.monotonic() - started) * 1000)
+            return item
+        
+        started = time.monotonic()
+        items = await asyncio.gather(*(
+            asyncio.ensure_future(_run(i, req)) for i, req in enumerate(requests)
+        ))
+        result = BatchResult(
+            items=list(items),
+            duration_ms=int((time.monotonic() - started) * 1000),
+            max_concurrency=max_concurrency,
+        )
+        logger.info(f"[LLMClient] 批量请求完成: {result.summary()}")
+        return result
+    
     def generate_test_cases(
         self,
         requirement: str,
@@ -398,17 +1015,7 @@ class LLMClient:
                 "content": ""
             }
     
-    def analyze_bug(self, analysis_prompt: str) -> Dict[str, Any]:
-        """
-        分析 Bug
-        
-        Args:
-            analysis_prompt: Bug 分析提示
-        
-        Returns:
-            Bug 分析结果
-        """
-        system_prompt = """你是一个专业的 Bug 分析专家。
+    _BUG_ANALYSIS_SYSTEM_PROMPT = """你是一个专业的 Bug 分析专家。
 请分析测试失败的原因，并返回结构化的 Bug 报告。
 
 返回 JSON 格式:
@@ -418,9 +1025,47 @@ class LLMClient:
     "actual_result": "实际结果描述",
     "result_feedback": "问题分析和建议"
 }"""
+    
+    @staticmethod
+    def _parse_bug_analysis(response: str) -> Dict[str, Any]:
+        """解析 Bug 分析响应（JSON 格式异常时返回兜底结果）"""
+        # 清理 markdown 代码块
+        cleaned_response = response.strip()
+        if cleaned_response.startswith('```json'):
+            cleaned_response = cleaned_response[7:]
+        if cleaned_response.startswith('```'):
+            cleaned_response = cleaned_response[3:]
+        if cleaned_response.endswith('```'):
+            cleaned_response = cleaned_response[:-3]
+        cleaned_response = cleaned_response.strip()
         
+        try:
+            bug_data = json.loads(cleaned_response)
+        except json.JSONDecodeError as e:
+            logger.warning(f"[LLMClient] JSON 解析失败: {e}")
+            bug_data = {
+                "error_type": "系统错误",
+                "severity_level": "一级",
+                "actual_result": response or "响应格式异常",
+                "result_feedback": "LLM 返回格式异常，无法解析"
+            }
+        return {
+            "success": True,
+            "data": bug_data
+        }
+    
+    def analyze_bug(self, analysis_prompt: str) -> Dict[str, Any]:
+        """
+        分析 Bug
+        
+        Args:
+            analysis_prompt: Bug 分析提示
+        
+        Returns:
+            Bug 分析结果
+        """
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": self._BUG_ANALYSIS_SYSTEM_PROMPT},
             {"role": "user", "content": analysis_prompt}
         ]
         
@@ -430,35 +1075,28 @@ class LLMClient:
                 temperature=0.1,
                 max_tokens=2000
             )
-            
-            # 清理 markdown 代码块
-            cleaned_response = response.strip()
-            if cleaned_response.startswith('```json'):
-                cleaned_response = cleaned_response[7:]
-            if cleaned_response.startswith('```'):
-                cleaned_response = cleaned_response[3:]
-            if cleaned_response.endswith('```'):
-                cleaned_response = cleaned_response[:-3]
-            cleaned_response = cleaned_response.strip()
-            
-            bug_data = json.loads(cleaned_response)
-            
-            return {
-                "success": True,
-                "data": bug_data
-            }
-            
-        except json.JSONDecodeError as e:
-            logger.warning(f"[LLMClient] JSON 解析失败: {e}")
+            return self._parse_bug_analysis(response)
+        except Exception as e:
             return {
-                "success": True,
-                "data": {
-                    "error_type": "系统错误",
-                    "severity_level": "一级",
-                    "actual_result": response if 'response' in dir() else "响应格式异常",
-                    "result_feedback": "LLM 返回格式异常，无法解析"
-                }
+                "success": False,
+                "message": str(e),
+                "data": {}
             }
+    
+    async def aanalyze_bug(self, analysis_prompt: str) -> Dict[str, Any]:
+        """分析 Bug（异步版本，返回格式同 analyze_bug）"""
+        messages = [
+            {"role": "system", "content": self._BUG_ANALYSIS_SYSTEM_PROMPT},
+            {"role": "user", "content": analysis_prompt}
+        ]
+        
+        try:
+            response = await self.achat(
+                messages=messages,
+                temperature=0.1,
+                max_tokens=2000
+            )
+            return self._parse_bug_analysis(response)
         except Exception as e:
             return {
                 "success": False,
@@ -470,6 +1108,7 @@ class LLMClient:
         """刷新配置和 Provider"""
         self._config = None
         self._provider = None
+        self._routed_providers.clear()
         model_config_manager.refresh_config()
 
     def parse_json_response(self, content: str) -> dict:
@@ -6,7 +6,7 @@ LLM 模块配置
 作者: 程序员Eighteen
 版本: 1.0
 """
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 
 # Provider 显示名称映射（与数据库 model_providers 表对应）
@@ -294,6 +294,155 @@ PROVIDER_FEATURES: Dict[str, Dict[str, bool]] = {
 }
 
 
+# 模型上下文窗口与最大输出 Token: 模型名前缀 → (上下文窗口, 最大输出)
+# 按前缀匹配（不区分大小写，去掉 "openai/" 这类路由前缀），前缀之后必须是名称结尾或 - : @ _ 分隔符，
+# 多个前缀都匹配时取最长的：gpt-4o-mini-2024-07-18 → gpt-4o-mini；gpt-4.1 不会匹配 gpt-4
+MODEL_CONTEXT_WINDOWS: Dict[str, Tuple[int, int]] = {
+    # OpenAI
+    "gpt-5": (400000, 128000),
+    "gpt-4.1": (1047576, 32768),
+    "gpt-4o-mini": (128000, 16384),
+    "gpt-4o": (128000, 16384),
+    "chatgpt-4o": (128000, 16384),
+    "gpt-4-turbo": (128000, 4096),
+    "gpt-4-32k": (32768, 4096),
+    "gpt-4": (8192, 4096),
+    "gpt-3.5-turbo": (16385, 4096),
+    "o1-preview": (128000, 32768),
+    "o1-mini": (128000, 65536),
+    "o1": (200000, 100000),
+    "o3-mini": (200000, 100000),
+    "o3": (200000, 100000),
+    "o4-mini": (200000, 100000),
+    # Anthropic
+    "claude-opus-4-5": (200000, 64000),
+    "claude-opus-4": (200000, 32000),
+    "claude-sonnet-4": (200000, 64000),
+    "claude-haiku-4": (200000, 64000),
+    "claude-3-7-sonnet": (200000, 64000),
+    "claude-3-5-sonnet": (200000, 8192),
+    "claude-3-5-haiku": (200000, 8192),
+    "claude-3": (200000, 4096),
+    # DeepSeek
+    "deepseek-chat": (131072, 8192),
+    "deepseek-coder": (65536, 8192),
+    "deepseek-reasoner": (131072, 65536),
+    "deepseek-r1": (65536, 16384),
+    "deepseek-v3": (65536, 8192),
+    # Google
+    "gemini-1.5-pro": (2097152, 8192),
+    "gemini-1.5-flash": (1048576, 8192),
+    "gemini-2.0-flash": (1048576, 8192),
+    "gemini-2.5": (1048576, 65536),
+    # 阿里云 / Qwen
+    "qwen-long": (1000000, 8192),
+    "qwen-turbo": (1000000, 8192),
+    "qwen-plus": (131072, 8192),
+    "qwen-max": (32768, 8192),
+    "qwen-vl": (32768, 2048),
+    "qwen2.5": (131072, 8192),
+    # Qwen3 各型号窗口差异很大（开源 32k / 131k，商业版 256k / 1M），只登记确定的型号，其余不做适配
+    "qwen3-max": (262144, 65536),
+    "qwen3-coder-plus": (1048576, 65536),
+    # Moonshot（输出与输入共用窗口）
+    "moonshot-v1-8k": (8192, 4096),
+    "moonshot-v1-32k": (32768, 8192),
+    "moonshot-v1-128k": (131072, 8192),
+    # Mistral
+    "codestral": (256000, 8192),
+    "mistral-large": (131072, 8192),
+    "mistral-medium": (131072, 8192),
+    "mistral-small": (32768, 8192),
+    "pixtral-large": (131072, 8192),
+    "ministral": (131072, 8192),
+    # Grok
+    "grok-2-vision": (32768, 8192),
+    "grok-2": (131072, 8192),
+    "grok-3": (131072, 8192),
+    # 智谱
+    "glm-4v": (8192, 1024),
+    "glm-4-airx": (8192, 4096),
+    "glm-4": (128000, 4096),
+    # 百川
+    "baichuan3-turbo-128k": (128000, 2048),
+    "baichuan3": (32768, 2048),
+    # MiniMax
+    "abab6.5s": (245760, 8192),
+    "abab6.5": (8192, 4096),
+    "abab5.5s": (8192, 4096),
+    "abab5.5": (16384, 4096),
+    # Llama
+    "llama3.1": (131072, 4096),
+    "llama-3.1": (131072, 4096),
+    "llama-3.3": (131072, 4096),
+    "llama-3": (8192, 4096),
+    "llama-4": (131072, 4096),
+}
+
+# 未登记模型按 Provider 取默认值（只用于调用方未指定 max_tokens 时的默认输出上限和展示，不用于裁剪请求）
+PROVIDER_DEFAULT_CONTEXT_WINDOWS: Dict[str, Tuple[int, int]] = {
+    "openai": (128000, 4096),
+    "anthropic": (200000, 4096),
+    "google": (1048576, 8192),
+    "deepseek": (65536, 8192),
+    "alibaba": (131072, 8192),
+    "moonshot": (32768, 4096),
+    "zhipu": (128000, 4096),
+    # Ollama 实际窗口取决于 num_ctx，默认值较小
+    "ollama": (8192, 4096),
+}
+
+DEFAULT_CONTEXT_WINDOW: Tuple[int, int] = (32768, 4096)
+
+_CONTEXT_WINDOW_PATTERNS = sorted(MODEL_CONTEXT_WINDOWS.items(), key=lambda item: len(item[0]), reverse=True)
+# 前缀之后允许出现的分隔符（"." 和字母数字都不算，避免 gpt-4 匹配 gpt-4.1 / gpt-4o）
+_MODEL_NAME_SEPARATORS = "-:@_ "
+
+
+def _normalize_model_name(model_name: str) -> str:
+    """小写并去掉路由前缀：openai/gpt-4.1 → gpt-4.1，models/gemini-2.5-pro → gemini-2.5-pro"""
+    return (model_name or "").strip().lower().rsplit("/", 1)[-1]
+
+
+def lookup_model_context_limits(
+    provider: str,
+    model_name: str,
+    num_ctx: Optional[int] = None,
+) -> Optional[Tuple[int, int]]:
+    """
+    查找已登记模型的 (上下文窗口, 最大输出 Token)；未登记的模型返回 None
+
+    Ollama 的窗口就是请求里发送的 num_ctx（LLMConfig.num_ctx），不看模型名；
+    未传 num_ctx 时无法确定窗口，返回 None。
+    """
+    if provider == "ollama":
+        if not num_ctx:
+            return None
+        return num_ctx, min(num_ctx, PROVIDER_DEFAULT_CONTEXT_WINDOWS["ollama"][1])
+    name = _normalize_model_name(model_name)
+    for pattern, limits in _CONTEXT_WINDOW_PATTERNS:
+        if name.startswith(pattern) and (len(name) == len(pattern) or name[len(pattern)] in _MODEL_NAME_SEPARATORS):
+            return limits
+    return None
+
+
+def get_model_context_limits(provider: str, model_name: str) -> Tuple[int, int]:
+    """
+    获取模型的 (上下文窗口, 最大输出 Token)，未登记的模型按 Provider 默认值
+
+    默认值只是估计，需要确定上限的场景（裁剪请求）用 lookup_model_context_limits()。
+    """
+    return (
+        lookup_model_context_limits(provider, model_name)
+        or PROVIDER_DEFAULT_CONTEXT_WINDOWS.get(provider, DEFAULT_CONTEXT_WINDOW)
+    )
+
+
+def get_model_max_output_tokens(provider: str, model_name: str) -> int:
+    """获取模型的最大输出 Token（Provider 默认 max_tokens 用）"""
+    return get_model_context_limits(provider, model_name)[1]
+
+
 def get_provider_display_name(provider: str) -> str:
     """获取 Provider 显示名称"""
     return PROVIDER_DISPLAY_NAMES.get(provider, provider.upper())
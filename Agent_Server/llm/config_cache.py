@@ -0,0 +1,252 @@
+"""
+模型配置快照缓存模块
+
+进程内缓存 llm_models 表的快照（激活模型 + 全部自动切换档案），
+通过版本号失效：
+- 模型管理接口激活 / 新增 / 更新 / 删除模型时调用 invalidate_model_config()
+- 自动切换 _do_switch 同步数据库后刷新
+- 可选 Redis pub/sub 广播失效消息，多个 uvicorn worker 保持一致
+- 另有 TTL 兜底：到期后重新加载，数据有变化时版本号同样 +1，
+  未开启 pub/sub 或 Redis 不可用时其他 worker 也能在一个 TTL 内看到变更
+
+作者: 程序员Eighteen
+版本: 1.0
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from .config import get_model_context_limits, get_model_max_output_tokens
+
+logger = logging.getLogger(__name__)
+
+# 配置
+MODEL_CONFIG_CACHE_TTL = float(os.getenv("MODEL_CONFIG_CACHE_TTL", "60"))
+MODEL_CONFIG_PUBSUB_ENABLED = os.getenv("MODEL_CONFIG_PUBSUB_ENABLED", "false").lower() in ("1", "true", "yes")
+MODEL_CONFIG_PUBSUB_CHANNEL = os.getenv("MODEL_CONFIG_PUBSUB_CHANNEL", "llm:model_config:invalidate")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/2")
+
+# 快照中保留的 LLMModel 字段
+_MODEL_FIELDS = (
+    "id", "model_name", "api_key", "base_url", "provider", "is_active",
+    "priority", "utilization", "auto_switch_enabled", "status",
+    "rpm_limit", "tpm_limit",
+)
+
+
+def model_row_to_dict(model) -> Dict[str, Any]:
+    """LLMModel ORM 对象转为快照字典"""
+    return {name: getattr(model, name, None) for name in _MODEL_FIELDS}
+
+
+def build_active_config(row: Dict[str, Any]) -> Dict[str, Any]:
+    """由模型行构建 ModelConfigManager 使用的激活配置"""
+    return {
+        'id': row['id'],
+        'model_name': row['model_name'],
+        'api_key': row['api_key'],
+        'base_url': row.get('base_url') or '',
+        'provider': row.get('provider') or 'openai',
+        'temperature': 0.0,
+        'max_tokens': get_model_max_output_tokens(row.get('provider') or 'openai', row['model_name']),
+        'context_window': get_model_context_limits(row.get('provider') or 'openai', row['model_name'])[0],
+    }
+
+
+class ModelConfigSnapshot:
+    """
+    llm_models 表的进程级快照
+
+    读路径只比较版本号和时间戳；版本变化或 TTL 到期后才访问数据库，
+    且一次查询同时得到激活模型和全部档案。
+    读取 version 本身也会触发 TTL 检查，只比较版本号的使用方同样能感知 TTL 重载带来的变更。
+    """
+
+    def __init__(self, ttl: float = MODEL_CONFIG_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._version = 0
+        self._loaded_version = -1
+        self._loaded_at = 0.0
+        self._models: List[Dict[str, Any]] = []
+        self._active: Optional[Dict[str, Any]] = None
+
+        self._instance_id = uuid.uuid4().hex
+        self._pubsub_thread: Optional[threading.Thread] = None
+        self._redis = None
+        self._redis_failed = False
+
+        self._stats = {"hits": 0, "loads": 0, "invalidations": 0, "remote_invalidations": 0, "ttl_changes": 0}
+
+    @property
+    def version(self) -> int:
+        """快照版本号（先按 TTL 检查是否需要重载，数据变化时版本号 +1）"""
+        self._ensure_fresh()
+        return self._version
+
+    def _is_stale(self) -> bool:
+        if self._loaded_version != self._version:
+            return True
+        return self.ttl > 0 and (time.time() - self._loaded_at) > self.ttl
+
+    def _load(self):
+        """从数据库加载全部模型（调用方持有锁）"""
+        from database.connection import SessionLocal, LLMModel
+
+        version = self._version
+        db = SessionLocal()
+        try:
+            rows = db.query(LLMModel).order_by(LLMModel.priority).all()
+            models = [model_row_to_dict(m) for m in rows]
+        finally:
+            db.close()
+
+        if self._loaded_version == version and models != self._models:
+            # TTL 重载发现数据已变（其他 worker 改了配置且没有收到广播）
+            self._version += 1
+            version = self._version
+            self._stats["ttl_changes"] += 1
+            logger.info(f"[ModelConfigCache] TTL 重载发现模型配置变化，快照升级为 v{version}")
+
+        self._models = models
+        self._active = next((m for m in models if m.get("is_active") == 1), None)
+        self._loaded_version = version
+        self._loaded_at = time.time()
+        self._stats["loads"] += 1
+        logger.debug(
+            f"[ModelConfigCache] 已加载快照 v{version}: {len(models)} 个模型, "
+            f"激活={self._active['id'] if self._active else None}"
+        )
+
+    def _ensure_fresh(self):
+        self._ensure_pubsub()
+        if not self._is_stale():
+            self._stats["hits"] += 1
+            return
+        with self._lock:
+            if not self._is_stale():
+                return
+            try:
+                self._load()
+            except Exception as e:
+                if self._loaded_version != self._version:
+                    raise
+                # 仅 TTL 到期时数据库出错：沿用旧快照，下一个 TTL 再试
+                self._loaded_at = time.time()
+                logger.warning(f"[ModelConfigCache] TTL 重载失败，沿用 v{self._version} 快照: {e}")
+
+    def get_active(self) -> Optional[Dict[str, Any]]:
+        """当前激活模型的行数据（无激活模型时返回 None）"""
+        self._ensure_fresh()
+        return dict(self._active) if self._active else None
+
+    def get_models(self) -> List[Dict[str, Any]]:
+        """全部模型的行数据（按 priority 排序）"""
+        self._ensure_fresh()
+        return [dict(m) for m in self._models]
+
+    def invalidate(self, reason: str = "", publish: bool = True):
+        """
+        使快照失效（版本号 +1）
+
+        Args:
+            reason: 失效原因（日志用）
+            publish: 是否通过 Redis 广播给其他 worker
+        """
+        with self._lock:
+            self._version += 1
+            self._stats["invalidations"] += 1
+        logger.info(f"[ModelConfigCache] 快照失效 v{self._version} ({reason or '-'})")
+        if publish:
+            self._publish(reason)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "version": self._version,
+            "loaded_version": self._loaded_version,
+            "models": len(self._models),
+            "pubsub": self._pubsub_thread is not None and self._pubsub_thread.is_alive(),
+        }
+
+    # ── Redis pub/sub ─────────────────────────────────────
+
+    def _get_redis(self):
+        if not MODEL_CONFIG_PUBSUB_ENABLED or self._redis_failed:
+            return None
+        if self._redis is not None:
+            return self._redis
+        try:
+            import redis
+
+            self._redis = redis.from_url(REDIS_URL, decode_responses=True)
+            self._redis.ping()
+            return self._redis
+        except Exception as e:
+            logger.warning(f"[ModelConfigCache] Redis 不可用，仅使用进程内失效: {e}")
+            self._redis = None
+            self._redis_failed = True
+            return None
+
+    def _publish(self, reason: str):
+        client = self._get_redis()
+        if client is None:
+            return
+        try:
+            client.publish(
+                MODEL_CONFIG_PUBSUB_CHANNEL,
+                json.dumps({"source": self._instance_id, "reason": reason}, ensure_ascii=False),
+            )
+        except Exception as e:
+            logger.warning(f"[ModelConfigCache] 广播失效消息失败: {e}")
+
+    def _ensure_pubsub(self):
+        """首次读取时启动订阅线程"""
+        if self._pubsub_thread is not None or self._get_redis() is None:
+            return
+        with self._lock:
+            if self._pubsub_thread is not None:
+                return
+            self._pubsub_thread = threading.Thread(
+                target=self._listen, name="model-config-pubsub", daemon=True
+            )
+            self._pubsub_thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(MODEL_CONFIG_PUBSUB_CHANNEL)
+                for message in pubsub.listen():
+                    try:
+                        data = json.loads(message.get("data") or "{}")
+                    except (TypeError, ValueError):
+                        data = {}
+                    if data.get("source") == self._instance_id:
+                        continue
+                    self._stats["remote_invalidations"] += 1
+                    self.invalidate(f"remote:{data.get('reason', '')}", publish=False)
+            except Exception as e:
+                logger.warning(f"[ModelConfigCache] 订阅中断，5 秒后重连: {e}")
+                time.sleep(5)
+
+
+# 全局单例
+_config_snapshot: Optional[ModelConfigSnapshot] = None
+
+
+def get_config_snapshot() -> ModelConfigSnapshot:
+    """获取全局模型配置快照"""
+    global _config_snapshot
+    if _config_snapshot is None:
+        _config_snapshot = ModelConfigSnapshot()
+    return _config_snapshot
+
+
+def invalidate_model_config(reason: str = ""):
+    """模型配置变更后调用，使所有 worker 的快照失效"""
+    get_config_snapshot().invalidate(reason)
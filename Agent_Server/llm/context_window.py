@@ -0,0 +1,191 @@
+"""
+上下文窗口适配模块
+
+请求发出前在本地计算 prompt Token 数，按模型上下文窗口（llm.config.MODEL_CONTEXT_WINDOWS）
+算出安全的 max_tokens；prompt 本身放不下时整条省略最早的对话消息（保留系统消息和最后一条），
+以摘要代替。避免请求排完限流队列后才被上游以 "context length exceeded" 拒绝，再进入切换重试循环。
+消息内容本身从不改写：省略后仍放不下时记录错误日志，按省略后的消息原样发送，由上游判定。
+
+Token 计数优先使用 tiktoken（cl100k_base），未安装时按字符估算；
+不同模型分词器有差异，窗口按 LLM_CONTEXT_SAFETY_MARGIN 预留余量。
+
+配置:
+    LLM_CONTEXT_FIT_ENABLED = true
+    LLM_CONTEXT_SAFETY_MARGIN = 0.08（窗口预留比例）
+    LLM_CONTEXT_MIN_OUTPUT_TOKENS = 1024（裁剪 prompt 时至少为输出保留的 Token）
+
+作者: 程序员Eighteen
+版本: 1.0
+"""
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import lookup_model_context_limits
+
+logger = logging.getLogger(__name__)
+
+# 配置
+LLM_CONTEXT_FIT_ENABLED = os.getenv("LLM_CONTEXT_FIT_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CONTEXT_SAFETY_MARGIN = float(os.getenv("LLM_CONTEXT_SAFETY_MARGIN", "0.08"))
+LLM_CONTEXT_MIN_OUTPUT_TOKENS = int(os.getenv("LLM_CONTEXT_MIN_OUTPUT_TOKENS", "1024"))
+
+# 每条消息的格式开销（role、分隔符）和回复起始开销
+_MESSAGE_OVERHEAD = 4
+_REPLY_OVERHEAD = 3
+# 被裁剪消息的摘要：每条保留的字符数、摘要最多列出的条数
+_DIGEST_CHARS = 80
+_DIGEST_MAX_ITEMS = 20
+
+# tiktoken 编码器（False 表示不可用）
+_encoder: Any = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    计算文本 Token 数
+
+    优先使用 tiktoken（cl100k_base），未安装时按 ASCII 4 字符 / 非 ASCII 1 字符估算。
+    """
+    global _encoder
+    if not text:
+        return 0
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text, disallowed_special=()))
+    non_ascii = len(text) - len(text.encode("ascii", "ignore"))
+    return (len(text) - non_ascii + 3) // 4 + non_ascii
+
+
+def _content_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(
+            part.get("text", "") if isinstance(part, dict) else str(getattr(part, "text", "") or "")
+            for part in content
+        )
+    return "" if content is None else str(content)
+
+
+def count_message_tokens(message: Dict[str, Any]) -> int:
+    return count_tokens(_content_text(message.get("content"))) + _MESSAGE_OVERHEAD
+
+
+def count_messages_tokens(messages: List[Dict[str, Any]]) -> int:
+    """计算消息列表的 prompt Token 数（含格式开销）"""
+    return sum(count_message_tokens(m) for m in messages or []) + _REPLY_OVERHEAD
+
+
+def _digest(dropped: List[Dict[str, Any]]) -> Dict[str, str]:
+    """被裁剪消息的简短摘要（每条截取开头），作为系统消息放在保留的对话之前"""
+    lines = []
+    for m in dropped[-_DIGEST_MAX_ITEMS:]:
+        text = " ".join(_content_text(m.get("content")).split())
+        if text:
+            lines.append(f"- {m.get('role', 'user')}: {text[:_DIGEST_CHARS]}{'…' if len(text) > _DIGEST_CHARS else ''}")
+    body = f"[上下文过长，已省略较早的 {len(dropped)} 条消息]"
+    if lines:
+        body += "\n摘要:\n" + "\n".join(lines)
+    return {"role": "system", "content": body}
+
+
+def fit_messages(
+    messages: List[Dict[str, Any]],
+    provider: str,
+    model_name: str,
+    max_tokens: Optional[int],
+    num_ctx: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], int, Dict[str, Any]]:
+    """
+    让请求适配模型上下文窗口
+
+    Args:
+        messages: 原始消息（不会被修改）
+        provider / model_name: 实际调用的模型
+        max_tokens: 调用方期望的最大输出；为空时使用模型最大输出
+        num_ctx: Ollama 请求发送的上下文长度（Ollama 的窗口以它为准）
+
+    Returns:
+        (消息, 安全的 max_tokens, 适配信息)
+        适配信息包含 context_window / prompt_tokens / dropped_messages / overflow（省略后仍超出窗口）
+
+    未登记窗口的模型（见 llm.config.MODEL_CONTEXT_WINDOWS）不做任何适配：消息和 max_tokens 原样返回，
+    max_tokens 为空时由 Provider 默认值补上。
+    """
+    limits = lookup_model_context_limits(provider, model_name, num_ctx)
+    if limits is None:
+        return messages, max_tokens, {
+            "context_window": None,
+            "prompt_tokens": None,
+            "dropped_messages": 0,
+            "overflow": False,
+        }
+    window, max_output = limits
+    requested = min(max_tokens or max_output, max_output)
+    usable = int(window * (1 - LLM_CONTEXT_SAFETY_MARGIN))
+    min_output = min(requested, LLM_CONTEXT_MIN_OUTPUT_TOKENS)
+    prompt_budget = usable - min_output
+
+    token_counts = [count_message_tokens(m) for m in messages]
+    prompt_tokens = sum(token_counts) + _REPLY_OVERHEAD
+    info = {
+        "context_window": window,
+        "prompt_tokens": prompt_tokens,
+        "dropped_messages": 0,
+        "overflow": False,
+    }
+
+    if prompt_tokens > prompt_budget and len(messages) > 0:
+        messages, prompt_tokens = _trim_messages(messages, token_counts, prompt_budget, info)
+        info["prompt_tokens"] = prompt_tokens
+        if prompt_tokens > prompt_budget:
+            info["overflow"] = True
+            logger.error(
+                f"[ContextWindow] ❌ {model_name} 窗口 {window}，省略 {info['dropped_messages']} 条消息后 "
+                f"prompt 仍有约 {prompt_tokens} Token，超出预算 {prompt_budget}；消息内容不做截断，按原样发送"
+            )
+        else:
+            logger.warning(
+                f"[ContextWindow] {model_name} 窗口 {window}，prompt 超出预算 {prompt_budget}，"
+                f"已省略 {info['dropped_messages']} 条较早的消息"
+            )
+
+    # prompt 仍超出时至少保留 min_output，不把 max_tokens 压到 1
+    safe_max_tokens = max(min_output, min(requested, usable - prompt_tokens))
+    if safe_max_tokens < requested:
+        logger.debug(f"[ContextWindow] {model_name} max_tokens {requested} → {safe_max_tokens}")
+    return messages, safe_max_tokens, info
+
+
+def _trim_messages(
+    messages: List[Dict[str, Any]],
+    token_counts: List[int],
+    budget: int,
+    info: Dict[str, Any],
+) -> Tuple[List[Dict[str, Any]], int]:
+    """按时间顺序整条省略最早的非系统消息，并以一条摘要代替（不截断任何消息内容）"""
+    # 开头的系统消息和最后一条消息始终保留
+    head = 0
+    while head < len(messages) - 1 and messages[head].get("role") == "system":
+        head += 1
+    middle = list(range(head, len(messages) - 1))
+
+    total = sum(token_counts) + _REPLY_OVERHEAD
+    dropped: List[int] = []
+    while middle and total > budget:
+        idx = middle.pop(0)
+        dropped.append(idx)
+        total -= token_counts[idx]
+    if not dropped:
+        return messages, total
+
+    digest = _digest([messages[i] for i in dropped])
+    result = messages[:head] + [digest] + [messages[i] for i in middle] + [messages[-1]]
+    info["dropped_messages"] = len(dropped)
+    return result, total + count_message_tokens(digest)
@@ -2,11 +2,14 @@
 LLM 工厂模块
 
 提供统一的 LLM 创建接口，根据 Provider 类型创建对应的实例
+Provider 模块按需导入，首次创建某个 Provider 时才加载其 SDK
 
 作者: 程序员Eighteen
 版本: 1.0
 """
+import importlib
 import logging
+import time
 from typing import Any, Dict, Optional, Type, Union
 
 from .base import BaseLLMProvider, LLMConfig, ProviderType
@@ -26,7 +29,47 @@ from .config import (
 logger = logging.getLogger(__name__)
 
 
-# Provider 类映射表
+# Provider 注册表：provider 代码 → "模块:类名"
+# 只在首次创建该 Provider 时才导入对应模块（及其 SDK），导入 llm 包不再加载任何 Provider
+_PROVIDER_REGISTRY: Dict[str, str] = {
+    # 核心 Provider（有专门实现）
+    "openai": "openai_provider:OpenAIProvider",
+    "anthropic": "anthropic_provider:AnthropicProvider",
+    "deepseek": "deepseek_provider:DeepSeekProvider",
+    "google": "google_provider:GoogleProvider",
+    "alibaba": "alibaba_provider:AlibabaProvider",
+    "ollama": "ollama_provider:OllamaProvider",
+    "azure_openai": "azure_provider:AzureOpenAIProvider",
+    "mistral": "mistral_provider:MistralProvider",
+    "moonshot": "moonshot_provider:MoonshotProvider",
+    "minimax": "minimax_provider:MiniMaxProvider",
+    
+    # 通用 OpenAI 兼容 Provider
+    "siliconflow": "generic_provider:SiliconFlowProvider",
+    "modelscope": "generic_provider:ModelScopeProvider",
+    "zhipu": "generic_provider:ZhipuProvider",
+    "grok": "generic_provider:GrokProvider",
+    
+    # 数据库中的其他 Provider（使用通用 OpenAI 兼容接口）
+    "baidu": "generic_provider:GenericOpenAIProvider",       # 百度文心一言
+    "openrouter": "generic_provider:GenericOpenAIProvider",  # OpenRouter 聚合平台
+    "vercel": "generic_provider:GenericOpenAIProvider",      # Vercel AI
+    "cerebras": "generic_provider:GenericOpenAIProvider",    # Cerebras
+    "browser_use": "generic_provider:GenericOpenAIProvider", # Browser-Use Cloud
+    
+    # 自定义
+    "custom": "generic_provider:GenericOpenAIProvider",
+    
+    # 别名（方便用户使用不同名称）
+    "azure": "azure_provider:AzureOpenAIProvider",
+    "qwen": "alibaba_provider:AlibabaProvider",
+    "tongyi": "alibaba_provider:AlibabaProvider",
+    "kimi": "moonshot_provider:MoonshotProvider",
+    "claude": "anthropic_provider:AnthropicProvider",
+    "gemini": "google_provider:GoogleProvider",
+}
+
+# 已加载的 Provider 类（首次使用时从注册表导入，或通过 _register_provider 直接注册）
 _PROVIDER_CLASSES: Dict[str, Type[BaseLLMProvider]] = {}
 
 
@@ -35,73 +78,33 @@ def _register_provider(provider_code: str, provider_class: Type[BaseLLMProvider]
     _PROVIDER_CLASSES[provider_code.lower()] = provider_class
 
 
-def _load_providers():
-    """加载所有 Provider 类"""
-    global _PROVIDER_CLASSES
-    
-    if _PROVIDER_CLASSES:
-        return
-    
-    from .providers.openai_provider import OpenAIProvider
-    from .providers.anthropic_provider import AnthropicProvider
-    from .providers.deepseek_provider import DeepSeekProvider
-    from .providers.google_provider import GoogleProvider
-    from .providers.alibaba_provider import AlibabaProvider
-    from .providers.ollama_provider import OllamaProvider
-    from .providers.azure_provider import AzureOpenAIProvider
-    from .providers.mistral_provider import MistralProvider
-    from .providers.moonshot_provider import MoonshotProvider
-    from .providers.minimax_provider import MiniMaxProvider
-    from .providers.generic_provider import (
-        GenericOpenAIProvider,
-        SiliconFlowProvider,
-        ModelScopeProvider,
-        ZhipuProvider,
-        GrokProvider,
+def _is_known_provider(provider_code: str) -> bool:
+    return provider_code in _PROVIDER_CLASSES or provider_code in _PROVIDER_REGISTRY
+
+
+def _get_provider_class(provider_code: str) -> Type[BaseLLMProvider]:
+    """获取 Provider 类，首次使用时导入其模块"""
+    provider_class = _PROVIDER_CLASSES.get(provider_code)
+    if provider_class is not None:
+        return provider_class
+    
+    target = _PROVIDER_REGISTRY.get(provider_code)
+    if target is None:
+        raise ProviderNotFoundError(provider_code)
+    module_name, class_name = target.split(":")
+    started = time.perf_counter()
+    module = importlib.import_module(f".providers.{module_name}", __package__)
+    provider_class = getattr(module, class_name)
+    _PROVIDER_CLASSES[provider_code] = provider_class
+    logger.debug(
+        f"[LLMFactory] 加载 Provider 模块 {module_name} "
+        f"({(time.perf_counter() - started) * 1000:.1f}ms)"
     )
-    
-    _PROVIDER_CLASSES = {
-        # 核心 Provider（有专门实现）
-        "openai": OpenAIProvider,
-        "anthropic": AnthropicProvider,
-        "deepseek": DeepSeekProvider,
-        "google": GoogleProvider,
-        "alibaba": AlibabaProvider,
-        "ollama": OllamaProvider,
-        "azure_openai": AzureOpenAIProvider,
-        "mistral": MistralProvider,
-        "moonshot": MoonshotProvider,
-        "minimax": MiniMaxProvider,
-        
-        # 通用 OpenAI 兼容 Provider
-        "siliconflow": SiliconFlowProvider,
-        "modelscope": ModelScopeProvider,
-        "zhipu": ZhipuProvider,
-        "grok": GrokProvider,
-        
-        # 数据库中的其他 Provider（使用通用 OpenAI 兼容接口）
-        "baidu": GenericOpenAIProvider,       # 百度文心一言
-        "openrouter": GenericOpenAIProvider,  # OpenRouter 聚合平台
-        "vercel": GenericOpenAIProvider,      # Vercel AI
-        "cerebras": GenericOpenAIProvider,    # Cerebras
-        "browser_use": GenericOpenAIProvider, # Browser-Use Cloud
-        
-        # 自定义
-        "custom": GenericOpenAIProvider,
-    }
-    
-    # 添加别名（方便用户使用不同名称）
-    _PROVIDER_CLASSES["azure"] = AzureOpenAIProvider
-    _PROVIDER_CLASSES["qwen"] = AlibabaProvider
-    _PROVIDER_CLASSES["tongyi"] = AlibabaProvider
-    _PROVIDER_CLASSES["kimi"] = MoonshotProvider
-    _PROVIDER_CLASSES["claude"] = AnthropicProvider
-    _PROVIDER_CLASSES["gemini"] = GoogleProvider
+    return provider_class
 
 
 def get_supported_providers() -> list:
     """获取支持的 Provider 列表"""
-    _load_providers()
     # 主要 Provider 列表（与数据库 model_providers 表对应）
     main_providers = [
         "openai", "anthropic", "google", "deepseek", "alibaba",
@@ -151,12 +154,10 @@ def create_llm_provider(
         ... )
         >>> response = provider.chat([{"role": "user", "content": "Hello"}])
     """
-    _load_providers()
-    
     provider_lower = provider.lower().strip()
     
     # 检查 Provider 是否存在
-    if provider_lower not in _PROVIDER_CLASSES:
+    if not _is_known_provider(provider_lower):
         raise ProviderNotFoundError(provider)
     
     # 构建配置
@@ -177,7 +178,7 @@ def create_llm_provider(
     
     try:
         # 创建 Provider 实例
-        provider_class = _PROVIDER_CLASSES[provider_lower]
+        provider_class = _get_provider_class(provider_lower)
         provider_instance = provider_class(config)
         
         logger.info(f"[LLMFactory] 创建 Provider: {provider_class.__name__}(model={model_name})")
@@ -0,0 +1,222 @@
+"""
+LLM HTTP 连接池模块
+
+按模型档案（provider + base_url + api_key）复用长连接的 httpx.AsyncClient，
+避免每次异步调用都重新建立 TCP+TLS 连接。
+
+- 开启 keep-alive，连接数上限可通过环境变量配置
+- 安装了 h2 时自动启用 HTTP/2
+- SDK 客户端（AsyncOpenAI / AsyncAnthropic / AsyncAzureOpenAI）同样按档案缓存
+- 由 FastAPI lifespan 在关闭时统一释放
+- LangChain 的 ChatAnthropic / ChatGoogleGenerativeAI 等不支持传入 httpx 客户端的类不在此池内
+
+作者: 程序员Eighteen
+版本: 1.0
+"""
+import hashlib
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 连接池配置
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60"))
+LLM_HTTP_CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "10"))
+LLM_HTTP2_ENABLED = os.getenv("LLM_HTTP2_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def _http2_available() -> bool:
+    """HTTP/2 依赖 h2 包，未安装时回退 HTTP/1.1"""
+    if not LLM_HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _profile_key(provider: str, base_url: Optional[str], api_key: Optional[str]) -> Tuple[str, str, str]:
+    """模型档案键（api_key 只保留摘要，避免明文驻留在键中）"""
+    key_digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+    return ((provider or "").lower(), (base_url or "").rstrip("/"), key_digest)
+
+
+def _provider_code(config) -> str:
+    """LLMConfig.provider 可能是 ProviderType 或字符串"""
+    provider = config.provider
+    return provider.value if hasattr(provider, "value") else str(provider)
+
+
+class LLMHttpClientPool:
+    """
+    按模型档案复用的异步 HTTP 客户端池
+
+    同一档案的 LLMClient、FailoverChatModel、browser-use LLM 共享同一个
+    httpx.AsyncClient，从而共享连接池。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._http_clients: Dict[Tuple[str, str, str], Any] = {}
+        self._sdk_clients: Dict[Tuple, Any] = {}
+        self._http2 = _http2_available()
+
+    def get_http_client(
+        self,
+        provider: str,
+        base_url: Optional[str],
+        api_key: Optional[str],
+        timeout: float = 180,
+    ) -> Any:
+        """
+        获取档案对应的 httpx.AsyncClient（不存在或已关闭时新建）
+
+        Args:
+            provider: 供应商代码
+            base_url: API 地址
+            api_key: API 密钥
+            timeout: 读超时秒数
+
+        Returns:
+            httpx.AsyncClient 实例
+        """
+        key = _profile_key(provider, base_url, api_key)
+        with self._lock:
+            client = self._http_clients.get(key)
+            if client is not None and not client.is_closed:
+                return client
+
+            import httpx
+
+            client = httpx.AsyncClient(
+                http2=self._http2,
+                timeout=httpx.Timeout(timeout, connect=LLM_HTTP_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+                ),
+            )
+            self._http_clients[key] = client
+            # 底层连接重建后，旧的 SDK 客户端不能再用
+            self._sdk_clients = {k: v for k, v in self._sdk_clients.items() if k[1:4] != key}
+            logger.info(
+                f"[LLMHttpPool] 新建连接池: provider={key[0]}, base_url={key[1] or '-'}, "
+                f"http2={self._http2}, max_connections={LLM_HTTP_MAX_CONNECTIONS}"
+            )
+            return client
+
+    def _get_sdk_client(self, kind: str, config, factory) -> Any:
+        """按 (kind, 档案, timeout) 缓存 SDK 客户端"""
+        provider = _provider_code(config)
+        http_client = self.get_http_client(provider, config.base_url, config.api_key, config.timeout)
+        key = (kind,) + _profile_key(provider, config.base_url, config.api_key) + (
+            config.timeout, config.api_version
+        )
+        with self._lock:
+            sdk_client = self._sdk_clients.get(key)
+            if sdk_client is None:
+                sdk_client = factory(http_client)
+                self._sdk_clients[key] = sdk_client
+            return sdk_client
+
+    def get_async_openai(self, config) -> Any:
+        """获取共享连接池的 AsyncOpenAI 客户端"""
+        from openai import AsyncOpenAI
+
+        return self._get_sdk_client(
+            "openai",
+            config,
+            lambda http_client: AsyncOpenAI(
+                api_key=config.api_key,
+                base_url=config.base_url,
+                timeout=config.timeout,
+                http_client=http_client,
+            ),
+        )
+
+    def get_async_azure_openai(self, config) -> Any:
+        """获取共享连接池的 AsyncAzureOpenAI 客户端"""
+        from openai import AsyncAzureOpenAI
+
+        return self._get_sdk_client(
+            "azure",
+            config,
+            lambda http_client: AsyncAzureOpenAI(
+                api_key=config.api_key,
+                api_version=config.api_version,
+                azure_endpoint=config.base_url,
+                timeout=config.timeout,
+                http_client=http_client,
+            ),
+        )
+
+    def get_async_anthropic(self, config) -> Any:
+        """获取共享连接池的 AsyncAnthropic 客户端"""
+        from anthropic import AsyncAnthropic
+
+        return self._get_sdk_client(
+            "anthropic",
+            config,
+            lambda http_client: AsyncAnthropic(
+                api_key=config.api_key,
+                base_url=config.base_url,
+                timeout=config.timeout,
+                http_client=http_client,
+            ),
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """连接池概况"""
+        with self._lock:
+            return {
+                "http2": self._http2,
+                "max_connections": LLM_HTTP_MAX_CONNECTIONS,
+                "max_keepalive_connections": LLM_HTTP_MAX_KEEPALIVE,
+                "profiles": len(self._http_clients),
+                "sdk_clients": len(self._sdk_clients),
+            }
+
+    async def aclose(self):
+        """关闭所有连接（应用关闭时调用）"""
+        with self._lock:
+            clients = list(self._http_clients.values())
+            self._http_clients.clear()
+            self._sdk_clients.clear()
+
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"[LLMHttpPool] 关闭连接失败: {e}")
+
+        if clients:
+            logger.info(f"[LLMHttpPool] 已关闭 {len(clients)} 个连接池")
+
+
+# 全局单例
+_http_pool: Optional[LLMHttpClientPool] = None
+
+
+def get_http_pool() -> LLMHttpClientPool:
+    """获取全局 LLM HTTP 连接池"""
+    global _http_pool
+    if _http_pool is None:
+        _http_pool = LLMHttpClientPool()
+    return _http_pool
+
+
+def get_shared_http_client(config) -> Any:
+    """获取 LLMConfig 对应档案的共享 httpx.AsyncClient"""
+    return get_http_pool().get_http_client(_provider_code(config), config.base_url, config.api_key, config.timeout)
+
+
+async def close_http_pool():
+    """关闭全局连接池"""
+    if _http_pool is not None:
+        await _http_pool.aclose()
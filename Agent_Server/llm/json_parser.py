@@ -0,0 +1,406 @@
+"""
+LLM 输出 JSON 容错解析模块
+
+所有 Provider 和 LLMWrapper 共用的 JSON 解析入口，取代原先
+"正则清洗 → json.loads → 正则修复 → 再 json.loads" 的多轮级联。
+
+处理流程:
+1. 定位: 去掉 <think>...</think>、**JSON Response:** 前缀、```json 围栏，找到第一个 {
+2. 快速路径: json.JSONDecoder.raw_decode 一次解析（C 实现，自动忽略 JSON 之后的文字）
+3. 容错路径: 一遍递归下降扫描，同时处理
+   - 多余 / 尾部逗号、缺少逗号
+   - 截断: 自动闭合未完成的对象/数组，丢弃最后一个不完整的成员
+   - 字符串内未转义的引号、原始换行、\\' 等不规范转义、单引号字符串
+   - True/False/None 等 Python 字面量
+4. 兜底: json_repair（可选依赖）
+
+全部失败时抛出 json.JSONDecodeError，调用方沿用 except (json.JSONDecodeError, ValueError)。
+
+使用示例:
+    >>> from llm.json_parser import parse_llm_json
+    >>> parse_llm_json('<think>...</think>```json\\n{"a": 1, "b": [1, 2,],}\\n```')
+    {'a': 1, 'b': [1, 2]}
+
+作者: 程序员Eighteen
+版本: 1.0
+"""
+import json
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .tracing import note_parse_stage
+
+logger = logging.getLogger(__name__)
+
+_THINK_RE = re.compile(r"<think>[\s\S]*?</think>")
+_THINK_CLOSE = "</think>"
+_JSON_MARKER = "**JSON Response:**"
+_WS_RE = re.compile(r"[ \t\r\n]*")
+_NUMBER_RE = re.compile(r"-?\d+(\.\d+)?([eE][+-]?\d+)?")
+_BARE_KEY_RE = re.compile(r"[A-Za-z_$][\w$\-]*")
+
+_DECODER = json.JSONDecoder()
+
+_ESCAPES = {
+    '"': '"', "\\": "\\", "/": "/", "'": "'",
+    "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t",
+}
+_LITERALS = (
+    ("true", True), ("false", False), ("null", None),
+    ("True", True), ("False", False), ("None", None),
+)
+# 字符串闭合引号之后允许出现的字符；其余情况视为字符串内未转义的引号
+_STRING_FOLLOWERS = frozenset(',:}]"\'')
+
+
+class _Truncated(Exception):
+    """文本在值的中间结束"""
+
+
+class _Malformed(Exception):
+    """无法容错的格式错误"""
+
+    def __init__(self, pos: int, msg: str):
+        super().__init__(msg)
+        self.pos = pos
+
+
+class _TolerantParser:
+    """
+    单遍容错解析器
+
+    只向前移动下标；字符串按 str.find 整段跳跃，不逐字符处理。
+    规范的子对象/数组直接交给 C 解码器，总开销约为 文本长度 × 嵌套深度 次 C 级扫描。
+    """
+
+    __slots__ = ("text", "n", "i", "truncated")
+
+    def __init__(self, text: str, pos: int):
+        self.text = text
+        self.n = len(text)
+        self.i = pos
+        self.truncated = False
+
+    def _skip_ws(self):
+        self.i = _WS_RE.match(self.text, self.i).end()
+
+    def parse_value(self) -> Any:
+        self._skip_ws()
+        if self.i >= self.n:
+            raise _Truncated()
+        ch = self.text[self.i]
+        if ch == "{" or ch == "[":
+            # 先让 C 解码器整体解析子树，只有不规范的子树才逐字符处理
+            try:
+                value, self.i = _DECODER.raw_decode(self.text, self.i)
+                return value
+            except json.JSONDecodeError:
+                pass
+            return self._parse_object() if ch == "{" else self._parse_array()
+        if ch == '"' or ch == "'":
+            return self._parse_string(ch)
+        if ch == "-" or ch.isdigit():
+            return self._parse_number()
+        return self._parse_literal()
+
+    # ── 容器 ──────────────────────────────────────────────
+
+    def _finish_member(self, value: Any) -> bool:
+        """截断产生的空对象不保留（如 "action": [{ → "action": []）"""
+        return not (self.truncated and isinstance(value, dict) and not value)
+
+    def _parse_object(self) -> Dict[str, Any]:
+        text = self.text
+        self.i += 1
+        result: Dict[str, Any] = {}
+        while True:
+            self._skip_ws()
+            if self.i >= self.n:
+                self.truncated = True
+                return result
+            ch = text[self.i]
+            if ch == "}":
+                self.i += 1
+                return result
+            if ch == ",":
+                # 多余 / 尾部逗号直接跳过；缺少逗号时下一个键照常解析
+                self.i += 1
+                continue
+            if ch == "]":
+                # 括号不配对：交给外层数组处理
+                return result
+
+            if ch == '"' or ch == "'":
+                try:
+                    key = self._parse_string(ch)
+                except _Truncated:
+                    self.truncated = True
+                    return result
+            else:
+                m = _BARE_KEY_RE.match(text, self.i)
+                if not m:
+                    raise _Malformed(self.i, f"对象键位置出现非法字符 {ch!r}")
+                key = m.group(0)
+                self.i = m.end()
+
+            self._skip_ws()
+            if self.i >= self.n:
+                self.truncated = True
+                return result
+            if text[self.i] == ":":
+                self.i += 1
+
+            try:
+                value = self.parse_value()
+            except _Truncated:
+                self.truncated = True
+                return result
+            if self._finish_member(value):
+                result[key] = value
+
+    def _parse_array(self) -> List[Any]:
+        text = self.text
+        self.i += 1
+        result: List[Any] = []
+        while True:
+            self._skip_ws()
+            if self.i >= self.n:
+                self.truncated = True
+                return result
+            ch = text[self.i]
+            if ch == "]":
+                self.i += 1
+                return result
+            if ch == ",":
+                self.i += 1
+                continue
+            if ch == "}":
+                return result
+
+            try:
+                value = self.parse_value()
+            except _Truncated:
+                self.truncated = True
+                return result
+            if self._finish_member(value):
+                result.append(value)
+
+    # ── 标量 ──────────────────────────────────────────────
+
+    def _parse_string(self, quote: str) -> str:
+        text = self.text
+        n = self.n
+        i = self.i + 1
+        parts: List[str] = []
+        close = text.find(quote, i)
+        while True:
+            if close < 0:
+                raise _Truncated()
+            slash = text.find("\\", i, close)
+            if slash >= 0:
+                parts.append(text[i:slash])
+                i = self._read_escape(slash, parts)
+                if i > close:
+                    close = text.find(quote, i)
+                continue
+
+            parts.append(text[i:close])
+            after = _WS_RE.match(text, close + 1).end()
+            if after >= n or text[after] in _STRING_FOLLOWERS:
+                self.i = close + 1
+                return "".join(parts)
+            # 字符串内部未转义的引号，按字面量保留
+            parts.append(quote)
+            i = close + 1
+            close = text.find(quote, i)
+
+    def _read_escape(self, slash: int, parts: List[str]) -> int:
+        """解析 slash 处的转义序列，返回其后的下标"""
+        text = self.text
+        if slash + 1 >= self.n:
+            raise _Truncated()
+        esc = text[slash + 1]
+        mapped = _ESCAPES.get(esc)
+        if mapped is not None:
+            parts.append(mapped)
+            return slash + 2
+        if esc == "u":
+            hex_part = text[slash + 2:slash + 6]
+            if len(hex_part) < 4:
+                raise _Truncated()
+            try:
+                code = int(hex_part, 16)
+            except ValueError:
+                parts.append("\\u")
+                return slash + 2
+            end = slash + 6
+            # UTF-16 代理对
+            if 0xD800 <= code < 0xDC00 and text.startswith("\\u", end):
+                try:
+                    low = int(text[end + 2:end + 6], 16)
+                except ValueError:
+                    low = 0
+                if 0xDC00 <= low < 0xE000:
+                    code = 0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)
+                    end += 6
+            parts.append(chr(code))
+            return end
+        # 非法转义（如 \d），保留原样
+        parts.append("\\" + esc)
+        return slash + 2
+
+    def _parse_number(self):
+        m = _NUMBER_RE.match(self.text, self.i)
+        if not m:
+            if self.i + 1 >= self.n:
+                raise _Truncated()
+            raise _Malformed(self.i, "非法数字")
+        self.i = m.end()
+        raw = m.group(0)
+        if m.group(1) or m.group(2):
+            return float(raw)
+        return int(raw)
+
+    def _parse_literal(self):
+        text = self.text
+        for word, value in _LITERALS:
+            if text.startswith(word, self.i):
+                self.i += len(word)
+                return value
+            rest = text[self.i:self.i + len(word)]
+            if len(rest) < len(word) and word.startswith(rest):
+                raise _Truncated()
+        raise _Malformed(self.i, f"非法字符 {text[self.i]!r}")
+
+
+def _locate_json(text: str, allow_array: bool) -> Tuple[str, int]:
+    """
+    剥离推理段和包裹文字，返回 (文本, JSON 起始下标)
+
+    起始下标为 -1 表示找不到 JSON。
+    """
+    if "<think>" in text:
+        # 包括嵌在 JSON 字段值内的推理段
+        text = _THINK_RE.sub("", text)
+    if _THINK_CLOSE in text:
+        # 部分模型省略了开头的 <think>，只输出 </think>
+        text = text[text.rfind(_THINK_CLOSE) + len(_THINK_CLOSE):]
+    text = text.strip()
+
+    base = 0
+    marker = text.find(_JSON_MARKER)
+    if marker >= 0:
+        base = marker + len(_JSON_MARKER)
+    fence = text.find("```", base)
+    if fence >= 0:
+        line_end = text.find("\n", fence)
+        base = line_end + 1 if line_end >= 0 else fence + 3
+
+    start = _find_start(text, base, allow_array)
+    if start < 0 and base:
+        start = _find_start(text, 0, allow_array)
+    return text, start
+
+
+def _find_start(text: str, pos: int, allow_array: bool) -> int:
+    obj = text.find("{", pos)
+    if not allow_array:
+        return obj
+    arr = text.find("[", pos)
+    if obj < 0 or (0 <= arr < obj):
+        return arr
+    return obj
+
+
+# 解析路径统计
+_stats_lock = threading.Lock()
+_stats = {"fast": 0, "tolerant": 0, "truncated": 0, "json_repair": 0, "failed": 0}
+
+
+def _count(path: str):
+    with _stats_lock:
+        _stats[path] += 1
+    note_parse_stage(path)
+
+
+def get_json_parse_stats() -> Dict[str, int]:
+    """各解析路径的命中次数"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _accepts(value: Any, allow_array: bool) -> bool:
+    return isinstance(value, dict) or (allow_array and isinstance(value, list))
+
+
+def parse_llm_json(content: str, allow_array: bool = False, source: str = "") -> Any:
+    """
+    从 LLM 响应中解析 JSON
+
+    Args:
+        content: LLM 原始响应文本
+        allow_array: 是否允许顶层为数组（默认只返回对象）
+        source: 调用方标识（日志用）
+
+    Returns:
+        解析后的 dict（allow_array=True 时也可能是 list）
+
+    Raises:
+        ValueError: 响应为空
+        json.JSONDecodeError: 无法解析
+    """
+    if not content or not content.strip():
+        raise ValueError("LLM 响应为空")
+
+    tag = f"[JSONParser{':' + source if source else ''}]"
+    text, start = _locate_json(content, allow_array)
+    if start < 0:
+        _count("failed")
+        raise json.JSONDecodeError("响应中未找到 JSON", text, 0)
+
+    # 1. 快速路径
+    try:
+        value, end = _DECODER.raw_decode(text, start)
+        if _accepts(value, allow_array):
+            _count("fast")
+            if end < len(text) and text[end:].strip(" \t\r\n`"):
+                logger.debug(f"{tag} 忽略 JSON 之后的 {len(text) - end} 个字符")
+            return value
+    except json.JSONDecodeError:
+        pass
+
+    # 2. 单遍容错解析
+    error: Optional[_Malformed] = None
+    parser = _TolerantParser(text, start)
+    try:
+        # 顶层已确定不规范，直接进入容错扫描
+        value = parser._parse_object() if text[start] == "{" else parser._parse_array()
+        if _accepts(value, allow_array):
+            if parser.truncated:
+                _count("truncated")
+                logger.info(f"{tag} 响应被截断，已补全未闭合的括号 ({len(text)} 字符)")
+            else:
+                _count("tolerant")
+                logger.debug(f"{tag} 已容错修复 JSON ({len(text)} 字符)")
+            return value
+    except _Malformed as e:
+        error = e
+    except (_Truncated, RecursionError):
+        pass
+
+    # 3. json_repair 兜底
+    try:
+        from json_repair import repair_json
+        repaired = repair_json(text[start:], return_objects=True)
+        if _accepts(repaired, allow_array) and repaired:
+            _count("json_repair")
+            logger.info(f"{tag} json_repair 成功修复 JSON ({len(text)} 字符)")
+            return repaired
+    except Exception as e:
+        logger.debug(f"{tag} json_repair 也失败: {e}")
+
+    _count("failed")
+    pos = error.pos if error else start
+    raise json.JSONDecodeError(str(error) if error else "无法解析 JSON", text, pos)
@@ -0,0 +1,93 @@
+"""
+模型延迟统计模块
+
+每个模型档案维护最近 N 次调用的耗时和首 Token 时间（TTFT）滑动窗口，
+提供 p50 / p95，用于：
+- 同优先级模型中优先选择更快的（ModelAutoSwitcher 路由）
+- 对冲请求: 调用超过该模型 p95 仍未返回时，向次优模型发送副本
+
+作者: 程序员Eighteen
+版本: 1.0
+"""
+import os
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+# 配置
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))
+# 样本数少于该值时不给出分位数（避免冷启动时的偶然值影响路由）
+LLM_LATENCY_MIN_SAMPLES = int(os.getenv("LLM_LATENCY_MIN_SAMPLES", "5"))
+
+
+def _percentile(sorted_values, q: float) -> float:
+    """最近秩法分位数（sorted_values 非空）"""
+    idx = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+class _RollingWindow:
+    """固定长度滑动窗口，分位数在新样本到来后惰性重算"""
+
+    def __init__(self, size: int):
+        self._values: Deque[float] = deque(maxlen=size)
+        self._sorted: Optional[list] = None
+
+    def add(self, value: float):
+        self._values.append(value)
+        self._sorted = None
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self._values) < LLM_LATENCY_MIN_SAMPLES:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._values)
+        return _percentile(self._sorted, q)
+
+
+class LatencyTracker:
+    """单个模型档案的延迟统计（秒）"""
+
+    def __init__(self, window: int = LLM_LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._latency = _RollingWindow(window)
+        self._ttft = _RollingWindow(window)
+
+    def record(self, latency: float, ttft: Optional[float] = None):
+        with self._lock:
+            self._latency.add(latency)
+            if ttft is not None:
+                self._ttft.add(ttft)
+
+    @property
+    def p50(self) -> Optional[float]:
+        with self._lock:
+            return self._latency.percentile(0.5)
+
+    @property
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            return self._latency.percentile(0.95)
+
+    @property
+    def samples(self) -> int:
+        return len(self._latency)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            values = {
+                "p50": self._latency.percentile(0.5),
+                "p95": self._latency.percentile(0.95),
+                "ttft_p50": self._ttft.percentile(0.5),
+                "ttft_p95": self._ttft.percentile(0.95),
+            }
+            samples = len(self._latency)
+            ttft_samples = len(self._ttft)
+        return {
+            **{k: round(v, 3) if v is not None else None for k, v in values.items()},
+            "samples": samples,
+            "ttft_samples": ttft_samples,
+        }
@@ -12,6 +12,7 @@ from typing import Any, Dict, Optional
 from .base import LLMConfig, BaseLLMProvider
 from .factory import create_llm_provider, get_llm_model, get_browser_use_llm
 from .exceptions import NoActiveModelError, ConfigurationError
+from .config import get_model_context_limits
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +50,20 @@ class ModelConfigManager:
             logger.error(f"[ModelConfigManager] 无法导入数据库连接: {e}")
             raise
     
+    def _get_model_from_snapshot(self) -> Dict:
+        """从进程级快照获取激活的模型配置（版本未变时不访问数据库）"""
+        from .config_cache import get_config_snapshot, build_active_config
+        
+        try:
+            active = get_config_snapshot().get_active()
+        except Exception as e:
+            logger.error(f"[ModelConfigManager] 加载模型配置快照失败: {e}")
+            raise ConfigurationError(f"数据库查询失败: {e}")
+        
+        if not active:
+            raise NoActiveModelError()
+        return build_active_config(active)
+    
     def _get_model_from_db(self, db=None) -> Dict:
         """从数据库获取激活的模型配置"""
         close_db = False
@@ -72,8 +87,10 @@ class ModelConfigManager:
                 'base_url': active_model.base_url or '',
                 'provider': active_model.provider or 'openai',
                 'temperature': 0.0,
-                'max_tokens': 128000,
             }
+            config['context_window'], config['max_tokens'] = get_model_context_limits(
+                config['provider'], config['model_name']
+            )
             
             logger.info(f"[ModelConfigManager] 从数据库加载激活模型: ID={active_model.id}, "
                        f"model_name={config['model_name']}, provider={config['provider']}")
@@ -93,6 +110,9 @@ class ModelConfigManager:
         """
         获取当前激活的模型配置
         
+        未传入 db 时读取进程级快照（llm.config_cache），由版本号失效；
+        传入 db 时直接在该会话中查询。
+        
         Args:
             db: 数据库会话（可选）
             use_cache: 是否使用缓存
@@ -103,13 +123,19 @@ class ModelConfigManager:
         if use_cache and self._cached_config:
             return self._cached_config
         
-        config = self._get_model_from_db(db)
+        if db is None:
+            config = self._get_model_from_snapshot()
+        else:
+            config = self._get_model_from_db(db)
         self._cached_config = config
         return config
     
     def refresh_config(self, db=None) -> Dict:
-        """刷新配置缓存"""
+        """刷新配置缓存（同时使所有 worker 的快照失效）"""
+        from .config_cache import invalidate_model_config
+        
         self._cached_config = None
+        invalidate_model_config("refresh_config")
         return self.get_active_model_config(db)
     
     def get_llm_provider(self, db=None) -> BaseLLMProvider:
@@ -215,10 +241,18 @@ class ModelConfigManager:
         error_type: str = None,
         duration_ms: int = 0,
         db=None,
+        model_id: int = None,
+        model_name: str = None,
+        provider: str = None,
+        cached_tokens: int = 0,
+        cache_creation_tokens: int = 0,
     ):
         """
         增加 Token 使用量（增强版，支持详细统计）
         
+        默认写入内存缓冲（llm.usage_ledger），由后台批量落库；
+        显式传入 db 或关闭 TOKEN_LEDGER_ENABLED 时同步写库。
+        
         Args:
             tokens: 总 token 数量（如果为 0 则自动计算）
             prompt_tokens: 输入 token
@@ -229,11 +263,25 @@ class ModelConfigManager:
             error_type: 错误类型
             duration_ms: 耗时毫秒
             db: 数据库会话
+            model_id: 实际调用的模型 ID（为空时取当前激活模型）
+            model_name: 模型名称
+            provider: 供应商
+            cached_tokens: 命中提示词缓存的输入 token（包含在 prompt_tokens 内）
+            cache_creation_tokens: 写入提示词缓存的输入 token（Anthropic）
         """
         total = tokens if tokens > 0 else (prompt_tokens + completion_tokens)
         if total <= 0:
             return
 
+        from .usage_ledger import TOKEN_LEDGER_ENABLED
+        if TOKEN_LEDGER_ENABLED and db is None:
+            self._record_usage_event(
+                total, prompt_tokens, completion_tokens, source, session_id,
+                success, error_type, duration_ms, model_id, model_name, provider,
+                cached_tokens, cache_creation_tokens,
+            )
+            return
+
         close_db = False
         if db is None:
             db = self._get_db_session()
@@ -264,6 +312,8 @@ class ModelConfigManager:
                     prompt_tokens=prompt_tokens,
                     completion_tokens=completion_tokens,
                     total_tokens=total,
+                    cached_tokens=cached_tokens,
+                    cache_creation_tokens=cache_creation_tokens,
                     source=source,
                     session_id=session_id,
                     success=1 if success else 0,
@@ -296,6 +346,59 @@ class ModelConfigManager:
             if close_db:
                 db.close()
 
+    def _record_usage_event(
+        self,
+        total: int,
+        prompt_tokens: int,
+        completion_tokens: int,
+        source: str,
+        session_id: Optional[int],
+        success: bool,
+        error_type: Optional[str],
+        duration_ms: int,
+        model_id: Optional[int],
+        model_name: Optional[str],
+        provider: Optional[str],
+        cached_tokens: int = 0,
+        cache_creation_tokens: int = 0,
+    ):
+        """写入使用量缓冲（不访问数据库，除非本进程从未加载过激活模型）"""
+        from .usage_ledger import UsageEvent, get_usage_ledger
+
+        try:
+            if model_id is None:
+                active = self.get_active_model_config(use_cache=True)
+                model_id = active['id']
+                model_name = model_name or active.get('model_name')
+                provider = provider or active.get('provider')
+
+            get_usage_ledger().record(UsageEvent(
+                model_id=model_id,
+                model_name=model_name or "",
+                provider=provider or "",
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=total,
+                cached_tokens=cached_tokens,
+                cache_creation_tokens=cache_creation_tokens,
+                source=source,
+                session_id=session_id,
+                success=success,
+                error_type=error_type,
+                duration_ms=duration_ms,
+            ))
+        except Exception as e:
+            logger.warning(f"[ModelConfigManager] 记录 Token 使用量失败: {e}")
+            return
+
+        # 同步到 auto_switcher（内存操作）
+        if success:
+            try:
+                from llm.auto_switch import get_auto_switcher
+                get_auto_switcher().mark_success(model_id, total)
+            except Exception:
+                pass
+
 
 # 全局单例
 model_config_manager = ModelConfigManager()
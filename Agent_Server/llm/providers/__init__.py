@@ -2,18 +2,41 @@
 LLM Providers 模块
 
 导出所有 Provider 实现
+
+各 Provider 模块按需导入：访问某个类时才加载对应模块（及其 SDK），
+导入本包本身不会加载 openai / anthropic / google / langchain 等依赖。
 """
-from .openai_provider import OpenAIProvider
-from .anthropic_provider import AnthropicProvider
-from .deepseek_provider import DeepSeekProvider
-from .google_provider import GoogleProvider
-from .alibaba_provider import AlibabaProvider
-from .ollama_provider import OllamaProvider
-from .azure_provider import AzureOpenAIProvider
-from .mistral_provider import MistralProvider
-from .moonshot_provider import MoonshotProvider
-from .generic_provider import GenericOpenAIProvider
-from .minimax_provider import MiniMaxProvider
+import importlib
+from typing import Any
+
+# 类名 → 所在模块
+_LAZY_EXPORTS = {
+    "OpenAIProvider": "openai_provider",
+    "AnthropicProvider": "anthropic_provider",
+    "DeepSeekProvider": "deepseek_provider",
+    "GoogleProvider": "google_provider",
+    "AlibabaProvider": "alibaba_provider",
+    "OllamaProvider": "ollama_provider",
+    "AzureOpenAIProvider": "azure_provider",
+    "MistralProvider": "mistral_provider",
+    "MoonshotProvider": "moonshot_provider",
+    "GenericOpenAIProvider": "generic_provider",
+    "MiniMaxProvider": "minimax_provider",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_EXPORTS))
+
 
 __all__ = [
     "OpenAIProvider",
@@ -10,12 +10,11 @@
 
 作者: 程序员Eighteen
 """
-import json
 import os
-import re
 import logging
 from typing import Any, Dict, List
 
+from ..http_pool import get_shared_http_client
 from ..base import BaseOpenAICompatibleProvider, LLMConfig, LLMResponse, ProviderType
 from ..config import PROVIDER_DEFAULT_ENDPOINTS, get_api_key_env_var
 
@@ -83,6 +82,7 @@ class AlibabaProvider(BaseOpenAICompatibleProvider):
             base_url=self.config.base_url,
             temperature=self.config.temperature,
             max_tokens=self.config.max_tokens,
+            http_async_client=get_shared_http_client(self.config),
         )
     
     def get_browser_use_llm(self) -> Any:
@@ -116,6 +116,7 @@ class AlibabaProvider(BaseOpenAICompatibleProvider):
             base_url=self.config.base_url,
             temperature=self.config.temperature,
             request_timeout=timeout,
+            http_async_client=get_shared_http_client(self.config),
         )
 
         # Qwen 系列特有的 action 别名
@@ -137,71 +138,3 @@ class AlibabaProvider(BaseOpenAICompatibleProvider):
     def supports_structured_output(self) -> bool:
         """Qwen 模型对 browser-use 的复杂 schema 支持不稳定"""
         return False
-
-    def parse_json_response(self, content: str) -> dict:
-        """
-        Alibaba/Qwen JSON 解析
-
-        Qwen 模型的常见问题：
-        - Qwen3.5 等大参数模型可能返回 {"thinking": "...", "action": [...]}
-          其中 thinking 字段不属于目标 schema
-        - 可能在 JSON 前后添加中文解释文字
-        - 偶尔有 markdown 代码块包裹
-        - 可能返回 ```json\n{...}\n``` 格式
-        - <think> 内容可能嵌在 JSON 字段值内
-        """
-        if not content:
-            raise ValueError("LLM 响应为空")
-
-        text = content.strip()
-
-        # 1. 剥离所有 <think>...</think>（包括嵌在 JSON 字段值内的）
-        text = re.sub(r'<think>[\s\S]*?</think>', '', text).strip()
-
-        # 2. 剥离 markdown 代码块
-        text = self._extract_json(text)
-
-        # 3. 如果不是以 { 开头，找到第一个 {
-        if text and text[0] != '{':
-            idx = text.find('{')
-            if idx >= 0:
-                text = text[idx:]
-
-        # 4. 用括号匹配提取完整 JSON 对象
-        from ..base import _find_matching_brace
-        if text and text.startswith('{'):
-            end_idx = _find_matching_brace(text)
-            if end_idx > 0:
-                extracted = text[:end_idx + 1]
-                if end_idx < len(text) - 1:
-                    logger.debug(
-                        f"[Alibaba] 括号匹配截断: "
-                        f"原始 {len(text)} → 提取 {len(extracted)} 字符"
-                    )
-                text = extracted
-
-        # 5. 直接尝试解析
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-
-        # 6. 移除尾部逗号
-        fixed = re.sub(r',\s*([}\]])', r'\1', text)
-        try:
-            return json.loads(fixed)
-        except json.JSONDecodeError:
-            pass
-
-        # 7. 使用 json_repair 库修复
-        try:
-            from json_repair import repair_json
-            repaired = repair_json(text, return_objects=True)
-            if isinstance(repaired, dict):
-                logger.info(f"[Alibaba] json_repair 成功修复 JSON ({len(text)} 字符)")
-                return repaired
-        except Exception as e:
-            logger.debug(f"[Alibaba] json_repair 失败: {e}")
-
-        # 8. 回退到基类通用解析（含截断修复等）
-        return super().parse_json_response(content)
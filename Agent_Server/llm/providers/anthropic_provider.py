@@ -3,19 +3,65 @@ Anthropic Provider 实现
 
 支持 Claude 系列模型
 
+系统提示词作为稳定前缀发送，并在第一段系统提示词上设置 cache_control，
+由 Anthropic 服务端缓存（命中时输入按缓存价计费、首 Token 更快）。
+browser-use 路径使用 browser-use 自带的 ChatAnthropic，系统提示词的 cache_control 由其序列化器添加。
+配置: ANTHROPIC_PROMPT_CACHE_ENABLED = true
+
 作者: 程序员Eighteen
 """
-import json
 import os
-import re
 import logging
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 
 from ..base import BaseLLMProvider, LLMConfig, LLMResponse, ProviderType
 from ..config import PROVIDER_DEFAULT_ENDPOINTS, get_api_key_env_var
 
 logger = logging.getLogger(__name__)
 
+# 配置
+ANTHROPIC_PROMPT_CACHE_ENABLED = os.getenv("ANTHROPIC_PROMPT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def _split_messages(messages: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    分离系统消息和对话消息
+
+    多条系统消息（如上下文裁剪插入的摘要）按顺序拼成多个 system 块；
+    缓存断点放在第一块（静态系统提示词）上，后续动态内容不影响前缀命中。
+    """
+    system_blocks = []
+    chat_messages = []
+    for msg in messages:
+        if msg["role"] == "system":
+            if msg.get("content"):
+                system_blocks.append({"type": "text", "text": msg["content"]})
+        else:
+            chat_messages.append(msg)
+    if system_blocks and ANTHROPIC_PROMPT_CACHE_ENABLED:
+        system_blocks[0]["cache_control"] = {"type": "ephemeral"}
+    return system_blocks, chat_messages
+
+
+def _usage_tokens(usage: Any) -> Dict[str, int]:
+    """
+    Anthropic 的 input_tokens 不含缓存部分，这里把缓存读取 / 写入加回 prompt_tokens，
+    与其它供应商的口径一致
+    """
+    if usage is None:
+        return {}
+    cached = getattr(usage, "cache_read_input_tokens", 0) or 0
+    created = getattr(usage, "cache_creation_input_tokens", 0) or 0
+    prompt = (usage.input_tokens or 0) + cached + created
+    completion = usage.output_tokens or 0
+    return {
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "total_tokens": prompt + completion,
+        "cached_tokens": cached,
+        "cache_creation_tokens": created,
+    }
+
 
 class AnthropicProvider(BaseLLMProvider):
     """
@@ -70,22 +116,15 @@ class AnthropicProvider(BaseLLMProvider):
         self.ensure_initialized()
         
         # 分离系统消息和其他消息
-        system_message = ""
-        chat_messages = []
-        
-        for msg in messages:
-            if msg["role"] == "system":
-                system_message = msg["content"]
-            else:
-                chat_messages.append(msg)
+        system_blocks, chat_messages = _split_messages(messages)
         
         try:
             response = self._client.messages.create(
                 model=self.config.model_name,
                 max_tokens=max_tokens or self.config.max_tokens,
-                system=system_message if system_message else None,
                 messages=chat_messages,
                 temperature=temperature if temperature is not None else self.config.temperature,
+                **({"system": system_blocks} if system_blocks else {}),
             )
             
             # 提取内容
@@ -97,10 +136,8 @@ class AnthropicProvider(BaseLLMProvider):
                 content=content,
                 model=response.model,
                 finish_reason=response.stop_reason or "",
-                prompt_tokens=response.usage.input_tokens if response.usage else 0,
-                completion_tokens=response.usage.output_tokens if response.usage else 0,
-                total_tokens=(response.usage.input_tokens + response.usage.output_tokens) if response.usage else 0,
-                raw_response=response
+                raw_response=response,
+                **_usage_tokens(response.usage),
             )
             
         except Exception as e:
@@ -115,33 +152,23 @@ class AnthropicProvider(BaseLLMProvider):
         **kwargs
     ) -> LLMResponse:
         """异步聊天"""
+        from ..http_pool import get_http_pool
+        
         try:
-            from anthropic import AsyncAnthropic
+            async_client = get_http_pool().get_async_anthropic(self.config)
         except ImportError:
             logger.error("[Anthropic] anthropic 库未安装")
             raise
         
-        async_client = AsyncAnthropic(
-            api_key=self.config.api_key,
-            base_url=self.config.base_url
-        )
-        
-        system_message = ""
-        chat_messages = []
-        
-        for msg in messages:
-            if msg["role"] == "system":
-                system_message = msg["content"]
-            else:
-                chat_messages.append(msg)
+        system_blocks, chat_messages = _split_messages(messages)
         
         try:
             response = await async_client.messages.create(
                 model=self.config.model_name,
                 max_tokens=max_tokens or self.config.max_tokens,
-                system=system_message if system_message else None,
                 messages=chat_messages,
                 temperature=temperature if temperature is not None else self.config.temperature,
+                **({"system": system_blocks} if system_blocks else {}),
             )
             
             content = ""
@@ -152,18 +179,59 @@ class AnthropicProvider(BaseLLMProvider):
                 content=content,
                 model=response.model,
                 finish_reason=response.stop_reason or "",
-                prompt_tokens=response.usage.input_tokens if response.usage else 0,
-                completion_tokens=response.usage.output_tokens if response.usage else 0,
-                total_tokens=(response.usage.input_tokens + response.usage.output_tokens) if response.usage else 0,
-                raw_response=response
+                raw_response=response,
+                **_usage_tokens(response.usage),
             )
             
         except Exception as e:
             logger.error(f"[Anthropic] 异步聊天请求失败: {e}")
             raise
     
+    async def achat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None,
+        usage_callback: Optional[Callable[[int, int], None]] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """异步流式聊天"""
+        from ..http_pool import get_http_pool
+        
+        async_client = get_http_pool().get_async_anthropic(self.config)
+        
+        system_blocks, chat_messages = _split_messages(messages)
+        
+        request_params = {
+            "model": self.config.model_name,
+            "max_tokens": max_tokens or self.config.max_tokens,
+            "messages": chat_messages,
+            "temperature": temperature if temperature is not None else self.config.temperature,
+        }
+        if system_blocks:
+            request_params["system"] = system_blocks
+        
+        try:
+            async with async_client.messages.stream(**request_params) as stream:
+                async for text in stream.text_stream:
+                    if text:
+                        yield text
+                final_message = await stream.get_final_message()
+            
+            if usage_callback and final_message.usage:
+                usage = _usage_tokens(final_message.usage)
+                usage_callback(usage["prompt_tokens"], usage["completion_tokens"])
+        except Exception as e:
+            logger.error(f"[Anthropic] 流式聊天请求失败: {e}")
+            raise
+    
     def get_langchain_llm(self) -> Any:
-        """获取 LangChain LLM 实例"""
+        """
+        获取 LangChain LLM 实例
+
+        langchain_anthropic 的 ChatAnthropic 没有传入 httpx 客户端的参数，不使用 llm.http_pool 的共享连接池；
+        它自己按 (base_url, timeout) 缓存一个进程级 httpx 客户端，同一端点的实例之间仍会复用连接。
+        """
         from langchain_anthropic import ChatAnthropic
         
         return ChatAnthropic(
@@ -174,50 +242,24 @@ class AnthropicProvider(BaseLLMProvider):
         )
     
     def get_browser_use_llm(self) -> Any:
-        """获取 Browser-Use LLM 实例"""
-        # Browser-Use 使用 LangChain 的 Anthropic
-        return self.get_langchain_llm()
-
-    def parse_json_response(self, content: str) -> dict:
         """
-        Anthropic (Claude) JSON 解析
+        获取 Browser-Use LLM 实例
 
-        Claude 的特点：
-        - 经常在 JSON 前后添加解释性文字（如 "Here is the JSON:" 或 "以下是结果："）
-        - 有时用 markdown 代码块包裹
-        - JSON 本身通常格式规范，很少有尾部逗号等问题
+        使用 browser-use 自带的 ChatAnthropic：Agent 的系统提示词（含 extend_system_message）以 cache=True
+        发送，由其序列化器加上 cache_control；底层复用本档案的共享连接池。
         """
-        if not content:
-            raise ValueError("LLM 响应为空")
-
-        text = content.strip()
-
-        # 1. 剥离 markdown 代码块
-        text = self._extract_json(text)
-
-        # 2. 直接尝试
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-
-        # 3. Claude 喜欢在 JSON 前后加文字，提取第一个完整 JSON 对象
-        match = re.search(r'\{[\s\S]*\}', text)
-        if match:
-            try:
-                return json.loads(match.group(0))
-            except json.JSONDecodeError:
-                pass
-
-        # 4. 使用 json_repair 库修复
         try:
-            from json_repair import repair_json
-            repaired = repair_json(text, return_objects=True)
-            if isinstance(repaired, dict):
-                logger.info(f"[Anthropic] json_repair 成功修复 JSON ({len(text)} 字符)")
-                return repaired
-        except Exception as e:
-            logger.debug(f"[Anthropic] json_repair 失败: {e}")
-
-        # 5. 回退到基类通用解析
-        return super().parse_json_response(content)
+            from browser_use.llm.anthropic.chat import ChatAnthropic as BrowserUseChatAnthropic
+            from ..http_pool import get_shared_http_client
+            
+            return BrowserUseChatAnthropic(
+                model=self.config.model_name,
+                api_key=self.config.api_key,
+                base_url=self.config.base_url,
+                temperature=self.config.temperature,
+                max_tokens=self.config.max_tokens,
+                http_client=get_shared_http_client(self.config),
+            )
+        except ImportError:
+            logger.warning("[Anthropic] browser-use 未安装，回退到 LangChain")
+            return self.get_langchain_llm()
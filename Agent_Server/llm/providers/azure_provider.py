@@ -9,7 +9,7 @@ import os
 import logging
 from typing import Any, Dict, List
 
-from ..base import BaseLLMProvider, LLMConfig, LLMResponse, ProviderType
+from ..base import BaseLLMProvider, LLMConfig, LLMResponse, ProviderType, get_cached_prompt_tokens
 from ..config import get_api_key_env_var
 
 logger = logging.getLogger(__name__)
@@ -87,6 +87,7 @@ class AzureOpenAIProvider(BaseLLMProvider):
                 prompt_tokens=usage.prompt_tokens if usage else 0,
                 completion_tokens=usage.completion_tokens if usage else 0,
                 total_tokens=usage.total_tokens if usage else 0,
+                cached_tokens=get_cached_prompt_tokens(usage),
                 raw_response=response
             )
             
@@ -102,13 +103,9 @@ class AzureOpenAIProvider(BaseLLMProvider):
         **kwargs
     ) -> LLMResponse:
         """异步聊天"""
-        from openai import AsyncAzureOpenAI
+        from ..http_pool import get_http_pool
         
-        async_client = AsyncAzureOpenAI(
-            api_key=self.config.api_key,
-            api_version=self.config.api_version,
-            azure_endpoint=self.config.base_url,
-        )
+        async_client = get_http_pool().get_async_azure_openai(self.config)
         
         request_params = {
             "model": self.config.model_name,
@@ -133,6 +130,7 @@ class AzureOpenAIProvider(BaseLLMProvider):
                 prompt_tokens=usage.prompt_tokens if usage else 0,
                 completion_tokens=usage.completion_tokens if usage else 0,
                 total_tokens=usage.total_tokens if usage else 0,
+                cached_tokens=get_cached_prompt_tokens(usage),
                 raw_response=response
             )
             
@@ -6,17 +6,18 @@ DeepSeek Provider 实现
 
 作者: 程序员Eighteen
 """
-import json
 import os
-import re
 import logging
-from typing import Any, Dict, List
+from typing import TYPE_CHECKING, Any, Dict, List
 
-from langchain_core.language_models.base import LanguageModelInput
-from langchain_core.runnables import RunnableConfig
-from langchain_core.messages import AIMessage, SystemMessage, HumanMessage
+if TYPE_CHECKING:
+    # langchain_core 只在 LangChain 兼容调用时才导入，避免拖慢 Provider 加载
+    from langchain_core.language_models.base import LanguageModelInput
+    from langchain_core.runnables import RunnableConfig
+    from langchain_core.messages import AIMessage
 
-from ..base import BaseOpenAICompatibleProvider, LLMConfig, LLMResponse, ProviderType
+from ..http_pool import get_shared_http_client
+from ..base import BaseOpenAICompatibleProvider, LLMConfig, LLMResponse, ProviderType, get_cached_prompt_tokens
 from ..config import PROVIDER_DEFAULT_ENDPOINTS, get_api_key_env_var, is_reasoning_model
 
 logger = logging.getLogger(__name__)
@@ -51,6 +52,8 @@ class DeepSeekR1ChatOpenAI:
     
     def _convert_messages(self, input_messages) -> List[Dict]:
         """转换 LangChain 消息格式为 OpenAI 格式"""
+        from langchain_core.messages import AIMessage, SystemMessage
+        
         message_history = []
         for msg in input_messages:
             if isinstance(msg, SystemMessage):
@@ -63,10 +66,10 @@ class DeepSeekR1ChatOpenAI:
     
     async def ainvoke(
         self,
-        input: LanguageModelInput,
-        config: RunnableConfig = None,
+        input: "LanguageModelInput",
+        config: "RunnableConfig" = None,
         **kwargs
-    ) -> AIMessage:
+    ) -> "AIMessage":
         """异步调用"""
         message_history = self._convert_messages(input)
         
@@ -81,6 +84,7 @@ class DeepSeekR1ChatOpenAI:
         reasoning_content = getattr(message, 'reasoning_content', '') or ''
         content = message.content or ''
         
+        from langchain_core.messages import AIMessage
         return AIMessage(
             content=content,
             additional_kwargs={"reasoning_content": reasoning_content}
@@ -88,10 +92,10 @@ class DeepSeekR1ChatOpenAI:
     
     def invoke(
         self,
-        input: LanguageModelInput,
-        config: RunnableConfig = None,
+        input: "LanguageModelInput",
+        config: "RunnableConfig" = None,
         **kwargs
-    ) -> AIMessage:
+    ) -> "AIMessage":
         """同步调用"""
         message_history = self._convert_messages(input)
         
@@ -105,6 +109,7 @@ class DeepSeekR1ChatOpenAI:
         reasoning_content = getattr(message, 'reasoning_content', '') or ''
         content = message.content or ''
         
+        from langchain_core.messages import AIMessage
         return AIMessage(
             content=content,
             additional_kwargs={"reasoning_content": reasoning_content}
@@ -189,6 +194,7 @@ class DeepSeekProvider(BaseOpenAICompatibleProvider):
                 prompt_tokens=usage.prompt_tokens if usage else 0,
                 completion_tokens=usage.completion_tokens if usage else 0,
                 total_tokens=usage.total_tokens if usage else 0,
+                cached_tokens=get_cached_prompt_tokens(usage),
                 raw_response=response
             )
             
@@ -216,6 +222,7 @@ class DeepSeekProvider(BaseOpenAICompatibleProvider):
             base_url=self.config.base_url,
             temperature=self.config.temperature,
             max_tokens=self.config.max_tokens,
+            http_async_client=get_shared_http_client(self.config),
         )
     
     def get_browser_use_llm(self) -> Any:
@@ -237,6 +244,7 @@ class DeepSeekProvider(BaseOpenAICompatibleProvider):
             base_url=self.config.base_url,
             temperature=self.config.temperature,
             request_timeout=timeout,
+            http_async_client=get_shared_http_client(self.config),
         )
 
         # DeepSeek 特有的 action 别名
@@ -257,89 +265,3 @@ class DeepSeekProvider(BaseOpenAICompatibleProvider):
     def supports_structured_output(self) -> bool:
         """DeepSeek 不支持结构化输出"""
         return False
-
-    def parse_json_response(self, content: str) -> dict:
-        """
-        DeepSeek JSON 解析
-
-        DeepSeek 的特点：
-        - 不支持 response_format=json_object，必须从自由文本中提取 JSON
-        - R1 (reasoner) 模型有 reasoning_content 字段，但 chat() 返回的 content
-          可能仍包含 <think>...</think> 标签（取决于 API 版本）
-        - deepseek-chat 通常比较规范，但偶尔有 markdown 包裹
-        - 可能在 JSON 后面追加解释文字
-        - 可能缺少逗号分隔符或有多余逗号
-        - <think> 内容可能嵌在 JSON 字段值内（如 "thinking": "<think>..."）
-        """
-        if not content:
-            raise ValueError("LLM 响应为空")
-
-        text = content.strip()
-
-        # 1. 剥离所有 <think>...</think>（包括嵌在 JSON 字段值内的）
-        text = re.sub(r'<think>[\s\S]*?</think>', '', text).strip()
-
-        # 2. 剥离 **JSON Response:** 格式
-        if "**JSON Response:**" in text:
-            text = text.split("**JSON Response:**")[-1].strip()
-
-        # 3. 剥离 markdown 代码块
-        text = self._extract_json(text)
-
-        # 4. 如果不是以 { 开头，找到第一个 {
-        if text and text[0] != '{':
-            idx = text.find('{')
-            if idx >= 0:
-                text = text[idx:]
-
-        # 5. 用括号匹配提取完整 JSON 对象
-        from ..base import _find_matching_brace
-        if text and text.startswith('{'):
-            end_idx = _find_matching_brace(text)
-            if end_idx > 0:
-                extracted = text[:end_idx + 1]
-                if end_idx < len(text) - 1:
-                    logger.debug(
-                        f"[DeepSeek] 括号匹配截断: "
-                        f"原始 {len(text)} → 提取 {len(extracted)} 字符"
-                    )
-                text = extracted
-
-        # 6. 直接尝试
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-
-        # 7. 修复常见 JSON 格式问题
-        fixed = self._fix_common_json_issues(text)
-        try:
-            return json.loads(fixed)
-        except json.JSONDecodeError:
-            pass
-
-        # 8. 使用 json_repair 库修复
-        try:
-            from json_repair import repair_json
-            repaired = repair_json(text, return_objects=True)
-            if isinstance(repaired, dict):
-                logger.info(f"[DeepSeek] json_repair 成功修复 JSON ({len(text)} 字符)")
-                return repaired
-        except Exception as e:
-            logger.debug(f"[DeepSeek] json_repair 失败: {e}")
-
-        # 9. 回退到基类通用解析
-        return super().parse_json_response(content)
-
-    @staticmethod
-    def _fix_common_json_issues(text: str) -> str:
-        """修复 DeepSeek 常见的 JSON 格式问题"""
-        # 移除尾部逗号: ,} 或 ,]
-        fixed = re.sub(r',\s*([}\]])', r'\1', text)
-        # 修复缺少逗号: "value"\n"key" → "value",\n"key"
-        fixed = re.sub(r'"\s*\n(\s*")', r'",\n\1', fixed)
-        # 修复缺少逗号: }\n{ 或 ]\n{
-        fixed = re.sub(r'(\})\s*\n(\s*\{)', r'\1,\n\2', fixed)
-        # 修复缺少逗号: true/false/null/数字 后面直接跟 "key"
-        fixed = re.sub(r'(true|false|null|\d+)\s*\n(\s*")', r'\1,\n\2', fixed)
-        return fixed
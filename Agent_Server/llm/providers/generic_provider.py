@@ -5,13 +5,12 @@
 
 作者: 程序员Eighteen
 """
-import json
 import os
-import re
 import logging
 from typing import Any, Dict, List
 
-from ..base import BaseOpenAICompatibleProvider, LLMConfig, LLMResponse, ProviderType
+from ..http_pool import get_shared_http_client
+from ..base import BaseOpenAICompatibleProvider, LLMConfig, LLMResponse, ProviderType, get_cached_prompt_tokens
 from ..config import is_reasoning_model
 
 logger = logging.getLogger(__name__)
@@ -38,6 +37,9 @@ class GenericOpenAIProvider(BaseOpenAICompatibleProvider):
     这些 Provider 都使用 OpenAI 兼容的 API 格式
     """
     
+    # 兼容服务不一定识别 stream_options，流式请求不附带
+    supports_stream_usage = False
+    
     def __init__(self, config: LLMConfig, provider_name: str = None):
         # 如果没有指定 provider_name，从 config.provider 获取显示名称
         if provider_name is None:
@@ -110,6 +112,7 @@ class GenericOpenAIProvider(BaseOpenAICompatibleProvider):
                 prompt_tokens=usage.prompt_tokens if usage else 0,
                 completion_tokens=usage.completion_tokens if usage else 0,
                 total_tokens=usage.total_tokens if usage else 0,
+                cached_tokens=get_cached_prompt_tokens(usage),
                 raw_response=response
             )
             
@@ -127,6 +130,7 @@ class GenericOpenAIProvider(BaseOpenAICompatibleProvider):
             "base_url": self.config.base_url,
             "temperature": self.config.temperature,
             "max_tokens": self.config.max_tokens,
+            "http_async_client": get_shared_http_client(self.config),
         }
         
         # 添加额外参数
@@ -146,73 +150,12 @@ class GenericOpenAIProvider(BaseOpenAICompatibleProvider):
                 base_url=self.config.base_url,
                 temperature=self.config.temperature,
                 dont_force_structured_output=not self.supports_structured_output(),
+                http_client=get_shared_http_client(self.config),
             )
         except ImportError:
             logger.warning(f"[{self.provider_name}] browser-use 未安装，回退到 LangChain")
             return self.get_langchain_llm()
 
-    def parse_json_response(self, content: str) -> dict:
-        """
-        通用 OpenAI 兼容 Provider JSON 解析
-
-        覆盖 SiliconFlow、ModelScope、智谱、Grok 等多种服务：
-        - SiliconFlow/ModelScope 上的 DeepSeek R1 有 <think> 标签
-        - 智谱 GLM 不支持结构化输出，可能有 markdown 包裹
-        - 参考 openclaw: Minimax 是 reasoning tag provider
-        """
-        if not content:
-            raise ValueError("LLM 响应为空")
-
-        text = content.strip()
-
-        # 1. 剥离推理标签（SiliconFlow/ModelScope 上的 R1、QwQ 等）
-        if self.is_reasoning_model() and "<think>" in text and "</think>" in text:
-            parts = text.split("</think>", 1)
-            text = parts[1].strip() if len(parts) >= 2 else text
-
-        # 2. 剥离 **JSON Response:**
-        if "**JSON Response:**" in text:
-            text = text.split("**JSON Response:**")[-1].strip()
-
-        # 3. 剥离 markdown 代码块
-        text = self._extract_json(text)
-
-        # 4. 直接尝试
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-
-        # 5. 移除尾部逗号
-        fixed = re.sub(r',\s*([}\]])', r'\1', text)
-        try:
-            return json.loads(fixed)
-        except json.JSONDecodeError:
-            pass
-
-        # 6. 提取第一个 JSON 对象
-        match = re.search(r'\{[\s\S]*\}', text)
-        if match:
-            try:
-                candidate = re.sub(r',\s*([}\]])', r'\1', match.group(0))
-                return json.loads(candidate)
-            except json.JSONDecodeError:
-                pass
-
-        # 7. 使用 json_repair 库修复
-        try:
-            from json_repair import repair_json
-            repaired = repair_json(text, return_objects=True)
-            if isinstance(repaired, dict):
-                logger.info(f"[{self.provider_name}] json_repair 成功修复 JSON ({len(text)} 字符)")
-                return repaired
-        except Exception as e:
-            logger.debug(f"[{self.provider_name}] json_repair 失败: {e}")
-
-        # 8. 回退到基类
-        return super().parse_json_response(content)
-
-
 # 预定义的特定 Provider（继承 GenericOpenAIProvider）
 
 class SiliconFlowProvider(GenericOpenAIProvider):
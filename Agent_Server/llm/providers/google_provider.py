@@ -5,11 +5,9 @@ Google Provider 实现
 
 作者: 程序员Eighteen
 """
-import json
 import os
-import re
 import logging
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
 
 from ..base import BaseLLMProvider, LLMConfig, LLMResponse, ProviderType
 from ..config import get_api_key_env_var
@@ -182,6 +180,69 @@ class GoogleProvider(BaseLLMProvider):
             logger.error(f"[Google] 异步聊天请求失败: {e}")
             raise
     
+    async def achat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None,
+        usage_callback: Optional[Callable[[int, int], None]] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """异步流式聊天"""
+        self.ensure_initialized()
+        
+        history = []
+        system_instruction = ""
+        for msg in messages:
+            if msg["role"] == "system":
+                system_instruction = msg["content"]
+            elif msg["role"] == "user":
+                history.append({"role": "user", "parts": [msg["content"]]})
+            elif msg["role"] == "assistant":
+                history.append({"role": "model", "parts": [msg["content"]]})
+        
+        try:
+            import google.generativeai as genai
+            
+            generation_config = genai.GenerationConfig(
+                temperature=temperature if temperature is not None else self.config.temperature,
+                max_output_tokens=max_tokens or self.config.max_tokens,
+            )
+            
+            if system_instruction:
+                model = genai.GenerativeModel(
+                    self.config.model_name,
+                    system_instruction=system_instruction
+                )
+            else:
+                model = self._client
+            
+            chat = model.start_chat(history=history[:-1] if history else [])
+            last_message = history[-1]["parts"][0] if history else ""
+            response = await chat.send_message_async(
+                last_message, generation_config=generation_config, stream=True
+            )
+            
+            usage_metadata = None
+            async for chunk in response:
+                usage_metadata = getattr(chunk, 'usage_metadata', None) or usage_metadata
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # 被安全策略拦截等情况下 chunk 没有文本
+                    text = ""
+                if text:
+                    yield text
+            
+            if usage_callback and usage_metadata:
+                usage_callback(
+                    getattr(usage_metadata, 'prompt_token_count', 0) or 0,
+                    getattr(usage_metadata, 'candidates_token_count', 0) or 0,
+                )
+        except Exception as e:
+            logger.error(f"[Google] 流式聊天请求失败: {e}")
+            raise
+    
     def get_langchain_llm(self) -> Any:
         """获取 LangChain LLM 实例"""
         from langchain_google_genai import ChatGoogleGenerativeAI
@@ -195,46 +256,3 @@ class GoogleProvider(BaseLLMProvider):
     def get_browser_use_llm(self) -> Any:
         """获取 Browser-Use LLM 实例"""
         return self.get_langchain_llm()
-
-    def parse_json_response(self, content: str) -> dict:
-        """
-        Google (Gemini) JSON 解析
-
-        Gemini 的特点：
-        - Thinking 模型（gemini-2.0-flash-thinking-exp 等）会在响应中包含推理过程
-        - 经常用 ```json 代码块包裹
-        - 有时返回多个 JSON 候选，需要取第一个
-        - 2.5 系列模型可能在 JSON 前加 "```json\n" 后加 "\n```"
-        """
-        if not content:
-            raise ValueError("LLM 响应为空")
-
-        text = content.strip()
-
-        # 1. Gemini thinking 模型可能有类似推理标签的输出
-        #    参考 openclaw: google-generative-ai 是 reasoning tag provider
-        if "<think>" in text and "</think>" in text:
-            parts = text.split("</think>", 1)
-            text = parts[1].strip() if len(parts) >= 2 else text
-
-        # 2. 剥离 markdown 代码块
-        text = self._extract_json(text)
-
-        # 3. 直接尝试
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-
-        # 4. 使用 json_repair 库修复
-        try:
-            from json_repair import repair_json
-            repaired = repair_json(text, return_objects=True)
-            if isinstance(repaired, dict):
-                logger.info(f"[Google] json_repair 成功修复 JSON ({len(text)} 字符)")
-                return repaired
-        except Exception as e:
-            logger.debug(f"[Google] json_repair 失败: {e}")
-
-        # 5. 回退到基类通用解析
-        return super().parse_json_response(content)
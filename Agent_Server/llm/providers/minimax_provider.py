@@ -5,12 +5,11 @@ MiniMax Provider 实现
 
 作者: 程序员Eighteen
 """
-import json
 import os
-import re
 import logging
 from typing import Any, Dict, List
 
+from ..http_pool import get_shared_http_client
 from ..base import BaseOpenAICompatibleProvider, LLMConfig, LLMResponse, ProviderType
 from ..config import PROVIDER_DEFAULT_ENDPOINTS, get_api_key_env_var
 
@@ -61,6 +60,7 @@ class MiniMaxProvider(BaseOpenAICompatibleProvider):
             base_url=self.config.base_url,
             temperature=self.config.temperature,
             max_tokens=self.config.max_tokens,
+            http_async_client=get_shared_http_client(self.config),
         )
 
     def get_browser_use_llm(self) -> Any:
@@ -82,6 +82,7 @@ class MiniMaxProvider(BaseOpenAICompatibleProvider):
             base_url=self.config.base_url,
             temperature=self.config.temperature,
             request_timeout=timeout,
+            http_async_client=get_shared_http_client(self.config),
         )
 
         # MiniMax 特有的 action 别名
@@ -101,55 +102,3 @@ class MiniMaxProvider(BaseOpenAICompatibleProvider):
     def supports_structured_output(self) -> bool:
         """MiniMax 不支持结构化输出"""
         return False
-
-    def parse_json_response(self, content: str) -> dict:
-        """
-        MiniMax JSON 解析
-
-        MiniMax 的特点：
-        - 不支持 response_format=json_object
-        - 输出通常比较规范，偶尔有 markdown 代码块包裹
-        - 可能在 JSON 前后加中文说明文字
-        """
-        if not content:
-            raise ValueError("LLM 响应为空")
-
-        text = content.strip()
-
-        # 1. 剥离 markdown 代码块
-        text = self._extract_json(text)
-
-        # 2. 直接尝试
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-
-        # 3. 移除尾部逗号
-        fixed = re.sub(r',\s*([}\]])', r'\1', text)
-        try:
-            return json.loads(fixed)
-        except json.JSONDecodeError:
-            pass
-
-        # 4. 提取第一个 JSON 对象
-        match = re.search(r'\{[\s\S]*\}', text)
-        if match:
-            try:
-                candidate = re.sub(r',\s*([}\]])', r'\1', match.group(0))
-                return json.loads(candidate)
-            except json.JSONDecodeError:
-                pass
-
-        # 5. 使用 json_repair 库修复
-        try:
-            from json_repair import repair_json
-            repaired = repair_json(text, return_objects=True)
-            if isinstance(repaired, dict):
-                logger.info(f"[MiniMax] json_repair 成功修复 JSON ({len(text)} 字符)")
-                return repaired
-        except Exception as e:
-            logger.debug(f"[MiniMax] json_repair 失败: {e}")
-
-        # 6. 回退到基类
-        return super().parse_json_response(content)
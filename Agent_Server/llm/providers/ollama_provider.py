@@ -7,13 +7,14 @@ Ollama Provider 实现
 """
 import json
 import os
-import re
 import logging
-from typing import Any, Dict, List
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, List, Optional
 
-from langchain_core.language_models.base import LanguageModelInput
-from langchain_core.runnables import RunnableConfig
-from langchain_core.messages import AIMessage
+if TYPE_CHECKING:
+    # langchain_core 只在 LangChain 兼容调用时才导入，避免拖慢 Provider 加载
+    from langchain_core.language_models.base import LanguageModelInput
+    from langchain_core.runnables import RunnableConfig
+    from langchain_core.messages import AIMessage
 
 from ..base import BaseLLMProvider, LLMConfig, LLMResponse, ProviderType
 from ..config import PROVIDER_DEFAULT_ENDPOINTS, is_reasoning_model
@@ -66,16 +67,17 @@ class DeepSeekR1ChatOllama:
     
     async def ainvoke(
         self,
-        input: LanguageModelInput,
-        config: RunnableConfig = None,
+        input: "LanguageModelInput",
+        config: "RunnableConfig" = None,
         **kwargs
-    ) -> AIMessage:
+    ) -> "AIMessage":
         """异步调用"""
         response = await self._ollama.ainvoke(input)
         content = response.content
         
         thinking, final = self._parse_thinking_output(content)
         
+        from langchain_core.messages import AIMessage
         return AIMessage(
             content=final,
             additional_kwargs={"reasoning_content": thinking}
@@ -83,16 +85,17 @@ class DeepSeekR1ChatOllama:
     
     def invoke(
         self,
-        input: LanguageModelInput,
-        config: RunnableConfig = None,
+        input: "LanguageModelInput",
+        config: "RunnableConfig" = None,
         **kwargs
-    ) -> AIMessage:
+    ) -> "AIMessage":
         """同步调用"""
         response = self._ollama.invoke(input)
         content = response.content
         
         thinking, final = self._parse_thinking_output(content)
         
+        from langchain_core.messages import AIMessage
         return AIMessage(
             content=final,
             additional_kwargs={"reasoning_content": thinking}
@@ -224,47 +227,95 @@ class OllamaProvider(BaseLLMProvider):
         **kwargs
     ) -> LLMResponse:
         """异步聊天"""
+        from ..http_pool import get_shared_http_client
+        
         try:
-            import httpx
+            client = get_shared_http_client(self.config)
+            
+            response = await client.post(
+                f"{self.config.base_url}/api/chat",
+                json={
+                    "model": self.config.model_name,
+                    "messages": messages,
+                    "stream": False,
+                    "options": {
+                        "temperature": temperature if temperature is not None else self.config.temperature,
+                        "num_ctx": self.config.num_ctx,
+                    }
+                },
+                timeout=self.config.timeout
+            )
+            response.raise_for_status()
+            result = response.json()
+            
+            content = result.get("message", {}).get("content", "")
+            
+            reasoning_content = ""
+            if self.is_reasoning_model():
+                if "<think>" in content and "</think>" in content:
+                    parts = content.split("</think>")
+                    reasoning_content = parts[0].replace("<think>", "").strip()
+                    content = parts[1].strip()
+            
+            return LLMResponse(
+                content=content,
+                reasoning_content=reasoning_content,
+                model=self.config.model_name,
+                finish_reason="stop",
+                raw_response=result
+            )
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.config.base_url}/api/chat",
-                    json={
-                        "model": self.config.model_name,
-                        "messages": messages,
-                        "stream": False,
-                        "options": {
-                            "temperature": temperature if temperature is not None else self.config.temperature,
-                            "num_ctx": self.config.num_ctx,
-                        }
-                    },
-                    timeout=self.config.timeout
-                )
-                response.raise_for_status()
-                result = response.json()
-                
-                content = result.get("message", {}).get("content", "")
-                
-                reasoning_content = ""
-                if self.is_reasoning_model():
-                    if "<think>" in content and "</think>" in content:
-                        parts = content.split("</think>")
-                        reasoning_content = parts[0].replace("<think>", "").strip()
-                        content = parts[1].strip()
-                
-                return LLMResponse(
-                    content=content,
-                    reasoning_content=reasoning_content,
-                    model=self.config.model_name,
-                    finish_reason="stop",
-                    raw_response=result
-                )
-                
         except Exception as e:
             logger.error(f"[Ollama] 异步聊天请求失败: {e}")
             raise
     
+    async def achat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None,
+        usage_callback: Optional[Callable[[int, int], None]] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """异步流式聊天（Ollama 按行返回 JSON，最后一行带 done=true 和 token 统计）"""
+        from ..http_pool import get_shared_http_client
+        
+        client = get_shared_http_client(self.config)
+        options = {
+            "temperature": temperature if temperature is not None else self.config.temperature,
+            "num_ctx": self.config.num_ctx,
+        }
+        if max_tokens:
+            options["num_predict"] = max_tokens
+        
+        try:
+            async with client.stream(
+                "POST",
+                f"{self.config.base_url}/api/chat",
+                json={
+                    "model": self.config.model_name,
+                    "messages": messages,
+                    "stream": True,
+                    "options": options,
+                },
+                timeout=self.config.timeout,
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    data = json.loads(line)
+                    text = data.get("message", {}).get("content", "")
+                    if text:
+                        yield text
+                    if data.get("done"):
+                        if usage_callback:
+                            usage_callback(data.get("prompt_eval_count", 0), data.get("eval_count", 0))
+                        break
+        except Exception as e:
+            logger.error(f"[Ollama] 流式聊天请求失败: {e}")
+            raise
+    
     def get_langchain_llm(self) -> Any:
         """获取 LangChain LLM 实例"""
         # DeepSeek R1 使用特殊实现
@@ -293,85 +344,3 @@ class OllamaProvider(BaseLLMProvider):
     def supports_structured_output(self) -> bool:
         """Ollama 不支持结构化输出"""
         return False
-
-    def parse_json_response(self, content: str) -> dict:
-        """
-        Ollama JSON 解析
-
-        Ollama 本地模型的特点：
-        - 输出最不稳定，格式差异大，取决于具体模型
-        - DeepSeek R1 系列有 <think>...</think> 标签
-        - 可能输出 **JSON Response:** 前缀
-        - 小模型（7B/14B）经常产生不完整 JSON、尾部逗号、未闭合括号
-        - 有时在 JSON 前后夹杂大量解释文字
-        - 参考 openclaw: Ollama 的 OpenAI 兼容端点通过 reasoning 字段原生处理推理，
-          不需要 tag-based 处理，但直接 API 调用仍可能包含 <think> 标签
-        """
-        if not content:
-            raise ValueError("LLM 响应为空")
-
-        text = content.strip()
-
-        # 1. 剥离 <think>...</think>
-        if "<think>" in text and "</think>" in text:
-            parts = text.split("</think>", 1)
-            text = parts[1].strip() if len(parts) >= 2 else text
-
-        # 2. 剥离 **JSON Response:**
-        if "**JSON Response:**" in text:
-            text = text.split("**JSON Response:**")[-1].strip()
-
-        # 3. 剥离 markdown 代码块
-        text = self._extract_json(text)
-
-        # 4. 直接尝试
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-
-        # 5. 移除尾部逗号
-        fixed = re.sub(r',\s*([}\]])', r'\1', text)
-        try:
-            return json.loads(fixed)
-        except json.JSONDecodeError:
-            pass
-
-        # 6. 修复截断 JSON（小模型常见）
-        open_braces = fixed.count('{') - fixed.count('}')
-        open_brackets = fixed.count('[') - fixed.count(']')
-        if open_braces > 0 or open_brackets > 0:
-            patched = fixed
-            last_close = max(patched.rfind('}'), patched.rfind(']'))
-            if last_close > 0:
-                patched = patched[:last_close + 1]
-                open_braces = patched.count('{') - patched.count('}')
-                open_brackets = patched.count('[') - patched.count(']')
-            patched += ']' * open_brackets + '}' * open_braces
-            patched = re.sub(r',\s*([}\]])', r'\1', patched)
-            try:
-                return json.loads(patched)
-            except json.JSONDecodeError:
-                pass
-
-        # 7. 提取第一个 JSON 对象
-        match = re.search(r'\{[\s\S]*\}', text)
-        if match:
-            try:
-                candidate = re.sub(r',\s*([}\]])', r'\1', match.group(0))
-                return json.loads(candidate)
-            except json.JSONDecodeError:
-                pass
-
-        # 8. 使用 json_repair 库修复
-        try:
-            from json_repair import repair_json
-            repaired = repair_json(text, return_objects=True)
-            if isinstance(repaired, dict):
-                logger.info(f"[Ollama] json_repair 成功修复 JSON ({len(text)} 字符)")
-                return repaired
-        except Exception as e:
-            logger.debug(f"[Ollama] json_repair 失败: {e}")
-
-        # 9. 回退到基类
-        return super().parse_json_response(content)
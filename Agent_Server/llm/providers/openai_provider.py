@@ -9,6 +9,7 @@ import os
 import logging
 from typing import Any, Dict, List
 
+from ..http_pool import get_shared_http_client
 from ..base import BaseOpenAICompatibleProvider, LLMConfig, LLMResponse, ProviderType
 from ..config import PROVIDER_DEFAULT_ENDPOINTS, get_api_key_env_var
 
@@ -55,6 +56,7 @@ class OpenAIProvider(BaseOpenAICompatibleProvider):
             base_url=self.config.base_url,
             temperature=self.config.temperature,
             max_tokens=self.config.max_tokens,
+            http_async_client=get_shared_http_client(self.config),
         )
     
     def get_browser_use_llm(self) -> Any:
@@ -67,6 +69,7 @@ class OpenAIProvider(BaseOpenAICompatibleProvider):
                 api_key=self.config.api_key,
                 base_url=self.config.base_url,
                 temperature=self.config.temperature,
+                http_client=get_shared_http_client(self.config),
             )
         except ImportError:
             logger.warning("[OpenAI] browser-use 未安装，回退到 LangChain")
@@ -0,0 +1,174 @@
+"""
+模型限流模块
+
+每个模型档案一组令牌桶（请求数/分钟 + Token 数/分钟），在请求发出前主动限流，
+而不是等到 429 之后再冷却切换。
+
+- 限额来自 llm_models.rpm_limit / tpm_limit，0 表示不限
+- 发请求前按估算 Token 扣减，完成后按实际用量多退少补
+- 剩余额度比例参与 ModelAutoSwitcher 的加权路由
+
+作者: 程序员Eighteen
+版本: 1.0
+"""
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    容量为每分钟限额（允许一分钟内的突发），按 capacity/60 每秒匀速回填。
+    额度可以被扣成负数（实际用量超过估算时），回填后再恢复。
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def available(self, now: float) -> float:
+        self._refill(now)
+        return self._tokens
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """距离可以扣减 amount 还需等待的秒数"""
+        self._refill(now)
+        # 单次请求超过整桶容量时，只要求桶是满的，避免永远等不到
+        need = min(amount, self.capacity)
+        if self._tokens >= need:
+            return 0.0
+        return (need - self._tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def consume(self, amount: float, now: float):
+        self._refill(now)
+        self._tokens -= amount
+
+    def adjust(self, delta: float):
+        """按实际用量修正：delta > 0 归还额度，delta < 0 追加扣减"""
+        self._tokens = min(self.capacity, self._tokens + delta)
+
+
+class ProfileRateLimiter:
+    """单个模型档案的 RPM + TPM 限流器"""
+
+    def __init__(self, rpm_limit: int = 0, tpm_limit: int = 0):
+        self.rpm_limit = rpm_limit or 0
+        self.tpm_limit = tpm_limit or 0
+        self._rpm = TokenBucket(self.rpm_limit) if self.rpm_limit > 0 else None
+        self._tpm = TokenBucket(self.tpm_limit) if self.tpm_limit > 0 else None
+        self._lock = threading.Lock()
+        self._stats = {"acquired": 0, "throttled": 0}
+
+    @property
+    def limited(self) -> bool:
+        return self._rpm is not None or self._tpm is not None
+
+    def same_limits(self, rpm_limit: int, tpm_limit: int) -> bool:
+        return self.rpm_limit == (rpm_limit or 0) and self.tpm_limit == (tpm_limit or 0)
+
+    def try_acquire(self, estimated_tokens: int) -> float:
+        """
+        尝试占用一次请求额度
+
+        Returns:
+            0 表示已占用；否则为需要等待的秒数（未占用）
+        """
+        if not self.limited:
+            with self._lock:
+                self._stats["acquired"] += 1
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self._rpm is not None:
+                wait = max(wait, self._rpm.wait_time(1, now))
+            if self._tpm is not None:
+                wait = max(wait, self._tpm.wait_time(estimated_tokens, now))
+            if wait > 0:
+                self._stats["throttled"] += 1
+                return wait
+            if self._rpm is not None:
+                self._rpm.consume(1, now)
+            if self._tpm is not None:
+                self._tpm.consume(estimated_tokens, now)
+            self._stats["acquired"] += 1
+            return 0.0
+
+    def consume(self, estimated_tokens: int):
+        """不等待、直接扣减一次请求额度（限流等待超时后仍要发出请求时使用，额度可扣成负数）"""
+        with self._lock:
+            now = time.monotonic()
+            if self._rpm is not None:
+                self._rpm.consume(1, now)
+            if self._tpm is not None:
+                self._tpm.consume(estimated_tokens, now)
+            self._stats["acquired"] += 1
+
+    def refund(self, estimated_tokens: int):
+        """原样退回一次占用（请求最终没有发出时使用）"""
+        with self._lock:
+            if self._rpm is not None:
+                self._rpm.adjust(1)
+            if self._tpm is not None:
+                self._tpm.adjust(estimated_tokens)
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """请求结束后按实际 Token 用量修正 TPM 桶"""
+        if self._tpm is None or actual_tokens is None:
+            return
+        with self._lock:
+            self._tpm.adjust(estimated_tokens - actual_tokens)
+
+    def headroom(self) -> float:
+        """剩余额度比例 (0~1)，取 RPM / TPM 中较紧的一个；不限流时为 1"""
+        if not self.limited:
+            return 1.0
+        with self._lock:
+            now = time.monotonic()
+            ratios = [
+                max(0.0, bucket.available(now)) / bucket.capacity
+                for bucket in (self._rpm, self._tpm) if bucket is not None
+            ]
+        return min(ratios)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                **self._stats,
+                "rpm_limit": self.rpm_limit,
+                "tpm_limit": self.tpm_limit,
+                "rpm_available": round(self._rpm.available(now), 1) if self._rpm else None,
+                "tpm_available": round(self._tpm.available(now)) if self._tpm else None,
+            }
+
+
+def estimate_messages_tokens(messages: Iterable[Any]) -> int:
+    """
+    粗略估算消息的 prompt Token 数（用于限流预扣，实际用量返回后再修正）
+
+    兼容 dict 消息、LangChain / browser-use 消息对象；按 ASCII 4 字符、
+    非 ASCII 1 字符计 1 个 Token，不做分词以免拖慢请求路径。
+    """
+    total = 0
+    for msg in messages or []:
+        content = msg.get("content", "") if isinstance(msg, dict) else getattr(msg, "content", msg)
+        if isinstance(content, list):
+            content = " ".join(
+                part.get("text", "") if isinstance(part, dict) else str(getattr(part, "text", "") or "")
+                for part in content
+            )
+        text = content if isinstance(content, str) else str(content)
+        non_ascii = len(text) - len(text.encode("ascii", "ignore"))
+        total += (len(text) - non_ascii) // 4 + non_ascii + 4
+    return total
@@ -0,0 +1,340 @@
+"""
+LLM 响应缓存模块
+
+对低温度、输入确定的调用（接口匹配、页面能力抽象、DSL 生成等）
+按内容寻址缓存模型输出，重复运行同一套用例时不再重复消耗 Token。
+
+- 键: sha256(provider, model, 规范化 messages, temperature, max_tokens, response_format)
+- 一级: 进程内 LRU
+- 二级: Redis 或 SQLite（LLM_CACHE_BACKEND = redis / sqlite / none）
+- 每条记录带 TTL，命中/未命中按来源统计
+- 被截断或未通过校验的回答不写入，命中时再次校验，不通过则删除（校验规则见 LLMClient.chat 的 cache_validate）
+
+作者: 程序员Eighteen
+版本: 1.0
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 配置
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "sqlite").lower()
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MEMORY_SIZE = int(os.getenv("LLM_CACHE_MEMORY_SIZE", "512"))
+LLM_CACHE_SQLITE_PATH = os.getenv(
+    "LLM_CACHE_SQLITE_PATH",
+    os.path.join(os.getenv("SAVE_FOLDER_DIR", "../save_floder"), "cache", "llm_response_cache.sqlite3"),
+)
+LLM_CACHE_REDIS_PREFIX = os.getenv("LLM_CACHE_REDIS_PREFIX", "llm:resp:")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/2")
+
+
+def _normalize_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """规范化消息：统一换行、去掉首尾空白，只保留 role/content"""
+    normalized = []
+    for msg in messages:
+        content = msg.get("content", "")
+        if isinstance(content, str):
+            content = content.replace("\r\n", "\n").strip()
+        normalized.append({"role": msg.get("role", "user"), "content": content})
+    return normalized
+
+
+def build_cache_key(
+    provider: str,
+    model: str,
+    messages: List[Dict[str, Any]],
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+    response_format: Optional[Dict[str, Any]] = None,
+) -> str:
+    """计算内容寻址的缓存键"""
+    payload = {
+        "provider": (provider or "").lower(),
+        "model": model or "",
+        "messages": _normalize_messages(messages),
+        "temperature": round(float(temperature), 4) if temperature is not None else None,
+        "max_tokens": max_tokens,
+        "response_format": response_format,
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _SQLiteTier:
+    """SQLite 持久层（单文件，多 worker 共享）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_response_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM llm_response_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None
+        if row[1] < time.time():
+            self.delete(key)
+            return None
+        return row[0]
+
+    def set(self, key: str, value: str, ttl: int):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl),
+            )
+            conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM llm_response_cache")
+            conn.commit()
+
+
+class _RedisTier:
+    """Redis 持久层"""
+
+    def __init__(self, url: str, prefix: str):
+        import redis
+
+        self._client = redis.from_url(url, decode_responses=True)
+        self._client.ping()
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, value: str, ttl: int):
+        self._client.set(self.prefix + key, value, ex=ttl)
+
+    def delete(self, key: str):
+        self._client.delete(self.prefix + key)
+
+    def clear(self):
+        for k in self._client.scan_iter(match=self.prefix + "*", count=500):
+            self._client.delete(k)
+
+
+class LLMResponseCache:
+    """
+    LLM 响应两级缓存
+
+    内存层为 LRU，命中持久层时回填内存层。持久层不可用时自动降级为仅内存。
+    """
+
+    def __init__(
+        self,
+        backend: str = LLM_CACHE_BACKEND,
+        ttl: int = LLM_CACHE_TTL_SECONDS,
+        memory_size: int = LLM_CACHE_MEMORY_SIZE,
+    ):
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._tier = self._init_tier(backend)
+        self.backend = backend if self._tier is not None else "memory"
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def _init_tier(backend: str):
+        try:
+            if backend == "redis":
+                return _RedisTier(REDIS_URL, LLM_CACHE_REDIS_PREFIX)
+            if backend == "sqlite":
+                return _SQLiteTier(LLM_CACHE_SQLITE_PATH)
+        except Exception as e:
+            logger.warning(f"[LLMCache] 持久层 {backend} 不可用，仅使用内存缓存: {e}")
+        return None
+
+    # ── 统计 ──────────────────────────────────────────────
+
+    def _count(self, source: str, field: str):
+        with self._lock:
+            stats = self._stats.setdefault(
+                source or "unknown",
+                {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "stores": 0},
+            )
+            stats[field] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """命中率统计（总计 + 按来源）"""
+        with self._lock:
+            by_source = {k: dict(v) for k, v in self._stats.items()}
+            memory_entries = len(self._memory)
+        total = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "stores": 0}
+        for s in by_source.values():
+            for k in total:
+                total[k] += s[k]
+        lookups = total["memory_hits"] + total["persistent_hits"] + total["misses"]
+        hits = total["memory_hits"] + total["persistent_hits"]
+        return {
+            **total,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": memory_entries,
+            "backend": self.backend,
+            "by_source": by_source,
+        }
+
+    # ── 读写 ──────────────────────────────────────────────
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._memory.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.time():
+                self._memory.pop(key, None)
+                return None
+            self._memory.move_to_end(key)
+            return value
+
+    def _memory_set(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _tier_get(self, key: str) -> Optional[str]:
+        if self._tier is None:
+            return None
+        try:
+            return self._tier.get(key)
+        except Exception as e:
+            logger.warning(f"[LLMCache] 持久层读取失败: {e}")
+            return None
+
+    def _tier_set(self, key: str, value: str, ttl: int):
+        if self._tier is None:
+            return
+        try:
+            self._tier.set(key, value, ttl)
+        except Exception as e:
+            logger.warning(f"[LLMCache] 持久层写入失败: {e}")
+
+    def get(self, key: str, source: str = "") -> Optional[str]:
+        """同步读取"""
+        value = self._memory_get(key)
+        if value is not None:
+            self._count(source, "memory_hits")
+            return value
+        value = self._tier_get(key)
+        if value is not None:
+            self._memory_set(key, value, time.time() + self.ttl)
+            self._count(source, "persistent_hits")
+            return value
+        self._count(source, "misses")
+        return None
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None, source: str = ""):
+        """同步写入"""
+        if not value:
+            return
+        ttl = ttl or self.ttl
+        self._memory_set(key, value, time.time() + ttl)
+        self._tier_set(key, value, ttl)
+        self._count(source, "stores")
+
+    async def aget(self, key: str, source: str = "") -> Optional[str]:
+        """异步读取（持久层 IO 放到线程池）"""
+        value = self._memory_get(key)
+        if value is not None:
+            self._count(source, "memory_hits")
+            return value
+        if self._tier is None:
+            self._count(source, "misses")
+            return None
+        value = await asyncio.to_thread(self._tier_get, key)
+        if value is not None:
+            self._memory_set(key, value, time.time() + self.ttl)
+            self._count(source, "persistent_hits")
+            return value
+        self._count(source, "misses")
+        return None
+
+    async def aset(self, key: str, value: str, ttl: Optional[int] = None, source: str = ""):
+        """异步写入"""
+        if not value:
+            return
+        ttl = ttl or self.ttl
+        self._memory_set(key, value, time.time() + ttl)
+        if self._tier is not None:
+            await asyncio.to_thread(self._tier_set, key, value, ttl)
+        self._count(source, "stores")
+
+    def delete(self, key: str):
+        """删除一条缓存（回答校验不通过时调用）"""
+        with self._lock:
+            self._memory.pop(key, None)
+        if self._tier is not None:
+            try:
+                self._tier.delete(key)
+            except Exception as e:
+                logger.warning(f"[LLMCache] 持久层删除失败: {e}")
+
+    async def adelete(self, key: str):
+        """异步删除一条缓存（持久层 IO 放到线程池）"""
+        if self._tier is None:
+            self.delete(key)
+        else:
+            await asyncio.to_thread(self.delete, key)
+
+    def clear(self):
+        """清空全部缓存"""
+        with self._lock:
+            self._memory.clear()
+        if self._tier is not None:
+            try:
+                self._tier.clear()
+            except Exception as e:
+                logger.warning(f"[LLMCache] 清空持久层失败: {e}")
+
+
+# 全局单例
+_response_cache: Optional[LLMResponseCache] = None
+
+
+def get_response_cache() -> Optional[LLMResponseCache]:
+    """获取全局 LLM 响应缓存（LLM_CACHE_ENABLED=false 时返回 None）"""
+    global _response_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _response_cache is None:
+        _response_cache = LLMResponseCache()
+    return _response_cache
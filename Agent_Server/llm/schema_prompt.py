@@ -0,0 +1,185 @@
+"""
+结构化输出 Schema 提示词缓存模块
+
+LLMWrapper 每一步都要把 output_format 的 JSON Schema 拼到最后一条消息里。
+AgentOutput 的 schema 很大，每步重复 model_json_schema() + json.dumps(indent=2)
+既耗 CPU 又浪费数千 prompt token。
+
+- 按 output_format 类缓存渲染结果（弱引用，动态创建的 AgentOutput 类回收后自动清除）
+- 可选紧凑模式: 一次性展开 $defs 引用，去掉 title/description 和缩进
+- 首次渲染时同时计算完整/紧凑两种模式的 token 数，供调试统计对比
+
+配置:
+    LLM_SCHEMA_PROMPT_MODE = full（默认，与原行为一致）/ compact
+
+作者: 程序员Eighteen
+版本: 1.0
+"""
+import json
+import logging
+import os
+import threading
+import weakref
+from typing import Any, Dict, Optional, Set
+
+from .context_window import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# 配置
+LLM_SCHEMA_PROMPT_MODE = os.getenv("LLM_SCHEMA_PROMPT_MODE", "full").lower()
+
+SCHEMA_PROMPT_PREFIX = "\n\nPlease respond with a valid JSON object matching this schema:\n"
+
+# 紧凑模式下删除的注释性字段
+_DROP_KEYS = frozenset(("title", "description", "examples"))
+# 值为 "属性名 → 子 schema" 映射的字段，键名不能当作注释字段删除
+_NAMED_CHILD_KEYS = frozenset(("properties", "patternProperties", "$defs", "definitions"))
+
+
+def _get_schema(output_format) -> Dict[str, Any]:
+    if hasattr(output_format, 'model_json_schema'):
+        return output_format.model_json_schema()
+    if hasattr(output_format, 'schema'):
+        return output_format.schema()
+    return {}
+
+
+def compact_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    生成紧凑 schema
+
+    每个 $defs 条目只解析一次并内联到引用处；递归引用保留 $ref，
+    相应定义留在 $defs 中。
+    """
+    defs = schema.get("$defs") or schema.get("definitions") or {}
+    resolved: Dict[str, Any] = {}
+    recursive: Set[str] = set()
+
+    def resolve(name: str, stack: Set[str]) -> Any:
+        if name in resolved:
+            return resolved[name]
+        if name in stack:
+            recursive.add(name)
+            return {"$ref": f"#/$defs/{name}"}
+        stack.add(name)
+        value = walk(defs[name], stack)
+        stack.discard(name)
+        resolved[name] = value
+        return value
+
+    def walk(node: Any, stack: Set[str]) -> Any:
+        if isinstance(node, list):
+            return [walk(v, stack) for v in node]
+        if not isinstance(node, dict):
+            return node
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith(("#/$defs/", "#/definitions/")):
+            name = ref.rsplit("/", 1)[-1]
+            if name in defs:
+                return resolve(name, stack)
+        out = {}
+        for key, value in node.items():
+            if key in _DROP_KEYS or key in ("$defs", "definitions"):
+                continue
+            if key in _NAMED_CHILD_KEYS and isinstance(value, dict):
+                out[key] = {k: walk(v, stack) for k, v in value.items()}
+            else:
+                out[key] = walk(value, stack)
+        return out
+
+    result = walk(schema, set())
+    if recursive:
+        result["$defs"] = {name: resolved[name] for name in sorted(recursive) if name in resolved}
+    return result
+
+
+class SchemaPromptCache:
+    """
+    output_format → 渲染好的 schema 提示词
+
+    以类对象为弱引用键；统计按类名聚合。
+    """
+
+    def __init__(self, mode: str = LLM_SCHEMA_PROMPT_MODE):
+        self.mode = "compact" if mode == "compact" else "full"
+        self._lock = threading.Lock()
+        self._cache: "weakref.WeakKeyDictionary[Any, Dict[str, str]]" = weakref.WeakKeyDictionary()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def _render(self, output_format) -> Dict[str, str]:
+        schema = _get_schema(output_format)
+        full = json.dumps(schema, ensure_ascii=False, indent=2)
+        try:
+            compact = json.dumps(compact_schema(schema), ensure_ascii=False, separators=(",", ":"))
+        except Exception as e:
+            logger.warning(f"[SchemaPrompt] 紧凑渲染失败，使用完整 schema: {e}")
+            compact = full
+
+        full_tokens = count_tokens(full)
+        compact_tokens = count_tokens(compact)
+        name = getattr(output_format, '__name__', str(output_format))
+        with self._lock:
+            stats = self._stats.setdefault(name, {"renders": 0, "hits": 0})
+            stats.update({
+                "full_chars": len(full),
+                "compact_chars": len(compact),
+                "full_tokens": full_tokens,
+                "compact_tokens": compact_tokens,
+                "saved_ratio": round(1 - compact_tokens / full_tokens, 4) if full_tokens else 0.0,
+            })
+            stats["renders"] += 1
+        logger.debug(
+            f"[SchemaPrompt] {name}: 完整 {full_tokens} tokens, 紧凑 {compact_tokens} tokens"
+        )
+        return {"full": full, "compact": compact}
+
+    def get(self, output_format, compact: Optional[bool] = None) -> str:
+        """
+        获取 output_format 的 schema 提示词后缀
+
+        Args:
+            output_format: Pydantic 模型类
+            compact: 是否使用紧凑模式；为空时取 LLM_SCHEMA_PROMPT_MODE
+        """
+        mode = self.mode if compact is None else ("compact" if compact else "full")
+        try:
+            rendered = self._cache.get(output_format)
+        except TypeError:
+            # 不可弱引用的类型，不缓存
+            return SCHEMA_PROMPT_PREFIX + self._render(output_format)[mode]
+
+        name = getattr(output_format, '__name__', str(output_format))
+        if rendered is None:
+            rendered = self._render(output_format)
+            with self._lock:
+                self._cache[output_format] = rendered
+        else:
+            with self._lock:
+                self._stats.setdefault(name, {"renders": 0, "hits": 0})["hits"] += 1
+        return SCHEMA_PROMPT_PREFIX + rendered[mode]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各 output_format 的渲染次数、命中次数和完整/紧凑 token 对比"""
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "cached_formats": len(self._cache),
+                "formats": {k: dict(v) for k, v in self._stats.items()},
+            }
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+# 全局单例
+_schema_prompt_cache: Optional[SchemaPromptCache] = None
+
+
+def get_schema_prompt_cache() -> SchemaPromptCache:
+    """获取全局 schema 提示词缓存"""
+    global _schema_prompt_cache
+    if _schema_prompt_cache is None:
+        _schema_prompt_cache = SchemaPromptCache()
+    return _schema_prompt_cache
@@ -0,0 +1,109 @@
+"""
+请求合并模块 (Singleflight)
+
+多个 OneClick 会话指向同一环境时，会几乎同时发出字节级相同的意图分析、
+能力抽象和 Embedding 请求。响应缓存只能在第一次调用返回之后生效，
+并发的相同请求仍会各自打到上游。
+
+- 相同键的请求在途时，后到的调用直接等待同一个结果，不再发起上游调用
+- 上游调用在独立 Task 中执行，单个调用方被取消不影响其它等待者
+- 上游异常同样传递给所有等待者
+- 按来源统计调用数和被合并的次数
+
+配置:
+    LLM_SINGLEFLIGHT_ENABLED = true
+
+作者: 程序员Eighteen
+版本: 1.0
+"""
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from .tracing import annotate
+
+logger = logging.getLogger(__name__)
+
+# 配置
+LLM_SINGLEFLIGHT_ENABLED = os.getenv("LLM_SINGLEFLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+class SingleFlight:
+    """
+    按键合并并发的相同异步调用
+
+    在途表按事件循环区分（Future 不能跨循环等待）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[Tuple[int, Hashable], asyncio.Future] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, source: str, field: str):
+        with self._lock:
+            stats = self._stats.setdefault(source or "unknown", {"calls": 0, "upstream": 0, "collapsed": 0})
+            stats["calls"] += 1
+            stats[field] += 1
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], source: str = "") -> Any:
+        """
+        执行 fn()；相同 key 的调用在途时复用其结果
+
+        Args:
+            key: 请求键（调用方保证相同键的请求结果可以共享）
+            fn: 发起上游调用的无参异步函数
+            source: 统计来源
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        with self._lock:
+            task = self._inflight.get(flight_key)
+            leader = task is None
+            if leader:
+                task = asyncio.ensure_future(fn())
+                self._inflight[flight_key] = task
+                task.add_done_callback(lambda _t: self._forget(flight_key, _t))
+        if leader:
+            self._count(source, "upstream")
+        else:
+            self._count(source, "collapsed")
+            annotate(coalesced=True)
+            logger.debug(f"[SingleFlight] 合并在途请求 (source={source})")
+        return await asyncio.shield(task)
+
+    def _forget(self, flight_key, task: asyncio.Future):
+        with self._lock:
+            if self._inflight.get(flight_key) is task:
+                del self._inflight[flight_key]
+        # 所有等待者都已取消时，避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """合并统计（总计 + 按来源）"""
+        with self._lock:
+            by_source = {k: dict(v) for k, v in self._stats.items()}
+            inflight = len(self._inflight)
+        total = {"calls": 0, "upstream": 0, "collapsed": 0}
+        for s in by_source.values():
+            for k in total:
+                total[k] += s[k]
+        return {
+            **total,
+            "collapse_rate": round(total["collapsed"] / total["calls"], 4) if total["calls"] else 0.0,
+            "inflight": inflight,
+            "enabled": LLM_SINGLEFLIGHT_ENABLED,
+            "by_source": by_source,
+        }
+
+
+# 全局单例
+_singleflight = SingleFlight()
+
+
+def get_singleflight() -> SingleFlight:
+    """获取全局请求合并器"""
+    return _singleflight
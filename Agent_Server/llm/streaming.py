@@ -0,0 +1,212 @@
+"""
+流式 JSON 增量提取模块
+
+配合 Provider.achat_stream 使用：逐段喂入模型输出，
+每当目标数组中的一个元素闭合，立即解析并返回该元素。
+
+- 目标数组可以是顶层数组，也可以是顶层对象中的某个字段（如 cases / l3_nodes）
+- 自动跳过 <think>...</think> 推理段和 ```json 围栏等前后缀文字
+- 响应被截断时，已闭合的元素不受影响，只丢失最后一个未闭合的元素
+
+使用示例:
+    >>> extractor = IncrementalJSONArrayExtractor(array_key="cases")
+    >>> async for delta in provider.achat_stream(messages):
+    ...     for case in extractor.feed(delta):
+    ...         save(case)
+
+作者: 程序员Eighteen
+版本: 1.0
+"""
+import json
+import logging
+from typing import Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_THINK_OPEN = "<think>"
+_THINK_CLOSE = "</think>"
+
+
+def _partial_tag_suffix(text: str, tag: str) -> int:
+    """text 末尾可能是 tag 前缀的长度（需要等下一段数据才能判断）"""
+    for n in range(min(len(tag) - 1, len(text)), 0, -1):
+        if tag.startswith(text[-n:]):
+            return n
+    return 0
+
+
+class IncrementalJSONArrayExtractor:
+    """
+    增量 JSON 数组元素提取器
+
+    单次线性扫描：维护括号栈与字符串/转义状态，已扫描的字符不会重复处理。
+    """
+
+    def __init__(self, array_key: Optional[str] = None):
+        """
+        Args:
+            array_key: 顶层对象中目标数组的字段名；为空时取顶层数组，
+                       或顶层对象中出现的第一个数组字段
+        """
+        self.array_key = array_key
+
+        self._raw_pending = ""     # 尚未过滤 think 标签的尾部
+        self._in_think = False
+        self._buf = ""             # 过滤后的文本
+        self._pos = 0              # 扫描进度
+
+        self._stack: List[str] = []
+        self._in_str = False
+        self._esc = False
+        self._str_start = -1
+        self._last_string: Optional[str] = None
+        self._current_key: Optional[str] = None
+
+        self._target_depth: Optional[int] = None
+        self._item_start: Optional[int] = None
+        self._done = False
+
+        self.items: List[Any] = []
+        self.errors = 0
+
+    @property
+    def text(self) -> str:
+        """目前收到的完整文本（已去除 think 段），可用于最终整体解析"""
+        return self._buf
+
+    @property
+    def finished(self) -> bool:
+        """目标数组是否已闭合"""
+        return self._done
+
+    def feed(self, chunk: str) -> List[Any]:
+        """
+        喂入一段输出
+
+        Returns:
+            本段数据中新闭合的元素列表
+        """
+        if not chunk:
+            return []
+        self._append_filtered(chunk)
+        return self._scan()
+
+    # ── think 过滤 ────────────────────────────────────────
+
+    def _append_filtered(self, chunk: str):
+        raw = self._raw_pending + chunk
+        self._raw_pending = ""
+        while raw:
+            if self._in_think:
+                idx = raw.find(_THINK_CLOSE)
+                if idx < 0:
+                    keep = _partial_tag_suffix(raw, _THINK_CLOSE)
+                    self._raw_pending = raw[len(raw) - keep:] if keep else ""
+                    return
+                raw = raw[idx + len(_THINK_CLOSE):]
+                self._in_think = False
+            else:
+                # 只在 JSON 外部识别 think 标签
+                idx = raw.find(_THINK_OPEN) if not self._stack else -1
+                if idx < 0:
+                    keep = _partial_tag_suffix(raw, _THINK_OPEN) if not self._stack else 0
+                    self._buf += raw[:len(raw) - keep]
+                    self._raw_pending = raw[len(raw) - keep:] if keep else ""
+                    return
+                self._buf += raw[:idx]
+                raw = raw[idx + len(_THINK_OPEN):]
+                self._in_think = True
+
+    # ── 扫描 ──────────────────────────────────────────────
+
+    def _emit(self, fragment: str, out: List[Any]):
+        fragment = fragment.strip()
+        if not fragment:
+            return
+        try:
+            item = json.loads(fragment)
+        except json.JSONDecodeError:
+            try:
+                from json_repair import repair_json
+                item = repair_json(fragment, return_objects=True)
+            except Exception:
+                self.errors += 1
+                logger.debug(f"[StreamJSON] 元素解析失败，已跳过: {fragment[:100]}")
+                return
+        self.items.append(item)
+        out.append(item)
+
+    def _scan(self) -> List[Any]:
+        out: List[Any] = []
+        buf = self._buf
+        i = self._pos
+        n = len(buf)
+
+        while i < n and not self._done:
+            ch = buf[i]
+
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                    try:
+                        self._last_string = json.loads(buf[self._str_start:i + 1])
+                    except json.JSONDecodeError:
+                        self._last_string = None
+                i += 1
+                continue
+
+            depth = len(self._stack)
+            at_target = self._target_depth is not None and depth == self._target_depth
+
+            # 顶层 JSON 之外的文字（说明、围栏等）直接跳过
+            if depth == 0 and ch not in "{[":
+                i += 1
+                continue
+
+            if at_target and self._item_start is None and ch not in " \t\r\n,]":
+                self._item_start = i
+
+            if ch == '"':
+                self._in_str = True
+                self._str_start = i
+            elif ch == ":" and depth == 1 and self._stack[0] == "{":
+                self._current_key = self._last_string
+            elif ch in "{[":
+                if ch == "[" and self._target_depth is None and self._is_target_array(depth):
+                    self._target_depth = depth + 1
+                self._stack.append(ch)
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                new_depth = len(self._stack)
+                if self._target_depth is not None:
+                    if new_depth == self._target_depth and self._item_start is not None:
+                        self._emit(buf[self._item_start:i + 1], out)
+                        self._item_start = None
+                    elif new_depth < self._target_depth:
+                        # 目标数组闭合：先输出最后一个标量元素
+                        if self._item_start is not None:
+                            self._emit(buf[self._item_start:i], out)
+                            self._item_start = None
+                        self._done = True
+            elif ch == "," and at_target and self._item_start is not None:
+                self._emit(buf[self._item_start:i], out)
+                self._item_start = None
+
+            i += 1
+
+        self._pos = i
+        return out
+
+    def _is_target_array(self, depth: int) -> bool:
+        """当前将要打开的数组是否就是目标数组"""
+        if depth == 0:
+            # 顶层直接是数组（即使指定了 array_key，模型也可能省略外层对象）
+            return True
+        if depth == 1 and self._stack[0] == "{":
+            return self.array_key is None or self._current_key == self.array_key
+        return False
@@ -0,0 +1,377 @@
+"""
+LLM 调用链路追踪模块
+
+原先只有 TokenUsageLog.duration_ms，看不出 LLM 时间花在哪里。
+每次 Provider 调用记录一个结构化 Span：
+
+- prompt 字符数 / 估算 Token 数、实际 prompt / completion Token
+- 排队时间（RPM/TPM 限流等待）、首 Token 时间（流式）、总耗时、输出速度 tokens/s
+- parse_json_response 成功的解析阶段（fast / tolerant / truncated / json_repair / failed）
+- 响应缓存命中、请求合并、对冲请求、FailoverChatModel / LLMClient 的故障转移跳转
+- 按 source / session_id 打标签，最近 N 条保存在进程内环形缓冲区，供 Model_manage 查询
+
+Span 通过 contextvar 传递：调用内部（限流、路由、用量记账、JSON 解析）只需调用 annotate()，
+不必层层传参。调用结束后当前任务中紧接着的 JSON 解析也会记到刚结束的 Span 上。
+
+可选 OpenTelemetry 导出（LLM_TRACE_OTEL_ENABLED=true）：已安装 opentelemetry-api 时，
+Span 结束后按真实起止时间补发到全局 TracerProvider；同时配置了
+LLM_TRACE_OTLP_ENDPOINT 且安装了 opentelemetry-sdk / OTLP exporter 时自动初始化导出器。
+
+作者: 程序员Eighteen
+版本: 1.0
+"""
+import contextvars
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 配置
+LLM_TRACE_ENABLED = os.getenv("LLM_TRACE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_TRACE_BUFFER_SIZE = int(os.getenv("LLM_TRACE_BUFFER_SIZE", "2000"))
+LLM_TRACE_OTEL_ENABLED = os.getenv("LLM_TRACE_OTEL_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_TRACE_OTLP_ENDPOINT = os.getenv("LLM_TRACE_OTLP_ENDPOINT", "")
+
+
+@dataclass
+class LLMSpan:
+    """一次 LLM 调用的链路记录（时间单位毫秒）"""
+    span_id: int
+    name: str
+    source: str = ""
+    session_id: Optional[int] = None
+    started_at: float = 0.0  # Unix 时间戳（秒）
+
+    # 模型
+    model_id: Optional[int] = None
+    model_name: Optional[str] = None
+    provider: Optional[str] = None
+
+    # 输入输出规模
+    prompt_chars: int = 0
+    prompt_tokens_est: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0  # 命中供应商提示词缓存的输入 Token
+    context_window: Optional[int] = None
+    context_trimmed: int = 0  # 因超出上下文窗口被省略的消息数
+
+    # 分阶段耗时
+    queue_ms: float = 0.0
+    ttft_ms: Optional[float] = None
+    latency_ms: float = 0.0
+    tokens_per_sec: Optional[float] = None
+
+    # 过程
+    parse_stage: Optional[str] = None
+    cache_hit: bool = False
+    coalesced: bool = False
+    hedged: bool = False
+    hedge_won: bool = False
+    failover_hops: List[Dict[str, Any]] = field(default_factory=list)
+
+    status: str = "running"  # running / ok / error
+    error: Optional[str] = None
+
+    _start_mono: float = field(default=0.0, repr=False)
+    _start_ns: int = field(default=0, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("_start_mono", None)
+        data.pop("_start_ns", None)
+        return data
+
+
+# 当前调用的 Span（调用结束后复位）
+_active_span: contextvars.ContextVar[Optional[LLMSpan]] = contextvars.ContextVar("llm_active_span", default=None)
+# 当前任务最近结束的 Span（调用返回后的 JSON 解析记到它上面）
+_last_span: contextvars.ContextVar[Optional[LLMSpan]] = contextvars.ContextVar("llm_last_span", default=None)
+# 外层设置的默认标签（如 browser-use 会话）
+_trace_tags: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("llm_trace_tags", default=None)
+
+
+def current_span() -> Optional[LLMSpan]:
+    return _active_span.get()
+
+
+def annotate(**fields):
+    """给当前调用的 Span 设置字段（不在追踪中时忽略）"""
+    span = _active_span.get()
+    if span is None:
+        return
+    for key, value in fields.items():
+        setattr(span, key, value)
+
+
+def add_failover_hop(from_model_id: Optional[int], to_model_id: Optional[int], reason: str):
+    """记录一次故障转移跳转"""
+    span = _active_span.get()
+    if span is not None:
+        span.failover_hops.append({
+            "from": from_model_id,
+            "to": to_model_id,
+            "reason": reason,
+            "at_ms": round((time.monotonic() - span._start_mono) * 1000, 1),
+        })
+
+
+def note_parse_stage(stage: str):
+    """记录 JSON 解析阶段：优先当前调用，其次当前任务最近结束且尚未记录解析阶段的调用"""
+    span = _active_span.get() or _last_span.get()
+    if span is not None and span.parse_stage is None:
+        span.parse_stage = stage
+
+
+@contextmanager
+def trace_context(source: Optional[str] = None, session_id: Optional[int] = None) -> Iterator[None]:
+    """为其中发起的 LLM 调用设置默认 source / session_id 标签"""
+    tags = dict(_trace_tags.get() or {})
+    if source is not None:
+        tags["source"] = source
+    if session_id is not None:
+        tags["session_id"] = session_id
+    token = _trace_tags.set(tags)
+    try:
+        yield
+    finally:
+        _trace_tags.reset(token)
+
+
+def _message_chars(messages: Any) -> int:
+    total = 0
+    for msg in messages or []:
+        content = msg.get("content", "") if isinstance(msg, dict) else getattr(msg, "content", msg)
+        if isinstance(content, list):
+            total += sum(
+                len(part.get("text", "") if isinstance(part, dict) else str(getattr(part, "text", "") or ""))
+                for part in content
+            )
+        else:
+            total += len(content) if isinstance(content, str) else len(str(content))
+    return total
+
+
+class _OTelExporter:
+    """把结束的 Span 补发到 OpenTelemetry（依赖缺失时不启用）"""
+
+    def __init__(self):
+        from opentelemetry import trace
+
+        if LLM_TRACE_OTLP_ENDPOINT:
+            self._init_otlp(trace)
+        self._tracer = trace.get_tracer("agent_server.llm")
+
+    @staticmethod
+    def _init_otlp(trace):
+        try:
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+            provider = TracerProvider(resource=Resource.create({"service.name": "agent_server"}))
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=LLM_TRACE_OTLP_ENDPOINT)))
+            trace.set_tracer_provider(provider)
+            logger.info(f"[LLMTrace] OTLP 导出器已初始化: {LLM_TRACE_OTLP_ENDPOINT}")
+        except Exception as e:
+            logger.warning(f"[LLMTrace] OTLP 导出器初始化失败，使用已有 TracerProvider: {e}")
+
+    def export(self, span: LLMSpan, end_ns: int):
+        otel_span = self._tracer.start_span(span.name, start_time=span._start_ns)
+        for key, value in span.to_dict().items():
+            if key == "failover_hops":
+                otel_span.set_attribute("llm.failover_hops", len(value))
+                for hop in value:
+                    otel_span.add_event("failover", {k: str(v) for k, v in hop.items()})
+            elif value is not None and key not in ("name", "started_at"):
+                otel_span.set_attribute(f"llm.{key}", value)
+        if span.status == "error":
+            from opentelemetry.trace import Status, StatusCode
+            otel_span.set_status(Status(StatusCode.ERROR, span.error or ""))
+        otel_span.end(end_time=end_ns)
+
+
+class LLMTracer:
+    """Span 记录器：进程内环形缓冲区 + 可选 OpenTelemetry 导出"""
+
+    def __init__(self, buffer_size: int = LLM_TRACE_BUFFER_SIZE):
+        self._lock = threading.Lock()
+        self._spans: Deque[LLMSpan] = deque(maxlen=buffer_size)
+        self._ids = itertools.count(1)
+        self._exporter: Optional[_OTelExporter] = None
+        if LLM_TRACE_OTEL_ENABLED:
+            try:
+                self._exporter = _OTelExporter()
+                logger.info("[LLMTrace] OpenTelemetry 导出已开启")
+            except Exception as e:
+                logger.warning(f"[LLMTrace] OpenTelemetry 不可用，仅记录本地 Span: {e}")
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        messages: Any = None,
+        source: Optional[str] = None,
+        session_id: Optional[int] = None,
+        activate: bool = True,
+    ) -> Iterator[Optional[LLMSpan]]:
+        """
+        记录一次 LLM 调用
+
+        未显式传入的 source / session_id 取 trace_context() 设置的默认值。
+        activate=False 时不设置 contextvar（用于异步生成器，可能在其它上下文中结束），
+        调用方直接修改返回的 Span。
+        """
+        if not LLM_TRACE_ENABLED:
+            yield None
+            return
+        tags = _trace_tags.get() or {}
+        if messages is not None:
+            from .rate_limiter import estimate_messages_tokens
+            prompt_tokens_est = estimate_messages_tokens(messages)
+        else:
+            prompt_tokens_est = 0
+        span = LLMSpan(
+            span_id=next(self._ids),
+            name=name,
+            source=source or tags.get("source", ""),
+            session_id=session_id if session_id is not None else tags.get("session_id"),
+            started_at=time.time(),
+            prompt_chars=_message_chars(messages),
+            prompt_tokens_est=prompt_tokens_est,
+            _start_mono=time.monotonic(),
+            _start_ns=time.time_ns(),
+        )
+        token = _active_span.set(span) if activate else None
+        try:
+            yield span
+            span.status = "ok"
+        except GeneratorExit:
+            # 调用方提前结束流式读取，不算失败
+            span.status = "ok"
+            raise
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"[:500]
+            raise
+        finally:
+            if token is not None:
+                _active_span.reset(token)
+                _last_span.set(span)
+            self._finish(span)
+
+    def _finish(self, span: LLMSpan):
+        span.latency_ms = round((time.monotonic() - span._start_mono) * 1000, 1)
+        if span.completion_tokens:
+            generation_ms = span.latency_ms - span.queue_ms - (span.ttft_ms or 0)
+            if generation_ms > 0:
+                span.tokens_per_sec = round(span.completion_tokens / (generation_ms / 1000), 1)
+        with self._lock:
+            self._spans.append(span)
+        if self._exporter is not None:
+            try:
+                self._exporter.export(span, time.time_ns())
+            except Exception as e:
+                logger.debug(f"[LLMTrace] OpenTelemetry 导出失败: {e}")
+
+    # ── 查询 ──────────────────────────────────────────────
+
+    def query(
+        self,
+        source: Optional[str] = None,
+        session_id: Optional[int] = None,
+        status: Optional[str] = None,
+        model_id: Optional[int] = None,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        """按条件查询最近的 Span（新的在前）"""
+        with self._lock:
+            spans = list(self._spans)
+        result = []
+        for span in reversed(spans):
+            if source and span.source != source:
+                continue
+            if session_id is not None and span.session_id != session_id:
+                continue
+            if status and span.status != status:
+                continue
+            if model_id is not None and span.model_id != model_id:
+                continue
+            result.append(span.to_dict())
+            if len(result) >= limit:
+                break
+        return result
+
+    def summary(self, session_id: Optional[int] = None) -> Dict[str, Any]:
+        """按 source 聚合：调用数、错误率、耗时分位数、排队时间、解析阶段分布、故障转移次数"""
+        with self._lock:
+            spans = [s for s in self._spans if session_id is None or s.session_id == session_id]
+        groups: Dict[str, List[LLMSpan]] = {}
+        for span in spans:
+            groups.setdefault(span.source or "unknown", []).append(span)
+
+        def pct(values: List[float], q: float) -> Optional[float]:
+            if not values:
+                return None
+            values = sorted(values)
+            return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+        by_source = {}
+        for source, items in groups.items():
+            latencies = [s.latency_ms for s in items if s.status == "ok"]
+            ttfts = [s.ttft_ms for s in items if s.ttft_ms is not None]
+            speeds = [s.tokens_per_sec for s in items if s.tokens_per_sec]
+            stages: Dict[str, int] = {}
+            for s in items:
+                if s.parse_stage:
+                    stages[s.parse_stage] = stages.get(s.parse_stage, 0) + 1
+            by_source[source] = {
+                "calls": len(items),
+                "errors": sum(1 for s in items if s.status == "error"),
+                "cache_hits": sum(1 for s in items if s.cache_hit),
+                "coalesced": sum(1 for s in items if s.coalesced),
+                "hedged": sum(1 for s in items if s.hedged),
+                "failover_hops": sum(len(s.failover_hops) for s in items),
+                "latency_p50_ms": pct(latencies, 0.5),
+                "latency_p95_ms": pct(latencies, 0.95),
+                "ttft_p50_ms": pct(ttfts, 0.5),
+                "queue_avg_ms": round(sum(s.queue_ms for s in items) / len(items), 1),
+                "tokens_per_sec_p50": pct(speeds, 0.5),
+                "prompt_tokens": sum(s.prompt_tokens for s in items),
+                "completion_tokens": sum(s.completion_tokens for s in items),
+                "cached_tokens": sum(s.cached_tokens for s in items),
+                "parse_stages": stages,
+            }
+        return {
+            "enabled": LLM_TRACE_ENABLED,
+            "otel_enabled": self._exporter is not None,
+            "buffered_spans": len(spans),
+            "by_source": by_source,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+
+# 全局单例
+_tracer: Optional[LLMTracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_llm_tracer() -> LLMTracer:
+    """获取全局 LLM 链路追踪器"""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = LLMTracer()
+    return _tracer
@@ -0,0 +1,282 @@
+"""
+Token 使用量写后缓冲模块
+
+LLM 调用只把使用事件放入内存队列，由后台线程定期批量落库：
+- 一次 bulk insert 写入所有 TokenUsageLog
+- 每个模型一条 UPDATE llm_models SET x = x + :delta
+- 队列有上限，满时立即触发刷新；应用关闭时强制刷新
+
+避免在异步请求路径里同步写库阻塞事件循环，以及 llm_models 行锁争用。
+
+作者: 程序员Eighteen
+版本: 1.0
+"""
+import logging
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 配置
+TOKEN_LEDGER_ENABLED = os.getenv("TOKEN_LEDGER_ENABLED", "true").lower() in ("1", "true", "yes")
+TOKEN_LEDGER_FLUSH_INTERVAL = float(os.getenv("TOKEN_LEDGER_FLUSH_INTERVAL", "5"))
+TOKEN_LEDGER_FLUSH_BATCH = int(os.getenv("TOKEN_LEDGER_FLUSH_BATCH", "200"))
+TOKEN_LEDGER_MAX_PENDING = int(os.getenv("TOKEN_LEDGER_MAX_PENDING", "10000"))
+
+
+@dataclass
+class UsageEvent:
+    """单次 LLM 调用的使用事件"""
+    model_id: int
+    model_name: str = ""
+    provider: str = ""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    cached_tokens: int = 0
+    cache_creation_tokens: int = 0
+    source: str = "chat"
+    session_id: Optional[int] = None
+    success: bool = True
+    error_type: Optional[str] = None
+    duration_ms: int = 0
+    created_at: datetime = field(default_factory=datetime.now)
+
+    def to_log_row(self) -> Dict[str, Any]:
+        """转为 TokenUsageLog 批量插入的字段"""
+        return {
+            "model_id": self.model_id,
+            "model_name": self.model_name,
+            "provider": self.provider,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cache_creation_tokens": self.cache_creation_tokens,
+            "source": self.source,
+            "session_id": self.session_id,
+            "success": 1 if self.success else 0,
+            "error_type": self.error_type,
+            "duration_ms": self.duration_ms,
+            "created_at": self.created_at,
+        }
+
+
+class TokenUsageLedger:
+    """
+    Token 使用量聚合器
+
+    record() 只做内存操作，可在事件循环中直接调用；
+    落库由守护线程完成（SQLAlchemy 为同步驱动）。
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = TOKEN_LEDGER_FLUSH_INTERVAL,
+        flush_batch: int = TOKEN_LEDGER_FLUSH_BATCH,
+        max_pending: int = TOKEN_LEDGER_MAX_PENDING,
+    ):
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.max_pending = max_pending
+
+        self._queue: Deque[UsageEvent] = deque()
+        self._lock = threading.Lock()
+        # 同一时刻只允许一个刷新，保证失败回填时顺序不乱
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._stats = {
+            "recorded": 0,
+            "flushed": 0,
+            "dropped": 0,
+            "flush_count": 0,
+            "flush_errors": 0,
+            "last_flush_at": None,
+        }
+
+    # ── 写入 ──────────────────────────────────────────────
+
+    def record(self, event: UsageEvent):
+        """记录一条使用事件（非阻塞）"""
+        with self._lock:
+            if len(self._queue) >= self.max_pending:
+                # 落库长时间失败时才会走到这里，丢弃最旧的事件保护内存
+                self._queue.popleft()
+                self._stats["dropped"] += 1
+                if self._stats["dropped"] % 100 == 1:
+                    logger.warning(
+                        f"[TokenLedger] 缓冲队列已满({self.max_pending})，"
+                        f"累计丢弃 {self._stats['dropped']} 条使用记录"
+                    )
+            self._queue.append(event)
+            self._stats["recorded"] += 1
+            pending = len(self._queue)
+
+        self._ensure_started()
+        if pending >= self.flush_batch:
+            self._wakeup.set()
+
+    def _ensure_started(self):
+        """首次写入时启动后台刷新线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="token-usage-ledger", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"[TokenLedger] 后台刷新异常: {e}")
+
+    # ── 刷新 ──────────────────────────────────────────────
+
+    def _drain(self) -> List[UsageEvent]:
+        with self._lock:
+            events = list(self._queue)
+            self._queue.clear()
+        return events
+
+    def _requeue(self, events: List[UsageEvent]):
+        """落库失败时把事件放回队首，下次重试"""
+        with self._lock:
+            room = self.max_pending - len(self._queue)
+            if room < len(events):
+                self._stats["dropped"] += len(events) - max(room, 0)
+                events = events[len(events) - max(room, 0):]
+            self._queue.extendleft(reversed(events))
+
+    @staticmethod
+    def _aggregate(events: List[UsageEvent]) -> Dict[int, Dict[str, Any]]:
+        """按模型汇总计数器增量"""
+        deltas: Dict[int, Dict[str, Any]] = {}
+        for ev in events:
+            d = deltas.setdefault(ev.model_id, {
+                "total": 0, "prompt": 0, "completion": 0,
+                "requests": 0, "failures": 0,
+                "last_used_at": ev.created_at, "last_failure_reason": None,
+            })
+            d["total"] += ev.total_tokens
+            d["prompt"] += ev.prompt_tokens
+            d["completion"] += ev.completion_tokens
+            d["requests"] += 1
+            if ev.created_at > d["last_used_at"]:
+                d["last_used_at"] = ev.created_at
+            if not ev.success:
+                d["failures"] += 1
+                d["last_failure_reason"] = ev.error_type
+        return deltas
+
+    def flush(self) -> int:
+        """
+        把缓冲的事件批量落库
+
+        Returns:
+            本次写入的事件数
+        """
+        with self._flush_lock:
+            events = self._drain()
+            if not events:
+                return 0
+
+            try:
+                from database.connection import SessionLocal, LLMModel, TokenUsageLog
+                from sqlalchemy import func
+            except ImportError as e:
+                logger.error(f"[TokenLedger] 无法导入数据库连接: {e}")
+                self._requeue(events)
+                return 0
+
+            db = SessionLocal()
+            try:
+                db.bulk_insert_mappings(TokenUsageLog, [ev.to_log_row() for ev in events])
+
+                for model_id, d in self._aggregate(events).items():
+                    values = {
+                        LLMModel.tokens_used_today: func.coalesce(LLMModel.tokens_used_today, 0) + d["total"],
+                        LLMModel.tokens_used_total: func.coalesce(LLMModel.tokens_used_total, 0) + d["total"],
+                        LLMModel.tokens_input_total: func.coalesce(LLMModel.tokens_input_total, 0) + d["prompt"],
+                        LLMModel.tokens_output_total: func.coalesce(LLMModel.tokens_output_total, 0) + d["completion"],
+                        LLMModel.request_count_total: func.coalesce(LLMModel.request_count_total, 0) + d["requests"],
+                        LLMModel.request_count_today: func.coalesce(LLMModel.request_count_today, 0) + d["requests"],
+                        LLMModel.last_used_at: d["last_used_at"],
+                    }
+                    if d["failures"]:
+                        values[LLMModel.failure_count_total] = (
+                            func.coalesce(LLMModel.failure_count_total, 0) + d["failures"]
+                        )
+                        values[LLMModel.last_failure_reason] = d["last_failure_reason"]
+
+                    db.query(LLMModel).filter(LLMModel.id == model_id).update(
+                        values, synchronize_session=False
+                    )
+
+                db.commit()
+            except Exception as e:
+                logger.warning(f"[TokenLedger] 批量写入 Token 使用量失败，稍后重试: {e}")
+                try:
+                    db.rollback()
+                except Exception:
+                    pass
+                self._requeue(events)
+                with self._lock:
+                    self._stats["flush_errors"] += 1
+                return 0
+            finally:
+                db.close()
+
+            with self._lock:
+                self._stats["flushed"] += len(events)
+                self._stats["flush_count"] += 1
+                self._stats["last_flush_at"] = datetime.now().isoformat()
+
+            logger.debug(f"[TokenLedger] 已落库 {len(events)} 条使用记录")
+            return len(events)
+
+    def stop(self):
+        """停止后台线程并做最后一次刷新"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓冲统计"""
+        with self._lock:
+            return {**self._stats, "pending": len(self._queue)}
+
+
+# 全局单例
+_usage_ledger: Optional[TokenUsageLedger] = None
+
+
+def get_usage_ledger() -> TokenUsageLedger:
+    """获取全局 Token 使用量聚合器"""
+    global _usage_ledger
+    if _usage_ledger is None:
+        _usage_ledger = TokenUsageLedger()
+    return _usage_ledger
+
+
+def stop_usage_ledger():
+    """应用关闭时调用：刷新剩余事件"""
+    if _usage_ledger is not None:
+        _usage_ledger.stop()
@@ -8,99 +8,12 @@ LLM 包装器模块
 """
 import json
 import logging
-import re
 from typing import Any, Dict, List, Optional
 
-logger = logging.getLogger(__name__)
-
-
-def _find_matching_brace(text: str) -> int:
-    """
-    找到与第一个 '{' 匹配的 '}' 的位置索引。
-    正确处理 JSON 字符串中的转义字符和嵌套括号。
-    返回 -1 表示未找到匹配。
-    
-    移植自 browser-use 0.11.1 的 _find_matching_brace()
-    """
-    if not text or text[0] != '{':
-        return -1
-
-    depth = 0
-    in_string = False
-    escape_next = False
-    i = 0
-
-    while i < len(text):
-        ch = text[i]
-
-        if escape_next:
-            escape_next = False
-            i += 1
-            continue
+from .json_parser import parse_llm_json
+from .schema_prompt import get_schema_prompt_cache
 
-        if ch == '\\' and in_string:
-            escape_next = True
-            i += 1
-            continue
-
-        if ch == '"' and not escape_next:
-            in_string = not in_string
-        elif not in_string:
-            if ch == '{':
-                depth += 1
-            elif ch == '}':
-                depth -= 1
-                if depth == 0:
-                    return i
-
-        i += 1
-
-    return -1
-
-
-def _clean_llm_json_output(text: str) -> str:
-    """
-    清理 LLM 返回的非标准 JSON 输出
-    
-    移植自 browser-use 0.11.1 的 _clean_llm_json_output()
-    
-    处理：
-    1. 剥离 <think>...</think> 推理标签（包括嵌在 JSON 字段值内的）
-    2. 剥离 markdown 代码块包裹
-    3. 修复不规范的 JSON 转义字符
-    4. 用括号匹配提取完整 JSON 对象（解决 Extra data / trailing characters）
-    """
-    cleaned = text.strip()
-
-    # 1. 剥离 <think>...</think>（贪婪匹配，可能跨多行）
-    cleaned = re.sub(r'<think>[\s\S]*?</think>', '', cleaned).strip()
-
-    # 2. 剥离 markdown 代码块
-    md_match = re.search(r'```(?:json)?\s*\n?([\s\S]*?)\n?```', cleaned)
-    if md_match:
-        cleaned = md_match.group(1).strip()
-
-    # 3. 如果不是以 { 开头，找到第一个 {
-    if cleaned and cleaned[0] != '{':
-        idx = cleaned.find('{')
-        if idx >= 0:
-            cleaned = cleaned[idx:]
-
-    # 4. 修复不规范的转义
-    cleaned = cleaned.replace("\\'", "'")
-
-    # 5. 用括号匹配提取完整 JSON 对象
-    if cleaned.startswith('{'):
-        end_idx = _find_matching_brace(cleaned)
-        if end_idx > 0 and end_idx < len(cleaned) - 1:
-            extracted = cleaned[:end_idx + 1]
-            logger.debug(
-                f"[_clean_llm_json_output] 截断 trailing characters: "
-                f"原始 {len(cleaned)} → 提取 {len(extracted)} 字符"
-            )
-            cleaned = extracted
-
-    return cleaned
+logger = logging.getLogger(__name__)
 
 
 class _WrapperResponse:
@@ -130,14 +43,16 @@ class LLMWrapper:
     3. 不同模型输出格式的统一处理
     """
     
-    def __init__(self, llm, action_aliases=None):
+    def __init__(self, llm, action_aliases=None, compact_schema: Optional[bool] = None):
         """
         Args:
             llm: 原始的 LLM 实例（LangChain 或 browser-use 格式）
             action_aliases: 可选的 provider 特定 action 别名映射 dict
                            key=模型返回的名称, value=browser-use 实际名称
+            compact_schema: 是否用紧凑 schema 提示词；为空时取 LLM_SCHEMA_PROMPT_MODE
         """
         object.__setattr__(self, '_llm', llm)
+        object.__setattr__(self, '_compact_schema', compact_schema)
         object.__setattr__(self, '_original_ainvoke', llm.ainvoke if hasattr(llm, 'ainvoke') else None)
 
         # 合并别名映射：默认 + provider 特定
@@ -265,17 +180,13 @@ class LLMWrapper:
                 last_msg = converted_messages[-1]
                 if hasattr(last_msg, 'content'):
                     try:
-                        if hasattr(output_format, 'model_json_schema'):
-                            schema = output_format.model_json_schema()
-                        elif hasattr(output_format, 'schema'):
-                            schema = output_format.schema()
-                        else:
-                            schema = {}
-                        
-                        schema_str = json.dumps(schema, ensure_ascii=False, indent=2)
+                        # schema 按 output_format 类缓存，不再每步重新生成和序列化
+                        schema_prompt = get_schema_prompt_cache().get(
+                            output_format, compact=self._compact_schema
+                        )
                         
                         from langchain_core.messages import HumanMessage
-                        new_content = f"{last_msg.content}\n\nPlease respond with a valid JSON object matching this schema:\n{schema_str}"
+                        new_content = f"{last_msg.content}{schema_prompt}"
                         converted_messages[-1] = HumanMessage(content=new_content)
                         
                     except Exception as e:
@@ -288,12 +199,9 @@ class LLMWrapper:
             try:
                 raw_content = response.content
                 
-                # 使用统一的 JSON 清理（移植自 browser-use 0.11.1）
-                # 处理: <think> 标签（包括嵌在 JSON 字段值内的）、markdown、trailing chars
-                content = _clean_llm_json_output(raw_content)
-                
-                # 尝试解析 JSON，失败则尝试修复截断
-                data = self._try_parse_json(content)
+                # 统一的单遍容错解析：<think> 标签（包括嵌在 JSON 字段值内的）、
+                # markdown、trailing chars、尾部/缺少逗号、max_tokens 截断
+                data = parse_llm_json(raw_content, source=f"LLMWrapper:{self.provider}")
                 
                 # 仅对包含 action 字段的类型（AgentOutput）做 action 格式修正
                 if _has_action_field:
@@ -320,158 +228,6 @@ class LLMWrapper:
             content = response.content if hasattr(response, 'content') else str(response)
             return _WrapperResponse(completion=content)
     
-    def _try_parse_json(self, content: str) -> dict:
-        """
-        尝试解析 JSON，失败时自动修复截断/格式问题
-        
-        Qwen3.5 等大模型常见问题：
-        - JSON 被 max_tokens 截断，如 "action": [{ 就结束了
-        - 尾部多余逗号
-        - 未闭合的括号
-        """
-        # 1. 直接尝试
-        try:
-            return json.loads(content)
-        except json.JSONDecodeError:
-            pass
-        
-        # 2. 移除尾部逗号
-        fixed = re.sub(r',\s*([}\]])', r'\1', content)
-        try:
-            return json.loads(fixed)
-        except json.JSONDecodeError:
-            pass
-        
-        # 3. 用括号匹配提取完整 JSON 对象（解决 Extra data）
-        if content.strip().startswith('{'):
-            end_idx = _find_matching_brace(content.strip())
-            if end_idx > 0:
-                extracted = content.strip()[:end_idx + 1]
-                try:
-                    return json.loads(extracted)
-                except json.JSONDecodeError:
-                    # 提取后仍失败，尝试修复尾部逗号
-                    extracted_fixed = re.sub(r',\s*([}\]])', r'\1', extracted)
-                    try:
-                        return json.loads(extracted_fixed)
-                    except json.JSONDecodeError:
-                        pass
-        
-        # 4. 修复截断的 JSON（补全缺失的括号）
-        patched = fixed.rstrip()
-        if patched.endswith(','):
-            patched = patched[:-1]
-        
-        truncated = self._truncate_to_valid_json(patched)
-        if truncated:
-            try:
-                return json.loads(truncated)
-            except json.JSONDecodeError:
-                pass
-        
-        # 5. 暴力补全括号
-        open_braces = patched.count('{') - patched.count('}')
-        open_brackets = patched.count('[') - patched.count(']')
-        if open_braces > 0 or open_brackets > 0:
-            patched += ']' * max(0, open_brackets) + '}' * max(0, open_braces)
-            patched = re.sub(r',\s*([}\]])', r'\1', patched)
-            try:
-                return json.loads(patched)
-            except json.JSONDecodeError:
-                pass
-        
-        # 6. 全部失败，抛出原始错误
-        return json.loads(content)
-    
-    @staticmethod
-    def _truncate_to_valid_json(text: str) -> Optional[str]:
-        """
-        将截断的 JSON 修复为有效 JSON
-        
-        策略：找到最后一个完整的 key-value 对，截断后面的不完整部分，
-        然后补全括号。
-        
-        例如:
-        {"thinking": "...", "action": [{   → {"thinking": "...", "action": []}
-        {"thinking": "...", "next_goal": " → {"thinking": "..."}
-        """
-        if not text or not text.startswith('{'):
-            return None
-        
-        # 从后往前找到最后一个完整的 value 结束标记
-        # 完整 value 结束于: "string", number, true, false, null, }, ]
-        # 不完整的情况: 截断在字符串中间、对象/数组中间
-        
-        best_pos = -1
-        depth_brace = 0
-        depth_bracket = 0
-        in_string = False
-        escape_next = False
-        
-        for i in range(len(text)):
-            ch = text[i]
-            
-            if escape_next:
-                escape_next = False
-                continue
-            
-            if ch == '\\' and in_string:
-                escape_next = True
-                continue
-            
-            if ch == '"' and not escape_next:
-                in_string = not in_string
-                if not in_string:
-                    # 字符串结束，可能是一个完整的 value
-                    # 检查这是否是一个 value（前面有冒号）或 key
-                    # 简单策略：记录位置，后续判断
-                    best_pos = i
-                continue
-            
-            if in_string:
-                continue
-            
-            if ch == '{':
-                depth_brace += 1
-            elif ch == '}':
-                depth_brace -= 1
-                best_pos = i
-            elif ch == '[':
-                depth_bracket += 1
-            elif ch == ']':
-                depth_bracket -= 1
-                best_pos = i
-            elif ch in '0123456789':
-                best_pos = i
-            elif ch == 'e' and i >= 3 and text[i-3:i+1] in ('true', 'alse'):
-                best_pos = i
-            elif ch == 'l' and i >= 3 and text[i-3:i+1] == 'null':
-                best_pos = i
-        
-        if best_pos <= 0:
-            return None
-        
-        # 截断到 best_pos
-        truncated = text[:best_pos + 1].rstrip()
-        
-        # 去掉尾部逗号
-        if truncated.endswith(','):
-            truncated = truncated[:-1]
-        
-        # 补全括号
-        open_braces = truncated.count('{') - truncated.count('}')
-        open_brackets = truncated.count('[') - truncated.count(']')
-        
-        if open_brackets > 0:
-            truncated += ']' * open_brackets
-        if open_braces > 0:
-            truncated += '}' * open_braces
-        
-        # 清理尾部逗号（补全括号后可能出现 ,] 或 ,}）
-        truncated = re.sub(r',\s*([}\]])', r'\1', truncated)
-        
-        return truncated
-    
     # browser-use 0.11.1 注册的合法 action 名称（函数名即 action 名）
     VALID_BROWSER_ACTIONS = {
         # 导航
@@ -632,7 +388,7 @@ class LLMWrapper:
     
     def __getattr__(self, name):
         """委托属性访问到原始 LLM"""
-        if name in ['provider', 'model', '_original_ainvoke']:
+        if name in ['provider', 'model', '_original_ainvoke', '_compact_schema']:
             return object.__getattribute__(self, name)
         return getattr(self._llm, name)
     
@@ -647,17 +403,18 @@ class LLMWrapper:
         return f"LLMWrapper(provider={self.provider}, model={self.model}, llm={self._llm})"
 
 
-def wrap_llm(llm, action_aliases=None) -> LLMWrapper:
+def wrap_llm(llm, action_aliases=None, compact_schema: Optional[bool] = None) -> LLMWrapper:
     """
     包装 LLM 实例
     
     Args:
         llm: 原始 LLM 实例
         action_aliases: 可选的 provider 特定 action 别名映射
+        compact_schema: 是否用紧凑 schema 提示词；为空时取 LLM_SCHEMA_PROMPT_MODE
     
     Returns:
         LLMWrapper 实例
     """
     if isinstance(llm, LLMWrapper):
         return llm
-    return LLMWrapper(llm, action_aliases=action_aliases)
+    return LLMWrapper(llm, action_aliases=action_aliases, compact_schema=compact_schema)